@@ -1,102 +1,533 @@
 #!/usr/bin/env python3
 """
 API wrapper for Docker and QEMU operations
-Called from Electron via command line
+Called from Electron via command line (one action per process), or kept
+resident with --serve and driven over newline-delimited JSON-RPC 2.0
+
+Every action is declared in ACTIONS with the JSON arguments it takes. Arguments
+are checked against that schema before anything else happens, and a service's
+module (docker, qemu) is only imported when one of its actions runs, so a
+Docker call never pays for QEMU's imports and vice versa.
 """
+import io
+import os
 import sys
+import copy
 import json
 import argparse
-from docker import DockerManager
-from qemu import Qemu
+import importlib
+import threading
+import instrumentation
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+# service -> (module, manager class), imported on first use
+SERVICES = {
+    'docker': ('docker', 'DockerManager'),
+    'qemu': ('qemu', 'Qemu'),
+}
+
+_TYPES = {
+    'str': (str,),
+    'int': (int,),
+    'number': (int, float),
+    'bool': (bool,),
+    'list': (list,),
+    'dict': (dict,),
+}
+
+_manager_lock = threading.Lock()
+
+
+class ActionError(Exception):
+    """A request that cannot be run: unknown method or invalid arguments"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Param:
+    """One JSON argument: accepted types ('any' or names from _TYPES), default and method keyword.
+
+    `convert`, when given, normalises a supplied value; a ValueError from it
+    is reported as invalid params.
+    """
+
+    def __init__(self, name, types='any', default=None, arg=None, aliases=(), convert=None):
+        self.name = name
+        self.types = (types,) if isinstance(types, str) else tuple(types)
+        self.default = default
+        self.arg = arg or name
+        self.aliases = aliases
+        self.convert = convert
+
+    def value(self, params):
+        """The argument from params; missing or null means the default"""
+        value = params.get(self.name)
+        for alias in self.aliases:
+            if value is None:
+                value = params.get(alias)
+        if value is None:
+            return copy.copy(self.default) if isinstance(self.default, (list, dict)) else self.default
+        if 'any' not in self.types and not any(
+                # JSON booleans are Python ints; only accept them where a bool is expected
+                isinstance(value, _TYPES[name]) and (name == 'bool' or not isinstance(value, bool))
+                for name in self.types):
+            raise ActionError(INVALID_PARAMS, f"Invalid argument '{self.name}': expected {' or '.join(self.types)}, "
+                                              f"got {type(value).__name__}")
+        if self.convert is not None:
+            try:
+                return self.convert(value)
+            except ValueError as e:
+                raise ActionError(INVALID_PARAMS, f"Invalid argument '{self.name}': {e}")
+        return value
+
+    def describe(self):
+        return {"type": self.types[0] if len(self.types) == 1 else list(self.types), "default": self.default}
+
+
+class Action:
+    """A callable action: manager method (or function for 'backend'), arguments and push channels.
+
+    `channels` maps method keywords to Notifier attributes; they are None in
+    one-shot mode, and actions marked `serve_only` refuse to run without them.
+    `fixed` holds keywords that are the same for every call.
+    """
+
+    def __init__(self, service, name, method=None, params=(), channels=None, serve_only=False, fixed=None):
+        self.service = service
+        self.name = name
+        self.method = method or name
+        self.params = params
+        self.channels = channels or {}
+        self.serve_only = serve_only
+        self.fixed = fixed or {}
+
+    def bind(self, params):
+        """Method keywords for a request's params; raises ActionError on a bad argument"""
+        if not isinstance(params, dict):
+            raise ActionError(INVALID_PARAMS, "params must be an object")
+        kwargs = {param.arg: param.value(params) for param in self.params}
+        kwargs.update(self.fixed)
+        return kwargs
+
+    def describe(self):
+        return {"params": {param.name: param.describe() for param in self.params},
+                "serve_only": self.serve_only}
+
+
+ACTIONS = {}
+
+
+def action(service, name, *params, **options):
+    ACTIONS[(service, name)] = Action(service, name, params=params, **options)
+
+
+def _backend_metrics(format='json', reset=False):
+    data = instrumentation.prometheus_text() if format == 'prometheus' else instrumentation.snapshot()
+    if reset:
+        instrumentation.reset()
+    return json.dumps({"success": True, "data": data})
+
+
+def _backend_traces(limit=None):
+    return json.dumps({"success": True, "data": instrumentation.recent_traces(limit)})
+
+
+def _backend_set_profiling(directory=None):
+    return json.dumps({"success": True, "data": instrumentation.set_profiling(directory)})
+
+
+# Arguments shared by several actions
+ID = Param('id', 'str', '', arg='ID')
+FORCE = Param('force', 'bool', False)
+TIMEOUT = Param('timeout', 'number')
+INTERVAL = Param('interval', ('number', 'str'))
+RANGE = (Param('start', ('number', 'str')), Param('end', ('number', 'str')), Param('points', ('int', 'str')))
+def _log_tail(value):
+    # docker_logs comes with the docker service; never import it for other actions
+    from docker_logs import parse_tail
+    return parse_tail(value)
+
+
+TAIL = Param('tail', ('int', 'str'), 100, convert=_log_tail)
+LOG_FILTERS = (Param('pattern', 'str'), Param('levels', ('list', 'str')),
+               Param('since', ('str', 'number')), Param('until', ('str', 'number')))
+VM = Param('vm', ('str', 'int'), aliases=('pid',))
+PATH = Param('path', 'str', '')
+NAME = Param('name', 'str', '')
+TAG = Param('tag', 'str')
+TARGET = Param('target', ('str', 'int'), '')
+COMPRESS = Param('compress', 'bool', False)
+RATE_LIMIT = Param('rate_limit', ('str', 'int'))
+
+
+def _hub_page(value):
+    # Imports the docker service only when a page is given; its action needs it next anyway
+    from docker import check_page
+    return check_page(value)
+
+
+def _hub_page_size(value):
+    from docker import check_page_size
+    return check_page_size(value)
+
+
+# -- docker --------------------------------------------------------------------
+
+action('docker', 'list_images')
+action('docker', 'list_containers')
+action('docker', 'list_running_containers')
+action('docker', 'create_dockerfile', PATH, Param('code', 'str', ''))
+action('docker', 'build_image', PATH, Param('tag', 'str', ''), Param('cache_from', ('list', 'str')),
+       Param('no_cache', 'bool', False), Param('target', 'str'), Param('build_args', 'dict'),
+       channels={'on_event': 'build_progress'})
+action('docker', 'stop_container', ID, TIMEOUT)
+action('docker', 'start_container', ID)
+action('docker', 'create_container', Param('image', 'str', ''), Param('name', 'str'), Param('ports'),
+       Param('env_vars'))
+action('docker', 'restart_container', ID, TIMEOUT)
+action('docker', 'delete_container', ID, FORCE)
+for _bulk in ('start', 'stop', 'restart', 'delete'):
+    action('docker', f'{_bulk}_containers', Param('ids', ('list', 'str')), Param('labels', ('list', 'dict', 'str')),
+           TIMEOUT, FORCE, Param('max_workers', 'int'), method='bulk_container_action', fixed={'action': _bulk})
+action('docker', 'delete_image', ID, FORCE)
+action('docker', 'get_container_logs', ID, TAIL, Param('cursor', 'str'), *LOG_FILTERS)
+action('docker', 'follow_logs', ID, TAIL, *LOG_FILTERS,
+       method='follow_container_logs', channels={'listener': 'log'}, serve_only=True)
+action('docker', 'unfollow_logs', ID, method='unfollow_container_logs', channels={'listener': 'log'})
+action('docker', 'get_container_stats', ID)
+action('docker', 'get_containers_stats', Param('ids', ('list', 'str'), 'all'))
+action('docker', 'start_metrics', INTERVAL)
+action('docker', 'stop_metrics')
+action('docker', 'get_metrics', Param('id', 'str', arg='ID'), *RANGE)
+action('docker', 'cache_stats', Param('clear', 'bool', False))
+action('docker', 'search_dockerhub', NAME, Param('page', 'int', 1, convert=_hub_page),
+       Param('page_size', 'int', convert=_hub_page_size),
+       Param('official_only', 'bool', False), Param('min_stars', 'int', 0), Param('limit', 'int'),
+       Param('fresh', 'bool', False))
+action('docker', 'pull_image', NAME, channels={'on_progress': 'pull_progress'})
+action('docker', 'pull_images', Param('names', 'list', []), channels={'on_progress': 'pull_progress'})
+action('docker', 'cancel_pull', NAME)
+action('docker', 'search_image_local', NAME, Param('limit', 'int'))
+action('docker', 'subscribe_events', channels={'listener': 'inventory'}, serve_only=True)
+action('docker', 'unsubscribe_events', channels={'listener': 'inventory'})
+action('docker', 'get_inventory', Param('since_version', 'int'))
+
+# -- qemu ------------------------------------------------------------------------
+
+action('qemu', 'start_virtual_machine', Param('cpu_cores', ('int', 'str')), Param('ram_size', ('int', 'str')),
+       Param('disk_path', 'str'), Param('iso_path', 'str'), Param('name', 'str'), Param('profile', 'str'),
+       Param('options', 'dict'), Param('dry_run', 'bool', False), Param('snapshot', 'str'),
+       Param('placement', 'dict'), channels={'on_queued': 'vm_queue'})
+action('qemu', 'create_vm_from_config', Param('config_file_path', 'str', ''))
+action('qemu', 'delete_vm', Param('disk_path', 'str', ''))
+action('qemu', 'list_running_vms', Param('legacy', 'bool', False))
+action('qemu', 'vm_status', VM)
+action('qemu', 'stop_vm', Param('vm', ('str', 'int'), arg='pid', aliases=('pid',)), FORCE, TIMEOUT)
+action('qemu', 'create_disk_image', PATH, Param('size', ('str', 'int'), ''))
+action('qemu', 'get_capabilities', Param('refresh', 'bool', False))
+action('qemu', 'save_snapshot', Param('vm', ('str', 'int'), ''), TAG, Param('stop', 'bool', False))
+action('qemu', 'restore_snapshot', Param('vm', ('str', 'int'), ''), Param('tag', 'str', ''))
+action('qemu', 'list_snapshots', TARGET)
+action('qemu', 'delete_snapshot', TARGET, Param('tag', 'str', ''))
+action('qemu', 'resume_vm', Param('disk_path', 'str', ''), TAG, Param('name', 'str'))
+action('qemu', 'scheduler_status')
+action('qemu', 'set_scheduler_policy', Param('policy', 'dict', {}, arg='changes'))
+action('qemu', 'cancel_queued_vm', Param('queue_id', ('str', 'int')))
+action('qemu', 'start_vm_metrics', INTERVAL)
+action('qemu', 'stop_vm_metrics')
+action('qemu', 'get_vm_metrics', Param('vm', ('str', 'int')), *RANGE)
+action('qemu', 'convert_disk', Param('source', 'str', ''), Param('output', 'str'),
+       Param('format', 'str', 'qcow2', arg='fmt'), COMPRESS, RATE_LIMIT, Param('overwrite', 'bool', False),
+       channels={'on_progress': 'disk_job'})
+action('qemu', 'compact_disk', PATH, COMPRESS, RATE_LIMIT, channels={'on_progress': 'disk_job'})
+action('qemu', 'list_disk_jobs', Param('id', 'str', arg='job_id'))
+action('qemu', 'cancel_disk_job', Param('id', 'str', '', arg='job_id'))
+action('qemu', 'resume_disk_jobs', channels={'on_progress': 'disk_job'})
+action('qemu', 'inspect_disk', PATH)
+action('qemu', 'list_disk_images', Param('directory', 'str', ''))
+action('qemu', 'list_base_images')
+action('qemu', 'add_base_image', PATH, Param('name', 'str'), Param('copy', 'bool', False))
+action('qemu', 'remove_base_image', Param('base', 'str', ''), Param('delete_file', 'bool', False), FORCE)
+action('qemu', 'create_overlay_disk', Param('base', 'str', ''), PATH, Param('size', ('str', 'int')))
+action('qemu', 'commit_overlay', PATH, FORCE)
+action('qemu', 'rebase_overlay', PATH, Param('base', 'str', ''))
+action('qemu', 'flatten_overlay', PATH)
+
+# -- backend ---------------------------------------------------------------------
+
+action('backend', 'metrics', Param('format', 'str', 'json'), Param('reset', 'bool', False), method=_backend_metrics)
+action('backend', 'traces', Param('limit', 'int'), method=_backend_traces)
+action('backend', 'set_profiling', Param('directory', 'str'), method=_backend_set_profiling)
+
+
+def get_manager(managers, service):
+    """Return the cached manager for a service, importing its module and creating it on first use"""
+    with _manager_lock:
+        manager = managers.get(service)
+        if manager is None:
+            module, class_name = SERVICES[service]
+            manager = getattr(importlib.import_module(module), class_name)()
+            managers[service] = manager
+        return manager
+
+
+def prepare(service, action_name, params):
+    """(Action, method keywords) for a request, or ActionError; imports nothing"""
+    spec = ACTIONS.get((service, action_name))
+    if spec is None:
+        if service not in SERVICES and service != 'backend':
+            raise ActionError(METHOD_NOT_FOUND, f"Unknown service: {service}")
+        raise ActionError(METHOD_NOT_FOUND, f"Unknown action: {action_name}")
+    return spec, spec.bind(params if params is not None else {})
+
+
+def invoke(spec, kwargs, managers=None, notify=None):
+    """Run a prepared action and return its JSON string result.
+
+    `managers` keeps DockerManager/Qemu instances alive between calls; the
+    one-shot CLI passes a fresh dict, the server keeps one for its lifetime.
+    `notify` carries the server-push channels and is only available in server mode.
+    """
+    if spec.serve_only and notify is None:
+        return json.dumps({"success": False, "error": f"{spec.name} requires --serve mode"})
+    for keyword, channel in spec.channels.items():
+        kwargs[keyword] = getattr(notify, channel) if notify is not None else None
+    if spec.service == 'backend':
+        return spec.method(**kwargs)
+    manager = get_manager(managers if managers is not None else {}, spec.service)
+    return getattr(manager, spec.method)(**kwargs)
+
+
+def dispatch(service, action_name, params, managers=None, notify=None):
+    """Validate and run a single action, returning its JSON string result"""
+    try:
+        spec, kwargs = prepare(service, action_name, params)
+    except ActionError as e:
+        return json.dumps({"success": False, "error": e.message})
+    return invoke(spec, kwargs, managers, notify)
+
+
+def describe_actions():
+    """Argument schema of every action, keyed by JSON-RPC method name"""
+    return {f"{service}.{name}": spec.describe() for (service, name), spec in sorted(ACTIONS.items())}
+
+
+class RpcConnection:
+    """One JSON-RPC peer: reads request lines, answers them by id.
+
+    Requests are executed on a shared thread pool so a slow action (pull,
+    build) never blocks the list/stats calls queued behind it. Responses are
+    written as soon as each one finishes, so they may arrive out of order.
+    """
+
+    def __init__(self, reader, writer, managers, executor):
+        self.reader = reader
+        self.writer = writer
+        self.managers = managers
+        self.executor = executor
+        self._write_lock = threading.Lock()
+        self.notify = Notifier(self)
+
+    def send(self, message):
+        line = json.dumps(message) + '\n'
+        with self._write_lock:
+            try:
+                self.writer.write(line)
+                self.writer.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                # Peer went away; nothing left to report to
+                pass
+
+    def send_notification(self, method, params):
+        self.send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def send_error(self, request_id, code, message):
+        self.send({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}})
+
+    def handle_line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            self.send_error(None, PARSE_ERROR, f"Parse error: {e}")
+            return
+
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            self.send_error(None, INVALID_REQUEST, "Invalid request")
+            return
+
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            self.send_error(request_id, INVALID_REQUEST, "params must be an object")
+            return
+
+        if method == 'ping':
+            self.send({"jsonrpc": "2.0", "id": request_id, "result": {"success": True}})
+            return
+
+        service, _, action_name = method.partition('.')
+        try:
+            spec, kwargs = prepare(service, action_name, params)
+        except ActionError as e:
+            message = f"Unknown method: {method}" if e.code == METHOD_NOT_FOUND else e.message
+            self.send_error(request_id, e.code, message)
+            return
+
+        self.executor.submit(self._run, request_id, spec, kwargs)
+
+    def _run(self, request_id, spec, kwargs):
+        try:
+            result = json.loads(invoke(spec, kwargs, self.managers, self.notify))
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        # Requests without an id are notifications and get no response
+        if request_id is not None:
+            self.send({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+    def serve_forever(self):
+        try:
+            for line in self.reader:
+                self.handle_line(line)
+        finally:
+            self.close()
+
+    def close(self):
+        # Drop this peer's subscriptions so background watchers can stop
+        docker = self.managers.get('docker')
+        if docker is not None:
+            docker.unsubscribe_events(self.notify.inventory)
+            docker.unfollow_container_logs(None, self.notify.log)
+        qemu = self.managers.get('qemu')
+        if qemu is not None:
+            qemu.unwatch_disk_jobs(self.notify.disk_job)
+
+
+class Notifier:
+    """Server-push channels for one connection, handed to subscription actions"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, method, params):
+        self.connection.send_notification(method, params)
+
+    def inventory(self, delta):
+        self.connection.send_notification('docker.inventory', delta)
+
+    def pull_progress(self, event):
+        self.connection.send_notification('docker.pull_progress', event)
+
+    def build_progress(self, event):
+        self.connection.send_notification('docker.build_progress', event)
+
+    def log(self, payload):
+        self.connection.send_notification('docker.log', payload)
+
+    def disk_job(self, job):
+        self.connection.send_notification('qemu.disk_job', job)
+
+    def vm_queue(self, result):
+        self.connection.send_notification('qemu.vm_queue', result)
+
+
+def serve(socket_path=None, workers=8, metrics_port=None):
+    """Run the resident backend until stdin closes (or forever on a socket)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    managers = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+    if metrics_port:
+        instrumentation.serve_metrics(metrics_port)
+
+    if socket_path:
+        import socketserver
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                reader = io.TextIOWrapper(self.rfile, encoding='utf-8')
+                writer = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+                RpcConnection(reader, writer, managers, executor).serve_forever()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = Server(socket_path, Handler)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            executor.shutdown(wait=True)
+        return
+
+    # Keep the real stdout for the protocol; anything else printed by a
+    # module goes to stderr instead of corrupting the response stream
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    connection = RpcConnection(sys.stdin, protocol_out, managers, executor)
+    try:
+        connection.serve_forever()
+    finally:
+        executor.shutdown(wait=True)
+
 
 def main():
     parser = argparse.ArgumentParser(description='Docker and QEMU API')
-    parser.add_argument('--service', required=True, choices=['docker', 'qemu'], help='Service to use')
-    parser.add_argument('--action', required=True, help='Action to perform')
+    parser.add_argument('--service', choices=sorted({service for service, _ in ACTIONS}), help='Service to use')
+    parser.add_argument('--action', help='Action to perform')
     parser.add_argument('--args', help='JSON string with arguments')
-    
+    parser.add_argument('--serve', action='store_true', help='Run as a resident JSON-RPC server')
+    parser.add_argument('--socket', help='Unix socket path for --serve (default: stdin/stdout)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests in --serve mode')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve /metrics (Prometheus) and /metrics.json on 127.0.0.1:PORT in --serve mode')
+    parser.add_argument('--profile', metavar='DIR', help='Write a cProfile .pstats file per action into DIR')
+    parser.add_argument('--trace', action='store_true', help='Print the action\'s span tree to stderr')
+    parser.add_argument('--list-actions', action='store_true', help='Print every action and its argument schema')
+
     args = parser.parse_args()
-    
+    instrumentation.record_startup()
+    if args.profile:
+        instrumentation.set_profiling(args.profile)
+
+    if args.list_actions:
+        sys.stdout.write(json.dumps(describe_actions(), indent=2) + '\n')
+        sys.exit(0)
+
+    if args.serve:
+        serve(args.socket, args.workers, args.metrics_port)
+        sys.exit(0)
+
+    if not args.service or not args.action:
+        parser.error('--service and --action are required unless --serve or --list-actions is given')
+
     try:
-        if args.service == 'docker':
-            manager = DockerManager()
-            action = args.action
-            
-            # Parse arguments
-            params = json.loads(args.args) if args.args else {}
-            
-            # Map actions to methods
-            if action == 'list_images':
-                result = manager.list_images()
-            elif action == 'list_containers':
-                result = manager.list_containers()
-            elif action == 'list_running_containers':
-                result = manager.list_running_containers()
-            elif action == 'create_dockerfile':
-                result = manager.create_dockerfile(params.get('path', ''), params.get('code', ''))
-            elif action == 'build_image':
-                result = manager.build_image(params.get('path', ''), params.get('tag', ''))
-            elif action == 'stop_container':
-                result = manager.stop_container(params.get('id', ''))
-            elif action == 'start_container':
-                result = manager.start_container(params.get('id', ''))
-            elif action == 'create_container':
-                result = manager.create_container(
-                    params.get('image', ''),
-                    params.get('name'),
-                    params.get('ports'),
-                    params.get('env_vars')
-                )
-            elif action == 'delete_container':
-                result = manager.delete_container(params.get('id', ''), params.get('force', False))
-            elif action == 'delete_image':
-                result = manager.delete_image(params.get('id', ''), params.get('force', False))
-            elif action == 'get_container_logs':
-                result = manager.get_container_logs(params.get('id', ''), params.get('tail', 100))
-            elif action == 'get_container_stats':
-                result = manager.get_container_stats(params.get('id', ''))
-            elif action == 'search_dockerhub':
-                result = manager.search_dockerhub(params.get('name', ''))
-            elif action == 'pull_image':
-                result = manager.pull_image(params.get('name', ''))
-            elif action == 'search_image_local':
-                result = manager.search_image_local(params.get('name', ''))
-            else:
-                result = json.dumps({"success": False, "error": f"Unknown action: {action}"})
-        
-        elif args.service == 'qemu':
-            qemu = Qemu()
-            action = args.action
-            
-            # Parse arguments
-            params = json.loads(args.args) if args.args else {}
-            
-            # Map actions to methods
-            if action == 'start_virtual_machine':
-                result = qemu.start_virtual_machine(
-                    params.get('cpu_cores'),
-                    params.get('ram_size'),
-                    params.get('disk_path'),
-                    params.get('iso_path')
-                )
-            elif action == 'create_vm_from_config':
-                result = qemu.create_vm_from_config(params.get('config_file_path', ''))
-            elif action == 'delete_vm':
-                result = qemu.delete_vm(params.get('disk_path', ''))
-            elif action == 'list_running_vms':
-                result = qemu.list_running_vms()
-            elif action == 'stop_vm':
-                result = qemu.stop_vm(params.get('pid'))
-            elif action == 'create_disk_image':
-                result = qemu.create_disk_image(params.get('path', ''), params.get('size', ''))
-            else:
-                result = json.dumps({"success": False, "error": f"Unknown action: {action}"})
-        
+        # Parse arguments
+        params = json.loads(args.args) if args.args else {}
+        result = dispatch(args.service, args.action, params)
+
         # Output result (ensure no extra output before JSON)
         sys.stdout.write(result)
         sys.stdout.flush()
+        if args.trace:
+            sys.stderr.write(json.dumps(instrumentation.recent_traces(1), indent=2) + '\n')
         sys.exit(0)
-    
+
     except Exception as e:
         error_result = json.dumps({"success": False, "error": str(e)})
         sys.stdout.write(error_result)
@@ -105,4 +536,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,87 @@
+"""
+Per-user locations for the backend's caches and persistent state.
+
+Set DOCKER_VM_MANAGER_HOME to keep everything under one directory instead
+(handy for running several isolated backends side by side).
+"""
+import os
+import sys
+import json
+import tempfile
+
+APP_NAME = 'docker-vm-manager'
+
+
+def _base_dir(kind):
+    override = os.environ.get('DOCKER_VM_MANAGER_HOME')
+    if override:
+        return os.path.join(override, kind)
+
+    home = os.path.expanduser('~')
+    if sys.platform == 'win32':
+        if kind == 'cache':
+            root = os.environ.get('LOCALAPPDATA') or os.path.join(home, 'AppData', 'Local')
+            return os.path.join(root, APP_NAME, 'Cache')
+        root = os.environ.get('APPDATA') or os.path.join(home, 'AppData', 'Roaming')
+        return os.path.join(root, APP_NAME)
+    if sys.platform == 'darwin':
+        if kind == 'cache':
+            return os.path.join(home, 'Library', 'Caches', APP_NAME)
+        return os.path.join(home, 'Library', 'Application Support', APP_NAME)
+    if kind == 'cache':
+        return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(home, '.cache'), APP_NAME)
+    return os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.join(home, '.local', 'share'), APP_NAME)
+
+
+def cache_dir():
+    """Directory for data that can be rebuilt at any time (probe results, indexes)"""
+    path = _base_dir('cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_dir():
+    """Directory for state that must survive restarts (registries, jobs)"""
+    path = _base_dir('data')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def runtime_dir():
+    """Short, private directory for sockets (Unix socket paths are limited to ~100 bytes)"""
+    override = os.environ.get('DOCKER_VM_MANAGER_HOME')
+    if override:
+        path = os.path.join(override, 'run')
+    elif os.environ.get('XDG_RUNTIME_DIR'):
+        path = os.path.join(os.environ['XDG_RUNTIME_DIR'], APP_NAME)
+    else:
+        uid = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+        path = os.path.join(tempfile.gettempdir(), f'{APP_NAME}-{uid}')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def read_json(path, default=None):
+    """Load a JSON file, returning `default` if it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    """Write JSON atomically so a crash never leaves a half-written file behind"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,213 @@
+"""
+Disk image inspection with a persistent index.
+
+Formats are detected from the image headers rather than the file name:
+qcow2 (magic, virtual size, backing file and backing format), VMDK (sparse
+and descriptor files), VDI, VHDX, VHD and raw (MBR/GPT boot signature). Only
+the first few KB of each file are read, and results are cached in
+cache_dir()/disk_index.json keyed by path, mtime and size, so listing a
+directory of images again is a stat per file:
+
+    {"path": "/vms/web.qcow2", "format": "qcow2", "virtual_size": 21474836480,
+     "actual_size": 200704, "backing_file": "/images/ubuntu.qcow2", "backing_format": "qcow2",
+     "bootable": null}
+"""
+import os
+import struct
+import threading
+from app_paths import cache_dir, read_json, write_json
+
+INDEX_VERSION = 1
+INDEX_FILE = 'disk_index.json'
+MAX_INDEX_ENTRIES = 4096
+HEADER_BYTES = 64 * 1024
+
+DISK_EXTENSIONS = ('.qcow2', '.raw', '.img', '.vmdk', '.vhdx', '.vdi', '.vhd')
+
+QCOW2_MAGIC = b'QFI\xfb'
+QCOW2_EXT_BACKING_FORMAT = 0xE2792ACA
+VMDK_SPARSE_MAGIC = b'KDMV'
+VMDK_DESCRIPTOR = b'# Disk DescriptorFile'
+VDI_SIGNATURE = 0xBEDA107F
+VHDX_MAGIC = b'vhdxfile'
+VHD_COOKIE = b'conectix'
+
+
+def _qcow2(header, info):
+    version, backing_offset, backing_size = struct.unpack_from('>IQI', header, 4)
+    info["virtual_size"] = struct.unpack_from('>Q', header, 24)[0]
+    info["version"] = version
+    if backing_offset and backing_offset + backing_size <= len(header):
+        info["backing_file"] = header[backing_offset:backing_offset + backing_size].decode('utf-8', 'replace')
+    # Header extensions follow the fixed header (72 bytes in v2, header_length in v3)
+    offset = struct.unpack_from('>I', header, 100)[0] if version >= 3 else 72
+    while offset + 8 <= len(header):
+        ext_type, ext_len = struct.unpack_from('>II', header, offset)
+        if ext_type == 0:
+            break
+        if ext_type == QCOW2_EXT_BACKING_FORMAT:
+            info["backing_format"] = header[offset + 8:offset + 8 + ext_len].decode('ascii', 'replace')
+        offset += 8 + ((ext_len + 7) & ~7)
+
+
+def _vmdk_descriptor(text, info):
+    sectors = 0
+    for line in text.splitlines():
+        line = line.strip()
+        parts = line.split()
+        # Extent lines: RW 41943040 SPARSE "disk-s001.vmdk"
+        if len(parts) >= 2 and parts[0] in ('RW', 'RDONLY', 'NOACCESS') and parts[1].isdigit():
+            sectors += int(parts[1])
+        elif line.startswith('parentFileNameHint='):
+            info["backing_file"] = line.split('=', 1)[1].strip().strip('"')
+            info["backing_format"] = 'vmdk'
+    if sectors:
+        info["virtual_size"] = sectors * 512
+
+
+def _vmdk_sparse(header, info):
+    info["virtual_size"] = struct.unpack_from('<Q', header, 12)[0] * 512
+    # An embedded descriptor lives at descriptor_offset (in sectors)
+    desc_offset, desc_size = struct.unpack_from('<QQ', header, 28)
+    start, end = desc_offset * 512, (desc_offset + desc_size) * 512
+    if desc_offset and end <= len(header):
+        _vmdk_descriptor(header[start:end].split(b'\0', 1)[0].decode('utf-8', 'replace'), info)
+
+
+def detect(path, header=None, footer=None):
+    """Format and sizes of one image, read from its headers"""
+    stat = os.stat(path)
+    info = {
+        "path": path,
+        "format": "raw",
+        "virtual_size": stat.st_size,
+        "actual_size": stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size,
+        "backing_file": None,
+        "backing_format": None,
+        "bootable": None,
+        "modified": stat.st_mtime,
+    }
+    if header is None:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+            if stat.st_size >= 512:
+                f.seek(stat.st_size - 512)
+                footer = f.read(512)
+
+    if header.startswith(QCOW2_MAGIC) and len(header) >= 104:
+        info["format"] = "qcow2"
+        _qcow2(header, info)
+    elif header.startswith(VMDK_SPARSE_MAGIC) and len(header) >= 44:
+        info["format"] = "vmdk"
+        _vmdk_sparse(header, info)
+    elif header.startswith(VMDK_DESCRIPTOR):
+        info["format"] = "vmdk"
+        _vmdk_descriptor(header.decode('utf-8', 'replace'), info)
+    elif len(header) >= 0x178 and struct.unpack_from('<I', header, 0x40)[0] == VDI_SIGNATURE:
+        info["format"] = "vdi"
+        info["virtual_size"] = struct.unpack_from('<Q', header, 0x170)[0]
+    elif header.startswith(VHDX_MAGIC):
+        # The virtual size is buried in the metadata region; leave it unknown
+        info["format"] = "vhdx"
+        info["virtual_size"] = None
+    elif header.startswith(VHD_COOKIE) or (footer and footer.startswith(VHD_COOKIE)):
+        info["format"] = "vpc"
+        info["virtual_size"] = struct.unpack_from('>Q', footer if footer and footer.startswith(VHD_COOKIE)
+                                                  else header, 48)[0]
+    else:
+        # Raw: an MBR (or GPT protective MBR) ends its first sector with 55 AA
+        info["bootable"] = len(header) >= 512 and header[510:512] == b'\x55\xaa'
+    return info
+
+
+class DiskInventory:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), INDEX_FILE)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is None:
+            index = read_json(self.path, {}) or {}
+            self._entries = index.get('entries', {}) if index.get('version') == INDEX_VERSION else {}
+        return self._entries
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        entries = self._entries
+        while len(entries) > MAX_INDEX_ENTRIES:
+            del entries[next(iter(entries))]
+        try:
+            write_json(self.path, {"version": INDEX_VERSION, "entries": entries})
+        except OSError:
+            pass
+        self._dirty = False
+
+    def _lookup(self, path, stat):
+        """Cached info for path, re-reading the headers only if mtime or size changed"""
+        key = os.path.abspath(path)
+        entries = self._load()
+        entry = entries.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return dict(entry['info'], cached=True)
+        info = detect(key)
+        entries.pop(key, None)
+        entries[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "info": info}
+        self._dirty = True
+        return dict(info, cached=False)
+
+    def inspect(self, path):
+        """Header information for one image (from the index when unchanged)"""
+        stat = os.stat(path)
+        with self._lock:
+            info = self._lookup(path, stat)
+            self._flush()
+        return info
+
+    def scan(self, directory):
+        """All disk images directly inside `directory`, sorted by name"""
+        directory = os.path.abspath(directory)
+        images = []
+        seen = set()
+        with self._lock:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if os.path.splitext(entry.name)[1].lower() not in DISK_EXTENSIONS:
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        images.append(self._lookup(entry.path, entry.stat()))
+                        seen.add(os.path.abspath(entry.path))
+                    except OSError:
+                        continue
+            # Forget images that were removed from this directory
+            entries = self._load()
+            for key in [k for k in entries if os.path.dirname(k) == directory and k not in seen]:
+                del entries[key]
+                self._dirty = True
+            self._flush()
+        images.sort(key=lambda info: os.path.basename(info["path"]))
+        return images
+
+    def pick(self, directory, images=None):
+        """The disk a VM in `directory` should boot from.
+
+        Images that serve as the backing file of another image in the same
+        directory are skipped (the overlay is the VM's disk), and so are raw
+        images without a boot sector unless nothing else is left; of the rest
+        the most recently modified wins.
+        """
+        if images is None:
+            images = self.scan(directory)
+        backing = set()
+        for info in images:
+            if info.get("backing_file"):
+                backing.add(os.path.abspath(os.path.join(directory, info["backing_file"])))
+        leaves = [info for info in images if os.path.abspath(info["path"]) not in backing] or images
+        leaves = [info for info in leaves if info.get("bootable") is not False] or leaves
+        if not leaves:
+            return None
+        return max(leaves, key=lambda info: info["modified"])
@@ -0,0 +1,325 @@
+"""
+Background `qemu-img convert` jobs: format conversion and compaction.
+
+- convert: write a copy in another format (qcow2 or raw), e.g. to move a
+  VMDK/VHDX/VDI image off its slow QEMU driver.
+- compact: rewrite an image in place. Zeroed and unused clusters are dropped
+  (qemu-img convert writes sparse output by default), optionally with
+  compression, and overlays keep their backing file.
+
+Output goes to "<target>.part" and is renamed over the target only when
+qemu-img succeeds, so a cancelled or crashed job never leaves a half-written
+disk behind. Jobs run on a small pool (at most `max_concurrent` at a time),
+can be throttled with qemu-img's `-r` rate limit and are persisted in
+data_dir()/disk_jobs.json. Jobs that were queued or running when the backend
+stopped are started again by resume(); qemu-img cannot continue a copy half
+way, so an interrupted job starts over.
+
+Each job runs as a traced action of its own (service "disk_jobs", action
+"convert" or "compact"; see instrumentation), with qemu-img's exec and wait
+spans under it. Progress events go to the job's listener:
+
+    {"id": "3f2a9c1d", "kind": "convert", "state": "running", "progress": 42.5, ...}
+"""
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+import psutil
+from concurrent.futures import ThreadPoolExecutor
+from app_paths import data_dir, read_json, write_json
+from instrumentation import run_action, traced_popen
+
+JOBS_FILE = 'disk_jobs.json'
+DEFAULT_CONCURRENCY = 2
+MAX_FINISHED_JOBS = 100
+PROGRESS_INTERVAL = 0.5
+
+KINDS = ('convert', 'compact')
+OUTPUT_FORMATS = ('qcow2', 'raw')
+ACTIVE_STATES = ('queued', 'running')
+EXTENSIONS = {'qcow2': '.qcow2', 'raw': '.raw'}
+
+_PROGRESS = re.compile(r'\((\d+(?:\.\d+)?)/100%\)')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def build_command(job, qemu_img='qemu-img'):
+    cmd = [qemu_img, 'convert', '-p']
+    if job.get('source_format'):
+        cmd.extend(['-f', job['source_format']])
+    cmd.extend(['-O', job['format']])
+    if job.get('compress') and job['format'] == 'qcow2':
+        cmd.append('-c')
+    if job.get('sparse_size'):
+        cmd.extend(['-S', str(job['sparse_size'])])
+    if job.get('rate_limit'):
+        cmd.extend(['-r', str(job['rate_limit'])])
+    if job.get('backing_file'):
+        # Keep an overlay an overlay: only its own clusters are copied
+        cmd.extend(['-B', job['backing_file']])
+        if job.get('backing_format'):
+            cmd.extend(['-F', job['backing_format']])
+    cmd.extend([job['source'], job['output'] + '.part'])
+    return cmd
+
+
+class DiskJobManager:
+    def __init__(self, path=None, qemu_img='qemu-img', max_concurrent=DEFAULT_CONCURRENCY, inventory=None,
+                 in_use=None):
+        self.path = path or os.path.join(data_dir(), JOBS_FILE)
+        self.qemu_img = qemu_img
+        self.inventory = inventory
+        # in_use(path) -> True if a running VM has the disk open
+        self.in_use = in_use
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='disk-job')
+        self._lock = threading.Lock()
+        self._jobs = (read_json(self.path, {}) or {}).get('jobs', {})
+        self._processes = {}
+        self._scheduled = set()   # job IDs handed to the pool by this process
+        self._cancelled = set()
+        self._listeners = {}
+
+    # -- state -------------------------------------------------------------
+
+    def _save(self):
+        finished = [job for job in self._jobs.values() if job['state'] not in ACTIVE_STATES]
+        finished.sort(key=lambda job: job.get('finished_at') or 0)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job['id']]
+        try:
+            write_json(self.path, {'jobs': self._jobs})
+        except OSError:
+            pass
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+            if 'state' in changes or 'pid' in changes:
+                self._save()
+        listener = self._listeners.get(job_id)
+        if listener is not None:
+            try:
+                listener(snapshot)
+            except Exception:
+                pass
+        return snapshot
+
+    def jobs(self, job_id=None):
+        with self._lock:
+            if job_id:
+                job = self._jobs.get(job_id)
+                return [dict(job)] if job else []
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda job: job['created_at'])
+
+    def unwatch(self, listener):
+        """Stop sending progress to `listener` (its connection went away)"""
+        with self._lock:
+            for job_id in [key for key, value in self._listeners.items() if value == listener]:
+                del self._listeners[job_id]
+
+    # -- submitting --------------------------------------------------------
+
+    def submit(self, kind, source, output=None, fmt=None, compress=False, sparse_size=None, rate_limit=None,
+               overwrite=False, listener=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown job kind: {kind} (expected one of: {', '.join(KINDS)})")
+        source = os.path.abspath(os.path.normpath(source))
+        if not os.path.isfile(source):
+            raise ValueError(f"Disk image does not exist: {source}")
+        if self.in_use is not None and self.in_use(source):
+            raise ValueError(f"{source} is in use by a running VM; stop it first")
+        info = self.inventory.inspect(source) if self.inventory is not None else {}
+        source_format = info.get('format')
+
+        if kind == 'compact':
+            fmt = fmt or (source_format if source_format in OUTPUT_FORMATS else 'qcow2')
+            output = source
+        else:
+            fmt = fmt or 'qcow2'
+            if output is None:
+                output = os.path.splitext(source)[0] + EXTENSIONS.get(fmt, '.' + fmt)
+            output = os.path.abspath(os.path.normpath(output))
+            if output == source:
+                raise ValueError("Output must differ from the source; use a compact job to rewrite in place")
+            if os.path.exists(output) and not overwrite:
+                raise ValueError(f"Output already exists: {output}")
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {fmt} (expected one of: {', '.join(OUTPUT_FORMATS)})")
+        if rate_limit is not None and int(rate_limit) <= 0:
+            raise ValueError("rate_limit must be a positive number of bytes per second")
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job['state'] in ACTIVE_STATES and output in (job['output'], job['source']):
+                    raise ValueError(f"Job {job['id']} is already working on {output}")
+            job_id = os.urandom(4).hex()
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "source": source,
+                "source_format": source_format,
+                "output": output,
+                "format": fmt,
+                "compress": bool(compress),
+                "sparse_size": sparse_size,
+                "rate_limit": int(rate_limit) if rate_limit else None,
+                # Compacting an overlay must not flatten it into a full copy
+                "backing_file": info.get('backing_file') if kind == 'compact' and fmt == 'qcow2' else None,
+                "backing_format": info.get('backing_format') if kind == 'compact' and fmt == 'qcow2' else None,
+                "state": "queued",
+                "progress": 0.0,
+                "attempts": 0,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "pid": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._scheduled.add(job_id)
+            if listener is not None:
+                self._listeners[job_id] = listener
+            self._save()
+        self.pool.submit(self._run, job_id)
+        return dict(job)
+
+    def resume(self, listener=None):
+        """Re-queue jobs that were interrupted by a backend restart"""
+        resumed = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job['state'] not in ACTIVE_STATES or job['id'] in self._scheduled:
+                    continue
+                self._kill_orphan(job)
+                job.update(state='queued', progress=0.0, pid=None)
+                self._scheduled.add(job['id'])
+                if listener is not None:
+                    self._listeners[job['id']] = listener
+                resumed.append(job['id'])
+            if resumed:
+                self._save()
+        for job_id in resumed:
+            self.pool.submit(self._run, job_id)
+        return resumed
+
+    @staticmethod
+    def _kill_orphan(job):
+        """A qemu-img left running by a backend that died would race the restarted job"""
+        if not job.get('pid'):
+            return
+        try:
+            process = psutil.Process(job['pid'])
+            if 'qemu-img' in process.name():
+                process.kill()
+        except psutil.Error:
+            pass
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] not in ACTIVE_STATES:
+                return False
+            self._cancelled.add(job_id)
+            process = self._processes.get(job_id)
+        if process is not None:
+            process.terminate()
+        elif job['state'] == 'queued':
+            self._update(job_id, state='cancelled', finished_at=time.time())
+        return True
+
+    # -- running -----------------------------------------------------------
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if job_id in self._cancelled or job['state'] != 'queued':
+                self._cancelled.discard(job_id)
+                self._scheduled.discard(job_id)
+                return
+            job = dict(job)
+        # Started from the pool long after the submitting action returned
+        run_action('disk_jobs', job['kind'], self._execute, job)
+
+    def _execute(self, job):
+        job_id = job['id']
+        part = job['output'] + '.part'
+        before = os.path.getsize(job['source']) if os.path.exists(job['source']) else None
+        self._update(job_id, state='running', started_at=time.time(), attempts=job['attempts'] + 1,
+                     progress=0.0, error=None)
+        try:
+            self._convert(job_id, build_command(job, self.qemu_img))
+            os.replace(part, job['output'])
+            after = os.path.getsize(job['output'])
+            result = self._update(job_id, state='done', progress=100.0, finished_at=time.time(), pid=None,
+                                  size_before=before, size_after=after)
+        except JobCancelled:
+            result = self._update(job_id, state='cancelled', finished_at=time.time(), pid=None)
+        except FileNotFoundError as e:
+            error = "qemu-img not found. Is QEMU installed?" if e.filename == self.qemu_img else str(e)
+            result = self._update(job_id, state='failed', finished_at=time.time(), pid=None, error=error)
+        except Exception as e:
+            result = self._update(job_id, state='failed', finished_at=time.time(), pid=None, error=str(e))
+        finally:
+            with self._lock:
+                self._processes.pop(job_id, None)
+                self._cancelled.discard(job_id)
+                self._scheduled.discard(job_id)
+            if os.path.exists(part):
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+        # The action's outcome in the metrics
+        return json.dumps({"success": result['state'] == 'done', "id": job_id, "state": result['state']})
+
+    def _convert(self, job_id, cmd):
+        with traced_popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            stderr = self._watch(job_id, process)
+        with self._lock:
+            cancelled = job_id in self._cancelled
+        if cancelled:
+            raise JobCancelled()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.decode('utf-8', 'ignore').strip() or
+                               f"qemu-img exited with status {process.returncode}")
+
+    def _watch(self, job_id, process):
+        """Turn qemu-img's -p output into progress updates; returns its stderr"""
+        with self._lock:
+            self._processes[job_id] = process
+            cancelled = job_id in self._cancelled
+        if cancelled:
+            process.terminate()
+        self._update(job_id, pid=process.pid)
+
+        # stderr is drained on the side so a chatty qemu-img can't block on a full pipe
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+        reader.start()
+
+        # -p redraws "    (42.50/100%)" with carriage returns
+        buffer = b''
+        last_sent = 0
+        while True:
+            chunk = process.stdout.read1(4096) if hasattr(process.stdout, 'read1') else process.stdout.read(64)
+            if not chunk:
+                break
+            buffer = (buffer + chunk)[-256:]
+            matches = _PROGRESS.findall(buffer.decode('ascii', 'ignore'))
+            now = time.monotonic()
+            if matches and now - last_sent >= PROGRESS_INTERVAL:
+                last_sent = now
+                self._update(job_id, progress=float(matches[-1]))
+        process.wait()
+        reader.join(timeout=5)
+        return errors[0] if errors else b''
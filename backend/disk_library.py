@@ -0,0 +1,238 @@
+"""
+Golden-image library with qcow2 copy-on-write overlays.
+
+A base ("golden") image is installed once and registered here. New VM disks
+are then thin qcow2 overlays that point at the base through a backing file:
+`qemu-img create -b base -F fmt` writes a few hundred KB of metadata, so a
+fresh VM disk costs milliseconds instead of an OS install. The guest's writes
+land in the overlay and the base is never touched.
+
+The library keeps track of which overlays use which base so a base that is
+still referenced cannot be deleted or committed into by accident. State lives
+in data_dir()/disk_library.json:
+
+    {"bases": {"ubuntu-24.04": {"name": ..., "path": ..., "format": "qcow2", "virtual_size": ...}},
+     "overlays": {"/vms/web.qcow2": {"path": ..., "base": "ubuntu-24.04", "created_at": ...}}}
+"""
+import os
+import json
+import time
+import shutil
+import threading
+from app_paths import data_dir, read_json, write_json
+from instrumentation import traced_run
+
+LIBRARY_FILE = 'disk_library.json'
+QEMU_IMG_TIMEOUT = 60
+
+
+def normalize(path):
+    return os.path.normcase(os.path.abspath(os.path.normpath(path)))
+
+
+class DiskLibrary:
+    def __init__(self, path=None, qemu_img='qemu-img'):
+        self.path = path or os.path.join(data_dir(), LIBRARY_FILE)
+        self.images_dir = os.path.join(os.path.dirname(self.path), 'images')
+        self.qemu_img = qemu_img
+        self._lock = threading.Lock()
+
+    # -- state -------------------------------------------------------------
+
+    def _load(self):
+        state = read_json(self.path, {}) or {}
+        state.setdefault('bases', {})
+        state.setdefault('overlays', {})
+        return state
+
+    def _save(self, state):
+        write_json(self.path, state)
+
+    def _run(self, *args, timeout=QEMU_IMG_TIMEOUT):
+        return traced_run([self.qemu_img, *args], capture_output=True, text=True, check=True, timeout=timeout)
+
+    def info(self, path):
+        """`qemu-img info` as a dict (format, virtual-size, backing-filename, ...)"""
+        # --force-share so a disk in use by a running VM can still be inspected
+        result = self._run('info', '--force-share', '--output=json', path)
+        return json.loads(result.stdout)
+
+    @staticmethod
+    def _live_overlays(state):
+        """Overlay records whose file still exists (deleted files drop their reference)"""
+        return {key: overlay for key, overlay in state['overlays'].items() if os.path.exists(overlay['path'])}
+
+    def _find_base(self, state, base):
+        if base in state['bases']:
+            return state['bases'][base]
+        key = normalize(base)
+        for entry in state['bases'].values():
+            if normalize(entry['path']) == key:
+                return entry
+        raise ValueError(f"Base image not found in library: {base}")
+
+    # -- bases -------------------------------------------------------------
+
+    def add_base(self, source, name=None, copy=False):
+        """Register a golden image; copy=True stores a read-only copy in the library directory"""
+        source = os.path.normpath(source)
+        if not os.path.isfile(source):
+            raise ValueError(f"Base image does not exist: {source}")
+        name = name or os.path.splitext(os.path.basename(source))[0]
+        details = self.info(source)
+        with self._lock:
+            state = self._load()
+            if name in state['bases']:
+                raise ValueError(f"A base image named {name} already exists")
+            path = os.path.abspath(source)
+            if copy:
+                os.makedirs(self.images_dir, exist_ok=True)
+                path = os.path.join(self.images_dir, name + os.path.splitext(source)[1])
+                if os.path.exists(path):
+                    raise ValueError(f"File already exists in the library: {path}")
+                shutil.copy2(source, path)
+                # Overlays silently break if their base changes; keep copies read-only
+                os.chmod(path, 0o444)
+            entry = {
+                "name": name,
+                "path": path,
+                "format": details.get('format', 'raw'),
+                "virtual_size": details.get('virtual-size'),
+                "backing_file": details.get('backing-filename'),
+                "copied": bool(copy),
+                "added_at": time.time(),
+            }
+            state['bases'][name] = entry
+            self._save(state)
+        return dict(entry)
+
+    def list_bases(self):
+        with self._lock:
+            state = self._load()
+            overlays = self._live_overlays(state)
+            if len(overlays) != len(state['overlays']):
+                state['overlays'] = overlays
+                self._save(state)
+        result = []
+        for entry in state['bases'].values():
+            users = [overlay['path'] for overlay in overlays.values() if overlay['base'] == entry['name']]
+            result.append(dict(entry, exists=os.path.exists(entry['path']), overlays=users))
+        return result
+
+    def remove_base(self, base, delete_file=False, force=False):
+        with self._lock:
+            state = self._load()
+            entry = self._find_base(state, base)
+            users = [o['path'] for o in self._live_overlays(state).values() if o['base'] == entry['name']]
+            if users and not force:
+                raise ValueError(f"Base image {entry['name']} is still used by {len(users)} overlay(s): "
+                                 f"{', '.join(users)}")
+            del state['bases'][entry['name']]
+            self._save(state)
+        if delete_file and entry.get('copied') and os.path.exists(entry['path']):
+            os.chmod(entry['path'], 0o644)
+            os.remove(entry['path'])
+        return dict(entry, overlays=users)
+
+    # -- overlays ----------------------------------------------------------
+
+    def create_overlay(self, base, path, size=None):
+        """Thin qcow2 disk backed by a library base image"""
+        path = os.path.abspath(os.path.normpath(path))
+        if os.path.isdir(path):
+            path = os.path.join(path, "vm_disk.qcow2")
+        if os.path.exists(path):
+            raise ValueError(f"Disk image already exists at {path}")
+        with self._lock:
+            entry = self._find_base(self._load(), base)
+        if not os.path.exists(entry['path']):
+            raise ValueError(f"Base image file is missing: {entry['path']}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        started = time.monotonic()
+        args = ['create', '-f', 'qcow2', '-b', entry['path'], '-F', entry['format'], path]
+        if size:
+            args.append(str(size))
+        self._run(*args)
+        overlay = {"path": path, "base": entry['name'], "created_at": time.time()}
+        with self._lock:
+            state = self._load()
+            state['overlays'][normalize(path)] = overlay
+            self._save(state)
+        return dict(overlay, seconds=round(time.monotonic() - started, 3))
+
+    def _overlay(self, state, path):
+        overlay = state['overlays'].get(normalize(path))
+        if overlay is None:
+            raise ValueError(f"Not an overlay managed by the library: {path}")
+        return overlay
+
+    def commit_overlay(self, path, force=False):
+        """Merge an overlay's changes into its base (which every other overlay then sees)"""
+        with self._lock:
+            state = self._load()
+            overlay = self._overlay(state, path)
+            entry = self._find_base(state, overlay['base'])
+            others = [o['path'] for key, o in self._live_overlays(state).items()
+                      if o['base'] == entry['name'] and key != normalize(path)]
+        if others and not force:
+            raise ValueError(f"Committing would change base {entry['name']} under {len(others)} other overlay(s): "
+                             f"{', '.join(others)}")
+        read_only = not os.access(entry['path'], os.W_OK)
+        if read_only:
+            os.chmod(entry['path'], 0o644)
+        try:
+            # -d keeps the overlay as it is (now empty relative to the base) instead of emptying it
+            self._run('commit', '-d', overlay['path'], timeout=None)
+        finally:
+            if read_only:
+                os.chmod(entry['path'], 0o444)
+        return {"path": overlay['path'], "base": entry['name']}
+
+    def rebase_overlay(self, path, base):
+        """Point an overlay at another library base; differing clusters are copied in (safe mode)"""
+        with self._lock:
+            state = self._load()
+            overlay = self._overlay(state, path)
+            entry = self._find_base(state, base)
+        self._run('rebase', '-f', 'qcow2', '-b', entry['path'], '-F', entry['format'], overlay['path'],
+                  timeout=None)
+        with self._lock:
+            state = self._load()
+            state['overlays'][normalize(overlay['path'])] = dict(overlay, base=entry['name'])
+            self._save(state)
+        return {"path": overlay['path'], "base": entry['name'], "previous_base": overlay['base']}
+
+    def flatten_overlay(self, path):
+        """Copy the base's data into the overlay so it no longer needs a backing file"""
+        with self._lock:
+            overlay = self._overlay(self._load(), path)
+        self._run('rebase', '-f', 'qcow2', '-b', '', overlay['path'], timeout=None)
+        with self._lock:
+            state = self._load()
+            state['overlays'].pop(normalize(overlay['path']), None)
+            self._save(state)
+        return {"path": overlay['path'], "previous_base": overlay['base']}
+
+    # -- reference checks --------------------------------------------------
+
+    def users_of(self, path):
+        """Overlays that still depend on `path` if it is a registered base image"""
+        key = normalize(path)
+        with self._lock:
+            state = self._load()
+        for entry in state['bases'].values():
+            if normalize(entry['path']) == key:
+                return [o['path'] for o in self._live_overlays(state).values() if o['base'] == entry['name']]
+        return []
+
+    def forget(self, path):
+        """Drop the records for a disk that has been deleted"""
+        key = normalize(path)
+        with self._lock:
+            state = self._load()
+            changed = state['overlays'].pop(key, None) is not None
+            for name in [n for n, e in state['bases'].items() if normalize(e['path']) == key]:
+                del state['bases'][name]
+                changed = True
+            if changed:
+                self._save(state)
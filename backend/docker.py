@@ -1,14 +1,89 @@
 import subprocess
 import os
 import json
-import platform
 import shlex
+import socket
+import threading
+from docker_engine import (
+    DockerEngineClient, DockerEngineError, DockerEngineUnavailable,
+    container_row, demux_stream, hub_search_row, image_rows, parse_port_mapping, quote_path, stats_row,
+)
+from docker_logs import LogFilter, LogStreams, parse_tail, parse_timestamp, render
+from response_cache import ResponseCache, cached, invalidates, succeeded
+from image_index import ImageIndex
+from instrumentation import instrument_actions, span, traced_check_output, traced_run
 
+# Events, pulls, builds, bulk actions and metrics import their helper modules
+# (and concurrent.futures) on first use, so a one-shot listing does not pay for them
+
+# Seconds a listing may be served from the cache; container rows carry
+# status text ("Up 5 minutes") so they go stale sooner than images
+IMAGE_LIST_TTL = 10
+CONTAINER_LIST_TTL = 2
+# Docker Hub results change slowly; the registry returns at most 100 per search
+HUB_SEARCH_TTL = 300
+HUB_SEARCH_CACHE_SIZE = 64
+HUB_SEARCH_LIMIT = 100
+
+
+def check_page(value):
+    """A DockerHub search page number: an integer from 1"""
+    page = int(value)
+    if page < 1:
+        raise ValueError(f"page must be 1 or more, got {page}")
+    return page
+
+
+def check_page_size(value):
+    """A DockerHub search page size: 1 to HUB_SEARCH_LIMIT, the most one search returns"""
+    page_size = int(value)
+    if not 1 <= page_size <= HUB_SEARCH_LIMIT:
+        raise ValueError(f"page_size must be between 1 and {HUB_SEARCH_LIMIT}, got {page_size}")
+    return page_size
+
+@instrument_actions('docker')
 class DockerManager:
+    def __init__(self, engine=None):
+        # Talk HTTP to the daemon socket when it is there; every method falls
+        # back to the docker CLI when the socket is missing or unreachable
+        self.engine = engine if engine is not None else DockerEngineClient()
+        self._inventory = None
+        self._pull_manager = None
+        self._log_streams = None
+        self._metrics_collector = None
+        # Read-only listings, invalidated by the calls that change them
+        self.cache = ResponseCache()
+        self.hub_cache = ResponseCache(max_entries=HUB_SEARCH_CACHE_SIZE)
+        self._image_index = ImageIndex()
+        self._image_index_lock = threading.Lock()
+
+    def _try_engine(self, operation):
+        """Run operation(engine) over the daemon socket.
+
+        Returns the operation's JSON string, or None when the socket is not
+        usable (or the operation defers) and the caller should use the CLI.
+        A connection lost mid-response also falls back to the CLI; a reply
+        that is not valid JSON is an error.
+        """
+        if self.engine is None or not self.engine.is_configured():
+            return None
+        try:
+            return operation(self.engine)
+        except DockerEngineUnavailable:
+            return None
+        except DockerEngineError as e:
+            return json.dumps({"success": False, "error": e.message})
+        except socket.timeout:
+            return json.dumps({"success": False, "error": "Request to the Docker daemon timed out"})
+        except OSError:
+            return None
+        except ValueError as e:
+            return json.dumps({"success": False, "error": f"Invalid response from the Docker daemon: {e}"})
+
     def _is_docker_daemon_running(self):
         """Check if Docker daemon is running"""
         try:
-            subprocess.run(['docker', 'ps'], capture_output=True, text=True, check=True, timeout=5)
+            traced_run(['docker', 'ps'], capture_output=True, text=True, check=True, timeout=5)
             return True
         except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
             return False
@@ -42,17 +117,63 @@ class DockerManager:
                 return "Docker engine is not running. Please start Docker Desktop or Docker service."
         
         return None
+    # keeps an event-driven inventory and pushes deltas to listener(delta)
+    def subscribe_events(self, listener):
+        try:
+            if self._inventory is None:
+                from docker_events import DockerInventory
+                self._inventory = DockerInventory(self)
+            self._inventory.add_listener(listener)
+            # Answer with real data when the daemon is up; otherwise the
+            # snapshot arrives as a push once the watcher connects
+            self._inventory.wait_synced(timeout=10)
+            return json.dumps({"success": True, "data": self._inventory.snapshot()})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def unsubscribe_events(self, listener):
+        if self._inventory is not None:
+            self._inventory.remove_listener(listener)
+        return json.dumps({"success": True, "message": "Unsubscribed from Docker events"})
+
+    # current inventory; unchanged=True if nothing happened since `since_version`
+    def get_inventory(self, since_version=None):
+        if self._inventory is None:
+            return json.dumps({"success": False, "error": "Not subscribed to Docker events"})
+        snapshot = self._inventory.snapshot()
+        if since_version is not None and since_version == snapshot["version"]:
+            return json.dumps({"success": True, "unchanged": True, "version": snapshot["version"]})
+        return json.dumps({"success": True, "data": snapshot})
+
+    # hit/miss counters of the listing cache; clear=True empties it as well
+    def cache_stats(self, clear=False):
+        if clear:
+            self.cache.invalidate()
+            self.hub_cache.invalidate()
+        return json.dumps({"success": True, "data": dict(self.cache.stats(), hub_search=self.hub_cache.stats())})
+
+    def _engine_list_images(self, engine):
+        images = []
+        for raw in engine.get_json('/images/json') or []:
+            images.extend(image_rows(raw))
+        return json.dumps({"success": True, "data": images})
+
     #lists all images
+    @cached(IMAGE_LIST_TTL, tags=('images',))
     def list_images(self):
+        result = self._try_engine(self._engine_list_images)
+        if result is not None:
+            return result
         try:
-            output = subprocess.check_output(['docker', 'image', 'ls', '--format', 'json'], text=True, stderr=subprocess.PIPE)
+            output = traced_check_output(['docker', 'image', 'ls', '--digests', '--format', 'json'], text=True, stderr=subprocess.PIPE)
             images = []
-            for line in output.strip().split('\n'):
-                if line:
-                    try:
-                        images.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+            with span('parse'):
+                for line in output.strip().split('\n'):
+                    if line:
+                        try:
+                            images.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
             return json.dumps({"success": True, "data": images})
         except subprocess.CalledProcessError as e:
             # Check if error is due to Docker daemon not running
@@ -79,17 +200,26 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
 
+    def _engine_list_containers(self, engine, all_containers=True):
+        raw_containers = engine.get_json('/containers/json', params={'all': all_containers}) or []
+        return json.dumps({"success": True, "data": [container_row(c) for c in raw_containers]})
+
     #lists all containers
+    @cached(CONTAINER_LIST_TTL, tags=('containers',))
     def list_containers(self):
+        result = self._try_engine(self._engine_list_containers)
+        if result is not None:
+            return result
         try:
-            output = subprocess.check_output(['docker', 'container', 'ls', '-a', '--format', 'json'], text=True, stderr=subprocess.PIPE)
+            output = traced_check_output(['docker', 'container', 'ls', '-a', '--format', 'json'], text=True, stderr=subprocess.PIPE)
             containers = []
-            for line in output.strip().split('\n'):
-                if line:
-                    try:
-                        containers.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+            with span('parse'):
+                for line in output.strip().split('\n'):
+                    if line:
+                        try:
+                            containers.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
             return json.dumps({"success": True, "data": containers})
         except subprocess.CalledProcessError as e:
             # Check if error is due to Docker daemon not running
@@ -117,16 +247,21 @@ class DockerManager:
             return json.dumps({"success": False, "error": str(e)})
 
     #lists all running containers
+    @cached(CONTAINER_LIST_TTL, tags=('containers',))
     def list_running_containers(self):
+        result = self._try_engine(lambda engine: self._engine_list_containers(engine, all_containers=False))
+        if result is not None:
+            return result
         try:
-            output = subprocess.check_output(['docker', 'ps', '--format', 'json'], text=True, stderr=subprocess.PIPE)
+            output = traced_check_output(['docker', 'ps', '--format', 'json'], text=True, stderr=subprocess.PIPE)
             containers = []
-            for line in output.strip().split('\n'):
-                if line:
-                    try:
-                        containers.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+            with span('parse'):
+                for line in output.strip().split('\n'):
+                    if line:
+                        try:
+                            containers.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
             return json.dumps({"success": True, "data": containers})
         except subprocess.CalledProcessError as e:
             # Check if error is due to Docker daemon not running
@@ -170,17 +305,32 @@ class DockerManager:
             return json.dumps({"success": False, "error": str(e)})
 
     #should be within the docker file folder or the link to the docker file
-    def build_image(self, path, tag):
+    # cache_from/no_cache/target/build_args map to the matching docker build flags;
+    # on_event(event) receives steps and log lines while the build runs
+    @invalidates('images')
+    def build_image(self, path, tag, cache_from=None, no_cache=False, target=None, build_args=None,
+                    on_event=None):
         # this is if the path is to a docker file
         if os.path.isfile(path):
             path = os.path.dirname(path)
 
         # building image
+        # Builds stay on the CLI: it packs the context (honouring .dockerignore)
+        # and drives BuildKit, which the plain /build endpoint does not
         if os.path.exists(path):
             try:
-                result = subprocess.run(['docker', 'build', '-t', tag, path], 
-                                      capture_output=True, text=True, check=True)
-                return json.dumps({"success": True, "message": f"Image {tag} built successfully", "output": result.stdout})
+                from docker_build import build_command, run_build
+                cmd = build_command(path, tag, cache_from, no_cache, target, build_args)
+                returncode, output, summary, duration = run_build(cmd, tag, on_event)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, cmd, stderr=output)
+                return json.dumps({
+                    "success": True,
+                    "message": f"Image {tag} built successfully in {duration}s",
+                    "output": output,
+                    "duration": duration,
+                    **summary
+                })
             except subprocess.CalledProcessError as e:
                 # Handle stderr - it might be bytes or string
                 stderr_value = None
@@ -193,14 +343,38 @@ class DockerManager:
                 if docker_error:
                     return json.dumps({"success": False, "error": docker_error})
                 return json.dumps({"success": False, "error": str(e), "output": stderr_value if stderr_value else ''})
+            except FileNotFoundError:
+                return json.dumps({"success": False, "error": "Docker CLI not found. Is Docker installed and in PATH?"})
         else:
             return json.dumps({"success": False, "error": "Path not found"})
 
 
+    def _engine_container_action(self, engine, ID, verb, past, stop_timeout=None):
+        try:
+            # 304 means it was already in the requested state, which the CLI treats as success
+            engine.request('POST', f"/containers/{quote_path(ID)}/{verb}",
+                           params={'t': stop_timeout} if stop_timeout is not None else None,
+                           timeout=max(120, (stop_timeout or 0) + 30))
+        except DockerEngineError as e:
+            return json.dumps({
+                "success": False,
+                "error": f"Failed to {verb} container {ID}",
+                "details": e.message
+            })
+        return json.dumps({"success": True, "message": f"Container {ID} {past}"})
+
+    def _stop_args(self, timeout):
+        # -t: seconds to wait for a clean exit before SIGKILL (Docker's default is 10)
+        return ['-t', str(int(timeout))] if timeout is not None else []
+
     #takes id or name and stops the container
-    def stop_container(self, ID):
+    @invalidates('containers')
+    def stop_container(self, ID, timeout=None):
+        result = self._try_engine(lambda engine: self._engine_container_action(engine, ID, 'stop', 'stopped', timeout))
+        if result is not None:
+            return result
         try:
-            result = subprocess.run(['docker', 'stop', ID], capture_output=True, text=True, check=True)
+            result = traced_run(['docker', 'stop', *self._stop_args(timeout), ID], capture_output=True, text=True, check=True)
             return json.dumps({"success": True, "message": f"Container {ID} stopped"})
         except subprocess.CalledProcessError as e:
             # Handle stderr - it might be bytes or string
@@ -226,9 +400,13 @@ class DockerManager:
             return json.dumps({"success": False, "error": str(e)})
     
     # starts a stopped container
+    @invalidates('containers')
     def start_container(self, ID):
+        result = self._try_engine(lambda engine: self._engine_container_action(engine, ID, 'start', 'started'))
+        if result is not None:
+            return result
         try:
-            result = subprocess.run(['docker', 'start', ID], capture_output=True, text=True, check=True)
+            result = traced_run(['docker', 'start', ID], capture_output=True, text=True, check=True)
             return json.dumps({"success": True, "message": f"Container {ID} started"})
         except subprocess.CalledProcessError as e:
             # Handle stderr - it might be bytes or string
@@ -253,8 +431,79 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
     
+    # restarts a container (stop with the given grace period, then start)
+    @invalidates('containers')
+    def restart_container(self, ID, timeout=None):
+        result = self._try_engine(lambda engine: self._engine_container_action(engine, ID, 'restart', 'restarted', timeout))
+        if result is not None:
+            return result
+        try:
+            traced_run(['docker', 'restart', *self._stop_args(timeout), ID], capture_output=True, text=True, check=True)
+            return json.dumps({"success": True, "message": f"Container {ID} restarted"})
+        except subprocess.CalledProcessError as e:
+            stderr_value = e.stderr.decode('utf-8', errors='ignore') if isinstance(e.stderr, bytes) else e.stderr
+            docker_error = self._check_docker_error(e, stderr_value)
+            if docker_error:
+                return json.dumps({"success": False, "error": docker_error})
+            return json.dumps({
+                "success": False,
+                "error": f"Failed to restart container {ID}",
+                "details": stderr_value.strip() if stderr_value else str(e)
+            })
+        except Exception as e:
+            docker_error = self._check_docker_error(e)
+            if docker_error:
+                return json.dumps({"success": False, "error": docker_error})
+            return json.dumps({"success": False, "error": str(e)})
+
+    # runs start/stop/restart/delete over many containers at once: `ids` and/or
+    # `labels` ("key" or "key=value" selectors, all of which must match)
+    def bulk_container_action(self, action, ids=None, labels=None, timeout=None, force=False, max_workers=None):
+        from docker_bulk import DEFAULT_BULK_WORKERS, run_bulk
+        try:
+            result = run_bulk(self, action, ids, labels, timeout=timeout, force=force,
+                              max_workers=max_workers or DEFAULT_BULK_WORKERS)
+            return json.dumps({"success": True, **result})
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)})
+        except Exception as e:
+            docker_error = self._check_docker_error(e)
+            if docker_error:
+                return json.dumps({"success": False, "error": docker_error})
+            return json.dumps({"success": False, "error": str(e)})
+
+    def _engine_create_container(self, engine, image, name, ports, env_vars):
+        body = {"Image": image}
+        if env_vars:
+            body["Env"] = list(env_vars)
+        if ports:
+            exposed, bindings = {}, {}
+            for port_mapping in ports:
+                parsed = parse_port_mapping(port_mapping)
+                if parsed is None:
+                    # Ranges and other exotic forms are left to the CLI parser
+                    return None
+                container_port, binding = parsed
+                exposed[container_port] = {}
+                if binding["HostPort"] or binding["HostIp"]:
+                    bindings.setdefault(container_port, []).append(binding)
+            body["ExposedPorts"] = exposed
+            body["HostConfig"] = {"PortBindings": bindings}
+        try:
+            _, created = engine.post_json('/containers/create', params={'name': name or None}, body=body)
+        except DockerEngineError as e:
+            if e.status == 404 and 'no such image' in e.message.lower():
+                # `docker create` pulls missing images; let the CLI do that
+                return None
+            return json.dumps({"success": False, "error": e.message, "output": e.message})
+        return json.dumps({"success": True, "message": f"Container created", "container_id": created.get('Id', '')})
+
     # creates a container from an image
+    @invalidates('containers', 'images')
     def create_container(self, image, name=None, ports=None, env_vars=None):
+        result = self._try_engine(lambda engine: self._engine_create_container(engine, image, name, ports, env_vars))
+        if result is not None:
+            return result
         try:
             cmd = ['docker', 'create']
             if name:
@@ -266,7 +515,7 @@ class DockerManager:
                 for env_var in env_vars:
                     cmd.extend(['-e', env_var])
             cmd.append(image)
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = traced_run(cmd, capture_output=True, text=True, check=True)
             container_id = result.stdout.strip()
             return json.dumps({"success": True, "message": f"Container created", "container_id": container_id})
         except subprocess.CalledProcessError as e:
@@ -287,14 +536,32 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
     
+    def _engine_delete_container(self, engine, ID, force):
+        try:
+            engine.request('DELETE', f"/containers/{quote_path(ID)}", params={'force': bool(force)})
+        except DockerEngineError as e:
+            error_msg = e.message
+            if "is running" in error_msg.lower():
+                error = f"Container {ID} is running. Stop it first or use force delete."
+            elif e.status == 404 or "no such container" in error_msg.lower():
+                error = f"Container {ID} does not exist."
+            else:
+                error = f"Failed to delete container {ID}"
+            return json.dumps({"success": False, "error": error, "details": error_msg})
+        return json.dumps({"success": True, "message": f"Container {ID} deleted"})
+
     # deletes a container
+    @invalidates('containers')
     def delete_container(self, ID, force=False):
+        result = self._try_engine(lambda engine: self._engine_delete_container(engine, ID, force))
+        if result is not None:
+            return result
         try:
             cmd = ['docker', 'rm']
             if force:
                 cmd.append('-f')
             cmd.append(ID)
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = traced_run(cmd, capture_output=True, text=True, check=True)
             return json.dumps({"success": True, "message": f"Container {ID} deleted"})
         except subprocess.CalledProcessError as e:
             # Handle stderr - it might be bytes or string
@@ -333,14 +600,34 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
     
+    def _engine_delete_image(self, engine, ID, force):
+        try:
+            removed = engine.delete_json(f"/images/{quote_path(ID)}", params={'force': bool(force)}) or []
+        except DockerEngineError as e:
+            error_msg = e.message
+            if "is being used by" in error_msg or "is referenced in" in error_msg:
+                error = f"Image {ID} is being used by a container. Stop and remove the container first, or use force delete."
+            elif e.status == 404 or "no such image" in error_msg.lower():
+                error = f"Image {ID} does not exist."
+            else:
+                error = f"Failed to delete image {ID}"
+            return json.dumps({"success": False, "error": error, "details": error_msg})
+        # Same lines `docker rmi` prints
+        output = ''.join(f"{key}: {value}\n" for entry in removed for key, value in entry.items())
+        return json.dumps({"success": True, "message": f"Image {ID} deleted", "output": output})
+
     # deletes an image
+    @invalidates('images')
     def delete_image(self, ID, force=False):
+        result = self._try_engine(lambda engine: self._engine_delete_image(engine, ID, force))
+        if result is not None:
+            return result
         try:
             cmd = ['docker', 'rmi']
             if force:
                 cmd.append('-f')
             cmd.append(ID)
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = traced_run(cmd, capture_output=True, text=True, check=True)
             return json.dumps({"success": True, "message": f"Image {ID} deleted", "output": result.stdout})
         except subprocess.CalledProcessError as e:
             # Handle stderr - it might be bytes or string
@@ -376,11 +663,58 @@ class DockerManager:
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)})
     
+    def _engine_container_logs(self, engine, ID, tail):
+        try:
+            info = engine.get_json(f"/containers/{quote_path(ID)}/json")
+            _, _, data = engine.request('GET', f"/containers/{quote_path(ID)}/logs",
+                                        params={'stdout': True, 'stderr': True, 'tail': str(tail)})
+        except DockerEngineError as e:
+            if e.status == 404:
+                return json.dumps({"success": False, "error": f"Container {ID} not found"})
+            return json.dumps({"success": False, "error": e.message})
+        if (info.get('Config') or {}).get('Tty'):
+            logs_output = data.decode('utf-8', errors='replace')
+        else:
+            logs_output = b''.join(payload for _, payload in demux_stream(data)).decode('utf-8', errors='replace')
+        if logs_output.strip():
+            return json.dumps({"success": True, "logs": logs_output})
+        return json.dumps({"success": True, "logs": "No logs available for this container. The container may not have produced any output yet."})
+
+    def _logs(self):
+        if self._log_streams is None:
+            self._log_streams = LogStreams(self)
+        return self._log_streams
+
     # gets container logs
-    def get_container_logs(self, ID, tail=100):
+    # cursor: the `cursor` of an earlier result, to get only newer lines;
+    # pattern (regex), levels, since and until filter lines before they are returned
+    def get_container_logs(self, ID, tail=100, cursor=None, pattern=None, levels=None, since=None, until=None):
         try:
-            result = subprocess.run(['docker', 'logs', '--tail', str(tail), ID], 
-                                  capture_output=True, text=True, check=False, timeout=30)
+            tail = parse_tail(tail)
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)})
+        if any(value is not None for value in (cursor, pattern, levels, since, until)):
+            try:
+                log_filter = LogFilter(pattern, levels, since, until)
+                entries, truncated = self._logs().read(ID, parse_timestamp(cursor), tail, log_filter)
+                return json.dumps({"success": True, "truncated": truncated, **render(entries)})
+            except ValueError as e:
+                return json.dumps({"success": False, "error": str(e)})
+            except subprocess.TimeoutExpired:
+                return json.dumps({"success": False, "error": "Logs request timed out after 30 seconds"})
+            except Exception as e:
+                docker_error = self._check_docker_error(e)
+                if docker_error:
+                    return json.dumps({"success": False, "error": docker_error})
+                return json.dumps({"success": False, "error": str(e)})
+
+        tail = 'all' if tail is None else tail
+        result = self._try_engine(lambda engine: self._engine_container_logs(engine, ID, tail))
+        if result is not None:
+            return result
+        try:
+            result = traced_run(['docker', 'logs', '--tail', str(tail), ID], 
+                              capture_output=True, text=True, check=False, timeout=30)
             
             logs_output = ""
             
@@ -423,12 +757,50 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
     
+    # follows a container's logs, pushing new lines to listener(payload) as they arrive;
+    # returns the current tail with the same filters applied
+    def follow_container_logs(self, ID, listener, tail=100, pattern=None, levels=None, since=None, until=None):
+        try:
+            log_filter = LogFilter(pattern, levels, since, until)
+            entries = self._logs().follow(ID, listener, log_filter, tail)
+            return json.dumps({"success": True, "following": True, **render(entries, ID)})
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)})
+        except Exception as e:
+            docker_error = self._check_docker_error(e)
+            if docker_error:
+                return json.dumps({"success": False, "error": docker_error})
+            return json.dumps({"success": False, "error": str(e)})
+
+    # stops pushes for one container (or every container when ID is empty)
+    def unfollow_container_logs(self, ID, listener=None):
+        if self._log_streams is not None:
+            self._log_streams.unfollow(ID, listener)
+        return json.dumps({"success": True, "message": "Stopped following logs"})
+
+    def _engine_container_stats(self, engine, ID):
+        try:
+            raw = engine.get_json(f"/containers/{quote_path(ID)}/stats", params={'stream': False}, timeout=10)
+        except DockerEngineError as e:
+            if e.status == 404:
+                return json.dumps({"success": False, "error": f"Container {ID} not found"})
+            if e.status == 409 or "is not running" in e.message.lower():
+                return json.dumps({"success": False, "error": "Container is not running. Stats are only available for running containers."})
+            return json.dumps({"success": False, "error": e.message})
+        if not raw or not (raw.get('memory_stats') or raw.get('cpu_stats', {}).get('system_cpu_usage')):
+            # A stopped container answers with an all-zero sample
+            return json.dumps({"success": False, "error": "No stats available - container may not be running"})
+        return json.dumps({"success": True, "stats": stats_row(raw, ID)})
+
     # gets container stats
     def get_container_stats(self, ID):
+        result = self._try_engine(lambda engine: self._engine_container_stats(engine, ID))
+        if result is not None:
+            return result
         try:
             # this requires the container to be running
-            result = subprocess.run(['docker', 'stats', '--no-stream', '--format', 'json', ID], 
-                                  capture_output=True, text=True, check=False, timeout=10)
+            result = traced_run(['docker', 'stats', '--no-stream', '--format', 'json', ID], 
+                              capture_output=True, text=True, check=False, timeout=10)
             
             if result.returncode == 0:
                 if result.stdout.strip():
@@ -466,75 +838,102 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
 
-    # takes a name and searches for it on dockerhub
-    def search_dockerhub(self, name):
+    def _metrics(self):
+        if self._metrics_collector is None:
+            from docker_metrics import MetricsCollector
+            self._metrics_collector = MetricsCollector(self)
+        return self._metrics_collector
+
+    # samples every running container in the background every `interval` seconds
+    def start_metrics(self, interval=None):
         try:
-            result = subprocess.run(['docker', 'search', '--format', 'json', name], 
-                                  capture_output=True, text=True, check=False, timeout=30)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                results = []
-                for line in result.stdout.strip().split('\n'):
-                    if line.strip():
-                        try:
-                            img_data = json.loads(line)
-                            star_count_str = str(img_data.get('StarCount', '0'))
-                            star_count = int(star_count_str) if star_count_str.isdigit() else 0
-                            
-                            results.append({
-                                "name": img_data.get('Name', ''),
-                                "description": img_data.get('Description', ''),
-                                "star_count": star_count,
-                                "is_official": str(img_data.get('IsOfficial', '')).lower() == 'true',
-                                "is_automated": str(img_data.get('IsAutomated', '')).lower() == 'true'
-                            })
-                        except json.JSONDecodeError as e:
-                            continue
-                
-                if results:
-                    return json.dumps({"success": True, "data": results})
-            
-            # Fallback to text format if JSON fails or returns empty
-            result = subprocess.run(['docker', 'search', name], 
-                                  capture_output=True, text=True, check=False, timeout=30)
-            
+            collector = self._metrics()
+            collector.start(interval)
+            return json.dumps({"success": True, "message": "Metrics collector running",
+                               "interval": collector.interval, "capacity": collector.capacity})
+        except (TypeError, ValueError) as e:
+            return json.dumps({"success": False, "error": f"Invalid interval: {e}"})
+
+    def stop_metrics(self):
+        if self._metrics_collector is not None:
+            self._metrics_collector.stop()
+        return json.dumps({"success": True, "message": "Metrics collector stopped"})
+
+    # history recorded by the collector; start/end are epoch seconds and
+    # points (optional) downsamples each series for charts
+    def get_metrics(self, ID=None, start=None, end=None, points=None):
+        collector = self._metrics_collector
+        if collector is None:
+            return json.dumps({"success": False, "error": "Metrics collector is not running"})
+        try:
+            containers = collector.query(ID, start, end, int(points) if points else None)
+        except (TypeError, ValueError) as e:
+            return json.dumps({"success": False, "error": str(e)})
+        if ID and not containers:
+            return json.dumps({"success": False, "error": f"No metrics recorded for container {ID}"})
+        return json.dumps({
+            "success": True,
+            "running": collector.running,
+            "interval": collector.interval,
+            "last_pass": collector.last_pass,
+            "last_error": collector.last_error,
+            "containers": containers,
+        })
+
+    # stats for many containers in one call: ids is a list of IDs/names, or
+    # "all"/None for every running container; errors are reported per container
+    def get_containers_stats(self, ids=None):
+        if ids == 'all':
+            ids = None
+        elif isinstance(ids, str):
+            ids = [ids]
+        if ids is not None:
+            ids = list(dict.fromkeys(ids))
+            if not ids:
+                return json.dumps({"success": True, "data": {}})
+        try:
+            samples = self._metrics().batch(ids)
+        except subprocess.TimeoutExpired:
+            return json.dumps({"success": False, "error": "Stats request timed out after 30 seconds"})
+        except Exception as e:
+            docker_error = self._check_docker_error(e)
+            if docker_error:
+                return json.dumps({"success": False, "error": docker_error})
+            return json.dumps({"success": False, "error": str(e)})
+        data = {}
+        for key, sample in samples.items():
+            if "error" in sample:
+                data[key] = {"success": False, "error": sample["error"]}
+            else:
+                data[key] = {"success": True, "stats": sample["stats"]}
+        return json.dumps({"success": True, "data": data})
+
+    def _engine_search_dockerhub(self, engine, name):
+        found = engine.get_json('/images/search', params={'term': name, 'limit': HUB_SEARCH_LIMIT}, timeout=30) or []
+        return json.dumps({"success": True, "data": [hub_search_row(raw) for raw in found]})
+
+    def _fetch_dockerhub(self, name):
+        result = self._try_engine(lambda engine: self._engine_search_dockerhub(engine, name))
+        if result is not None:
+            return result
+        try:
+            result = traced_run(['docker', 'search', '--no-trunc', '--limit', str(HUB_SEARCH_LIMIT),
+                                 '--format', '{{json .}}', name],
+                                capture_output=True, text=True, check=False, timeout=30)
             if result.returncode != 0:
                 error_msg = result.stderr.strip() if result.stderr else "Unknown error"
                 docker_error = self._check_docker_error(error_msg, error_msg)
                 if docker_error:
                     return json.dumps({"success": False, "error": docker_error})
                 return json.dumps({"success": False, "error": error_msg})
-            lines = result.stdout.strip().split('\n')
-            if len(lines) < 2:
-                return json.dumps({"success": True, "data": []})
-            
             results = []
-            for line in lines[1:]:
-                if not line.strip():
-                    continue
-                
-                parts = line.split()
-                if len(parts) >= 2:
-                    image_name = parts[0]
-                    description_parts = parts[1:-3] if len(parts) > 4 else parts[1:]
-                    description = ' '.join(description_parts) if description_parts else ''
-                    stars = parts[-3] if len(parts) >= 3 else '0'
-                    official = parts[-2] if len(parts) >= 2 else ''
-                    automated = parts[-1] if len(parts) >= 1 else ''
-                    
-                    try:
-                        star_count = int(stars) if stars.isdigit() else 0
-                    except:
-                        star_count = 0
-                    
-                    results.append({
-                        "name": image_name,
-                        "description": description,
-                        "star_count": star_count,
-                        "is_official": official == "[OK]",
-                        "is_automated": automated == "[OK]"
-                    })
-            
+            with span('parse'):
+                for line in result.stdout.splitlines():
+                    if line.strip():
+                        try:
+                            results.append(hub_search_row(json.loads(line)))
+                        except json.JSONDecodeError:
+                            continue
             return json.dumps({"success": True, "data": results})
         except subprocess.TimeoutExpired:
             return json.dumps({"success": False, "error": "Search request timed out"})
@@ -544,83 +943,108 @@ class DockerManager:
                 return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
 
+    # takes a name and searches for it on dockerhub
+    # The registry is asked once per term for its first HUB_SEARCH_LIMIT
+    # results; filters and pages are applied to that cached answer, and
+    # identical searches already in flight share the one request
+    def search_dockerhub(self, name, page=1, page_size=None, official_only=False, min_stars=0, limit=None,
+                         fresh=False):
+        term = (name or '').strip().lower()
+        if not term:
+            return json.dumps({"success": False, "error": "Search term is required"})
+        try:
+            page = int(page) if page is not None else 1
+            page_size = int(page_size) if page_size is not None else None
+            min_stars = int(min_stars or 0)
+            limit = int(limit) if limit else None
+        except (TypeError, ValueError):
+            return json.dumps({"success": False, "error": "page, page_size, min_stars and limit must be numbers"})
+        try:
+            page = check_page(page)
+            page_size = check_page_size(page_size) if page_size is not None else None
+        except ValueError as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+        response = self.hub_cache.get_or_compute(term, HUB_SEARCH_TTL, lambda: self._fetch_dockerhub(term),
+                                                 fresh=fresh, cacheable=succeeded)
+        data = json.loads(response)
+        if not data.get("success"):
+            return response
+        results = []
+        seen = set()
+        for row in data["data"]:
+            if row["name"] in seen:
+                continue
+            seen.add(row["name"])
+            if official_only and not row["is_official"]:
+                continue
+            if row["star_count"] < min_stars:
+                continue
+            results.append(row)
+        if limit:
+            results = results[:limit]
+        total = len(results)
+        if page_size:
+            results = results[(page - 1) * page_size:page * page_size]
+        return json.dumps({
+            "success": True,
+            "data": results,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": -(-total // page_size) if page_size else 1,
+        })
+
+
+    def _pulls(self):
+        if self._pull_manager is None:
+            from docker_pull import PullManager
+            self._pull_manager = PullManager(self)
+        return self._pull_manager
 
     # takes a name and pulls the image from dockerhub
-    def pull_image(self, name):
-        try:
-            # Docker pull outputs progress to stderr, so we need to capture both
-            # Use a longer timeout for large images (10 minutes)
-            result = subprocess.run(
-                ['docker', 'pull', name], 
-                capture_output=True, 
-                text=True, 
-                check=True,
-                timeout=600  # 10 minute timeout
-            )
-            # Combine stdout and stderr as docker pull outputs to stderr
-            output = result.stderr if result.stderr else result.stdout
-            return json.dumps({
-                "success": True, 
-                "message": f"Image {name} pulled successfully", 
-                "output": output
-            })
-        except subprocess.TimeoutExpired:
-            return json.dumps({
-                "success": False, 
-                "error": f"Pulling image {name} timed out after 10 minutes. The image might be very large."
-            })
-        except subprocess.CalledProcessError as e:
-            # Handle stderr - it might be bytes or string
-            stderr_value = None
-            if e.stderr:
-                if isinstance(e.stderr, bytes):
-                    stderr_value = e.stderr.decode('utf-8', errors='ignore')
-                else:
-                    stderr_value = str(e.stderr)
-            docker_error = self._check_docker_error(e, stderr_value)
+    # on_progress(event) receives per-layer progress while the pull runs
+    @invalidates('images')
+    def pull_image(self, name, on_progress=None):
+        try:
+            return json.dumps(self._pulls().pull(name, on_progress))
+        except Exception as e:
+            docker_error = self._check_docker_error(e)
             if docker_error:
                 return json.dumps({"success": False, "error": docker_error})
-            error_msg = stderr_value.strip() if stderr_value else str(e)
+            return json.dumps({"success": False, "error": str(e)})
+
+    # pulls several images concurrently (bounded pool); results keyed by name
+    @invalidates('images')
+    def pull_images(self, names, on_progress=None):
+        try:
+            if not names:
+                return json.dumps({"success": False, "error": "No images given."})
+            results = self._pulls().pull_many(names, on_progress)
             return json.dumps({
-                "success": False, 
-                "error": f"Failed to pull image {name}",
-                "details": error_msg
+                "success": all(r.get("success") for r in results.values()),
+                "results": results
             })
         except Exception as e:
-            docker_error = self._check_docker_error(e)
-            if docker_error:
-                return json.dumps({"success": False, "error": docker_error})
             return json.dumps({"success": False, "error": str(e)})
 
+    # cancels an in-flight pull started by pull_image/pull_images
+    def cancel_pull(self, name):
+        if self._pull_manager is not None and self._pull_manager.cancel(name):
+            return json.dumps({"success": True, "message": f"Cancelling pull of {name}"})
+        return json.dumps({"success": False, "error": f"No pull in progress for {name}"})
 
-    # takes a name and searches for it in the local images
-    def search_image_local(self, name):
+    # takes a name and searches for it in the local images: ranked matches on
+    # repository, tag, ID/digest and labels, tolerating small typos
+    def search_image_local(self, name, limit=None):
+        listing = self.list_images()
+        if not succeeded(listing):
+            return listing
         try:
-            output = subprocess.check_output(['docker', 'images', '--format', 'json'], text=True)
-            results = []
-            for line in output.strip().split('\n'):
-                if line:
-                    try:
-                        image_data = json.loads(line)
-                        if name.lower() in image_data.get('Repository', '').lower():
-                            results.append(image_data)
-                    except json.JSONDecodeError:
-                        continue
+            with self._image_index_lock:
+                # Only re-indexes when list_images returned a new listing
+                self._image_index.sync_listing(listing)
+                results = self._image_index.search(name, int(limit) if limit else None)
             return json.dumps({"success": True, "data": results})
-        except subprocess.CalledProcessError as e:
-            # Handle stderr - it might be bytes or string
-            stderr_value = None
-            if e.stderr:
-                if isinstance(e.stderr, bytes):
-                    stderr_value = e.stderr.decode('utf-8', errors='ignore')
-                else:
-                    stderr_value = str(e.stderr)
-            docker_error = self._check_docker_error(e, stderr_value)
-            if docker_error:
-                return json.dumps({"success": False, "error": docker_error})
-            return json.dumps({"success": False, "error": str(e)})
-        except Exception as e:
-            docker_error = self._check_docker_error(e)
-            if docker_error:
-                return json.dumps({"success": False, "error": docker_error})
+        except (RuntimeError, ValueError) as e:
             return json.dumps({"success": False, "error": str(e)})
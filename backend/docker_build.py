@@ -0,0 +1,147 @@
+"""
+Streaming `docker build` with per-step timing and BuildKit cache options.
+
+The build runs with BuildKit's plain progress output, which is parsed line by
+line so callers see steps and log lines as they happen (through an
+`on_event(event)` callback) and get a per-step timing summary at the end.
+Events look like:
+
+    {"type": "step", "tag": "app:dev", "step": {"id": 5, "name": "[2/3] RUN make",
+     "status": "done", "duration": 12.4, "cached": false}}
+    {"type": "log", "tag": "app:dev", "step": 5, "line": "gcc -O2 ..."}
+"""
+import os
+import re
+import time
+import subprocess
+
+STEP_LINE = re.compile(r'^#(\d+) (.*)$')
+DONE_LINE = re.compile(r'^DONE (\d+(?:\.\d+)?)s$')
+TIMED_LOG_LINE = re.compile(r'^\d+(?:\.\d+)? (.*)$')
+LEGACY_STEP_LINE = re.compile(r'^Step (\d+)/(\d+) : (.*)$')
+
+
+def build_command(path, tag, cache_from=None, no_cache=False, target=None, build_args=None):
+    """docker build argv for the given cache options"""
+    cmd = ['docker', 'build', '--progress=plain', '-t', tag]
+    if no_cache:
+        cmd.append('--no-cache')
+    for source in cache_from or []:
+        cmd.extend(['--cache-from', source])
+    if target:
+        cmd.extend(['--target', target])
+    if isinstance(build_args, dict):
+        build_args = [f"{key}={value}" for key, value in build_args.items()]
+    for build_arg in build_args or []:
+        cmd.extend(['--build-arg', build_arg])
+    cmd.append(path)
+    return cmd
+
+
+class BuildLogParser:
+    """Turns BuildKit plain progress lines (or legacy builder output) into step events"""
+
+    def __init__(self, tag, on_event=None):
+        self.tag = tag
+        self.on_event = on_event
+        self.steps = {}
+        self._legacy_current = None
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            event["tag"] = self.tag
+            self.on_event(event)
+
+    def _step(self, step_id, name=None):
+        step = self.steps.get(step_id)
+        if step is None:
+            step = {"id": step_id, "name": name or '', "status": "running", "duration": None,
+                    "cached": False, "_started": time.monotonic()}
+            self.steps[step_id] = step
+            self._emit({"type": "step", "step": self.public(step)})
+        return step
+
+    def _finish(self, step, status, duration=None):
+        step["status"] = status
+        if duration is None:
+            duration = round(time.monotonic() - step["_started"], 3)
+        step["duration"] = duration
+        self._emit({"type": "step", "step": self.public(step)})
+
+    @staticmethod
+    def public(step):
+        return {k: v for k, v in step.items() if not k.startswith('_')}
+
+    def feed(self, line):
+        line = line.rstrip('\r\n')
+        if not line:
+            return
+        match = STEP_LINE.match(line)
+        if match:
+            self._feed_buildkit(int(match.group(1)), match.group(2))
+            return
+        self._feed_legacy(line)
+
+    def _feed_buildkit(self, step_id, rest):
+        if step_id not in self.steps:
+            self._step(step_id, rest)
+            return
+        step = self.steps[step_id]
+        done = DONE_LINE.match(rest)
+        if done:
+            self._finish(step, "done", float(done.group(1)))
+        elif rest == 'CACHED':
+            step["cached"] = True
+            self._finish(step, "cached", 0.0)
+        elif rest.startswith('ERROR'):
+            self._finish(step, "error")
+            self._emit({"type": "log", "step": step_id, "line": rest})
+        else:
+            timed = TIMED_LOG_LINE.match(rest)
+            self._emit({"type": "log", "step": step_id, "line": timed.group(1) if timed else rest})
+
+    def _feed_legacy(self, line):
+        # Classic builder: "Step 2/5 : RUN make", " ---> Using cache", " ---> Running in ..."
+        match = LEGACY_STEP_LINE.match(line)
+        if match:
+            previous = self._legacy_current
+            if previous is not None and previous["status"] == "running":
+                self._finish(previous, "cached" if previous["cached"] else "done")
+            self._legacy_current = self._step(int(match.group(1)), match.group(3))
+            return
+        current = self._legacy_current
+        if current is not None and line.strip() == '---> Using cache':
+            current["cached"] = True
+        elif current is not None and line.startswith('Successfully built') and current["status"] == "running":
+            self._finish(current, "cached" if current["cached"] else "done")
+        self._emit({"type": "log", "step": current["id"] if current else None, "line": line})
+
+    def close(self, failed=False):
+        """Mark still-running steps at the end of the build"""
+        for step in self.steps.values():
+            if step["status"] == "running":
+                self._finish(step, "error" if failed else "done")
+
+    def summary(self):
+        steps = [self.public(step) for step in sorted(self.steps.values(), key=lambda s: s["id"])]
+        return {
+            "steps": steps,
+            "cached_steps": sum(1 for s in steps if s["cached"]),
+            "slowest": sorted((s for s in steps if s["duration"]), key=lambda s: -s["duration"])[:5],
+        }
+
+
+def run_build(cmd, tag, on_event=None):
+    """Run a build, streaming events; returns (returncode, output, summary, seconds)"""
+    env = dict(os.environ, DOCKER_BUILDKIT='1')
+    parser = BuildLogParser(tag, on_event)
+    lines = []
+    started = time.monotonic()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors='replace', env=env)
+    for line in process.stdout:
+        lines.append(line)
+        parser.feed(line)
+    process.wait()
+    parser.close(failed=process.returncode != 0)
+    return process.returncode, ''.join(lines), parser.summary(), round(time.monotonic() - started, 3)
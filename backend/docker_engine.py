@@ -0,0 +1,643 @@
+"""
+Minimal Docker Engine API client that speaks HTTP over the daemon's Unix socket.
+
+Used by DockerManager to avoid forking the `docker` CLI for every call. Idle
+connections are kept alive in a small pool and reused across requests.
+"""
+import os
+import re
+import json
+import time
+import socket
+import threading
+import http.client
+from urllib.parse import urlencode, quote
+from instrumentation import span
+
+DEFAULT_SOCKET = '/var/run/docker.sock'
+
+
+class DockerEngineUnavailable(Exception):
+    """The daemon socket cannot be reached; callers should fall back to the CLI"""
+
+
+class DockerEngineError(Exception):
+    """The daemon answered with an HTTP error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a Unix domain socket instead of TCP"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def default_socket_path():
+    """Socket path from DOCKER_HOST (unix:// only) or the standard location"""
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    if docker_host:
+        # tcp:// and npipe:// hosts are left to the CLI
+        return None
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    return DEFAULT_SOCKET
+
+
+def quote_path(value):
+    """Quote an ID/name for use in a URL path segment"""
+    return quote(str(value), safe='')
+
+
+class StreamResponse:
+    """Response body read incrementally; owns its connection until closed"""
+
+    def __init__(self, connection, response):
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+
+    def read(self, amount=None):
+        return self.response.read(amount) if amount else self.response.read()
+
+    def iter_lines(self):
+        """Yield raw lines as the daemon flushes them"""
+        while True:
+            line = self.response.readline()
+            if not line:
+                return
+            yield line
+
+    def iter_json(self):
+        """Yield decoded objects from a newline-delimited JSON stream"""
+        for line in self.iter_lines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+    def iter_frames(self):
+        """Yield (stream, bytes) frames from a multiplexed stream as they arrive (see demux_stream)"""
+        while True:
+            header = self.response.read(8)
+            if len(header) < 8:
+                return
+            length = int.from_bytes(header[4:8], 'big')
+            payload = self.response.read(length) if length else b''
+            yield header[0], payload
+
+    def abort(self):
+        """Wake a reader blocked in another thread; it sees end-of-stream and closes"""
+        sock = self.connection.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.abort()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DockerEngineClient:
+    def __init__(self, socket_path=None, timeout=30, pool_size=4):
+        self.socket_path = socket_path if socket_path is not None else default_socket_path()
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        """Cheap check: is there a socket file to talk to?"""
+        return bool(self.socket_path) and os.path.exists(self.socket_path)
+
+    def ping(self):
+        """Return True if the daemon answers on the socket"""
+        try:
+            status, _, _ = self.request('GET', '/_ping', timeout=2)
+            return status == 200
+        except (DockerEngineUnavailable, DockerEngineError):
+            return False
+
+    def _acquire(self, timeout):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+        return UnixHTTPConnection(self.socket_path, timeout=timeout), False
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _build_url(self, path, params):
+        if params:
+            query = {}
+            for key, value in params.items():
+                if value is None:
+                    continue
+                if isinstance(value, bool):
+                    value = '1' if value else '0'
+                elif isinstance(value, (dict, list)):
+                    value = json.dumps(value)
+                query[key] = value
+            if query:
+                return f"{path}?{urlencode(query)}"
+        return path
+
+    def _encode_body(self, body, headers):
+        headers = dict(headers or {})
+        if body is None:
+            return None, headers
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+        return body, headers
+
+    def _send(self, method, url, body, headers, timeout):
+        """Send a request and return (connection, response), retrying once on a stale pooled connection"""
+        if not self.socket_path:
+            raise DockerEngineUnavailable("No Docker socket configured")
+        for attempt in range(2):
+            connection, reused = self._acquire(timeout)
+            try:
+                connection.request(method, url, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                connection.close()
+                # The daemon may have dropped an idle keep-alive connection
+                if reused and attempt == 0:
+                    continue
+                raise DockerEngineUnavailable(str(e))
+            except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+                connection.close()
+                raise DockerEngineUnavailable(str(e))
+            except OSError:
+                connection.close()
+                raise
+        raise DockerEngineUnavailable("Could not reach the Docker daemon")
+
+    @staticmethod
+    def _error_message(status, data):
+        try:
+            return json.loads(data).get('message') or f"HTTP {status}"
+        except (ValueError, AttributeError):
+            text = data.decode('utf-8', errors='ignore').strip()
+            return text or f"HTTP {status}"
+
+    def request(self, method, path, params=None, body=None, headers=None, timeout=None):
+        """Perform a request and return (status, headers, body bytes); raises DockerEngineError on >= 400"""
+        url = self._build_url(path, params)
+        body, headers = self._encode_body(body, headers)
+        with span('request', method=method, path=path):
+            connection, response = self._send(method, url, body, headers, timeout or self.timeout)
+        try:
+            with span('read'):
+                data = response.read()
+        except http.client.IncompleteRead as e:
+            connection.close()
+            # The daemon went away mid-body
+            raise ConnectionResetError(f"Docker daemon closed the connection after {len(e.partial)} bytes "
+                                       f"of the response") from e
+        except OSError:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        if response.status >= 400:
+            raise DockerEngineError(response.status, self._error_message(response.status, data))
+        return response.status, response.getheaders(), data
+
+    def get_json(self, path, params=None, timeout=None):
+        _, _, data = self.request('GET', path, params=params, timeout=timeout)
+        return _decode(data)
+
+    def post_json(self, path, params=None, body=None, timeout=None):
+        status, _, data = self.request('POST', path, params=params, body=body, timeout=timeout)
+        return status, _decode(data)
+
+    def delete_json(self, path, params=None, timeout=None):
+        _, _, data = self.request('DELETE', path, params=params, timeout=timeout)
+        return _decode(data)
+
+    def stream(self, method, path, params=None, body=None, headers=None, timeout=None):
+        """Open a streaming request (events, pull progress, logs).
+
+        The connection is never returned to the pool; close the returned
+        StreamResponse (or use it as a context manager) when done. Closing it
+        early cancels the operation on the daemon side.
+        """
+        url = self._build_url(path, params)
+        body, headers = self._encode_body(body, headers)
+        connection, response = self._send(method, url, body, headers, timeout)
+        if response.status >= 400:
+            data = response.read()
+            connection.close()
+            raise DockerEngineError(response.status, self._error_message(response.status, data))
+        return StreamResponse(connection, response)
+
+
+def _decode(data):
+    if not data:
+        return None
+    with span('parse'):
+        return json.loads(data)
+
+
+def demux_stream(data):
+    """Split a multiplexed (non-TTY) attach/logs payload into (stream, bytes) frames.
+
+    Each frame is an 8-byte header: stream type (1=stdout, 2=stderr), three
+    zero bytes, then a big-endian uint32 payload length.
+    """
+    frames = []
+    offset = 0
+    while offset + 8 <= len(data):
+        stream_type = data[offset]
+        length = int.from_bytes(data[offset + 4:offset + 8], 'big')
+        frames.append((stream_type, data[offset + 8:offset + 8 + length]))
+        offset += 8 + length
+    return frames
+
+
+# ---------------------------------------------------------------------------
+# Converters from Engine API objects to the rows `docker ... --format json`
+# prints, so results look the same whichever transport produced them.
+# ---------------------------------------------------------------------------
+
+def _custom_size(fmt, size, base, units):
+    size = float(size)
+    i = 0
+    while size >= base and i < len(units) - 1:
+        size /= base
+        i += 1
+    return (fmt % size) + units[i]
+
+
+def human_size(size):
+    """Decimal size with 3 significant digits, e.g. 72.8MB (like `docker images`)"""
+    return _custom_size('%.3g', size, 1000.0, ['B', 'kB', 'MB', 'GB', 'TB', 'PB', 'EB'])
+
+
+def bytes_size(size):
+    """Binary size with 4 significant digits, e.g. 7.667GiB (like `docker stats`)"""
+    return _custom_size('%.4g', size, 1024.0, ['B', 'KiB', 'MiB', 'GiB', 'TiB', 'PiB', 'EiB'])
+
+
+SIZE_UNITS = {
+    'b': 1, 'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4, 'pb': 1000 ** 5,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4, 'pib': 1024 ** 5,
+}
+
+
+def parse_size(text):
+    """Inverse of human_size/bytes_size: "72.8MB" or "7.667GiB" -> bytes (None if unparseable)"""
+    match = re.match(r'^\s*([\d.]+)\s*([a-zA-Z]*)\s*$', text or '')
+    if not match:
+        return None
+    factor = SIZE_UNITS.get((match.group(2) or 'b').lower())
+    if factor is None:
+        return None
+    return float(match.group(1)) * factor
+
+
+def human_duration(seconds):
+    """Duration in the same words the docker CLI uses ("About an hour", "3 weeks")"""
+    seconds = int(seconds)
+    if seconds < 1:
+        return 'Less than a second'
+    if seconds == 1:
+        return '1 second'
+    if seconds < 60:
+        return f'{seconds} seconds'
+    minutes = seconds // 60
+    if minutes == 1:
+        return 'About a minute'
+    if minutes < 60:
+        return f'{minutes} minutes'
+    hours = minutes // 60
+    if hours == 1:
+        return 'About an hour'
+    if hours < 48:
+        return f'{hours} hours'
+    if hours < 24 * 7 * 2:
+        return f'{hours // 24} days'
+    if hours < 24 * 30 * 2:
+        return f'{hours // 24 // 7} weeks'
+    if hours < 24 * 365 * 2:
+        return f'{hours // 24 // 30} months'
+    return f'{hours // 24 // 365} years'
+
+
+def format_timestamp(epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S %z %Z', time.localtime(epoch))
+
+
+def short_id(value):
+    value = value or ''
+    if value.startswith('sha256:'):
+        value = value[len('sha256:'):]
+    return value[:12]
+
+
+def _split_repo_tag(ref):
+    # The tag separator is the last ':' after the last '/', so registry ports survive
+    slash = ref.rfind('/')
+    colon = ref.rfind(':')
+    if colon > slash:
+        return ref[:colon], ref[colon + 1:]
+    return ref, '<none>'
+
+
+def image_rows(raw):
+    """One `docker image ls` row per repository tag of an /images/json entry"""
+    created = raw.get('Created', 0)
+    common = {
+        "Containers": str(raw['Containers']) if raw.get('Containers', -1) >= 0 else 'N/A',
+        "CreatedAt": format_timestamp(created),
+        "CreatedSince": human_duration(time.time() - created) + ' ago',
+        "ID": short_id(raw.get('Id')),
+        # Not in the CLI's image rows; kept here so local search can match on labels
+        "Labels": ','.join(f"{k}={v}" for k, v in (raw.get('Labels') or {}).items()),
+        "SharedSize": human_size(raw['SharedSize']) if raw.get('SharedSize', -1) >= 0 else 'N/A',
+        "Size": human_size(raw.get('Size', 0)),
+        "UniqueSize": 'N/A',
+        "VirtualSize": human_size(raw.get('VirtualSize', raw.get('Size', 0))),
+    }
+    digests = {}
+    for repo_digest in raw.get('RepoDigests') or []:
+        repo, _, digest = repo_digest.partition('@')
+        digests.setdefault(repo, digest)
+
+    tags = [t for t in (raw.get('RepoTags') or []) if t != '<none>:<none>']
+    rows = []
+    for ref in tags:
+        repository, tag = _split_repo_tag(ref)
+        row = dict(common, Repository=repository, Tag=tag, Digest=digests.get(repository, '<none>'))
+        rows.append(row)
+    if not rows:
+        repository = next(iter(digests), '<none>')
+        rows.append(dict(common, Repository=repository, Tag='<none>',
+                         Digest=digests.get(repository, '<none>')))
+    return rows
+
+
+def image_summary_from_inspect(inspect):
+    """Turn an /images/{id}/json (or `docker image inspect`) object into an /images/json entry"""
+    from datetime import datetime
+    created = inspect.get('Created') or ''
+    try:
+        # RFC 3339 with nanoseconds; trim to microseconds for fromisoformat
+        stamp = re.sub(r'(\.\d{6})\d+', r'\1', created).replace('Z', '+00:00')
+        created_epoch = int(datetime.fromisoformat(stamp).timestamp())
+    except ValueError:
+        created_epoch = 0
+    return {
+        "Id": inspect.get('Id', ''),
+        "RepoTags": inspect.get('RepoTags') or [],
+        "RepoDigests": inspect.get('RepoDigests') or [],
+        "Created": created_epoch,
+        "Size": inspect.get('Size', 0),
+        "VirtualSize": inspect.get('VirtualSize', inspect.get('Size', 0)),
+        "Labels": (inspect.get('Config') or {}).get('Labels') or {},
+        "Containers": -1,
+        "SharedSize": -1,
+    }
+
+
+def _format_ports(ports):
+    formatted = []
+    for port in ports or []:
+        private = f"{port.get('PrivatePort')}/{port.get('Type', 'tcp')}"
+        if port.get('PublicPort'):
+            ip = port.get('IP', '')
+            formatted.append(f"{ip}:{port['PublicPort']}->{private}")
+        else:
+            formatted.append(private)
+    return ', '.join(formatted)
+
+
+def _flag(value):
+    # The CLI reports booleans as "true"/"false" or, before Docker 25, "[OK]"/""
+    return value is True or str(value).lower() in ('true', '[ok]')
+
+
+def hub_search_row(raw):
+    """Search result from an /images/search entry or a `docker search --format '{{json .}}'` line"""
+    stars = str(raw.get('star_count', raw.get('StarCount', 0)))
+    return {
+        "name": raw.get('name', raw.get('Name', '')),
+        "description": raw.get('description', raw.get('Description', '')),
+        "star_count": int(stars) if stars.isdigit() else 0,
+        "is_official": _flag(raw.get('is_official', raw.get('IsOfficial'))),
+        "is_automated": _flag(raw.get('is_automated', raw.get('IsAutomated'))),
+    }
+
+
+def container_row(raw):
+    """`docker container ls` row for an /containers/json entry"""
+    created = raw.get('Created', 0)
+    command = raw.get('Command') or ''
+    if len(command) > 20:
+        command = command[:19] + '…'
+    mounts = raw.get('Mounts') or []
+    labels = raw.get('Labels') or {}
+    networks = (raw.get('NetworkSettings') or {}).get('Networks') or {}
+    return {
+        "Command": json.dumps(command, ensure_ascii=False),
+        "CreatedAt": format_timestamp(created),
+        "ID": short_id(raw.get('Id')),
+        "Image": raw.get('Image', ''),
+        "Labels": ','.join(f"{k}={v}" for k, v in labels.items()),
+        "LocalVolumes": str(sum(1 for m in mounts if m.get('Type') == 'volume' and m.get('Driver') == 'local')),
+        "Mounts": ','.join((m.get('Name') or m.get('Source') or '')[:15] for m in mounts),
+        "Names": ','.join(n.lstrip('/') for n in raw.get('Names') or []),
+        "Networks": ','.join(networks.keys()),
+        "Ports": _format_ports(raw.get('Ports')),
+        "RunningFor": human_duration(time.time() - created) + ' ago',
+        "Size": human_size(raw['SizeRw']) if raw.get('SizeRw') else '0B',
+        "State": raw.get('State', ''),
+        "Status": raw.get('Status', ''),
+    }
+
+
+def stats_values(raw, previous=None):
+    """Numeric metrics for a /containers/{id}/stats sample.
+
+    CPU is computed against `previous` (an earlier sample of the same
+    container) when given, otherwise against the sample's own precpu_stats;
+    with neither, as for a first one-shot sample, cpu_percent is None.
+    """
+    cpu_stats = raw.get('cpu_stats') or {}
+    precpu_stats = (previous or {}).get('cpu_stats') or raw.get('precpu_stats') or {}
+    cpu_percent = None
+    if precpu_stats.get('system_cpu_usage'):
+        cpu_percent = 0.0
+        cpu_delta = (cpu_stats.get('cpu_usage') or {}).get('total_usage', 0) - \
+            (precpu_stats.get('cpu_usage') or {}).get('total_usage', 0)
+        system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+        online_cpus = cpu_stats.get('online_cpus') or \
+            len((cpu_stats.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+        if cpu_delta > 0 and system_delta > 0:
+            cpu_percent = cpu_delta / system_delta * online_cpus * 100.0
+
+    memory_stats = raw.get('memory_stats') or {}
+    details = memory_stats.get('stats') or {}
+    # Same as the CLI: page cache is not counted as used memory
+    cache = details.get('total_inactive_file', details.get('inactive_file', 0))
+    mem_usage = max(memory_stats.get('usage', 0) - cache, 0)
+    mem_limit = memory_stats.get('limit', 0)
+
+    rx = tx = 0
+    for network in (raw.get('networks') or {}).values():
+        rx += network.get('rx_bytes', 0)
+        tx += network.get('tx_bytes', 0)
+
+    blk_read = blk_write = 0
+    for entry in (raw.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = (entry.get('op') or '').lower()
+        if op == 'read':
+            blk_read += entry.get('value', 0)
+        elif op == 'write':
+            blk_write += entry.get('value', 0)
+
+    return {
+        "cpu_percent": cpu_percent,
+        "mem_usage": mem_usage,
+        "mem_limit": mem_limit,
+        "mem_percent": mem_usage / mem_limit * 100.0 if mem_limit else 0.0,
+        "net_rx": rx,
+        "net_tx": tx,
+        "block_read": blk_read,
+        "block_write": blk_write,
+        "pids": (raw.get('pids_stats') or {}).get('current', 0),
+    }
+
+
+def stats_row(raw, container, previous=None):
+    """`docker stats --no-stream --format json` row for a /containers/{id}/stats sample"""
+    values = stats_values(raw, previous)
+    return {
+        "BlockIO": f"{human_size(values['block_read'])} / {human_size(values['block_write'])}",
+        "CPUPerc": f"{values['cpu_percent'] or 0.0:.2f}%",
+        "Container": container,
+        "ID": short_id(raw.get('id')),
+        "MemPerc": f"{values['mem_percent']:.2f}%",
+        "MemUsage": f"{bytes_size(values['mem_usage'])} / {bytes_size(values['mem_limit'])}",
+        "Name": (raw.get('name') or '').lstrip('/'),
+        "NetIO": f"{human_size(values['net_rx'])} / {human_size(values['net_tx'])}",
+        "PIDs": str(values['pids']),
+    }
+
+
+def values_from_stats_row(row):
+    """stats_values-style numbers parsed back out of a `docker stats --format json` row"""
+    def pair(text):
+        left, _, right = (text or '').partition('/')
+        return parse_size(left), parse_size(right)
+
+    def percent(text):
+        try:
+            return float((text or '').rstrip('%'))
+        except ValueError:
+            return None
+
+    mem_usage, mem_limit = pair(row.get('MemUsage'))
+    rx, tx = pair(row.get('NetIO'))
+    blk_read, blk_write = pair(row.get('BlockIO'))
+    try:
+        pids = int(row.get('PIDs') or 0)
+    except ValueError:
+        pids = None
+    return {
+        "cpu_percent": percent(row.get('CPUPerc')),
+        "mem_usage": mem_usage,
+        "mem_limit": mem_limit,
+        "mem_percent": percent(row.get('MemPerc')),
+        "net_rx": rx,
+        "net_tx": tx,
+        "block_read": blk_read,
+        "block_write": blk_write,
+        "pids": pids,
+    }
+
+
+def parse_port_mapping(spec):
+    """Parse a `-p` style mapping into (container_port, binding) or None if unsupported.
+
+    Supports "80", "8080:80", "127.0.0.1:8080:80" and an optional "/udp" suffix.
+    Port ranges are left to the CLI.
+    """
+    spec = str(spec).strip()
+    proto = 'tcp'
+    if '/' in spec:
+        spec, proto = spec.rsplit('/', 1)
+    parts = spec.split(':')
+    if len(parts) == 1:
+        host_ip, host_port, container_port = '', '', parts[0]
+    elif len(parts) == 2:
+        host_ip, (host_port, container_port) = '', parts
+    elif len(parts) == 3:
+        host_ip, host_port, container_port = parts
+    else:
+        return None
+    if not container_port.isdigit() or (host_port and not host_port.isdigit()):
+        return None
+    return f"{container_port}/{proto}", {"HostIp": host_ip, "HostPort": host_port}
+
+
+def split_image_reference(name):
+    """Split an image reference into (fromImage, tag) for /images/create.
+
+    Without an explicit tag the API would pull every tag, so default to latest
+    the same way `docker pull` does.
+    """
+    if '@' in name:
+        return name, None
+    repository, tag = _split_repo_tag(name)
+    return repository, (tag if tag != '<none>' else 'latest')
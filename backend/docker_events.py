@@ -0,0 +1,250 @@
+"""
+In-memory container/image inventory kept current from the Docker events stream.
+
+The inventory does one full listing when it (re)connects, then patches single
+entries as events arrive, so keeping the UI current costs O(changes) instead
+of re-listing everything on a timer. Every change is pushed to listeners as a
+delta; a reconnect to the daemon triggers a full resync and a new snapshot.
+"""
+import json
+import subprocess
+import threading
+from docker_engine import (
+    DockerEngineError, DockerEngineUnavailable,
+    container_row, image_rows, image_summary_from_inspect, quote_path, short_id,
+)
+from instrumentation import traced_check_output, traced_run
+
+# Container actions that do not change what `docker ps -a` shows
+IGNORED_CONTAINER_ACTIONS = ('exec_create', 'exec_start', 'exec_die', 'exec_detach',
+                             'attach', 'detach', 'resize', 'top', 'export', 'archive-path',
+                             'extract-to-dir', 'commit', 'copy')
+
+MAX_BACKOFF = 30
+
+
+class DockerInventory:
+    def __init__(self, manager):
+        self.manager = manager
+        self.containers = {}   # short container ID -> `docker container ls` row
+        self.images = {}       # short image ID -> list of `docker image ls` rows
+        self.version = 0
+        self.connected = False
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._synced = threading.Event()
+        self._stream = None
+
+    # -- listeners ---------------------------------------------------------
+
+    def add_listener(self, listener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._watch, name='docker-events', daemon=True)
+                self._thread.start()
+            else:
+                # The last listener may have just left: the watcher has been told to stop
+                # but only exits once it sees _stop under this lock, so it keeps running
+                self._stop.clear()
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+            if not self._listeners:
+                self.stop()
+
+    def wait_synced(self, timeout):
+        """Block until the first full listing has landed (or timeout); True if it has"""
+        return self._synced.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        stream = self._stream
+        if stream is not None:
+            if isinstance(stream, subprocess.Popen):
+                stream.terminate()
+            else:
+                stream.abort()
+
+    def _emit(self, delta):
+        with self._lock:
+            self.version += 1
+            delta["version"] = self.version
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(delta)
+            except Exception:
+                continue
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "kind": "snapshot",
+                "version": self.version,
+                "connected": self.connected,
+                "containers": list(self.containers.values()),
+                "images": [row for rows in self.images.values() for row in rows],
+            }
+
+    # -- fetching ----------------------------------------------------------
+
+    def _engine(self):
+        engine = self.manager.engine
+        return engine if engine is not None and engine.is_configured() else None
+
+    def resync(self):
+        """Replace the whole inventory with a fresh listing and push a snapshot"""
+        # fresh: the point of a resync is not to trust anything cached
+        containers = json.loads(self.manager.list_containers(fresh=True))
+        images = json.loads(self.manager.list_images(fresh=True))
+        if not containers.get('success') or not images.get('success'):
+            raise RuntimeError(containers.get('error') or images.get('error') or 'Listing failed')
+
+        by_image = {}
+        for row in images['data']:
+            by_image.setdefault(short_id(row.get('ID')), []).append(row)
+        with self._lock:
+            self.containers = {short_id(row.get('ID')): row for row in containers['data']}
+            self.images = by_image
+        self._synced.set()
+        snapshot = self.snapshot()
+        self._emit(snapshot)
+        return snapshot
+
+    def _fetch_container(self, container_id):
+        engine = self._engine()
+        if engine is not None:
+            try:
+                found = engine.get_json('/containers/json', params={'all': True, 'filters': {'id': [container_id]}})
+                return container_row(found[0]) if found else None
+            except DockerEngineUnavailable:
+                pass
+        output = traced_check_output(
+            ['docker', 'container', 'ls', '-a', '--filter', f'id={container_id}', '--format', 'json'],
+            text=True, stderr=subprocess.PIPE, timeout=30)
+        for line in output.strip().split('\n'):
+            if line:
+                return json.loads(line)
+        return None
+
+    def _fetch_image(self, image_id):
+        engine = self._engine()
+        if engine is not None:
+            try:
+                return image_rows(image_summary_from_inspect(engine.get_json(f'/images/{quote_path(image_id)}/json')))
+            except DockerEngineError as e:
+                if e.status == 404:
+                    return None
+                raise
+            except DockerEngineUnavailable:
+                pass
+        result = traced_run(['docker', 'image', 'inspect', image_id],
+                            capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            return None
+        inspected = json.loads(result.stdout or '[]')
+        return image_rows(image_summary_from_inspect(inspected[0])) if inspected else None
+
+    # -- events ------------------------------------------------------------
+
+    def apply_event(self, event):
+        """Patch the inventory for one event and push the resulting delta"""
+        kind = event.get('Type')
+        action = (event.get('Action') or event.get('status') or '').split(':')[0].strip()
+        actor_id = (event.get('Actor') or {}).get('ID') or event.get('id') or ''
+        if not actor_id:
+            return
+        # Changes made outside the app (CLI, compose) reach cached listings this way
+        if kind in ('container', 'image') and getattr(self.manager, 'cache', None) is not None:
+            self.manager.cache.invalidate(kind + 's')
+
+        if kind == 'container':
+            if action in IGNORED_CONTAINER_ACTIONS or action.startswith('health_status'):
+                return
+            key = short_id(actor_id)
+            row = None if action == 'destroy' else self._fetch_container(actor_id)
+            with self._lock:
+                if row is None:
+                    if self.containers.pop(key, None) is None:
+                        return
+                else:
+                    self.containers[key] = row
+            self._emit({"kind": "container", "op": "remove" if row is None else "upsert", "id": key, "data": row})
+
+        elif kind == 'image':
+            rows = None if action == 'delete' else self._fetch_image(actor_id)
+            key = short_id(rows[0]['ID']) if rows else short_id(actor_id)
+            with self._lock:
+                if rows is None:
+                    if self.images.pop(key, None) is None:
+                        return
+                else:
+                    self.images[key] = rows
+            self._emit({"kind": "image", "op": "remove" if rows is None else "upsert", "id": key, "data": rows})
+
+    def _open_stream(self):
+        filters = {'type': ['container', 'image']}
+        engine = self._engine()
+        if engine is not None:
+            try:
+                response = engine.stream('GET', '/events', params={'filters': filters})
+                self._stream = response
+                return response.iter_json()
+            except DockerEngineUnavailable:
+                pass
+        process = subprocess.Popen(
+            ['docker', 'events', '--format', '{{json .}}', '--filter', 'type=container', '--filter', 'type=image'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self._stream = process
+        return (json.loads(line) for line in process.stdout if line.strip())
+
+    def _close_stream(self):
+        stream, self._stream = self._stream, None
+        if isinstance(stream, subprocess.Popen):
+            stream.terminate()
+            try:
+                stream.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                stream.kill()
+        elif stream is not None:
+            stream.close()
+
+    def _watch(self):
+        backoff = 1
+        while True:
+            with self._lock:
+                # Checked under the lock so add_listener either revives this loop or starts a new one
+                if self._stop.is_set():
+                    if self._thread is threading.current_thread():
+                        self._thread = None
+                    return
+            try:
+                # Subscribe before listing so nothing that happens in between is lost
+                events = self._open_stream()
+                self.connected = True
+                self.resync()
+                backoff = 1
+                for event in events:
+                    if self._stop.is_set():
+                        break
+                    try:
+                        self.apply_event(event)
+                    except (subprocess.SubprocessError, OSError, ValueError, DockerEngineError):
+                        continue
+            except Exception:
+                pass
+            finally:
+                self._close_stream()
+            if self.connected:
+                self.connected = False
+                self._emit({"kind": "disconnected"})
+            # Daemon went away (or never came up); retry, then resync on reconnect
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
@@ -0,0 +1,434 @@
+"""
+Container log reads with cursors, server-side filtering and follow mode.
+
+Every line is fetched with its daemon timestamp, which doubles as a cursor:
+a caller that passes back the last `cursor` it saw only receives newer lines.
+Followed containers keep their most recent lines in a bounded ring buffer
+and push new ones to listeners in small batches, already filtered by regex,
+level and time window, so a chatty container is never shipped whole over IPC.
+Pushes look like:
+
+    {"container": "3f2a...", "logs": "...", "count": 12,
+     "cursor": "2024-05-01T10:00:00.123456789Z"}
+"""
+import re
+import time
+import calendar
+import threading
+import subprocess
+from collections import deque
+from docker_engine import DockerEngineError, DockerEngineUnavailable, demux_stream, quote_path
+from instrumentation import span, traced_run
+
+DEFAULT_BUFFER_LINES = 5000
+# Lines scanned per one-shot read when a filter may discard most of them
+DEFAULT_SCAN_LINES = 5000
+FLUSH_INTERVAL = 0.1
+MAX_BATCH_LINES = 500
+
+TIMESTAMP_PREFIX = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d) ?(.*)$', re.DOTALL)
+LEVEL_PATTERN = re.compile(r'\b(fatal|panic|critical|crit|error|err|warning|warn|info|debug|trace)\b', re.IGNORECASE)
+LEVELS = {
+    'fatal': 'error', 'panic': 'error', 'critical': 'error', 'crit': 'error', 'error': 'error', 'err': 'error',
+    'warning': 'warn', 'warn': 'warn', 'info': 'info', 'debug': 'debug', 'trace': 'debug',
+}
+STREAMS = {1: 'stdout', 2: 'stderr'}
+
+
+def parse_timestamp(value):
+    """RFC 3339 timestamp (as `docker logs --timestamps` prints it) or epoch seconds -> integer nanoseconds"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value * 1000000000)
+    match = TIMESTAMP_PREFIX.match(f"{value} ")
+    if not match:
+        try:
+            return int(float(value) * 1000000000)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {value}")
+    seconds = calendar.timegm(time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S'))
+    nanos = int((match.group(2) or '0')[:9].ljust(9, '0'))
+    zone = match.group(3)
+    if zone != 'Z':
+        offset = int(zone[1:3]) * 3600 + int(zone[4:6]) * 60
+        seconds -= offset if zone[0] == '+' else -offset
+    return seconds * 1000000000 + nanos
+
+
+def parse_tail(value):
+    """Lines to keep from a `tail` argument (a count, a string of digits or 'all') -> int, or None for all"""
+    if value is None or value == 'all':
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise ValueError(f"Invalid tail: {value!r} (expected a number of lines or 'all')")
+
+
+def since_param(nanos):
+    """Integer nanoseconds -> the "seconds.nanoseconds" form --since/--until accept"""
+    return f"{nanos // 1000000000}.{nanos % 1000000000:09d}"
+
+
+def detect_level(line):
+    match = LEVEL_PATTERN.search(line[:200])
+    return LEVELS[match.group(1).lower()] if match else None
+
+
+def parse_line(raw, stream='stdout'):
+    """Split a `--timestamps` log line into an entry dict"""
+    raw = raw.rstrip('\r\n')
+    match = TIMESTAMP_PREFIX.match(raw)
+    if match:
+        ts = raw[:raw.index(' ')] if ' ' in raw else raw
+        line = match.group(4)
+        nanos = parse_timestamp(ts)
+    else:
+        ts, line, nanos = None, raw, None
+    return {"ts": ts, "nanos": nanos, "stream": stream, "line": line, "level": detect_level(line)}
+
+
+class LogFilter:
+    """Regex / level / time-window filter applied before lines leave the backend"""
+
+    def __init__(self, pattern=None, levels=None, since=None, until=None):
+        try:
+            self.regex = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}")
+        if isinstance(levels, str):
+            levels = [levels]
+        self.levels = {LEVELS.get(level.lower(), level.lower()) for level in levels} if levels else None
+        self.since = parse_timestamp(since)
+        self.until = parse_timestamp(until)
+
+    @property
+    def active(self):
+        return bool(self.regex or self.levels or self.since is not None or self.until is not None)
+
+    def matches(self, entry):
+        nanos = entry["nanos"]
+        if self.since is not None and nanos is not None and nanos < self.since:
+            return False
+        if self.until is not None and nanos is not None and nanos > self.until:
+            return False
+        if self.levels is not None and entry["level"] not in self.levels:
+            return False
+        if self.regex is not None and not self.regex.search(entry["line"]):
+            return False
+        return True
+
+    def apply(self, entries):
+        return [entry for entry in entries if self.matches(entry)] if self.active else list(entries)
+
+
+def render(entries, container=None):
+    """Payload shared by read results and follow pushes"""
+    cursor = next((entry["ts"] for entry in reversed(entries) if entry["ts"]), None)
+    payload = {"logs": '\n'.join(entry["line"] for entry in entries), "count": len(entries), "cursor": cursor}
+    if container is not None:
+        payload["container"] = container
+    return payload
+
+
+def after_cursor(entries, cursor):
+    """Entries strictly newer than cursor (the daemon's --since is inclusive)"""
+    if cursor is None:
+        return list(entries)
+    return [entry for entry in entries if entry["nanos"] is None or entry["nanos"] > cursor]
+
+
+class LogFollower:
+    """Follows one container's logs into a ring buffer and pushes batches to listeners"""
+
+    def __init__(self, manager, container, tail, buffer_lines=DEFAULT_BUFFER_LINES):
+        self.manager = manager
+        self.container = container
+        self.buffer = deque(maxlen=buffer_lines)
+        self.listeners = {}    # listener -> (LogFilter, nanos of the last line it already has)
+        self.tail = tail
+        self.error = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._started = threading.Event()
+        self._streams = []
+        self._thread = threading.Thread(target=self._run, name=f'docker-logs-{container[:12]}', daemon=True)
+        self._flusher = threading.Thread(target=self._flush_loop, name='docker-logs-flush', daemon=True)
+
+    def start(self, timeout=5):
+        self._thread.start()
+        self._flusher.start()
+        self._started.wait(timeout)
+
+    @property
+    def alive(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for stream in list(self._streams):
+            if isinstance(stream, subprocess.Popen):
+                if stream.poll() is None:
+                    stream.terminate()
+            else:
+                stream.abort()
+
+    def attach(self, listener, log_filter):
+        """Register listener and return the buffered lines; pushes start after the last of them"""
+        with self._lock:
+            entries = list(self.buffer)
+            last = next((entry["nanos"] for entry in reversed(entries) if entry["nanos"] is not None), None)
+            self.listeners[listener] = (log_filter, last)
+        return entries
+
+    def remove_listener(self, listener=None):
+        """Drop listener (or all of them); True when nobody is listening any more"""
+        with self._lock:
+            if listener is None:
+                self.listeners.clear()
+            else:
+                self.listeners.pop(listener, None)
+            return not self.listeners
+
+    def settle(self):
+        """Wait one flush interval so the initial tail has landed in the buffer"""
+        self._stop.wait(FLUSH_INTERVAL)
+
+    def entries(self):
+        with self._lock:
+            return list(self.buffer)
+
+    def covers(self, cursor):
+        """True when the buffer holds everything newer than cursor"""
+        with self._lock:
+            if not self.buffer:
+                return True
+            oldest = self.buffer[0]["nanos"]
+        return cursor is not None and oldest is not None and oldest <= cursor
+
+    def _append(self, entry):
+        with self._lock:
+            self.buffer.append(entry)
+            self._pending.append(entry)
+            full = len(self._pending) >= MAX_BATCH_LINES
+        if full:
+            self._flush()
+        else:
+            self._wake.set()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            listeners = list(self.listeners.items())
+        if not batch:
+            return
+        for listener, (log_filter, last) in listeners:
+            entries = log_filter.apply(after_cursor(batch, last))
+            if not entries:
+                continue
+            try:
+                listener(render(entries, self.container))
+            except Exception:
+                continue
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # Let a burst of lines collect into one push
+            self._stop.wait(FLUSH_INTERVAL)
+            self._flush()
+        self._flush()
+
+    def _run(self):
+        try:
+            engine = self.manager.engine
+            if engine is not None and engine.is_configured():
+                try:
+                    self._follow_engine(engine)
+                    return
+                except DockerEngineUnavailable:
+                    pass
+            self._follow_cli()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self._started.set()
+            self.stop()
+            self._flusher.join(timeout=1)
+            # Tell listeners a running stream ended (container stopped or removed)
+            with self._lock:
+                listeners = list(self.listeners) if self._streams else []
+            for listener in listeners:
+                try:
+                    listener({"container": self.container, "logs": '', "count": 0, "cursor": None,
+                              "ended": True, "error": self.error})
+                except Exception:
+                    continue
+
+    def _follow_engine(self, engine):
+        try:
+            info = engine.get_json(f"/containers/{quote_path(self.container)}/json")
+            response = engine.stream('GET', f"/containers/{quote_path(self.container)}/logs",
+                                     params={'follow': True, 'stdout': True, 'stderr': True,
+                                             'timestamps': True, 'tail': str(self.tail)})
+        except DockerEngineError as e:
+            self.error = f"Container {self.container} not found" if e.status == 404 else e.message
+            return
+        self._streams.append(response)
+        self._started.set()
+        try:
+            if (info.get('Config') or {}).get('Tty'):
+                for raw in response.iter_lines():
+                    self._append(parse_line(raw.decode('utf-8', errors='replace')))
+            else:
+                partial = {}
+                for stream_type, payload in response.iter_frames():
+                    text = partial.pop(stream_type, '') + payload.decode('utf-8', errors='replace')
+                    lines = text.split('\n')
+                    if lines[-1]:
+                        partial[stream_type] = lines[-1]
+                    for raw in lines[:-1]:
+                        self._append(parse_line(raw, STREAMS.get(stream_type, 'stdout')))
+        except OSError:
+            if not self._stop.is_set():
+                raise
+        finally:
+            response.close()
+
+    def _follow_cli(self):
+        # `docker logs` reports a missing container on the same pipe as its output
+        check = traced_run(['docker', 'container', 'inspect', '--format', '{{.Id}}', self.container],
+                           capture_output=True, text=True, timeout=30)
+        if check.returncode != 0:
+            message = check.stderr.strip()
+            self.error = f"Container {self.container} not found" if 'no such' in message.lower() else message
+            return
+        process = subprocess.Popen(['docker', 'logs', '--follow', '--timestamps', '--tail', str(self.tail),
+                                    self.container],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+        self._streams.append(process)
+        self._started.set()
+
+        def pump(pipe, stream):
+            for raw in pipe:
+                if raw.strip():
+                    self._append(parse_line(raw, stream))
+
+        stderr_thread = threading.Thread(target=pump, args=(process.stderr, 'stderr'), daemon=True)
+        stderr_thread.start()
+        pump(process.stdout, 'stdout')
+        stderr_thread.join()
+        process.wait()
+        if process.returncode not in (0, None) and not self._stop.is_set():
+            last = self.buffer[-1]["line"] if self.buffer else ''
+            self.error = last or f"docker logs exited with status {process.returncode}"
+
+
+class LogStreams:
+    """Followers and one-shot reads for one DockerManager"""
+
+    def __init__(self, manager, buffer_lines=DEFAULT_BUFFER_LINES):
+        self.manager = manager
+        self.buffer_lines = buffer_lines
+        self._followers = {}
+        self._lock = threading.Lock()
+
+    def follow(self, container, listener, log_filter, tail=100):
+        """Start (or join) following container; returns the current filtered tail"""
+        tail = parse_tail(tail)
+        with self._lock:
+            follower = self._followers.get(container)
+            if follower is None or not follower.alive:
+                follower = LogFollower(self.manager, container, 'all' if tail is None else tail, self.buffer_lines)
+                self._followers[container] = follower
+                follower.start()
+                if follower.error:
+                    del self._followers[container]
+                    raise RuntimeError(follower.error)
+                follower.settle()
+            entries = log_filter.apply(follower.attach(listener, log_filter))
+        return entries[-tail:] if tail else entries
+
+    def unfollow(self, container, listener=None):
+        """Drop listener (or every listener) for container; stops the follower when none remain"""
+        with self._lock:
+            followers = [container] if container else list(self._followers)
+            for key in followers:
+                follower = self._followers.get(key)
+                if follower is not None and follower.remove_listener(listener):
+                    follower.stop()
+                    del self._followers[key]
+
+    def read(self, container, cursor=None, tail=100, log_filter=None, scan_lines=DEFAULT_SCAN_LINES):
+        """Lines newer than cursor, filtered; served from a live follower's buffer when it covers the range"""
+        tail = parse_tail(tail)
+        log_filter = log_filter or LogFilter()
+        follower = self._followers.get(container)
+        if follower is not None and follower.alive and cursor is not None and follower.covers(cursor):
+            entries = after_cursor(follower.entries(), cursor)
+        else:
+            since = max(s for s in (cursor, log_filter.since, -1) if s is not None)
+            since = since if since >= 0 else None
+            # With a cursor every newer line is wanted; otherwise scan enough to fill `tail` after filtering
+            if cursor is not None or tail is None:
+                fetch_tail = 'all'
+            else:
+                fetch_tail = scan_lines if log_filter.active else tail
+            entries = after_cursor(self.fetch(container, fetch_tail, since, log_filter.until), cursor)
+        entries = log_filter.apply(entries)
+        truncated = bool(tail) and len(entries) > tail
+        if truncated:
+            entries = entries[-tail:]
+        return entries, truncated
+
+    def fetch(self, container, tail='all', since=None, until=None):
+        """One-shot timestamped read; since/until are integer nanoseconds"""
+        engine = self.manager.engine
+        if engine is not None and engine.is_configured():
+            try:
+                return self._fetch_engine(engine, container, tail, since, until)
+            except DockerEngineUnavailable:
+                pass
+        cmd = ['docker', 'logs', '--timestamps', '--tail', str(tail)]
+        if since is not None:
+            cmd.extend(['--since', since_param(since)])
+        if until is not None:
+            cmd.extend(['--until', since_param(until)])
+        result = traced_run(cmd + [container], capture_output=True, text=True, errors='replace', timeout=30)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"docker logs exited with status {result.returncode}")
+        with span('parse'):
+            entries = [parse_line(raw, 'stdout') for raw in result.stdout.splitlines() if raw.strip()]
+            entries.extend(parse_line(raw, 'stderr') for raw in result.stderr.splitlines() if raw.strip())
+            # stdout and stderr arrive separately; restore the daemon's order
+            entries.sort(key=lambda entry: entry["nanos"] or 0)
+        return entries
+
+    def _fetch_engine(self, engine, container, tail, since, until):
+        params = {'stdout': True, 'stderr': True, 'timestamps': True, 'tail': str(tail)}
+        if since is not None:
+            params['since'] = since_param(since)
+        if until is not None:
+            params['until'] = since_param(until)
+        try:
+            info = engine.get_json(f"/containers/{quote_path(container)}/json")
+            _, _, data = engine.request('GET', f"/containers/{quote_path(container)}/logs", params=params)
+        except DockerEngineError as e:
+            if e.status == 404:
+                raise RuntimeError(f"Container {container} not found")
+            raise RuntimeError(e.message)
+        with span('parse'):
+            if (info.get('Config') or {}).get('Tty'):
+                return [parse_line(raw) for raw in data.decode('utf-8', errors='replace').splitlines() if raw.strip()]
+            entries = []
+            for stream_type, payload in demux_stream(data):
+                for raw in payload.decode('utf-8', errors='replace').splitlines():
+                    if raw.strip():
+                        entries.append(parse_line(raw, STREAMS.get(stream_type, 'stdout')))
+        return entries
@@ -0,0 +1,163 @@
+"""
+Background metrics collector for running containers.
+
+One sampling pass covers every running container: over the socket the stats
+endpoints are queried concurrently in one-shot mode (CPU is computed against
+the collector's previous sample, so the daemon never blocks for a second per
+container); without it, a single `docker stats --no-stream` call samples them
+all. Samples land in a fixed-size RingSeries per container (see
+series_collector), which range and downsampled queries read without touching
+the daemon.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from docker_engine import (
+    DockerEngineError, DockerEngineUnavailable,
+    quote_path, short_id, stats_row, stats_values, values_from_stats_row,
+)
+from instrumentation import in_current_span, traced_run
+from series_collector import DEFAULT_CAPACITY, DEFAULT_INTERVAL, SeriesCollector
+from timeseries import MEAN, LAST
+
+FIELDS = ('cpu_percent', 'mem_usage', 'mem_limit', 'mem_percent',
+          'net_rx', 'net_tx', 'block_read', 'block_write', 'pids')
+# Network and block IO are cumulative counters: a bucket keeps its last value
+AGGREGATES = {
+    'cpu_percent': MEAN, 'mem_usage': MEAN, 'mem_percent': MEAN, 'mem_limit': LAST,
+    'net_rx': LAST, 'net_tx': LAST, 'block_read': LAST, 'block_write': LAST, 'pids': LAST,
+}
+# `docker stats` errors about one container (the daemon itself answered)
+CONTAINER_ERRORS = ('no such container', 'container does not exist', 'is not running', 'is not started')
+
+
+class MetricsCollector(SeriesCollector):
+    FIELDS = FIELDS
+    AGGREGATES = AGGREGATES
+    THREAD_NAME = 'docker-metrics'
+
+    def __init__(self, manager, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, max_workers=8):
+        super().__init__(interval, capacity)
+        self.manager = manager
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='docker-stats')
+
+    # -- sampling ----------------------------------------------------------
+
+    def _engine(self):
+        engine = self.manager.engine
+        return engine if engine is not None and engine.is_configured() else None
+
+    def sample(self, ids=None):
+        """One pass over `ids` (default: every running container).
+
+        Returns {key: {"id", "name", "stats" (a `docker stats` row), "values"}}
+        with {"error": ...} in place of the sample for containers that failed.
+        Keys are the short IDs, or the IDs/names as given when `ids` is passed.
+        """
+        engine = self._engine()
+        if engine is not None:
+            try:
+                return self._sample_engine(engine, ids)
+            except DockerEngineUnavailable:
+                pass
+        return self._sample_cli(ids)
+
+    def _sample_engine(self, engine, ids):
+        if ids is None:
+            targets = [(raw['Id'], (raw.get('Names') or [''])[0].lstrip('/'))
+                       for raw in engine.get_json('/containers/json') or []]
+        else:
+            targets = [(ID, ID) for ID in ids]
+
+        def fetch(target):
+            ID, name = target
+            requested = ID if ids is not None else None
+            try:
+                raw = engine.get_json(f"/containers/{quote_path(ID)}/stats",
+                                      params={'stream': False, 'one-shot': True}, timeout=10)
+            except DockerEngineError as e:
+                if e.status == 404:
+                    return ID, {"error": f"Container {ID} not found"}
+                if e.status == 409 or "is not running" in e.message.lower():
+                    return ID, {"error": "Container is not running. Stats are only available for running containers."}
+                return ID, {"error": e.message}
+            except OSError as e:
+                return ID, {"error": str(e)}
+            if not raw or not (raw.get('memory_stats') or raw.get('cpu_stats', {}).get('system_cpu_usage')):
+                return ID, {"error": "No stats available - container may not be running"}
+            key = short_id(raw.get('id') or ID)
+            with self._lock:
+                previous = self._previous.get(key)
+                self._previous[key] = raw
+            name = (raw.get('name') or '').lstrip('/') or name
+            return requested or key, {"id": key, "name": name, "stats": stats_row(raw, requested or key, previous),
+                                      "values": stats_values(raw, previous)}
+
+        return dict(self.pool.map(in_current_span(fetch), targets))
+
+    def _sample_cli(self, ids):
+        cmd = ['docker', 'stats', '--no-stream', '--format', 'json'] + list(ids or [])
+        result = traced_run(cmd, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            error = result.stderr.strip() or 'docker stats failed'
+            # "Error response from daemon: No such container: x" is not a daemon outage
+            about_container = any(text in error.lower() for text in CONTAINER_ERRORS)
+            docker_error = None if about_container else self.manager._check_docker_error(error, error)
+            if docker_error or not ids or len(ids) == 1:
+                if ids and not docker_error:
+                    return {ids[0]: {"error": self._cli_error(ids[0], error)}}
+                raise RuntimeError(docker_error or error)
+            # One bad ID fails the whole call; retry each on its own to pin the errors down
+            samples = {}
+            for part in self.pool.map(in_current_span(lambda ID: self._sample_cli([ID])), ids):
+                samples.update(part)
+            return samples
+        samples = {}
+        for line in result.stdout.strip().split('\n'):
+            if not line:
+                continue
+            row = json.loads(line)
+            key = row.get('Container') if ids else short_id(row.get('ID'))
+            samples[key] = {"id": short_id(row.get('ID')), "name": row.get('Name'), "stats": row,
+                            "values": values_from_stats_row(row)}
+        return samples
+
+    @staticmethod
+    def _cli_error(ID, error):
+        if "No such container" in error or "container does not exist" in error.lower():
+            return f"Container {ID} not found"
+        if "is not running" in error.lower() or "is not started" in error.lower():
+            return "Container is not running. Stats are only available for running containers."
+        return error
+
+    def batch(self, ids=None):
+        """Samples for `ids` (or every running container), reusing the collector's
+        last pass when it is fresh enough instead of asking the daemon again"""
+        last = self.fresh_samples()
+        if last is not None:
+            if ids is None:
+                return last
+            by_name = {sample.get("name"): sample for sample in last.values()}
+            found = {}
+            for ID in ids:
+                sample = last.get(ID) or by_name.get(ID) or \
+                    next((s for key, s in last.items() if ID.startswith(key)), None)
+                if sample is None:
+                    break
+                found[ID] = sample
+            else:
+                return found
+        samples = self.sample(ids)
+        self.record(samples, full_pass=ids is None)
+        return samples
+
+    # -- queries -----------------------------------------------------------
+
+    def resolve(self, container):
+        """Series key for a full/short ID or a container name"""
+        with self._lock:
+            if container in self.series:
+                return container
+            for key, name in self.names.items():
+                if name == container or container.startswith(key) or key.startswith(container):
+                    return key
+        return None
@@ -0,0 +1,203 @@
+"""
+Streaming image pulls with per-layer progress, cancellation and a bounded pool.
+
+Progress is reported to an `on_progress(event)` callback as the daemon sends
+it, instead of buffering the whole `docker pull` output until the end.
+Each event looks like:
+
+    {"image": "nginx:latest", "layer": "a2abf6c4d29d", "phase": "downloading",
+     "current": 1048576, "total": 31357311, "status": "Downloading"}
+"""
+import time
+import socket
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from docker_engine import DockerEngineError, DockerEngineUnavailable, split_image_reference
+
+# How often a single layer may report byte progress; phase changes always go out
+PROGRESS_INTERVAL = 0.2
+DEFAULT_CONCURRENCY = 3
+
+PHASES = {
+    'pulling fs layer': 'waiting',
+    'waiting': 'waiting',
+    'downloading': 'downloading',
+    'verifying checksum': 'verifying',
+    'download complete': 'downloaded',
+    'extracting': 'extracting',
+    'pull complete': 'done',
+    'already exists': 'done',
+}
+
+
+class PullCancelled(Exception):
+    pass
+
+
+def layer_event(image, message):
+    """Normalize one daemon progress message into a progress event"""
+    status = message.get('status', '')
+    detail = message.get('progressDetail') or {}
+    layer = message.get('id')
+    phase = PHASES.get(status.lower())
+    if phase is None:
+        # "latest: Pulling from library/nginx", "Digest: ...", "Status: ..."
+        phase = 'status'
+        layer = None
+    event = {"image": image, "layer": layer, "phase": phase, "status": status}
+    if detail.get('total'):
+        event["current"] = detail.get('current', 0)
+        event["total"] = detail['total']
+    return event
+
+
+class PullManager:
+    """Runs pulls for one DockerManager; one in-flight pull per image name"""
+
+    def __init__(self, manager, max_workers=DEFAULT_CONCURRENCY):
+        self.manager = manager
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='docker-pull')
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def cancel(self, name):
+        with self._lock:
+            cancel_event = self._active.get(name)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def active(self):
+        with self._lock:
+            return list(self._active)
+
+    def pull(self, name, on_progress=None):
+        """Pull one image, streaming progress; returns the result dict"""
+        cancel_event = threading.Event()
+        with self._lock:
+            if name in self._active:
+                return {"success": False, "error": f"Image {name} is already being pulled"}
+            self._active[name] = cancel_event
+        try:
+            return self._pull(name, on_progress, cancel_event)
+        finally:
+            with self._lock:
+                self._active.pop(name, None)
+
+    def pull_many(self, names, on_progress=None):
+        """Pull several images through the bounded pool; results keyed by name"""
+        futures = {name: self.pool.submit(self.pull, name, on_progress) for name in dict.fromkeys(names)}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _pull(self, name, on_progress, cancel_event):
+        layers = {}
+        lines = []
+        last_sent = {}
+
+        def report(event):
+            if event["layer"]:
+                previous = layers.get(event["layer"], {})
+                layers[event["layer"]] = {k: v for k, v in event.items() if k not in ('image', 'layer')}
+                now = time.monotonic()
+                # Rate-limit byte updates per layer, but never drop a phase change
+                if previous.get('phase') == event['phase'] and \
+                        now - last_sent.get(event["layer"], 0) < PROGRESS_INTERVAL:
+                    return
+                last_sent[event["layer"]] = now
+            if on_progress is not None:
+                on_progress(event)
+
+        try:
+            engine = self.manager.engine
+            output = None
+            if engine is not None and engine.is_configured():
+                try:
+                    output = self._pull_engine(engine, name, report, lines, cancel_event)
+                except DockerEngineUnavailable:
+                    output = None
+            if output is None:
+                output = self._pull_cli(name, report, lines, cancel_event)
+        except PullCancelled:
+            report({"image": name, "layer": None, "phase": "cancelled", "status": "Cancelled"})
+            return {"success": False, "error": f"Pull of {name} cancelled", "cancelled": True}
+
+        if output.get("success"):
+            report({"image": name, "layer": None, "phase": "complete", "status": "Pull complete"})
+            output["layers"] = layers
+        else:
+            report({"image": name, "layer": None, "phase": "failed", "status": output.get("details", "")})
+        return output
+
+    def _pull_engine(self, engine, name, report, lines, cancel_event):
+        from_image, tag = split_image_reference(name)
+        try:
+            response = engine.stream('POST', '/images/create', params={'fromImage': from_image, 'tag': tag},
+                                     timeout=600)
+        except DockerEngineError as e:
+            return {"success": False, "error": f"Failed to pull image {name}", "details": e.message}
+
+        # Closing the connection makes the daemon abort the pull
+        self._on_cancel(cancel_event, response.abort)
+        try:
+            for message in response.iter_json():
+                if message.get('error'):
+                    return {"success": False, "error": f"Failed to pull image {name}", "details": message['error']}
+                event = layer_event(name, message)
+                if not message.get('progressDetail'):
+                    status = message.get('status', '')
+                    lines.append(f"{message['id']}: {status}" if message.get('id') else status)
+                report(event)
+        except socket.timeout:
+            return {"success": False,
+                    "error": f"Pulling image {name} stalled for 10 minutes. The registry may be unreachable."}
+        except (OSError, ValueError):
+            if not cancel_event.is_set():
+                raise
+        finally:
+            cancelled = cancel_event.is_set()
+            response.close()
+            # Wake the watcher thread so it can exit
+            cancel_event.set()
+        if cancelled:
+            raise PullCancelled()
+        return {"success": True, "message": f"Image {name} pulled successfully", "output": '\n'.join(lines)}
+
+    @staticmethod
+    def _on_cancel(cancel_event, action):
+        """Run action() from a helper thread once cancel_event is set"""
+        def wait():
+            cancel_event.wait()
+            action()
+        threading.Thread(target=wait, daemon=True).start()
+
+    def _pull_cli(self, name, report, lines, cancel_event):
+        process = subprocess.Popen(['docker', 'pull', name], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True)
+        self._on_cancel(cancel_event, lambda: process.poll() is None and process.terminate())
+        try:
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                lines.append(line)
+                layer, sep, status = line.partition(': ')
+                if sep and ' ' not in layer and status.lower() in PHASES:
+                    report(layer_event(name, {"id": layer, "status": status}))
+                else:
+                    report(layer_event(name, {"status": line}))
+            process.wait()
+        finally:
+            cancelled = cancel_event.is_set()
+            cancel_event.set()
+
+        if cancelled:
+            raise PullCancelled()
+        output = '\n'.join(lines)
+        if process.returncode != 0:
+            docker_error = self.manager._check_docker_error(output, output)
+            if docker_error:
+                return {"success": False, "error": docker_error}
+            return {"success": False, "error": f"Failed to pull image {name}", "details": output.strip()}
+        return {"success": True, "message": f"Image {name} pulled successfully", "output": output}
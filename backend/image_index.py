@@ -0,0 +1,401 @@
+"""
+In-memory search index over local images.
+
+Each `docker image ls` row is split into terms: the repository and its path
+components ("ghcr.io/acme/web-api" -> "ghcr.io", "acme", "web-api", "web",
+"api"), the tag, the image ID and digest, and label keys and values. Terms
+go into a trigram index (with start/end markers, so "ngi" and "^ng" are
+different grams) plus a prefix table for one- and two-character queries.
+Full "registry/namespace/name" repositories, IDs and digests go into sorted
+lists searched by prefix (or scanned, for a query containing "/"). A query only
+scores the rows that share enough grams with it, which also lets a typo like
+"postgers" still find postgres; terms that share only a gram or two (swapped
+letters: "ngnix") are checked by edit distance.
+
+Queries are ranked: exact repository, repository prefix, ID/digest prefix,
+path component, substring, tag and label matches score in that order, and
+fuzzy matches below those. Equal scores list the most recently indexed
+image first. "repo:tag" narrows by tag. Scores are computed per matching
+term and rows grouped into sets by score, so a query that matches most of
+the images costs set unions rather than a pass over every row.
+
+The index is rebuilt incrementally: sync() takes the current listing and
+only adds and removes the rows that changed since the previous one.
+"""
+import re
+import json
+import bisect
+from collections import Counter
+
+# Share of a query's trigrams a term must contain to be considered at all
+MIN_GRAM_OVERLAP = 0.5
+# Shortest word looked up as an ID/digest prefix
+MIN_ID_PREFIX = 4
+HEX_FIELDS = ('id', 'digest')
+
+_SPLIT = re.compile(r'[/_.\-]+')
+_HEX = re.compile(r'[0-9a-f]+')
+
+# Score for where a query term matched
+EXACT_REPOSITORY = 100
+REPOSITORY_PREFIX = 80
+ID_PREFIX = 75
+COMPONENT = 70
+COMPONENT_PREFIX = 60
+SUBSTRING = 50
+TAG = 40
+LABEL = 30
+FUZZY = 25
+
+
+def _row_key(row):
+    return (row.get('ID') or '', row.get('Repository') or '', row.get('Tag') or '')
+
+
+def _grams(term):
+    padded = f'\x02{term}\x03'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _hex(value):
+    value = (value or '').lower()
+    return value.split(':', 1)[1] if ':' in value else value
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (a swap counts as one edit), or limit + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _typo_budget(word):
+    return 1 if len(word) <= 5 else 2
+
+
+def _labels(row):
+    labels = row.get('Labels') or ''
+    if isinstance(labels, dict):
+        return [(k.lower(), str(v).lower()) for k, v in labels.items()]
+    pairs = []
+    for part in labels.split(','):
+        if part:
+            key, _, value = part.partition('=')
+            pairs.append((key.lower(), value.lower()))
+    return pairs
+
+
+def terms_of(row):
+    """{term: field} for one image row ('repo', 'component', 'tag', 'id', 'digest', 'label')"""
+    terms = {}
+    repository = (row.get('Repository') or '').lower()
+    if repository and repository != '<none>':
+        terms[repository] = 'repo'
+        for component in repository.split('/'):
+            terms.setdefault(component, 'component')
+            for word in _SPLIT.split(component):
+                if word:
+                    terms.setdefault(word, 'component')
+    tag = (row.get('Tag') or '').lower()
+    if tag and tag != '<none>':
+        terms.setdefault(tag, 'tag')
+        for word in _SPLIT.split(tag):
+            if word:
+                terms.setdefault(word, 'tag')
+    image_id = _hex(row.get('ID'))
+    if image_id:
+        terms.setdefault(image_id, 'id')
+    digest = _hex(row.get('Digest'))
+    if digest and digest != '<none>':
+        terms.setdefault(digest, 'digest')
+    for key, value in _labels(row):
+        for word in (key, value):
+            if word:
+                terms.setdefault(word, 'label')
+    return terms
+
+
+class _SortedTerms:
+    """Terms kept in order for prefix lookups, each with {field: {doc number}}"""
+
+    def __init__(self):
+        self.docs = {}
+        self.terms = []
+
+    def add(self, term, field, doc):
+        fields = self.docs.get(term)
+        if fields is None:
+            fields = self.docs[term] = {}
+            bisect.insort(self.terms, term)
+        fields.setdefault(field, set()).add(doc)
+
+    def remove(self, term, field, doc):
+        fields = self.docs[term]
+        fields[field].discard(doc)
+        if not fields[field]:
+            del fields[field]
+        if not fields:
+            del self.docs[term]
+            del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def prefixed(self, prefix):
+        """Doc sets of every term starting with `prefix` (none for an empty prefix)"""
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return [docs for term in self.terms[start:end] for docs in self.docs[term].values()]
+
+    def containing(self, word):
+        return [(term, self.docs[term]) for term in self.terms if word in term]
+
+
+class ImageIndex:
+    def __init__(self):
+        self.rows = {}        # doc number -> row
+        self._keys = {}       # row key -> doc number
+        self._terms = {}      # doc number -> {term: field}
+        self._docs = {}       # term -> {field: {doc number}}
+        self._grams = {}      # trigram -> {term}
+        self._prefixes = {}   # 1-2 character prefix -> {term}
+        self._paths = _SortedTerms()  # repositories with a "/"
+        self._ids = _SortedTerms()    # IDs and digests
+        self._tags = {}       # tag -> {doc number}
+        self._next = 0
+        self._source = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    # -- maintenance -------------------------------------------------------
+
+    def _link(self, term):
+        for gram in _grams(term):
+            self._grams.setdefault(gram, set()).add(term)
+        if not _SPLIT.search(term):
+            # "redis-7" starts with the same letters as its first word "redis", which is also indexed
+            for length in (1, 2):
+                if len(term) >= length:
+                    self._prefixes.setdefault(term[:length], set()).add(term)
+
+    def _unlink(self, term):
+        for gram in _grams(term):
+            bucket = self._grams[gram]
+            bucket.discard(term)
+            if not bucket:
+                del self._grams[gram]
+        for length in (1, 2):
+            bucket = self._prefixes.get(term[:length])
+            if bucket is not None:
+                bucket.discard(term)
+                if not bucket:
+                    del self._prefixes[term[:length]]
+
+    def _sorted_table(self, term, field):
+        if field in HEX_FIELDS:
+            return self._ids
+        if field == 'repo' and '/' in term:
+            # Its components are in the gram index; only prefix lookups need the whole path
+            return self._paths
+        return None
+
+    def add(self, row):
+        key = _row_key(row)
+        if key in self._keys:
+            self.remove(key)
+        doc = self._next
+        self._next += 1
+        self.rows[doc] = row
+        self._keys[key] = doc
+        terms = self._terms[doc] = terms_of(row)
+        for term, field in terms.items():
+            table = self._sorted_table(term, field)
+            if table is not None:
+                table.add(term, field, doc)
+                continue
+            fields = self._docs.get(term)
+            if fields is None:
+                fields = self._docs[term] = {}
+                self._link(term)
+            fields.setdefault(field, set()).add(doc)
+        self._tags.setdefault((row.get('Tag') or '').lower(), set()).add(doc)
+
+    def remove(self, key):
+        doc = self._keys.pop(key, None)
+        if doc is None:
+            return
+        row = self.rows.pop(doc)
+        for term, field in self._terms.pop(doc).items():
+            table = self._sorted_table(term, field)
+            if table is not None:
+                table.remove(term, field, doc)
+                continue
+            fields = self._docs[term]
+            fields[field].discard(doc)
+            if not fields[field]:
+                del fields[field]
+            if not fields:
+                # Last row with this term: drop it from the gram and prefix tables too
+                del self._docs[term]
+                self._unlink(term)
+        tag = (row.get('Tag') or '').lower()
+        self._tags[tag].discard(doc)
+        if not self._tags[tag]:
+            del self._tags[tag]
+
+    def sync(self, rows):
+        """Bring the index in line with a full listing; returns (added, removed)"""
+        current = {_row_key(row): row for row in rows}
+        stale = [key for key, doc in self._keys.items()
+                 if key not in current or self.rows[doc] != current[key]]
+        for key in stale:
+            self.remove(key)
+        added = [row for key, row in current.items() if key not in self._keys]
+        # Listings are newest first; later doc numbers rank first on equal scores
+        for row in reversed(added):
+            self.add(row)
+        return len(added), len(stale)
+
+    def sync_listing(self, listing):
+        """sync() from a list_images JSON response; skipped when it is the same response as last time"""
+        if listing is self._source:
+            return 0, 0
+        data = json.loads(listing)
+        if not data.get('success'):
+            raise RuntimeError(data.get('error') or 'Listing images failed')
+        self._source = listing
+        return self.sync(data['data'])
+
+    # -- queries -----------------------------------------------------------
+
+    def _candidate_terms(self, word):
+        """{term: edit distance} for terms that could match `word`; 0 means the term contains it"""
+        if len(word) < 3:
+            # Too short for trigrams: prefix matches only
+            return {term: 0 for term in self._prefixes.get(word, ())}
+        grams = _grams(word)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._grams.get(gram, ()))
+        # A term containing the word shares all its inner grams, which is always enough
+        needed = max(1, int(len(grams) * MIN_GRAM_OVERLAP))
+        budget = _typo_budget(word)
+        candidates = {}
+        for term, count in counts.items():
+            if word in term:
+                candidates[term] = 0
+            elif count >= needed or term[0] == word[0] and abs(len(term) - len(word)) <= budget:
+                # Few shared grams: only typos after the first letter, as with most fuzzy matchers
+                distance = edit_distance(word, term, budget)
+                if distance <= budget:
+                    candidates[term] = distance
+        return candidates
+
+    @staticmethod
+    def _score(word, term, field, distance):
+        contained = distance == 0
+        if field == 'repo' and term == word:
+            return EXACT_REPOSITORY
+        if field == 'repo' and term.startswith(word):
+            return REPOSITORY_PREFIX
+        if field == 'component' and term == word:
+            return COMPONENT
+        if field == 'component' and term.startswith(word):
+            return COMPONENT_PREFIX
+        if field == 'tag' and contained:
+            return TAG + (5 if term == word else 0)
+        if field == 'label' and contained:
+            return LABEL
+        if contained and field in ('repo', 'component'):
+            return SUBSTRING
+        if contained:
+            return FUZZY
+        return FUZZY - 5 * distance + (2 if field == 'repo' else 0)
+
+    def _buckets(self, word):
+        """{score: {doc number}} for one query word"""
+        found = {}
+        for term, distance in self._candidate_terms(word).items():
+            for field, docs in self._docs[term].items():
+                found.setdefault(self._score(word, term, field, distance), []).append(docs)
+        if '/' in word:
+            for term, fields in self._paths.containing(word):
+                found.setdefault(self._score(word, term, 'repo', 0), []).extend(fields.values())
+        else:
+            # Repository prefixes in one range of the sorted paths; the word alone cannot equal a path
+            found.setdefault(REPOSITORY_PREFIX, []).extend(self._paths.prefixed(word))
+        if len(word) >= MIN_ID_PREFIX and _HEX.fullmatch(word):
+            found.setdefault(ID_PREFIX, []).extend(self._ids.prefixed(word))
+        return {score: set().union(*sets) for score, sets in found.items()}
+
+    @staticmethod
+    def _combine(per_word):
+        """Buckets of summed scores for the rows matching every word"""
+        candidates = None
+        for buckets in per_word:
+            docs = set().union(*buckets.values())
+            candidates = docs if candidates is None else candidates & docs
+        totals = dict.fromkeys(candidates, 0)
+        for buckets in per_word:
+            best = {}
+            # Ascending, so a row's best score for this word is written last
+            for score in sorted(buckets):
+                for doc in buckets[score] & candidates:
+                    best[doc] = score
+            for doc, score in best.items():
+                totals[doc] += score
+        combined = {}
+        for doc, score in totals.items():
+            combined.setdefault(score, set()).add(doc)
+        return combined
+
+    def search(self, query, limit=None):
+        """Rows matching every word of `query`, best first, each with a "Score"; every row for an empty query"""
+        query = (query or '').strip().lower()
+        tag = None
+        if ':' in query and not query.startswith('sha256:'):
+            query, tag = query.rsplit(':', 1)
+        words = [_hex(word) if word.startswith('sha256:') else word for word in query.split()]
+        # A bare "sha256:" leaves nothing to match on
+        words = [word for word in words if word]
+
+        if not words:
+            buckets = {0: set(self.rows)}
+        elif len(words) == 1:
+            buckets = self._buckets(words[0])
+        else:
+            buckets = self._combine([self._buckets(word) for word in words])
+        allowed = None
+        bonus = 0
+        if tag is not None:
+            allowed = set().union(*(docs for value, docs in self._tags.items() if value.startswith(tag)))
+            bonus = TAG
+
+        results = []
+        seen = set()
+        scores = sorted(buckets, reverse=True)
+        for position, score in enumerate(scores):
+            docs = buckets[score] - seen if seen else buckets[score]
+            if allowed is not None:
+                docs = docs & allowed
+            if position + 1 < len(scores):
+                seen |= docs
+            # Small ints iterate from a set almost in order, which sorts in linear time
+            docs = sorted(docs, reverse=True)
+            if limit is not None:
+                docs = docs[:limit - len(results)]
+            results.extend(dict(self.rows[doc], Score=score + bonus) for doc in docs)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,504 @@
+"""
+Timing, tracing and profiling for backend actions.
+
+Every public DockerManager/Qemu method runs inside an "action" span (see
+`instrument_actions`). Work inside an action is split into phase spans, and
+each phase is timed per action:
+
+    exec     forking a subprocess (docker, qemu-img, qemu-system-*)
+    wait     waiting for it to exit and collecting its output
+    request  sending an Engine API request and receiving the status line
+    read     reading the response body
+    qmp      one QMP command round trip
+    parse    decoding JSON / CLI output into rows
+
+    with span('parse'):
+        rows = [json.loads(line) for line in output.splitlines()]
+
+    result = traced_run(['docker', 'stop', ID], capture_output=True, text=True, check=True)
+
+`traced_run` and `traced_check_output` behave exactly like subprocess.run and
+subprocess.check_output (same arguments, same exceptions); `traced_popen` is
+for processes whose output is read as it arrives. Context does not
+follow work handed to a thread pool; wrap the callable with `in_current_span`
+so its spans are counted against the action that fanned it out.
+
+Aggregates are kept in memory for the life of the process. `snapshot()`
+returns them as JSON, `prometheus_text()` in the Prometheus exposition
+format, and `recent_traces()` holds the span trees of the last few actions:
+
+    {"service": "docker", "action": "list_images", "ms": 41.7, "outcome": "success",
+     "spans": [{"name": "exec", "ms": 3.1, "program": "docker"},
+               {"name": "wait", "ms": 35.9, "program": "docker"},
+               {"name": "parse", "ms": 2.2}]}
+
+Profiling is opt-in: after `set_profiling(directory)` (or with
+DOCKER_VM_MANAGER_PROFILE=<directory> in the environment) every top-level
+action runs under cProfile and writes
+<directory>/<time>-<pid>-<n>-<service>.<action>.pstats (open it with pstats).
+Only one action is profiled at a time; actions that overlap a profiled one run
+unprofiled and are counted as skipped.
+"""
+import os
+import time
+import types
+import bisect
+import itertools
+import threading
+import functools
+import contextlib
+import contextvars
+import subprocess
+from collections import deque
+
+from response_cache import succeeded
+
+# Upper bounds in seconds; everything slower lands in +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_TRACES = 50
+# Spans kept per trace; bulk actions can run thousands of subprocesses
+MAX_CHILD_SPANS = 200
+
+_active = contextvars.ContextVar('instrumentation_span', default=None)
+_started = time.time()
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+        return {"count": self.count, "total_ms": ms(self.sum), "mean_ms": ms(self.sum / self.count) if self.count else None,
+                "max_ms": ms(self.max), "p50_ms": ms(self.quantile(0.5)), "p90_ms": ms(self.quantile(0.9)),
+                "p99_ms": ms(self.quantile(0.99))}
+
+
+class Registry:
+    """Histograms and counters keyed by metric name and label values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}    # (name, labels) -> int
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def histograms(self, name):
+        with self._lock:
+            return [(dict(labels), histogram) for (metric, labels), histogram in sorted(self._histograms.items())
+                    if metric == name]
+
+    def counters(self, name):
+        with self._lock:
+            return [(dict(labels), value) for (metric, labels), value in sorted(self._counters.items())
+                    if metric == name]
+
+
+REGISTRY = Registry()
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'action', 'started', 'seconds', 'children', 'dropped', 'error')
+
+    def __init__(self, name, attrs, action):
+        self.name = name
+        self.attrs = attrs
+        self.action = action   # (service, action) of the enclosing action span
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.children = []
+        self.dropped = 0
+        self.error = None
+
+    def as_dict(self):
+        data = {"name": self.name, "ms": round((self.seconds or 0) * 1000, 3), **self.attrs}
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["spans"] = [child.as_dict() for child in self.children]
+        if self.dropped:
+            data["dropped_spans"] = self.dropped
+        return data
+
+
+def _finish(current, parent):
+    current.seconds = time.perf_counter() - current.started
+    if parent is not None:
+        if len(parent.children) < MAX_CHILD_SPANS:
+            parent.children.append(current)
+        else:
+            parent.dropped += 1
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time a phase of the current action; attrs are kept in the trace only"""
+    parent = _active.get()
+    current = Span(name, attrs, parent.action if parent is not None else None)
+    token = _active.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _active.reset(token)
+        _finish(current, parent)
+        service, action = current.action or ('', '')
+        REGISTRY.observe('backend_phase_seconds', current.seconds, service=service, action=action, phase=name)
+
+
+def in_current_span(function):
+    """Wrap function so spans it opens on a pool thread attach to the caller's current span"""
+    parent = _active.get()
+    if parent is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _active.set(parent)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _active.reset(token)
+    return wrapper
+
+
+# -- actions -----------------------------------------------------------------
+
+_traces = deque(maxlen=RECENT_TRACES)
+_traces_lock = threading.Lock()
+_profiling = {"directory": os.environ.get('DOCKER_VM_MANAGER_PROFILE') or None}
+_profile_lock = threading.Lock()
+
+
+def _outcome(result):
+    if isinstance(result, str) and result.startswith('{'):
+        return 'success' if succeeded(result) else 'error'
+    return 'success'
+
+
+_profile_ids = itertools.count(1)
+
+
+def _profile_path(directory, service, action):
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, f'{stamp}-{os.getpid()}-{next(_profile_ids)}-{service}.{action}.pstats')
+
+
+def run_action(service, action, method, *args, **kwargs):
+    """Call method(*args, **kwargs) as a traced action of `service`"""
+    parent = _active.get()
+    current = Span('action', {"service": service, "action": action}, (service, action))
+    token = _active.set(current)
+    profiler = None
+    directory = _profiling["directory"]
+    if parent is None and directory and _start_profile():
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) owns the interpreter hook
+            _profile_lock.release()
+            profiler = None
+    outcome = 'exception'
+    try:
+        result = method(*args, **kwargs)
+        outcome = _outcome(result)
+        return result
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            path = _profile_path(directory, service, action)
+            try:
+                os.makedirs(directory, exist_ok=True)
+                profiler.dump_stats(path)
+                current.attrs["profile"] = path
+            except OSError as e:
+                current.attrs["profile_error"] = str(e)
+        _active.reset(token)
+        _finish(current, parent)
+        REGISTRY.observe('backend_action_seconds', current.seconds, service=service, action=action)
+        REGISTRY.increment('backend_actions_total', service=service, action=action, outcome=outcome)
+        if parent is None:
+            current.attrs["outcome"] = outcome
+            with _traces_lock:
+                _traces.append(current)
+
+
+def _start_profile():
+    if _profile_lock.acquire(blocking=False):
+        return True
+    REGISTRY.increment('backend_profiles_skipped_total')
+    return False
+
+
+def instrument_actions(service, exclude=()):
+    """Class decorator: run every public method (except `exclude`) as a traced action"""
+    def decorate(cls):
+        for name, value in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not isinstance(value, types.FunctionType):
+                continue
+
+            def wrap(method, action):
+                @functools.wraps(method)
+                def wrapper(*args, **kwargs):
+                    return run_action(service, action, method, *args, **kwargs)
+                return wrapper
+            setattr(cls, name, wrap(value, name))
+        return cls
+    return decorate
+
+
+# -- subprocesses --------------------------------------------------------------
+
+def _program(args):
+    first = args.split()[0] if isinstance(args, str) else args[0]
+    return os.path.basename(os.fspath(first))
+
+
+def traced_run(args, *, input=None, capture_output=False, timeout=None, check=False, **kwargs):
+    """subprocess.run with separate exec and wait spans"""
+    if capture_output:
+        if kwargs.get('stdout') is not None or kwargs.get('stderr') is not None:
+            raise ValueError('stdout and stderr arguments may not be used with capture_output.')
+        kwargs['stdout'] = kwargs['stderr'] = subprocess.PIPE
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+    program = _program(args)
+    status = 'error'
+    try:
+        with span('exec', program=program):
+            process = subprocess.Popen(args, **kwargs)
+        with span('wait', program=program), process:
+            try:
+                stdout, stderr = process.communicate(input, timeout=timeout)
+            except subprocess.TimeoutExpired as e:
+                status = 'timeout'
+                process.kill()
+                e.stdout, e.stderr = process.communicate()
+                raise
+            except BaseException:
+                process.kill()
+                raise
+            returncode = process.poll()
+        status = 'ok' if returncode == 0 else 'error'
+    finally:
+        REGISTRY.increment('backend_subprocess_total', program=program, status=status)
+    if check and returncode:
+        raise subprocess.CalledProcessError(returncode, process.args, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(process.args, returncode, stdout, stderr)
+
+
+@contextlib.contextmanager
+def traced_popen(args, **kwargs):
+    """subprocess.Popen as a context manager: the fork is an exec span, the with block
+    (and the exit it waits for) a wait span"""
+    program = _program(args)
+    status = 'error'
+    try:
+        with span('exec', program=program):
+            process = subprocess.Popen(args, **kwargs)
+        with span('wait', program=program), process:
+            yield process
+            process.wait()
+        status = 'ok' if process.returncode == 0 else 'error'
+    finally:
+        REGISTRY.increment('backend_subprocess_total', program=program, status=status)
+
+
+def traced_check_output(args, *, timeout=None, **kwargs):
+    """subprocess.check_output with separate exec and wait spans"""
+    return traced_run(args, stdout=subprocess.PIPE, timeout=timeout, check=True, **kwargs).stdout
+
+
+# -- reporting -----------------------------------------------------------------
+
+def set_profiling(directory):
+    """Profile every later top-level action into `directory` (None turns profiling off)"""
+    _profiling["directory"] = directory or None
+    return profiling_status()
+
+
+def profiling_status():
+    skipped = sum(value for _, value in REGISTRY.counters('backend_profiles_skipped_total'))
+    return {"enabled": _profiling["directory"] is not None, "directory": _profiling["directory"], "skipped": skipped}
+
+
+_startup = {}
+
+
+def record_startup():
+    """Note when api.py finished importing; the process start time is looked up on demand"""
+    _startup.setdefault("ready", time.time())
+
+
+def _startup_seconds():
+    if "ready" not in _startup:
+        return None
+    if "seconds" not in _startup:
+        # psutil costs milliseconds to import, so only pay for it when someone asks
+        try:
+            import psutil
+            created = psutil.Process().create_time()
+        except Exception:
+            created = _started
+        _startup["seconds"] = max(0.0, _startup["ready"] - created)
+    return _startup["seconds"]
+
+
+def recent_traces(limit=None):
+    with _traces_lock:
+        traces = list(_traces)
+    if limit:
+        traces = traces[-limit:]
+    return [trace.as_dict() for trace in reversed(traces)]
+
+
+def reset():
+    REGISTRY.reset()
+    with _traces_lock:
+        _traces.clear()
+
+
+def snapshot():
+    """Aggregated timings as plain JSON-friendly data"""
+    startup = _startup_seconds()
+    outcomes = {}
+    for labels, value in REGISTRY.counters('backend_actions_total'):
+        counts = outcomes.setdefault((labels["service"], labels["action"]), {})
+        counts[labels["outcome"]] = value
+    actions = []
+    for labels, histogram in REGISTRY.histograms('backend_action_seconds'):
+        counts = outcomes.get((labels["service"], labels["action"]), {})
+        actions.append(dict(labels, **histogram.summary(), errors=counts.get('error', 0),
+                            exceptions=counts.get('exception', 0)))
+    phases = [dict(labels, **histogram.summary()) for labels, histogram in REGISTRY.histograms('backend_phase_seconds')]
+    subprocesses = [dict(labels, count=value) for labels, value in REGISTRY.counters('backend_subprocess_total')]
+    return {
+        "uptime_seconds": round(time.time() - _started, 3),
+        "startup_seconds": round(startup, 3) if startup is not None else None,
+        "actions": actions,
+        "phases": phases,
+        "subprocesses": subprocesses,
+        "profiling": profiling_status(),
+    }
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+
+    def histogram(name, help_text):
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} histogram'])
+        for labels, hist in REGISTRY.histograms(name):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (None,), hist.counts):
+                cumulative += count
+                le = '+Inf' if bound is None else repr(bound)
+                lines.append(f'{name}_bucket{_labels(labels, {"le": le})} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {hist.sum!r}')
+            lines.append(f'{name}_count{_labels(labels)} {hist.count}')
+
+    def counter(name, help_text):
+        lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} counter'])
+        for labels, value in REGISTRY.counters(name):
+            lines.append(f'{name}{_labels(labels)} {value}')
+
+    histogram('backend_action_seconds', 'Wall time of manager actions')
+    counter('backend_actions_total', 'Manager actions by outcome (success, error response, exception)')
+    histogram('backend_phase_seconds', 'Wall time of phases (exec, wait, request, read, qmp, parse) within actions')
+    counter('backend_subprocess_total', 'Subprocesses run by program and exit status')
+    counter('backend_profiles_skipped_total', 'Actions not profiled because another profile was running')
+    lines.extend(['# HELP backend_uptime_seconds Seconds since the backend process started',
+                  '# TYPE backend_uptime_seconds gauge', f'backend_uptime_seconds {time.time() - _started!r}'])
+    startup = _startup_seconds()
+    if startup is not None:
+        lines.extend(['# HELP backend_startup_seconds Seconds from process exec until the backend was imported',
+                      '# TYPE backend_startup_seconds gauge', f'backend_startup_seconds {startup!r}'])
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serve /metrics (Prometheus) and /metrics.json over HTTP from a daemon thread"""
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                body, content_type = prometheus_text().encode(), 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/metrics.json':
+                body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
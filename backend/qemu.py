@@ -1,34 +1,124 @@
 import subprocess
 import os
+import sys
 import json
-import platform
+import time
 import psutil
+from disk_inventory import DISK_EXTENSIONS, DiskInventory
+from disk_library import DiskLibrary
+from instrumentation import instrument_actions, span, traced_run
+from qemu_caps import get_capabilities
+from qemu_fleet import DEFAULT_PARALLEL, SETTLE_SECONDS, early_exit, fleet_settings, launch_fleet
+from qemu_profiles import DEFAULT_PROFILE, build_command, resolve_profile
+from qmp import QMPError, QMPClient
+from vm_metrics import VMMetricsCollector
+from vm_registry import VMRegistry, log_path, process_alive, qmp_address
+from vm_scheduler import VMScheduler, memory_args, pin_vcpus
+from vm_snapshots import (
+    SnapshotCatalog, check_tag, default_tag, delete_offline, disk_of, hmp, list_offline,
+)
 
+# How long a guest gets to act on an ACPI power-off before QEMU is told to quit
+DEFAULT_SHUTDOWN_TIMEOUT = 30
+
+# Every public method is a timed action except the launch helpers the scheduler and fleet build on
+@instrument_actions('qemu', exclude=('spawn', 'launch', 'forget', 'prepare_vm', 'unwatch_disk_jobs'))
 class Qemu:
     def __init__(self):
-        self.platform = platform.system()
-        self.qemu_binary = self._detect_qemu_binary()
+        # Same names platform.system() reports, without importing platform
+        self.platform = 'Windows' if sys.platform == 'win32' else os.uname().sysname
+        self._capabilities = None
+        self.registry = VMRegistry()
+        self.library = DiskLibrary()
+        self.inventory = DiskInventory()
+        self.snapshots = SnapshotCatalog()
+        self.metrics = VMMetricsCollector(self.registry)
+        self.scheduler = VMScheduler(self.registry, launcher=lambda request: json.loads(
+            self.start_virtual_machine(**request)))
+        self._disk_job_manager = None
+        self._processes = {}  # pid -> Popen for VMs started by this backend, so exits get reaped
     
-    def _detect_qemu_binary(self):
-        """Detect QEMU binary path based on platform"""
+    def _binary_candidates(self):
+        """QEMU binary names to look for, based on platform"""
         if self.platform == "Windows":
-            binaries = ["qemu-system-x86_64.exe", "qemu-system-x86_64"]
-        else:
-            binaries = ["qemu-system-x86_64"]
-        
-        for binary in binaries:
-            try:
-                subprocess.run([binary, '--version'], capture_output=True, check=True, timeout=2)
-                return binary
-            except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
-                continue
-        
-        return "qemu-system-x86_64"  # Default fallback
+            return ["qemu-system-x86_64.exe", "qemu-system-x86_64"]
+        return ["qemu-system-x86_64"]
 
-    def run_cmd(self, cmd: list[str]):
+    @property
+    def capabilities(self):
+        """Detected on first use, so disk, registry and metrics actions never look for QEMU"""
+        if self._capabilities is None:
+            self._capabilities = get_capabilities(self._binary_candidates())
+        return self._capabilities
+
+    @property
+    def qemu_binary(self):
+        return self.capabilities["binary"]
+
+    def _detect_qemu_binary(self):
+        """Detect QEMU binary path based on platform (served from the capability cache)"""
+        return get_capabilities(self._binary_candidates())["binary"]
+
+    def get_capabilities(self, refresh=False):
+        """QEMU version, accelerators and machine types; refresh forces a new probe"""
         try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return json.dumps({"success": True, "message": "VM started", "pid": process.pid, "command": " ".join(cmd)})
+            if refresh:
+                self._capabilities = get_capabilities(self._binary_candidates(), refresh=True)
+            return json.dumps({"success": True, "data": self.capabilities})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def spawn(self, cmd, log=os.devnull):
+        """Start QEMU and return the Popen (raises FileNotFoundError if the binary is missing).
+
+        Output goes to the file `log`, not a pipe: nobody reads a resident
+        backend's pipes, and a full one would block QEMU.
+        """
+        with span('exec', program=os.path.basename(cmd[0])), open(log, 'ab') as output:
+            return subprocess.Popen(cmd, stdout=output, stderr=subprocess.STDOUT)
+
+    def launch(self, cmd, config=None, name=None):
+        """Start QEMU with its own QMP socket and record it in the registry.
+
+        Returns (Popen, registry entry).
+        """
+        vm_id = self.registry.new_id()
+        qmp = qmp_address(vm_id)
+        cmd = list(cmd) + ["-qmp", f"{qmp},server=on,wait=off"]
+        process = self.spawn(cmd, log_path(vm_id))
+        self._processes[process.pid] = process
+        return process, self.registry.add(vm_id, name, process, qmp, config, cmd)
+
+    def forget(self, entry):
+        """Drop a VM from the registry (used when QEMU exits right after launch)"""
+        self._processes.pop(entry["pid"], None)
+        self.registry.remove(entry["id"])
+
+    def _reap(self):
+        for pid, process in list(self._processes.items()):
+            if process.poll() is not None:
+                del self._processes[pid]
+
+    def run_cmd(self, cmd: list[str], config=None, name=None, settle_seconds=SETTLE_SECONDS, reservation=None):
+        try:
+            try:
+                process, entry = self.launch(cmd, config, name)
+            finally:
+                # Registered (or failed): the registry accounts for it from here on
+                if reservation is not None:
+                    self.scheduler.release(reservation)
+            error = early_exit(self, process, entry, settle_seconds)
+            if error:
+                return json.dumps({"success": False, "error": error, "pid": process.pid,
+                                   "command": " ".join(entry["command"])})
+            result = {"success": True, "message": "VM started", "pid": process.pid, "id": entry["id"],
+                      "name": entry["name"], "qmp": entry["qmp"], "command": " ".join(entry["command"])}
+            if config and config.get("cpus"):
+                try:
+                    result["pinned"] = pin_vcpus(entry["qmp"], process.pid, config["cpus"])
+                except (QMPError, OSError, psutil.Error) as e:
+                    result["warning"] = f"VM started, but pinning its vCPUs failed: {e}"
+            return json.dumps(result)
         except FileNotFoundError:
             return json.dumps({"success": False, "error": "QEMU not found. Is Qemu installed and in PATH?"})
         except Exception as e:
@@ -39,64 +129,127 @@ class Qemu:
     # disk_path = Path where the VM will be saved
     # iso_path = Path to the ISO image (optional)
 
-    def start_virtual_machine(self, cpu_cores, ram_size, disk_path, iso_path=None):
+    # name = Display name for the VM (optional)
+    # profile = Launch profile, "compat" (default) or "performance" (see qemu_profiles)
+    # options = Per-VM overrides of the profile's settings (optional)
+    # dry_run = Return the command that would run instead of starting the VM
+    # snapshot = Resume from this internal snapshot of the disk instead of booting (optional)
+    # placement = {"pin": true | [host cpus], "numa_node": n, "hugepages": true} (optional, Linux; see vm_scheduler)
+    # on_queued = Called with the launch result when a queued launch finally starts; without it a
+    #             full host is an error even under the "queue" policy (nothing would outlive a one-shot call)
+
+    def start_virtual_machine(self, cpu_cores, ram_size, disk_path, iso_path=None, name=None,
+                              profile=None, options=None, dry_run=False, snapshot=None, placement=None,
+                              on_queued=None):
+        cmd, error = self.prepare_vm(cpu_cores, ram_size, disk_path, iso_path, profile, options)
+        if error:
+            return json.dumps(error)
+        if snapshot:
+            error = self._check_resume(disk_of(cmd), snapshot)
+            if error:
+                return json.dumps({"success": False, "error": error})
+            cmd.extend(["-loadvm", snapshot])
+        cores, ram = int(cpu_cores), int(ram_size)
+
+        # Capacity check, core selection and the reservation happen under one
+        # lock so two launches can't both take the last free cores
+        with self.scheduler.lock:
+            policy = self.scheduler.policy()
+            usage = self.scheduler.usage(policy)
+            try:
+                resolved = self.scheduler.place(cores, ram, placement, usage)
+            except (ValueError, TypeError) as e:
+                return json.dumps({"success": False, "error": str(e)})
+            cmd.extend(memory_args(ram, resolved))
+            problems = self.scheduler.check(cores, ram, usage)
+
+            if dry_run:
+                settings = resolve_profile(self.capabilities, profile, options, cores)
+                return json.dumps({
+                    "success": True,
+                    "dry_run": True,
+                    "profile": settings["profile"],
+                    "accelerator": settings["accel"],
+                    "settings": {key: value for key, value in settings.items() if key != "notes"},
+                    "notes": settings["notes"],
+                    "placement": resolved,
+                    "admission": problems or "ok",
+                    "command": cmd,
+                    "command_line": " ".join(cmd),
+                })
+
+            if problems:
+                # Without on_queued there is no resident backend to hold the queue: a one-shot
+                # process would exit with the launch still waiting, so refuse it outright
+                if policy["when_full"] == "queue" and on_queued is not None:
+                    request = {"cpu_cores": cpu_cores, "ram_size": ram_size, "disk_path": disk_path,
+                               "iso_path": iso_path, "name": name, "profile": profile, "options": options,
+                               "snapshot": snapshot, "placement": placement}
+                    queued = self.scheduler.enqueue(request, on_queued)
+                    return json.dumps(dict(queued, success=True, queued=True,
+                                           message=f"Host is full ({'; '.join(problems)}); "
+                                                   f"launch queued at position {queued['position']}"))
+                error = "Not enough host capacity: " + "; ".join(problems)
+                if policy["when_full"] == "queue":
+                    error += " (launches are only queued by the resident backend, api.py --serve)"
+                return json.dumps({"success": False, "error": error, "usage": usage})
+
+            config = {"cpu_cores": cpu_cores, "ram_size": ram_size, "disk_path": disk_path, "iso_path": iso_path,
+                      "profile": profile or DEFAULT_PROFILE, "options": options or {}, "placement": placement,
+                      "cpus": resolved["cpus"] if resolved else None}
+            reservation = self.scheduler.reserve(cores, ram, config["cpus"])
+        return self.run_cmd(cmd, config, name, reservation=reservation)
+
+    def prepare_vm(self, cpu_cores, ram_size, disk_path, iso_path=None, profile=None, options=None):
+        """Validate a VM definition and build its QEMU command line for a launch profile.
+
+        Returns (cmd, None), or (None, error dict) when the definition is invalid.
+        """
         if not cpu_cores:
-            return json.dumps({"success": False, "error": "No CPU Cores given."})
+            return None, {"success": False, "error": "No CPU Cores given."}
         
         # Validate CPU cores - must be positive integer
         try:
             cpu_cores_int = int(cpu_cores)
             if cpu_cores_int < 1:
-                return json.dumps({"success": False, "error": "CPU cores must be a positive number (at least 1)."})
+                return None, {"success": False, "error": "CPU cores must be a positive number (at least 1)."}
         except (ValueError, TypeError):
-            return json.dumps({"success": False, "error": "CPU cores must be a valid positive number."})
+            return None, {"success": False, "error": "CPU cores must be a valid positive number."}
         
         if not ram_size:
-            return json.dumps({"success": False, "error": "No RAM Size given."})
+            return None, {"success": False, "error": "No RAM Size given."}
         
         # Validate RAM size - must be positive integer
         try:
             ram_size_int = int(ram_size)
             if ram_size_int < 1:
-                return json.dumps({"success": False, "error": "RAM size must be a positive number (at least 1 MB)."})
+                return None, {"success": False, "error": "RAM size must be a positive number (at least 1 MB)."}
         except (ValueError, TypeError):
-            return json.dumps({"success": False, "error": "RAM size must be a valid positive number."})
+            return None, {"success": False, "error": "RAM size must be a valid positive number."}
         
         if not disk_path:
-            return json.dumps({"success": False, "error": "No Disk Path given."})
+            return None, {"success": False, "error": "No Disk Path given."}
 
         disk_path = os.path.normpath(disk_path)
         
-        # Check if disk_path is a directory - if so, look for existing disk images
+        # Check if disk_path is a directory - if so, pick a disk image from it (see DiskInventory.pick)
         if os.path.isdir(disk_path):
-            # Look for existing disk image files in the directory
-            disk_extensions = ['.qcow2', '.raw', '.img', '.vmdk', '.vhdx', '.vdi']
-            found_disk = None
-            
-            # Search for disk image files in the directory
             try:
-                for file in os.listdir(disk_path):
-                    file_path = os.path.join(disk_path, file)
-                    if os.path.isfile(file_path):
-                        # Check if file has a disk image extension
-                        file_ext = os.path.splitext(file)[1].lower()
-                        if file_ext in disk_extensions:
-                            found_disk = file_path
-                            break  # Use the first disk image found
+                found_disk = self.inventory.pick(disk_path)
             except OSError:
-                pass
+                found_disk = None
             
             if found_disk:
                 # Use the found disk image
-                disk_path = found_disk
+                disk_path = found_disk["path"]
             else:
                 # No disk image found, check if we need to create one or require ISO
                 default_disk = os.path.join(disk_path, "vm_disk.qcow2")
                 if not iso_path:
-                    return json.dumps({
+                    return None, {
                         "success": False, 
-                        "error": f"Directory selected but no disk image found (looking for: {', '.join(disk_extensions)}). Please create a disk image first, select an existing disk file, or provide an ISO image to create a new VM."
-                    })
+                        "error": f"Directory selected but no disk image found (looking for: {', '.join(DISK_EXTENSIONS)}). Please create a disk image first, select an existing disk file, or provide an ISO image to create a new VM."
+                    }
                 # If ISO is provided, we can create a disk image later, but for now use default path
                 disk_path = default_disk
         
@@ -104,89 +257,56 @@ class Qemu:
             # If the disk doesn't exist and the parent directory doesn't exist either, it's an error
             parent_dir = os.path.dirname(disk_path)
             if parent_dir and not os.path.exists(parent_dir):
-                return json.dumps({"success": False, "error": f"Parent directory does not exist: {parent_dir}"})
+                return None, {"success": False, "error": f"Parent directory does not exist: {parent_dir}"}
 
         if iso_path:
             iso_path = os.path.normpath(iso_path)
             if not os.path.exists(iso_path):
-                return json.dumps({"success": False, "error": f"ISO does not exist: {iso_path}"})
-        
-        # Determine disk format based on file extension
-        disk_format = "raw"  # default
-        disk_lower = disk_path.lower()
-        if disk_lower.endswith('.qcow2'):
-            disk_format = "qcow2"
-        elif disk_lower.endswith('.vmdk'):
-            disk_format = "vmdk"
-        elif disk_lower.endswith('.vhdx'):
-            disk_format = "vhdx"
-        elif disk_lower.endswith('.vdi'):
-            disk_format = "vdi"
-        elif disk_lower.endswith('.img') or disk_lower.endswith('.raw'):
-            # .img and .raw files are usually raw format
-            disk_format = "raw"
+                return None, {"success": False, "error": f"ISO does not exist: {iso_path}"}
         
         # Check if disk exists
+        disk_format = "raw"  # default
         disk_exists = os.path.exists(disk_path)
         if not disk_exists:
             # Disk doesn't exist yet - ISO is required to create and install
             if not iso_path:
-                return json.dumps({
+                return None, {
                     "success": False,
                     "error": f"Disk image does not exist: {disk_path}. Please create a disk image first or provide an ISO image to create a new VM."
-                })
+                }
+            if disk_path.lower().endswith('.qcow2'):
+                disk_format = "qcow2"
         else:
-            # Disk exists - check if it might be empty (but allow boot attempt)
-            # Note: We can't reliably detect if a disk is bootable without trying to boot it
-            # So we'll let QEMU try, and if it fails with "no bootable device", 
-            # the user can provide an ISO
+            # The format comes from the image header, not the file name
             try:
-                disk_size = os.path.getsize(disk_path)
-                # For qcow2, size check is not reliable (sparse files)
-                # For other formats, if extremely small, it's likely empty
-                if not disk_lower.endswith('.qcow2') and disk_size < 100 * 1024 and not iso_path:
-                    # For non-qcow2 formats, if very small and no ISO, warn
-                    return json.dumps({
-                        "success": False, 
-                        "error": "Disk image appears to be empty or very small. Please provide an ISO image to install an operating system, or use an existing bootable disk image."
-                    })
-            except OSError:
-                pass  # If we can't check size, continue anyway
-        
-        # Build QEMU command with proper arguments
-        # Use -drive instead of deprecated -hda for better compatibility
-        # Format the drive option with proper escaping for Windows paths
-        disk_path_escaped = disk_path.replace('\\', '/')  # QEMU uses forward slashes
+                disk_info = self.inventory.inspect(disk_path)
+                disk_format = disk_info["format"]
+            except OSError as e:
+                return None, {"success": False, "error": f"Cannot read disk image {disk_path}: {e}"}
+            # A raw disk without a boot sector has nothing to boot; the other
+            # formats can't be checked without reading guest data, so QEMU gets to try
+            if disk_info["bootable"] is False and not iso_path:
+                return None, {
+                    "success": False, 
+                    "error": "Disk image appears to be empty (no boot sector found). Please provide an ISO image to install an operating system, or use an existing bootable disk image."
+                }
         
-        cmd = [
-            self.qemu_binary,
-            "-smp", str(cpu_cores),
-            "-m", str(ram_size),
-            "-drive", f"file={disk_path_escaped},format={disk_format},if=ide,index=0,media=disk"
-        ]
-        
-        # Add ISO/CD-ROM if provided
-        if iso_path:
-            # Use -cdrom for ISO (simpler and more compatible)
-            iso_path_escaped = iso_path.replace('\\', '/')  # QEMU uses forward slashes
-            cmd.extend(["-cdrom", iso_path_escaped])
-            # Boot from CD-ROM first (d), then hard disk (c)
-            # Use simple boot order syntax for better compatibility
-            cmd.extend(["-boot", "order=dc"])
-        else:
-            # Boot from hard disk only
-            # If disk might not be bootable, try multiple boot methods
-            # order=c means boot from hard disk (c:)
-            # If that fails, QEMU will show "no bootable device"
-            cmd.extend(["-boot", "order=c"])
-            # Add BIOS boot menu option to help with boot issues
-            # This allows selecting boot device if available
-        
-        # Add network (user mode networking) - useful for most VMs
-        cmd.extend(["-netdev", "user,id=net0", "-device", "virtio-net,netdev=net0"])
+        # QEMU uses forward slashes, also for Windows paths
+        disk_path_escaped = disk_path.replace('\\', '/')
+        iso_path_escaped = iso_path.replace('\\', '/') if iso_path else None
+
+        # Accelerator, CPU model, disk bus and NIC come from the launch profile
+        try:
+            settings = resolve_profile(self.capabilities, profile, options, cpu_cores_int)
+        except (ValueError, TypeError) as e:
+            return None, {"success": False, "error": str(e)}
+        cmd = build_command(self.qemu_binary, settings, cpu_cores, ram_size,
+                            disk_path_escaped, disk_format, iso_path_escaped)
 
-        return self.run_cmd(cmd)
+        return cmd, None
     
+    # Launches every VM in the config file as a fleet (see qemu_fleet): all entries
+    # are validated first, then started concurrently after a host capacity check
     def create_vm_from_config(self, config_file_path):
         config_file_path = os.path.normpath(config_file_path)
         if not os.path.exists(config_file_path):
@@ -195,67 +315,21 @@ class Qemu:
         try:
             with open(config_file_path, 'r', encoding='utf-8') as f:
                 vm_file = json.load(f)
-            
-            results = []
-            if isinstance(vm_file, list):
-                for config_data in vm_file:
-                    # Validate config values before creating VM
-                    cpu_cores = config_data.get('cpu_cores')
-                    ram_size = config_data.get('ram_size')
-                    
-                    # Validate CPU cores
-                    try:
-                        if cpu_cores is None or int(cpu_cores) < 1:
-                            results.append({"success": False, "error": "CPU cores must be a positive number (at least 1)."})
-                            continue
-                    except (ValueError, TypeError):
-                        results.append({"success": False, "error": "CPU cores must be a valid positive number."})
-                        continue
-                    
-                    # Validate RAM size
-                    try:
-                        if ram_size is None or int(ram_size) < 1:
-                            results.append({"success": False, "error": "RAM size must be a positive number (at least 1 MB)."})
-                            continue
-                    except (ValueError, TypeError):
-                        results.append({"success": False, "error": "RAM size must be a valid positive number."})
-                        continue
-                    
-                    result = self.start_virtual_machine(
-                        cpu_cores=cpu_cores,
-                        ram_size=ram_size,
-                        disk_path=config_data.get('disk_path'),
-                        iso_path=config_data.get('iso_path')
-                    )
-                    results.append(json.loads(result))
-            else:
-                # Validate config values for single VM
-                cpu_cores = vm_file.get('cpu_cores')
-                ram_size = vm_file.get('ram_size')
-                
-                # Validate CPU cores
-                try:
-                    if cpu_cores is None or int(cpu_cores) < 1:
-                        return json.dumps({"success": False, "error": "CPU cores must be a positive number (at least 1)."})
-                except (ValueError, TypeError):
-                    return json.dumps({"success": False, "error": "CPU cores must be a valid positive number."})
-                
-                # Validate RAM size
-                try:
-                    if ram_size is None or int(ram_size) < 1:
-                        return json.dumps({"success": False, "error": "RAM size must be a positive number (at least 1 MB)."})
-                except (ValueError, TypeError):
-                    return json.dumps({"success": False, "error": "RAM size must be a valid positive number."})
-                
-                result = self.start_virtual_machine(
-                    cpu_cores=cpu_cores,
-                    ram_size=ram_size,
-                    disk_path=vm_file.get('disk_path'),
-                    iso_path=vm_file.get('iso_path')
-                )
-                results.append(json.loads(result))
-            
-            return json.dumps({"success": True, "results": results})
+
+            entries, settings = fleet_settings(vm_file)
+            result = launch_fleet(
+                self,
+                entries,
+                max_parallel=settings.get('max_parallel', DEFAULT_PARALLEL),
+                stagger_seconds=settings.get('stagger_seconds', 0),
+                allow_overcommit=bool(settings.get('allow_overcommit', False)),
+                profile=settings.get('profile')
+            )
+            # A single-VM file keeps its old shape: one error instead of a result list
+            if not isinstance(vm_file, list) and 'vms' not in vm_file and not result["results"][0].get("success") \
+                    and result["results"][0].get("pid") is None:
+                return json.dumps({"success": False, "error": result["results"][0]["error"]})
+            return json.dumps(result)
         except json.JSONDecodeError:
             return json.dumps({"success": False, "error": "The configuration file is not in JSON format."})
         except Exception as e:
@@ -265,14 +339,141 @@ class Qemu:
         disk_path = os.path.normpath(disk_path)
         if os.path.exists(disk_path):
             try:
+                # A golden image still backing overlays must stay, or those disks become unreadable
+                users = self.library.users_of(disk_path)
+                if users:
+                    return json.dumps({
+                        "success": False,
+                        "error": f"{disk_path} is a base image used by {len(users)} overlay disk(s). "
+                                 "Delete or flatten them first.",
+                        "overlays": users,
+                    })
+                if not os.access(disk_path, os.W_OK):
+                    # Library copies are read-only, which Windows refuses to delete
+                    os.chmod(disk_path, 0o644)
                 os.remove(disk_path)
+                self.library.forget(disk_path)
                 return json.dumps({"success": True, "message": "VM deleted successfully."})
             except Exception as e:
                 return json.dumps({"success": False, "error": str(e)})
         else:
             return json.dumps({"success": False, "error": "VM not found."})
     
-    def list_running_vms(self):
+    def list_running_vms(self, legacy=False):
+        """List the VMs started by this app, with their QMP run state and
+        resource usage (see vm_metrics).
+
+        Only registered VMs are looked at, so the cost grows with the number of
+        VMs rather than the number of processes on the host. legacy=True scans
+        the process table instead, which also finds QEMU started elsewhere.
+        """
+        if legacy:
+            return self._scan_running_vms()
+        try:
+            self._reap()
+            running_vms = []
+            entries = self.registry.entries()
+            metrics = self.metrics.current(entries)
+            for entry in entries:
+                vm = {
+                    "id": entry["id"],
+                    "pid": entry["pid"],
+                    "name": entry["name"],
+                    "cmdline": entry["command"],
+                    "create_time": entry["create_time"],
+                    "started_at": entry["started_at"],
+                    "config": entry["config"],
+                    "qmp": entry["qmp"],
+                }
+                vm.update(self._qmp_status(entry))
+                vm["metrics"] = metrics.get(entry["id"], {}).get("values")
+                running_vms.append(vm)
+            return json.dumps({"success": True, "data": running_vms})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def _qmp_status(self, entry):
+        try:
+            with QMPClient(entry["qmp"]) as qmp:
+                status = qmp.execute("query-status") or {}
+            return {"status": status.get("status", "unknown"), "running": bool(status.get("running"))}
+        except (QMPError, OSError, ValueError) as e:
+            return {"status": "unknown", "running": None, "qmp_error": str(e)}
+
+    # samples every registered VM in the background every `interval` seconds
+    def start_vm_metrics(self, interval=None):
+        try:
+            self.metrics.start(interval)
+            return json.dumps({"success": True, "message": "VM metrics collector running",
+                               "interval": self.metrics.interval, "capacity": self.metrics.capacity})
+        except (TypeError, ValueError) as e:
+            return json.dumps({"success": False, "error": f"Invalid interval: {e}"})
+
+    def stop_vm_metrics(self):
+        self.metrics.stop()
+        return json.dumps({"success": True, "message": "VM metrics collector stopped"})
+
+    # history for one VM (registry ID, name or PID) or all of them; start/end
+    # are epoch seconds and points (optional) downsamples each series
+    def get_vm_metrics(self, vm=None, start=None, end=None, points=None):
+        try:
+            vms = self.metrics.query(vm, start, end, int(points) if points else None)
+        except (TypeError, ValueError) as e:
+            return json.dumps({"success": False, "error": str(e)})
+        if vm and not vms:
+            return json.dumps({"success": False, "error": f"No metrics recorded for VM {vm}"})
+        return json.dumps({
+            "success": True,
+            "running": self.metrics.running,
+            "interval": self.metrics.interval,
+            "last_pass": self.metrics.last_pass,
+            "last_error": self.metrics.last_error,
+            "vms": vms,
+        })
+
+    # Admission control (see vm_scheduler)
+
+    def scheduler_status(self):
+        """Overcommit policy, committed vCPUs/RAM and queued launches"""
+        try:
+            policy = self.scheduler.policy()
+            return json.dumps({"success": True, "policy": policy, "usage": self.scheduler.usage(policy),
+                               "queue": self.scheduler.queued()})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def set_scheduler_policy(self, changes):
+        try:
+            policy = self.scheduler.set_policy(changes or {})
+            return json.dumps({"success": True, "message": "Scheduler policy updated", "policy": policy})
+        except (TypeError, ValueError) as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def cancel_queued_vm(self, queue_id):
+        try:
+            if self.scheduler.cancel(queue_id):
+                return json.dumps({"success": True, "message": f"Queued launch {queue_id} cancelled"})
+        except (TypeError, ValueError):
+            pass
+        return json.dumps({"success": False, "error": f"No queued launch {queue_id}"})
+
+    def vm_status(self, vm):
+        """Run state of one registered VM, by registry ID, name or PID"""
+        try:
+            self._reap()
+            entry = self.registry.find(vm)
+            if entry is None or not process_alive(entry):
+                if entry is not None:
+                    self.registry.remove(entry["id"])
+                return json.dumps({"success": False, "error": f"VM {vm} is not running"})
+            data = {"id": entry["id"], "pid": entry["pid"], "name": entry["name"], "config": entry["config"],
+                    "started_at": entry["started_at"], "qmp": entry["qmp"]}
+            data.update(self._qmp_status(entry))
+            return json.dumps({"success": True, "data": data})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def _scan_running_vms(self):
         """List all running QEMU processes"""
         try:
             running_vms = []
@@ -308,8 +509,16 @@ class Qemu:
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)})
     
-    def stop_vm(self, pid):
-        """Stop a running VM by PID"""
+    def stop_vm(self, pid, force=False, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """Stop a running VM by PID (or registry ID/name).
+
+        Registered VMs get an ACPI power-off over QMP and `timeout` seconds to
+        shut down before QEMU is told to quit; force=True quits right away.
+        Anything else falls back to signalling the process.
+        """
+        entry = self.registry.find(pid) if pid not in (None, '') else None
+        if entry is not None:
+            return self._shutdown(entry, force, timeout)
         try:
             pid = int(pid)
             process = psutil.Process(pid)
@@ -325,6 +534,43 @@ class Qemu:
             return json.dumps({"success": False, "error": f"Access denied to process {pid}"})
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)})
+
+    def _shutdown(self, entry, force, timeout):
+        pid, name = entry["pid"], entry["name"]
+        if not process_alive(entry):
+            self.forget(entry)
+            return json.dumps({"success": False, "error": f"VM {name} (PID {pid}) is not running"})
+        try:
+            process = psutil.Process(pid)
+            how = None
+            if not force:
+                try:
+                    with QMPClient(entry["qmp"]) as qmp:
+                        qmp.execute("system_powerdown")
+                    process.wait(timeout=float(timeout if timeout is not None else DEFAULT_SHUTDOWN_TIMEOUT))
+                    how = "shut down"
+                except (QMPError, OSError, psutil.TimeoutExpired):
+                    pass
+            if how is None:
+                try:
+                    with QMPClient(entry["qmp"]) as qmp:
+                        qmp.execute("quit")
+                    process.wait(timeout=5)
+                    how = "stopped"
+                except (QMPError, OSError, psutil.TimeoutExpired):
+                    process.kill()
+                    process.wait(timeout=5)
+                    how = "killed"
+        except psutil.NoSuchProcess:
+            how = "shut down"
+        except psutil.AccessDenied:
+            return json.dumps({"success": False, "error": f"Access denied to process {pid}"})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+        finally:
+            self._reap()
+        self.forget(entry)
+        return json.dumps({"success": True, "message": f"VM {name} (PID {pid}) {how}", "how": how})
     
     def create_disk_image(self, path, size):
         """Create a QEMU disk image"""
@@ -365,7 +611,7 @@ class Qemu:
             
             # Use qemu-img to create disk
             cmd = ['qemu-img', 'create', '-f', 'qcow2', path, size]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = traced_run(cmd, capture_output=True, text=True, check=True)
             return json.dumps({"success": True, "message": f"Disk image created at {path}", "output": result.stdout})
         except FileNotFoundError:
             return json.dumps({"success": False, "error": "qemu-img not found. Is QEMU installed?"})
@@ -373,4 +619,246 @@ class Qemu:
             error_msg = e.stderr if e.stderr else str(e)
             return json.dumps({"success": False, "error": f"Error creating disk image: {error_msg}"})
         except Exception as e:
-            return json.dumps({"success": False, "error": str(e)})
\ No newline at end of file
+            return json.dumps({"success": False, "error": str(e)})
+
+    # Golden images and copy-on-write overlays (see disk_library)
+
+    def _library_call(self, method, *args):
+        try:
+            return json.dumps({"success": True, "data": method(*args)})
+        except FileNotFoundError:
+            return json.dumps({"success": False, "error": "qemu-img not found. Is QEMU installed?"})
+        except subprocess.CalledProcessError as e:
+            return json.dumps({"success": False, "error": (e.stderr or str(e)).strip()})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def list_base_images(self):
+        """Registered golden images and the overlays using each one"""
+        return self._library_call(self.library.list_bases)
+
+    def add_base_image(self, path, name=None, copy=False):
+        """Register a golden image (copy=True stores a read-only copy in the library)"""
+        return self._library_call(self.library.add_base, path, name, bool(copy))
+
+    def remove_base_image(self, base, delete_file=False, force=False):
+        """Unregister a golden image; refused while overlays still use it unless forced"""
+        return self._library_call(self.library.remove_base, base, bool(delete_file), bool(force))
+
+    def create_overlay_disk(self, base, path, size=None):
+        """Thin qcow2 disk for a new VM, backed by a golden image"""
+        return self._library_call(self.library.create_overlay, base, path, size or None)
+
+    def commit_overlay(self, path, force=False):
+        """Write an overlay's changes back into its base image"""
+        return self._library_call(self.library.commit_overlay, path, bool(force))
+
+    def rebase_overlay(self, path, base):
+        """Move an overlay onto another golden image"""
+        return self._library_call(self.library.rebase_overlay, path, base)
+
+    def flatten_overlay(self, path):
+        """Make an overlay standalone so it no longer depends on its base"""
+        return self._library_call(self.library.flatten_overlay, path)
+
+    def inspect_disk(self, path):
+        """Format, virtual/actual size and backing file of a disk image, read from its header"""
+        try:
+            return json.dumps({"success": True, "data": self.inventory.inspect(os.path.normpath(path))})
+        except FileNotFoundError:
+            return json.dumps({"success": False, "error": f"Disk image not found: {path}"})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def list_disk_images(self, directory):
+        """Every disk image in a directory, with the one a VM would boot marked as selected"""
+        try:
+            directory = os.path.normpath(directory)
+            images = self.inventory.scan(directory)
+            chosen = self.inventory.pick(directory, images)
+            for info in images:
+                info["selected"] = chosen is not None and info["path"] == chosen["path"]
+            return json.dumps({"success": True, "data": images})
+        except FileNotFoundError:
+            return json.dumps({"success": False, "error": f"Directory not found: {directory}"})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    # Snapshots: internal qcow2 snapshots with RAM state (see vm_snapshots)
+
+    def _check_resume(self, disk_path, tag):
+        try:
+            check_tag(tag)
+            if disk_path is None or self.inventory.inspect(disk_path)["format"] != "qcow2":
+                return "Snapshots need a qcow2 disk image."
+            tags = [snap["tag"] for snap in list_offline(disk_path)]
+        except ValueError as e:
+            return str(e)
+        except (OSError, subprocess.SubprocessError):
+            # Without qemu-img the tag can't be checked up front; QEMU will complain instead
+            return None
+        if tag not in tags:
+            return f"Snapshot {tag} does not exist on {disk_path}"
+        return None
+
+    def _running_entry(self, vm):
+        entry = self.registry.find(vm) if vm not in (None, '') else None
+        if entry is None or not process_alive(entry):
+            return None
+        return entry
+
+    def _snapshot_disk(self, target):
+        """(disk path, registry entry or None) for a running VM or a disk path"""
+        entry = self._running_entry(target)
+        if entry is not None:
+            return disk_of(entry["command"]), entry
+        return os.path.normpath(target), None
+
+    def save_snapshot(self, vm, tag=None, stop=False):
+        """Save a running VM's disk and memory state; stop=True quits QEMU afterwards (suspend to disk)"""
+        try:
+            entry = self._running_entry(vm)
+            if entry is None:
+                return json.dumps({"success": False, "error": f"VM {vm} is not running"})
+            tag = check_tag(tag or default_tag())
+            disk_path = disk_of(entry["command"])
+            if disk_path is None or self.inventory.inspect(disk_path)["format"] != "qcow2":
+                return json.dumps({"success": False, "error": "Snapshots need a qcow2 disk image."})
+            started = time.monotonic()
+            hmp(entry["qmp"], f"savevm {tag}")
+            seconds = round(time.monotonic() - started, 3)
+            config = dict(entry["config"], disk_path=disk_path)
+            self.snapshots.record(disk_path, tag, entry["name"], config)
+            result = {"success": True, "message": f"Snapshot {tag} saved", "tag": tag,
+                      "disk_path": disk_path, "seconds": seconds}
+            if stop:
+                stopped = json.loads(self._shutdown(entry, True, 0))
+                result["stopped"] = stopped.get("success", False)
+            return json.dumps(result)
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def restore_snapshot(self, vm, tag):
+        """Roll a running VM back to a snapshot"""
+        try:
+            entry = self._running_entry(vm)
+            if entry is None:
+                return json.dumps({"success": False, "error": f"VM {vm} is not running"})
+            hmp(entry["qmp"], f"loadvm {check_tag(tag)}")
+            return json.dumps({"success": True, "message": f"VM {entry['name']} restored to {tag}"})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def list_snapshots(self, target):
+        """Snapshots on a VM's disk; target is a running VM (ID, name, PID) or a disk path"""
+        try:
+            disk_path, _ = self._snapshot_disk(target)
+            recorded = self.snapshots.tags(disk_path)
+            snapshots = list_offline(disk_path)
+            for snap in snapshots:
+                record = recorded.get(snap["tag"])
+                snap["resumable"] = record is not None
+                snap["name"] = record["name"] if record else None
+            return json.dumps({"success": True, "disk_path": disk_path, "data": snapshots})
+        except FileNotFoundError:
+            return json.dumps({"success": False, "error": "qemu-img not found. Is QEMU installed?"})
+        except subprocess.CalledProcessError as e:
+            return json.dumps({"success": False, "error": (e.stderr or str(e)).strip()})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def delete_snapshot(self, target, tag):
+        """Delete a snapshot, through QMP if the VM is running (its disk is locked) or qemu-img if not"""
+        try:
+            disk_path, entry = self._snapshot_disk(target)
+            check_tag(tag)
+            if entry is not None:
+                hmp(entry["qmp"], f"delvm {tag}")
+            else:
+                delete_offline(disk_path, tag)
+            self.snapshots.forget(disk_path, tag)
+            return json.dumps({"success": True, "message": f"Snapshot {tag} deleted"})
+        except FileNotFoundError:
+            return json.dumps({"success": False, "error": "qemu-img not found. Is QEMU installed?"})
+        except subprocess.CalledProcessError as e:
+            return json.dumps({"success": False, "error": (e.stderr or str(e)).strip()})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def resume_vm(self, disk_path, tag=None, name=None):
+        """Start a VM from a saved snapshot with the hardware it was saved on (newest snapshot by default)"""
+        disk_path = os.path.normpath(disk_path)
+        tag, record = self.snapshots.get(disk_path, tag)
+        if record is None:
+            return json.dumps({
+                "success": False,
+                "error": f"No saved launch settings for snapshot {tag or '(latest)'} of {disk_path}. "
+                         "Start it with start_virtual_machine(..., snapshot=tag) instead."
+            })
+        config = record["config"]
+        # Same memory backend as when the snapshot was saved, or loadvm can't find the guest RAM
+        return self.start_virtual_machine(
+            config.get("cpu_cores"), config.get("ram_size"), disk_path, config.get("iso_path"),
+            name or record.get("name"), config.get("profile"), config.get("options"), snapshot=tag,
+            placement=config.get("placement")
+        )
+
+    # Conversion and compaction jobs (see disk_jobs)
+
+    def _disk_jobs(self):
+        if self._disk_job_manager is None:
+            # Imported here: disk_jobs brings in concurrent.futures, which listings never need
+            from disk_jobs import DiskJobManager
+            self._disk_job_manager = DiskJobManager(inventory=self.inventory, in_use=self._disk_in_use)
+        return self._disk_job_manager
+
+    def _disk_in_use(self, path):
+        key = os.path.normcase(os.path.abspath(path))
+        for entry in self.registry.entries():
+            disk = disk_of(entry["command"])
+            if disk and os.path.normcase(os.path.abspath(disk)) == key:
+                return True
+        return False
+
+    # on_progress(job) receives the job record whenever its state or progress changes
+    def convert_disk(self, source, output=None, fmt='qcow2', compress=False, rate_limit=None, overwrite=False,
+                     on_progress=None):
+        """Queue a conversion to qcow2 or raw (e.g. VMDK/VHDX/VDI images off their slow drivers)"""
+        try:
+            job = self._disk_jobs().submit('convert', source, output, fmt or 'qcow2', compress, None,
+                                           rate_limit, overwrite, on_progress)
+            return json.dumps({"success": True, "message": f"Conversion queued as job {job['id']}", "data": job})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def compact_disk(self, path, compress=False, rate_limit=None, on_progress=None):
+        """Queue an in-place rewrite that drops zeroed/unused clusters (and optionally compresses)"""
+        try:
+            job = self._disk_jobs().submit('compact', path, None, None, compress, '4k', rate_limit, False,
+                                           on_progress)
+            return json.dumps({"success": True, "message": f"Compaction queued as job {job['id']}", "data": job})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def list_disk_jobs(self, job_id=None):
+        try:
+            return json.dumps({"success": True, "data": self._disk_jobs().jobs(job_id)})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def cancel_disk_job(self, job_id):
+        if self._disk_jobs().cancel(job_id):
+            return json.dumps({"success": True, "message": f"Cancelling job {job_id}"})
+        return json.dumps({"success": False, "error": f"No queued or running job {job_id}"})
+
+    def resume_disk_jobs(self, on_progress=None):
+        """Restart jobs that were interrupted when the previous backend stopped"""
+        try:
+            resumed = self._disk_jobs().resume(on_progress)
+            return json.dumps({"success": True, "data": resumed})
+        except Exception as e:
+            return json.dumps({"success": False, "error": str(e)})
+
+    def unwatch_disk_jobs(self, listener):
+        if self._disk_job_manager is not None:
+            self._disk_job_manager.unwatch(listener)
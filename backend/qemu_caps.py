@@ -0,0 +1,127 @@
+"""
+QEMU binary detection with a persistent capability cache.
+
+Probing `qemu-system-x86_64` means spawning it several times, so the results
+(version, accelerators, machine types) are stored on disk keyed by PATH and
+the binary's path, mtime and size. Upgrading or replacing QEMU changes the
+key and triggers a fresh probe; otherwise detection is a `which` and a stat.
+"""
+import os
+import re
+import shutil
+import subprocess
+import threading
+from app_paths import cache_dir, read_json, write_json
+from instrumentation import traced_run
+
+CACHE_VERSION = 1
+CACHE_FILE = 'qemu_capabilities.json'
+MAX_CACHE_ENTRIES = 8
+PROBE_TIMEOUT = 5
+
+_cache_lock = threading.Lock()
+
+
+def _cache_path():
+    return os.path.join(cache_dir(), CACHE_FILE)
+
+
+def _cache_key(binary_path):
+    stat = os.stat(binary_path)
+    return '|'.join([
+        os.environ.get('PATH', ''),
+        binary_path,
+        str(stat.st_mtime_ns),
+        str(stat.st_size),
+    ])
+
+
+def _run_probe(binary_path, *args):
+    try:
+        result = traced_run([binary_path, *args], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _parse_version(output):
+    match = re.search(r'version\s+(\d+(?:\.\d+)+)', output or '')
+    return match.group(1) if match else None
+
+
+def _parse_help_list(output):
+    """First word of every line after the "... supported ...:" header"""
+    names = []
+    for line in (output or '').splitlines():
+        line = line.strip()
+        if not line or line.endswith(':'):
+            continue
+        names.append(line.split()[0])
+    return names
+
+
+def probe_binary(binary_path):
+    """Spawn the binary to find out what it supports (the slow path)"""
+    version_output = _run_probe(binary_path, '--version')
+    return {
+        "usable": version_output is not None,
+        "version": _parse_version(version_output),
+        "accelerators": _parse_help_list(_run_probe(binary_path, '-accel', 'help')) if version_output else [],
+        "machine_types": _parse_help_list(_run_probe(binary_path, '-machine', 'help')) if version_output else [],
+    }
+
+
+def get_capabilities(candidates, refresh=False):
+    """Return capabilities for the first candidate binary found on PATH.
+
+    Result keys: binary (name to exec), path, usable, version, accelerators,
+    machine_types and cached (whether the probe was skipped).
+    """
+    for name in candidates:
+        binary_path = shutil.which(name)
+        if binary_path:
+            break
+    else:
+        # Nothing to key a cache entry on; keep the old default name
+        return {
+            "binary": candidates[0] if candidates else "qemu-system-x86_64",
+            "path": None,
+            "usable": False,
+            "version": None,
+            "accelerators": [],
+            "machine_types": [],
+            "cached": False,
+        }
+
+    binary_path = os.path.abspath(binary_path)
+    try:
+        key = _cache_key(binary_path)
+    except OSError:
+        key = None
+
+    with _cache_lock:
+        cache = read_json(_cache_path(), {})
+        if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+            cache = {"version": CACHE_VERSION, "entries": {}}
+        entries = cache["entries"]
+
+        entry = entries.get(key) if key and not refresh else None
+        cached = entry is not None
+        if entry is None:
+            entry = probe_binary(binary_path)
+            if key:
+                # Drop stale entries for the same binary, then cap the file size
+                for stale in [k for k, v in entries.items() if v.get('path') == binary_path]:
+                    del entries[stale]
+                entry["path"] = binary_path
+                entries[key] = entry
+                while len(entries) > MAX_CACHE_ENTRIES:
+                    del entries[next(iter(entries))]
+                try:
+                    write_json(_cache_path(), cache)
+                except OSError:
+                    pass
+
+    return dict(entry, binary=name, path=binary_path, cached=cached)
@@ -0,0 +1,151 @@
+"""
+Config-driven fleet launch for QEMU VMs.
+
+Every entry is validated (and its command line built) before anything starts,
+the fleet's total vCPUs and RAM are checked by the scheduler against what is
+already committed to running VMs (see vm_scheduler) and reserved there, and
+launches then run on a small thread pool, optionally staggered so a dozen VMs
+do not all hit the disk at the same moment. Each VM gets its own result with launch latency. A
+config file is either a list of VM entries, a single entry, or a fleet object:
+
+    {"max_parallel": 4, "stagger_seconds": 2, "allow_overcommit": false,
+     "profile": "performance",
+     "vms": [{"name": "web", "cpu_cores": 2, "ram_size": 2048, "disk_path": "..."}]}
+
+The fleet-level "profile" applies to entries that do not set their own.
+"""
+import os
+import time
+from instrumentation import in_current_span
+from vm_registry import log_tail
+
+DEFAULT_PARALLEL = 4
+# How long a fresh QEMU process must stay up to count as launched
+SETTLE_SECONDS = 0.5
+
+
+def early_exit(qemu, process, registered, settle_seconds=SETTLE_SECONDS):
+    """QEMU's error if it exited within settle_seconds of starting (the VM is forgotten), else None.
+
+    QEMU rejects bad options (or a locked disk) right away, before a launch
+    can be reported as started.
+    """
+    if not settle_seconds:
+        return None
+    time.sleep(settle_seconds)
+    if process.poll() is None:
+        return None
+    # Read before forget(), which deletes the log with the registry entry
+    error = log_tail(registered["id"]) or f"QEMU exited with status {process.poll()}"
+    qemu.forget(registered)
+    return error
+
+
+def fleet_settings(config):
+    """(entries, settings) from a parsed config file"""
+    if isinstance(config, list):
+        return config, {}
+    if isinstance(config, dict) and isinstance(config.get('vms'), list):
+        return config['vms'], config
+    return [config], {}
+
+
+def launch_fleet(qemu, entries, max_parallel=DEFAULT_PARALLEL, stagger_seconds=0, allow_overcommit=False,
+                 settle_seconds=SETTLE_SECONDS, profile=None):
+    started = time.monotonic()
+    results = [None] * len(entries)
+    plans = []
+    disks = {}
+
+    # 1. Validate everything before launching anything
+    for index, entry in enumerate(entries):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        name = name or f"vm-{index + 1}"
+        if not isinstance(entry, dict):
+            results[index] = {"name": name, "success": False, "error": "VM entry must be a JSON object."}
+            continue
+        entry = dict(entry, profile=entry.get('profile') or profile)
+        cmd, error = qemu.prepare_vm(entry.get('cpu_cores'), entry.get('ram_size'), entry.get('disk_path'),
+                                     entry.get('iso_path'), entry['profile'], entry.get('options'))
+        if error:
+            results[index] = dict(error, name=name)
+            continue
+        disk = os.path.normcase(os.path.abspath(os.path.normpath(entry['disk_path'])))
+        if disk in disks:
+            results[index] = {"name": name, "success": False,
+                              "error": f"Disk {entry['disk_path']} is already used by {disks[disk]} in this fleet."}
+            continue
+        disks[disk] = name
+        plans.append((index, name, int(entry['cpu_cores']), int(entry['ram_size']), cmd, entry))
+
+    # 2. Host capacity for everything that passed validation, on top of the VMs already running.
+    # Admitted VMs are reserved in the scheduler (even when overcommitting), so single and
+    # queued launches count them while the fleet starts without holding the scheduler lock
+    with qemu.scheduler.lock:
+        usage = qemu.scheduler.usage()
+        capacity = {key: value for key, value in usage.items() if key != "pinned_cpus"}
+        capacity["requested_cores"] = sum(plan[2] for plan in plans)
+        capacity["requested_ram_mb"] = sum(plan[3] for plan in plans)
+        problems = qemu.scheduler.check(capacity["requested_cores"], capacity["requested_ram_mb"], usage)
+        if problems and not allow_overcommit:
+            error = "Not enough host capacity: " + "; ".join(problems) + \
+                ". Set allow_overcommit to launch anyway."
+            for index, name, _, _, _, _ in plans:
+                results[index] = {"name": name, "success": False, "error": error}
+            return {"success": False, "error": error, "results": results, "capacity": capacity,
+                    "launched": 0, "failed": len(results), "seconds": round(time.monotonic() - started, 3)}
+        reservations = [qemu.scheduler.reserve(plan[2], plan[3]) for plan in plans]
+
+    # 3. Launch concurrently; the n-th VM waits n * stagger_seconds before starting
+    def launch(position, plan, reservation):
+        index, name, _, _, cmd, entry = plan
+        delay = position * float(stagger_seconds or 0)
+        wait = started + delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        launch_started = time.monotonic()
+        try:
+            config = {key: entry.get(key) for key in ('cpu_cores', 'ram_size', 'disk_path', 'iso_path',
+                                                      'profile', 'options')}
+            process, registered = qemu.launch(cmd, config, entry.get('name'))
+        except FileNotFoundError:
+            return index, {"name": name, "success": False, "error": "QEMU not found. Is Qemu installed and in PATH?"}
+        except Exception as e:
+            return index, {"name": name, "success": False, "error": str(e)}
+        finally:
+            # Registered (or failed): the registry accounts for it from here on
+            qemu.scheduler.release(reservation)
+        latency = time.monotonic() - launch_started
+        error = early_exit(qemu, process, registered, settle_seconds)
+        if error:
+            return index, {"name": name, "success": False, "pid": process.pid,
+                           "command": " ".join(registered["command"]), "error": error}
+        return index, {
+            "name": name,
+            "success": True,
+            "message": "VM started",
+            "pid": process.pid,
+            "id": registered["id"],
+            "qmp": registered["qmp"],
+            "command": " ".join(registered["command"]),
+            "latency_seconds": round(latency, 3),
+            "started_after_seconds": round(launch_started - started, 3),
+        }
+
+    if plans:
+        from concurrent.futures import ThreadPoolExecutor
+        workers = max(1, min(int(max_parallel or DEFAULT_PARALLEL), len(plans)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qemu-launch') as pool:
+            items = [(position, plan, reservations[position]) for position, plan in enumerate(plans)]
+            for index, result in pool.map(in_current_span(lambda item: launch(*item)), items):
+                results[index] = result
+
+    launched = sum(1 for result in results if result.get("success"))
+    return {
+        "success": True,
+        "results": results,
+        "capacity": capacity,
+        "launched": launched,
+        "failed": len(results) - launched,
+        "seconds": round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,198 @@
+"""
+Launch profiles for QEMU command lines.
+
+A profile decides everything about the command that is not the VM's own
+definition (cores, RAM, disk, ISO): accelerator, CPU model, disk bus and
+caching, and NIC model.
+
+- "compat" is the command line the app has always used (IDE disk, default
+  CPU model), but it now picks up a hardware accelerator when one is there.
+- "performance" uses KVM/HVF/WHPX with `-cpu host`, a virtio-blk disk on its
+  own iothread with cache=none and native AIO, and a virtio-net-pci NIC. With
+  a tap backend the NIC gets one queue pair per vCPU.
+
+Any profile setting can be overridden through `options`, e.g.
+{"disk_bus": "virtio-scsi", "aio": "io_uring", "network": "tap", "tap_ifname": "tap0"}.
+"""
+import os
+import sys
+
+DEFAULT_PROFILE = 'compat'
+
+PROFILES = {
+    'compat': {
+        'accel': 'auto',
+        'cpu_model': None,
+        'machine': None,
+        'disk_bus': 'ide',
+        'cache': None,
+        'aio': None,
+        'discard': None,
+        'iothread': False,
+        'nic': 'virtio-net',
+    },
+    'performance': {
+        'accel': 'auto',
+        'cpu_model': 'host',
+        'machine': 'q35',
+        'disk_bus': 'virtio-blk',
+        'cache': 'none',
+        'aio': 'auto',
+        'discard': 'unmap',
+        'iothread': True,
+        'nic': 'virtio-net-pci',
+    },
+}
+
+DISK_BUSES = ('ide', 'virtio-blk', 'virtio-scsi')
+CACHE_MODES = ('none', 'writeback', 'writethrough', 'directsync', 'unsafe')
+AIO_MODES = ('auto', 'threads', 'native', 'io_uring')
+NETWORKS = ('user', 'tap')
+# More queues than this stops paying off for a single disk or NIC
+MAX_QUEUES = 8
+
+# Hardware accelerator QEMU offers on each host OS
+HARDWARE_ACCELERATORS = {'linux': 'kvm', 'darwin': 'hvf', 'win32': 'whpx'}
+
+
+def hardware_accelerator(capabilities):
+    """The usable hardware accelerator on this host, or None (TCG only)"""
+    accel = HARDWARE_ACCELERATORS.get(sys.platform)
+    if accel is None:
+        return None
+    listed = capabilities.get('accelerators') or []
+    # An empty list means the probe failed; trust the host check alone then
+    if listed and accel not in listed:
+        return None
+    if accel == 'kvm' and not os.access('/dev/kvm', os.R_OK | os.W_OK):
+        return None
+    if accel != 'kvm' and not listed:
+        return None
+    return accel
+
+
+def _choice(key, value, allowed):
+    if value is not None and value not in allowed:
+        raise ValueError(f"Invalid {key}: {value} (expected one of: {', '.join(allowed)})")
+    return value
+
+
+def resolve_profile(capabilities, profile=None, options=None, cpu_cores=1):
+    """Concrete launch settings for a profile on this host.
+
+    Returns a dict of settings plus "notes" explaining any fallbacks; raises
+    ValueError for an unknown profile or option value.
+    """
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown launch profile: {profile} (expected one of: {', '.join(PROFILES)})")
+    options = dict(options or {})
+    settings = dict(PROFILES[profile], profile=profile, network='user', tap_ifname=None, queues=None)
+    unknown = [key for key in options if key not in settings or key == 'profile']
+    if unknown:
+        raise ValueError(f"Unknown launch option(s): {', '.join(sorted(unknown))}")
+    settings.update({key: value for key, value in options.items() if value is not None})
+    notes = []
+
+    _choice('disk_bus', settings['disk_bus'], DISK_BUSES)
+    _choice('cache', settings['cache'], CACHE_MODES)
+    _choice('aio', settings['aio'], AIO_MODES)
+    _choice('network', settings['network'], NETWORKS)
+
+    # Accelerator: "auto" takes the hardware one when /dev/kvm (or HVF/WHPX) is usable
+    hardware = hardware_accelerator(capabilities)
+    if settings['accel'] == 'auto':
+        settings['accel'] = hardware or 'tcg'
+        if hardware is None:
+            notes.append("No hardware accelerator available; the guest runs under TCG emulation.")
+    elif settings['accel'] != 'tcg' and settings['accel'] != hardware:
+        notes.append(f"Accelerator {settings['accel']} was requested but does not look usable on this host.")
+
+    # `-cpu host` only exists with a hardware accelerator; `max` is TCG's closest match
+    if settings['cpu_model'] == 'host' and settings['accel'] == 'tcg':
+        settings['cpu_model'] = 'max'
+        notes.append("Using -cpu max instead of -cpu host under TCG.")
+
+    machines = capabilities.get('machine_types') or []
+    if settings['machine'] and machines and settings['machine'] not in machines:
+        notes.append(f"Machine type {settings['machine']} is not supported by this QEMU; using its default.")
+        settings['machine'] = None
+
+    if settings['aio'] == 'auto':
+        # Native AIO needs O_DIRECT (cache=none/directsync) and is Linux/Windows only
+        direct = settings['cache'] in ('none', 'directsync')
+        settings['aio'] = 'native' if direct and sys.platform in ('linux', 'win32') else 'threads'
+    elif settings['aio'] == 'io_uring' and sys.platform != 'linux':
+        raise ValueError("aio=io_uring is only available on Linux hosts")
+    if settings['aio'] == 'native' and settings['cache'] not in ('none', 'directsync'):
+        raise ValueError("aio=native requires cache=none or cache=directsync")
+
+    if settings['disk_bus'] == 'ide':
+        settings['iothread'] = False
+
+    if settings['queues'] is None:
+        settings['queues'] = max(1, min(int(cpu_cores), MAX_QUEUES))
+    else:
+        settings['queues'] = max(1, min(int(settings['queues']), MAX_QUEUES))
+
+    if settings['network'] == 'tap':
+        if not settings['tap_ifname']:
+            raise ValueError("network=tap requires tap_ifname")
+        if settings['nic'] == 'virtio-net':
+            settings['nic'] = 'virtio-net-pci'
+    elif options.get('queues') and settings['queues'] > 1:
+        # user-mode networking (slirp) has a single queue whatever the NIC says
+        notes.append("Multi-queue virtio-net needs network=tap; user-mode networking uses one queue.")
+
+    settings['notes'] = notes
+    return settings
+
+
+def build_command(binary, settings, cpu_cores, ram_size, disk_path, disk_format, iso_path=None):
+    """QEMU argv for the resolved settings; paths are expected in QEMU's forward-slash form"""
+    cmd = [binary]
+    if settings['machine']:
+        cmd.extend(["-machine", settings['machine']])
+    cmd.extend(["-accel", settings['accel']])
+    if settings['cpu_model']:
+        cmd.extend(["-cpu", settings['cpu_model']])
+    cmd.extend(["-smp", str(cpu_cores), "-m", str(ram_size)])
+
+    queues = settings['queues']
+    bus = settings['disk_bus']
+    if bus == 'ide':
+        drive = f"file={disk_path},format={disk_format},if=ide,index=0,media=disk"
+    else:
+        drive = f"file={disk_path},format={disk_format},if=none,id=disk0"
+    for key in ('cache', 'aio', 'discard'):
+        if settings[key]:
+            drive += f",{key}={settings[key]}"
+    if settings['iothread']:
+        cmd.extend(["-object", "iothread,id=io0"])
+    cmd.extend(["-drive", drive])
+    iothread = ",iothread=io0" if settings['iothread'] else ""
+    if bus == 'virtio-blk':
+        cmd.extend(["-device", f"virtio-blk-pci,drive=disk0,num-queues={queues}{iothread}"])
+    elif bus == 'virtio-scsi':
+        cmd.extend(["-device", f"virtio-scsi-pci,id=scsi0,num_queues={queues}{iothread}",
+                    "-device", "scsi-hd,drive=disk0,bus=scsi0.0"])
+
+    if iso_path:
+        # Use -cdrom for ISO (simpler and more compatible); boot from CD-ROM first
+        cmd.extend(["-cdrom", iso_path, "-boot", "order=dc"])
+    else:
+        cmd.extend(["-boot", "order=c"])
+
+    if settings['network'] == 'tap':
+        netdev = f"tap,id=net0,ifname={settings['tap_ifname']},script=no,downscript=no"
+        nic = f"{settings['nic']},netdev=net0"
+        if os.access('/dev/vhost-net', os.R_OK | os.W_OK):
+            netdev += ",vhost=on"
+        if queues > 1:
+            netdev += f",queues={queues}"
+            # One MSI-X vector per queue pair plus config and control
+            nic += f",mq=on,vectors={2 * queues + 2}"
+        cmd.extend(["-netdev", netdev, "-device", nic])
+    else:
+        cmd.extend(["-netdev", "user,id=net0", "-device", f"{settings['nic']},netdev=net0"])
+    return cmd
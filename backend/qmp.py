@@ -0,0 +1,130 @@
+"""
+Minimal client for the QEMU Machine Protocol (QMP).
+
+Every VM this app launches gets its own QMP socket, so status and shutdown
+go straight to the VM instead of through a scan of the host's process table.
+Addresses use QEMU's own syntax: "unix:/path/to/socket" or "tcp:host:port".
+
+    with QMPClient("unix:/run/user/1000/docker-vm-manager/vm-1a2b.qmp") as qmp:
+        qmp.execute("query-status")            # {"status": "running", ...}
+        qmp.execute("system_powerdown")
+"""
+import json
+import socket
+from instrumentation import span
+
+DEFAULT_TIMEOUT = 2.0
+
+
+class QMPError(Exception):
+    """The VM answered with a QMP error, or the socket could not be used"""
+
+    def __init__(self, message, error_class=None):
+        super().__init__(message)
+        self.error_class = error_class
+
+
+def parse_address(address):
+    """(family, sockaddr) for a "unix:..." or "tcp:host:port" QMP address"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    if address.startswith('tcp:'):
+        host, _, port = address[len('tcp:'):].rpartition(':')
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    raise ValueError(f"Unsupported QMP address: {address}")
+
+
+def free_tcp_port(host='127.0.0.1'):
+    """A port nothing is listening on right now (for platforms without Unix sockets)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind((host, 0))
+        return probe.getsockname()[1]
+
+
+class QMPClient:
+    def __init__(self, address, timeout=DEFAULT_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.greeting = None
+        self.events = []
+        self._sock = None
+        self._buffer = b''
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self):
+        family, sockaddr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(sockaddr)
+        except OSError as e:
+            sock.close()
+            raise QMPError(f"Cannot connect to QMP socket {self.address}: {e}")
+        self._sock = sock
+        self.greeting = self._read_message()
+        if 'QMP' not in self.greeting:
+            self.close()
+            raise QMPError(f"Unexpected QMP greeting: {self.greeting}")
+        # Leave capabilities negotiation mode so regular commands are accepted
+        self.execute('qmp_capabilities')
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._buffer = b''
+
+    def _read_message(self):
+        while b'\n' not in self._buffer:
+            try:
+                chunk = self._sock.recv(65536)
+            except OSError as e:
+                raise QMPError(f"QMP socket {self.address} failed: {e}")
+            if not chunk:
+                raise QMPError(f"QMP socket {self.address} closed")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        line = line.strip()
+        if not line:
+            return self._read_message()
+        return json.loads(line.decode('utf-8'))
+
+    def execute(self, command, arguments=None):
+        """Run one QMP command and return its "return" value.
+
+        Asynchronous events that arrive before the reply are kept in
+        self.events (e.g. SHUTDOWN after system_powerdown).
+        """
+        if self._sock is None:
+            raise QMPError("QMP client is not connected")
+        message = {'execute': command}
+        if arguments:
+            message['arguments'] = arguments
+        with span('qmp', command=command):
+            try:
+                self._sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            except OSError as e:
+                raise QMPError(f"QMP socket {self.address} failed: {e}")
+            while True:
+                reply = self._read_message()
+                if 'event' in reply:
+                    self.events.append(reply)
+                    continue
+                if 'error' in reply:
+                    error = reply['error']
+                    raise QMPError(error.get('desc') or str(error), error.get('class'))
+                return reply.get('return')
+
+
+def qmp_command(address, command, arguments=None, timeout=DEFAULT_TIMEOUT):
+    """Connect, run a single command and disconnect"""
+    with QMPClient(address, timeout) as client:
+        return client.execute(command, arguments)
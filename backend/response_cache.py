@@ -0,0 +1,161 @@
+"""
+Short-lived cache for read-only manager queries.
+
+Listing calls such as `list_images` are cached per argument list for a few
+seconds and tagged with what they read ("images", "containers"). Mutating
+calls invalidate their tags, so a reload right after a delete is always
+fresh, while back-to-back reloads of the same tab hit the cache. Identical
+requests that arrive while the first one is still talking to the daemon wait
+for its answer instead of issuing their own call (coalescing).
+
+    class DockerManager:
+        @cached(ttl=10, tags=('images',))
+        def list_images(self): ...
+
+        @invalidates('images')
+        def delete_image(self, ID, force=False): ...
+
+Only successful responses are stored. A decorated query also accepts
+fresh=True, which skips the lookup and replaces the stored answer. A cache
+created with max_entries evicts the least recently used entry once full.
+"""
+import json
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+ANY = '*'
+
+
+class _Pending:
+    def __init__(self, tags):
+        self.tags = tuple(tags)
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires, value), least recently used first
+        self._tags = {}        # key -> tags
+        self._pending = {}     # key -> _Pending for calls in flight
+        self._generations = {}  # tag -> bumped on every invalidation
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "stores": 0,
+                          "evictions": 0}
+
+    def _generation(self, tags):
+        return tuple(self._generations.get(tag, 0) for tag in tags) + (self._generations.get(ANY, 0),)
+
+    def get_or_compute(self, key, ttl, compute, tags=(), fresh=False, cacheable=None):
+        """Cached value for key, or compute() once for every concurrent caller"""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if not fresh and entry is not None and entry[0] > now:
+                self._counters["hits"] += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            pending = self._pending.get(key)
+            if pending is not None and not fresh:
+                self._counters["coalesced"] += 1
+                owner = False
+            else:
+                pending = self._pending[key] = _Pending(tags)
+                self._counters["misses"] += 1
+                owner = True
+            generation = self._generation(tags)
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = compute()
+        except BaseException as e:
+            pending.error = e
+            raise
+        else:
+            pending.value = value
+            with self._lock:
+                # An invalidation while we were computing means the answer may predate the change
+                if (cacheable is None or cacheable(value)) and generation == self._generation(tags):
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(key)
+                    self._tags[key] = tuple(tags)
+                    self._counters["stores"] += 1
+                    while self.max_entries is not None and len(self._entries) > self.max_entries:
+                        evicted, _ = self._entries.popitem(last=False)
+                        self._tags.pop(evicted, None)
+                        self._counters["evictions"] += 1
+            return value
+        finally:
+            with self._lock:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            pending.done.set()
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying one of `tags` (all entries when no tag is given)"""
+        tags = tags or (ANY,)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [k for k, t in self._tags.items() if ANY in tags or set(t) & set(tags)]:
+                self._entries.pop(key, None)
+                self._tags.pop(key, None)
+            # Later callers must not join a call that started before the change
+            for key in [k for k, p in self._pending.items() if ANY in tags or set(p.tags) & set(tags)]:
+                del self._pending[key]
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+            return dict(
+                self._counters,
+                entries=sum(1 for expires, _ in self._entries.values() if expires > now),
+                in_flight=len(self._pending),
+                hit_ratio=round((self._counters["hits"] + self._counters["coalesced"]) / lookups, 3)
+                if lookups else None,
+            )
+
+
+def succeeded(response):
+    return isinstance(response, str) and response.startswith('{"success": true')
+
+
+def cached(ttl, tags=()):
+    """Cache a manager method's JSON response in `self.cache` for `ttl` seconds"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, fresh=False, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None:
+                return method(self, *args, **kwargs)
+            key = method.__name__ + json.dumps([args, kwargs], sort_keys=True, default=str)
+            return cache.get_or_compute(key, ttl, lambda: method(self, *args, **kwargs), tags, fresh,
+                                        cacheable=succeeded)
+        return wrapper
+    return decorate
+
+
+def invalidates(*tags):
+    """Drop cached responses with these tags once the decorated call has run"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                cache = getattr(self, 'cache', None)
+                if cache is not None:
+                    cache.invalidate(*tags)
+        return wrapper
+    return decorate
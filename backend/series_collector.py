@@ -0,0 +1,143 @@
+"""
+Background sampling loop and per-target history shared by the metrics collectors.
+
+A collector samples every target (container, VM) once per interval on a
+daemon thread and appends each sample to that target's RingSeries. History
+for a target that has gone away is kept for the span of the buffer, then
+dropped. Subclasses describe their series with FIELDS and AGGREGATES and
+provide two methods:
+
+  - sample(targets=None): one pass, {key: {"id", "name", "values"}} with
+    {"error": ...} in place of "values" for targets that could not be sampled
+  - resolve(target): the series key for whatever the caller used to name a
+    target (ID, short ID, name...), or None
+"""
+import time
+import threading
+from timeseries import RingSeries
+
+DEFAULT_INTERVAL = 5
+# One hour of history at the default interval
+DEFAULT_CAPACITY = 720
+MIN_INTERVAL = 1
+
+
+class SeriesCollector:
+    FIELDS = ()
+    AGGREGATES = {}
+    THREAD_NAME = 'metrics'
+
+    def __init__(self, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY):
+        self.interval = interval
+        self.capacity = capacity
+        self.series = {}      # key -> RingSeries
+        self.names = {}       # key -> display name
+        self.last_pass = None
+        self.last_samples = {}
+        self.last_error = None
+        self._previous = {}   # key -> previous raw sample, for rates and CPU deltas
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self, targets=None):
+        raise NotImplementedError
+
+    def resolve(self, target):
+        raise NotImplementedError
+
+    def forget(self, key):
+        """Drop the sampling state kept for a target that is no longer sampled"""
+        self._previous.pop(key, None)
+
+    # -- history -----------------------------------------------------------
+
+    def record(self, samples, timestamp=None, full_pass=True):
+        """Append a pass's samples to the per-target series.
+
+        full_pass marks a pass over every target, which becomes the cached
+        last pass; targets missing from it lose their sampling state.
+        """
+        with self._lock:
+            # Stamped under the lock so concurrent passes append in time order
+            timestamp = time.time() if timestamp is None else timestamp
+            for sample in samples.values():
+                if "values" not in sample:
+                    continue
+                key = sample["id"]
+                series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = RingSeries(self.FIELDS, self.capacity, self.AGGREGATES)
+                series.append(timestamp, sample["values"])
+                self.names[key] = sample.get("name") or self.names.get(key)
+            # Targets that went away keep their history for the span of the buffer
+            horizon = timestamp - self.capacity * self.interval
+            for key in [k for k, s in self.series.items() if s.last_time < horizon]:
+                del self.series[key]
+                self.names.pop(key, None)
+                self.forget(key)
+            if full_pass:
+                present = {sample.get("id") for sample in samples.values()}
+                for key in [k for k in self._previous if k not in present]:
+                    self.forget(key)
+                self.last_pass = timestamp
+                self.last_samples = samples
+
+    def fresh_samples(self):
+        """The background loop's last pass while it is current, else None"""
+        with self._lock:
+            fresh = self.running and self.last_pass is not None and \
+                time.time() - self.last_pass <= self.interval * 1.5
+            return dict(self.last_samples) if fresh else None
+
+    # -- background loop ---------------------------------------------------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if interval:
+            self.interval = max(float(interval), MIN_INTERVAL)
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.record(self.sample())
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            # Keep a steady cadence however long the pass took
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    # -- queries -----------------------------------------------------------
+
+    def query(self, target=None, start=None, end=None, points=None):
+        """{key: {"name", "latest", "series"}} for one target or all of them"""
+        if target:
+            key = self.resolve(target)
+            keys = [key] if key else []
+        else:
+            with self._lock:
+                keys = list(self.series)
+        result = {}
+        with self._lock:
+            for key in keys:
+                series = self.series.get(key)
+                if series is None:
+                    continue
+                result[key] = {
+                    "name": self.names.get(key),
+                    "latest": series.latest(),
+                    "series": series.downsample(points, start, end) if points else series.range(start, end),
+                }
+        return result
@@ -0,0 +1,135 @@
+"""
+Fixed-size, array-backed ring buffers for metric time series.
+
+Each series keeps one `array('d')` column per field plus one for timestamps,
+allocated once up front, so a sample costs a few float stores and memory
+stays flat however long the collector runs. Missing values are stored as NaN
+and come back as None. Query results are columnar to keep them compact:
+
+    {"t": [1714550400.0, ...], "cpu": [3.2, ...], "mem": [52428800.0, ...]}
+"""
+import math
+from array import array
+
+NAN = float('nan')
+
+# How a field is reduced when several samples fall into one chart bucket
+MEAN = 'mean'
+MAX = 'max'
+LAST = 'last'
+
+
+def _clean(value):
+    return None if value is None or math.isnan(value) else value
+
+
+def _aggregate(values, how):
+    values = [v for v in values if not math.isnan(v)]
+    if not values:
+        return None
+    if how == MAX:
+        return max(values)
+    if how == LAST:
+        return values[-1]
+    return sum(values) / len(values)
+
+
+class RingSeries:
+    """Time series with a fixed capacity; the oldest sample is overwritten when full"""
+
+    def __init__(self, fields, capacity, aggregates=None):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.aggregates = dict(aggregates or {})
+        self._times = array('d', [0.0]) * capacity
+        self._columns = [array('d', [NAN]) * capacity for _ in self.fields]
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _slot(self, index):
+        """Physical slot of the index-th oldest sample"""
+        return (self._start + index) % self.capacity
+
+    def append(self, timestamp, values):
+        """Add a sample; values is a dict keyed by field (missing fields are stored as NaN)"""
+        if self._count < self.capacity:
+            slot = self._slot(self._count)
+            self._count += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._times[slot] = timestamp
+        for column, field in zip(self._columns, self.fields):
+            value = values.get(field)
+            column[slot] = NAN if value is None else float(value)
+
+    @property
+    def first_time(self):
+        return self._times[self._start] if self._count else None
+
+    @property
+    def last_time(self):
+        return self._times[self._slot(self._count - 1)] if self._count else None
+
+    def latest(self):
+        if not self._count:
+            return None
+        slot = self._slot(self._count - 1)
+        sample = {"t": self._times[slot]}
+        for column, field in zip(self._columns, self.fields):
+            sample[field] = _clean(column[slot])
+        return sample
+
+    def _bisect(self, timestamp, after=False):
+        """Index of the first sample at (or, with after=True, past) timestamp; samples are in time order"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            value = self._times[self._slot(middle)]
+            if value < timestamp or (after and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _bounds(self, start, end):
+        first = self._bisect(start) if start is not None else 0
+        last = self._bisect(end, after=True) if end is not None else self._count
+        return first, last
+
+    def range(self, start=None, end=None):
+        """Raw samples with start <= t <= end, oldest first"""
+        first, last = self._bounds(start, end)
+        slots = [self._slot(i) for i in range(first, last)]
+        result = {"t": [self._times[slot] for slot in slots]}
+        for column, field in zip(self._columns, self.fields):
+            result[field] = [_clean(column[slot]) for slot in slots]
+        return result
+
+    def downsample(self, points, start=None, end=None):
+        """At most `points` buckets of equal width between start and end, each reduced per field"""
+        first, last = self._bounds(start, end)
+        if last - first <= points or points <= 0:
+            return self.range(start, end)
+        t0 = self._times[self._slot(first)] if start is None else start
+        t1 = self._times[self._slot(last - 1)] if end is None else end
+        width = (t1 - t0) / points or 1.0
+
+        buckets = {}
+        for i in range(first, last):
+            slot = self._slot(i)
+            bucket = min(int((self._times[slot] - t0) / width), points - 1)
+            buckets.setdefault(bucket, []).append(slot)
+
+        result = {"t": []}
+        for field in self.fields:
+            result[field] = []
+        for bucket in sorted(buckets):
+            slots = buckets[bucket]
+            result["t"].append(t0 + bucket * width)
+            for column, field in zip(self._columns, self.fields):
+                result[field].append(_aggregate([column[slot] for slot in slots], self.aggregates.get(field, MEAN)))
+        return result
@@ -0,0 +1,180 @@
+"""
+Host-side resource metrics for the VMs in the registry.
+
+Each pass samples every registered QEMU process with psutil: CPU time, RSS,
+thread count and process I/O counters, plus (optionally) `query-blockstats`
+over the VM's QMP socket for the guest's own disk traffic and the host tap
+interface counters for VMs on a tap backend. Counters are cumulative, so
+the collector keeps the previous raw sample per VM and stores rates
+alongside them:
+
+    {"t": 1714550400.0, "cpu_percent": 112.5, "rss": 2147483648.0,
+     "disk_read_rate": 1048576.0, "net_rx_rate": 2048.0, ...}
+
+cpu_percent is relative to one host core (a busy 4-vCPU guest can reach
+400), like top. History lives in a RingSeries per VM (see series_collector).
+"""
+import time
+import psutil
+from qmp import QMPClient, QMPError
+from series_collector import DEFAULT_CAPACITY, DEFAULT_INTERVAL, SeriesCollector
+from timeseries import MEAN, MAX, LAST
+
+QMP_TIMEOUT = 1.0
+
+FIELDS = ('cpu_percent', 'rss', 'threads',
+          'io_read', 'io_write', 'io_read_rate', 'io_write_rate',
+          'disk_read', 'disk_write', 'disk_read_rate', 'disk_write_rate', 'disk_read_ops', 'disk_write_ops',
+          'net_rx', 'net_tx', 'net_rx_rate', 'net_tx_rate')
+# Cumulative counters keep their last value in a bucket; rates are averaged
+AGGREGATES = {
+    'cpu_percent': MEAN, 'rss': MEAN, 'threads': MAX,
+    'io_read': LAST, 'io_write': LAST, 'disk_read': LAST, 'disk_write': LAST,
+    'disk_read_ops': LAST, 'disk_write_ops': LAST, 'net_rx': LAST, 'net_tx': LAST,
+}
+# counter field -> rate field
+RATES = {
+    'io_read': 'io_read_rate', 'io_write': 'io_write_rate',
+    'disk_read': 'disk_read_rate', 'disk_write': 'disk_write_rate',
+    'net_rx': 'net_rx_rate', 'net_tx': 'net_tx_rate',
+}
+
+
+def tap_interface(command):
+    """ifname of the first tap netdev in a QEMU argv, or None"""
+    for index, arg in enumerate(command[:-1]):
+        if arg == '-netdev' and command[index + 1].startswith('tap,'):
+            for part in command[index + 1].split(','):
+                if part.startswith('ifname='):
+                    return part[len('ifname='):]
+    return None
+
+
+def _tap_counters(ifname):
+    # The host's rx on a tap device is what the guest sent, and the other way round
+    base = f'/sys/class/net/{ifname}/statistics'
+    try:
+        with open(f'{base}/tx_bytes') as rx, open(f'{base}/rx_bytes') as tx:
+            return {'net_rx': int(rx.read()), 'net_tx': int(tx.read())}
+    except (OSError, ValueError):
+        return {}
+
+
+def _blockstats(address):
+    """Guest disk traffic summed over the VM's block devices"""
+    with QMPClient(address, timeout=QMP_TIMEOUT) as qmp:
+        devices = qmp.execute('query-blockstats') or []
+    totals = {'disk_read': 0, 'disk_write': 0, 'disk_read_ops': 0, 'disk_write_ops': 0}
+    for device in devices:
+        stats = device.get('stats') or {}
+        totals['disk_read'] += stats.get('rd_bytes', 0)
+        totals['disk_write'] += stats.get('wr_bytes', 0)
+        totals['disk_read_ops'] += stats.get('rd_operations', 0)
+        totals['disk_write_ops'] += stats.get('wr_operations', 0)
+    return totals
+
+
+class VMMetricsCollector(SeriesCollector):
+    FIELDS = FIELDS
+    AGGREGATES = AGGREGATES
+    THREAD_NAME = 'vm-metrics'
+
+    def __init__(self, registry, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, blockstats=True):
+        super().__init__(interval, capacity)
+        self.registry = registry
+        self.blockstats = blockstats
+        # _previous: registry ID -> (monotonic time, cpu seconds, raw counters)
+        self._processes = {}  # registry ID -> psutil.Process (keeps psutil's per-process caches warm)
+
+    def forget(self, key):
+        super().forget(key)
+        self._processes.pop(key, None)
+
+    # -- sampling ----------------------------------------------------------
+
+    def _process(self, entry):
+        process = self._processes.get(entry["id"])
+        if process is None or process.pid != entry["pid"]:
+            process = self._processes[entry["id"]] = psutil.Process(entry["pid"])
+        return process
+
+    def _sample_entry(self, entry):
+        process = self._process(entry)
+        with process.oneshot():
+            now = time.monotonic()
+            times = process.cpu_times()
+            counters = {}
+            try:
+                io = process.io_counters()
+                counters.update(io_read=io.read_bytes, io_write=io.write_bytes)
+            except (psutil.AccessDenied, AttributeError):
+                # Not available on macOS, and needs privileges for other users' processes
+                pass
+            values = {"rss": process.memory_info().rss, "threads": process.num_threads()}
+        if self.blockstats and entry.get("qmp"):
+            try:
+                counters.update(_blockstats(entry["qmp"]))
+            except (QMPError, OSError, ValueError):
+                pass
+        ifname = tap_interface(entry.get("command") or [])
+        if ifname:
+            counters.update(_tap_counters(ifname))
+        values.update(counters)
+
+        cpu = times.user + times.system
+        with self._lock:
+            previous = self._previous.get(entry["id"])
+            self._previous[entry["id"]] = (now, cpu, counters)
+        if previous is not None and now > previous[0]:
+            elapsed = now - previous[0]
+            values["cpu_percent"] = round(max(cpu - previous[1], 0) / elapsed * 100, 2)
+            for counter, rate in RATES.items():
+                if counter in counters and counter in previous[2]:
+                    # A counter that went backwards was reset (e.g. the tap device was recreated)
+                    values[rate] = round(max(counters[counter] - previous[2][counter], 0) / elapsed, 1)
+        return values
+
+    def sample(self, entries=None):
+        """One pass over `entries` (default: every registered VM).
+
+        Returns {registry ID: {"id", "name", "pid", "values"}} with {"error": ...}
+        in place of the values for VMs that could not be sampled. Rates are None
+        on a VM's first sample.
+        """
+        if entries is None:
+            entries = self.registry.entries()
+        samples = {}
+        for entry in entries:
+            sample = {"id": entry["id"], "name": entry["name"], "pid": entry["pid"]}
+            try:
+                sample["values"] = self._sample_entry(entry)
+            except psutil.NoSuchProcess:
+                sample["error"] = f"VM {entry['name']} is not running"
+            except psutil.Error as e:
+                sample["error"] = str(e)
+            samples[entry["id"]] = sample
+        return samples
+
+    def current(self, entries):
+        """Latest values for registry `entries`, from the background pass when it
+        is fresh and from a sample taken now otherwise"""
+        last = self.fresh_samples()
+        if last is not None and all(entry["id"] in last for entry in entries):
+            return {entry["id"]: last[entry["id"]] for entry in entries}
+        samples = self.sample(entries)
+        self.record(samples, full_pass=False)
+        return samples
+
+    # -- queries -----------------------------------------------------------
+
+    def resolve(self, vm):
+        """Series key for a registry ID, VM name or PID"""
+        vm = str(vm)
+        with self._lock:
+            if vm in self.series:
+                return vm
+            for key, name in self.names.items():
+                if name == vm:
+                    return key
+        entry = self.registry.find(vm)
+        return entry["id"] if entry is not None and entry["id"] in self.series else None
@@ -0,0 +1,175 @@
+"""
+Persistent registry of the VMs this app has launched.
+
+Each entry records what is needed to find and control the VM again after the
+backend (or the whole app) restarts: the QEMU PID and its start time (so a
+reused PID is never mistaken for the VM), the QMP address, the launch config
+and the command line. The registry lives in data_dir()/vms.json, and QEMU's
+own output goes to data_dir()/logs/vm-<id>.log for as long as the VM is
+registered:
+
+    {"vms": {"1a2b3c4d": {"id": "1a2b3c4d", "name": "web", "pid": 4242,
+                          "create_time": 1714550400.12, "qmp": "unix:/run/.../vm-1a2b3c4d.qmp",
+                          "config": {...}, "command": [...], "started_at": 1714550400.3}}}
+
+The resident backend and one-shot api.py calls share the file: each change is
+merged into its latest contents under a lock on vms.json.lock, and reads pick
+up whatever another process wrote last.
+"""
+import os
+import time
+import threading
+import psutil
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes from this process are still serialised by the thread lock
+    fcntl = None
+from app_paths import data_dir, read_json, runtime_dir, write_json
+from qmp import free_tcp_port
+
+REGISTRY_FILE = 'vms.json'
+LOG_DIR = 'logs'
+# How much of a VM's log an error message quotes
+LOG_TAIL_BYTES = 4096
+
+
+def qmp_address(vm_id):
+    """Where the VM's QMP server should listen"""
+    if hasattr(os, 'fork'):
+        return 'unix:' + os.path.join(runtime_dir(), f'vm-{vm_id}.qmp')
+    # No AF_UNIX support in QEMU on Windows: use a loopback port instead
+    return f'tcp:127.0.0.1:{free_tcp_port()}'
+
+
+def log_path(vm_id):
+    """Where QEMU's stdout/stderr for the VM is written"""
+    directory = os.path.join(data_dir(), LOG_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'vm-{vm_id}.log')
+
+
+def log_tail(vm_id, size=LOG_TAIL_BYTES):
+    """Last `size` bytes of the VM's log as text ('' if there is none)"""
+    try:
+        with open(log_path(vm_id), 'rb') as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - size))
+            return f.read().decode('utf-8', errors='ignore').strip()
+    except OSError:
+        return ''
+
+
+def process_alive(entry):
+    """True if the entry's PID is still the QEMU process that was registered"""
+    try:
+        process = psutil.Process(entry['pid'])
+        if process.status() == psutil.STATUS_ZOMBIE:
+            return False
+        create_time = entry.get('create_time')
+        return create_time is None or abs(process.create_time() - create_time) < 1
+    except (psutil.NoSuchProcess, psutil.AccessDenied, KeyError, TypeError):
+        return False
+
+
+class VMRegistry:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), REGISTRY_FILE)
+        self._lock = threading.Lock()
+        self._version = None
+        self._vms = {}
+        self._refresh()
+
+    def _refresh(self):
+        """Reload the file if another process has replaced it since (call with _lock held)"""
+        version = self._file_version()
+        if version != self._version:
+            self._vms = (read_json(self.path, {}) or {}).get('vms', {})
+            self._version = version
+
+    def _file_version(self):
+        # write_json replaces the file, so a new inode means a new write even within one mtime tick
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _update(self, vm_id, entry=None):
+        """Store (or, without entry, drop) one VM, merged with what other processes have written.
+
+        Returns the entry that was there before.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock:
+                if fcntl is not None:
+                    # Released when the lock file is closed
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                self._version = None
+                self._refresh()
+                previous = self._vms.pop(vm_id, None)
+                if entry is not None:
+                    self._vms[vm_id] = entry
+                if entry is not None or previous is not None:
+                    write_json(self.path, {'vms': self._vms})
+                    self._version = self._file_version()
+        return previous
+
+    @staticmethod
+    def new_id():
+        # Same 8 hex digits uuid4().hex[:8] gave, without uuid (which imports platform)
+        return os.urandom(4).hex()
+
+    def add(self, vm_id, name, process, qmp, config, command):
+        try:
+            create_time = psutil.Process(process.pid).create_time()
+        except psutil.Error:
+            create_time = None
+        entry = {
+            'id': vm_id,
+            'name': name or f'vm-{vm_id}',
+            'pid': process.pid,
+            'create_time': create_time,
+            'qmp': qmp,
+            'config': config or {},
+            'command': command,
+            'started_at': time.time(),
+        }
+        self._update(vm_id, entry)
+        return dict(entry)
+
+    def remove(self, vm_id):
+        entry = self._update(vm_id)
+        if entry is None:
+            return None
+        paths = [log_path(vm_id)]
+        if entry.get('qmp', '').startswith('unix:'):
+            paths.append(entry['qmp'][len('unix:'):])
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return entry
+
+    def find(self, key):
+        """Entry by registry ID, name or PID"""
+        key = str(key)
+        with self._lock:
+            self._refresh()
+            if key in self._vms:
+                return dict(self._vms[key])
+            for entry in self._vms.values():
+                if str(entry.get('pid')) == key or entry.get('name') == key:
+                    return dict(entry)
+        return None
+
+    def entries(self):
+        """Live entries; entries whose process has exited are dropped on the way"""
+        with self._lock:
+            self._refresh()
+            entries = list(self._vms.values())
+        dead = [entry['id'] for entry in entries if not process_alive(entry)]
+        for vm_id in dead:
+            self.remove(vm_id)
+        return [dict(entry) for entry in entries if entry['id'] not in dead]
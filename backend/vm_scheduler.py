@@ -0,0 +1,358 @@
+"""
+Admission control and placement for QEMU VMs.
+
+The scheduler adds up the vCPUs and RAM committed to the VMs in the registry
+and only admits a launch that stays within the host's capacity times the
+overcommit ratios in data_dir()/scheduler.json:
+
+    {"cpu_overcommit": 4.0, "ram_overcommit": 1.0, "reserved_ram_mb": 1024, "when_full": "reject"}
+
+With "when_full": "queue" a launch that does not fit waits in a FIFO queue
+and starts once enough VMs have stopped (the queue lives in the resident
+backend, so it is empty again after a restart).
+
+A launch can also ask for a placement (Linux hosts only):
+
+    {"pin": true, "numa_node": 0, "hugepages": true}
+
+- pin: true picks dedicated host cores (one per vCPU, not shared with other
+  pinned VMs, on a single NUMA node when possible); a list pins to exactly
+  those cores. Each vCPU thread is bound to one core through the thread IDs
+  QMP `query-cpus-fast` reports.
+- numa_node binds the guest's memory (and the picked cores) to that node.
+- hugepages backs guest RAM with a preallocated hugetlbfs file.
+"""
+import os
+import sys
+import time
+import glob
+import threading
+import psutil
+from app_paths import data_dir, read_json, write_json
+from qmp import QMPClient, QMPError
+
+POLICY_FILE = 'scheduler.json'
+DEFAULT_POLICY = {
+    "cpu_overcommit": 4.0,
+    "ram_overcommit": 1.0,
+    "reserved_ram_mb": 1024,
+    "when_full": "reject",
+}
+WHEN_FULL = ('reject', 'queue')
+QUEUE_POLL_SECONDS = 2
+# QEMU opens its QMP socket right after it starts; give it this long before pinning fails
+PIN_TIMEOUT = 5.0
+PLACEMENT_KEYS = ('pin', 'numa_node', 'hugepages')
+
+
+def parse_cpulist(text):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in (text or '').strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-', 1)
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_nodes():
+    """{node: [host cpus]}; hosts without NUMA information are one node 0"""
+    nodes = {}
+    for path in glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'):
+        node = int(os.path.basename(os.path.dirname(path))[len('node'):])
+        try:
+            with open(path) as f:
+                cpus = parse_cpulist(f.read())
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes[node] = cpus
+    return nodes or {0: list(range(psutil.cpu_count(logical=True) or 1))}
+
+
+def hugepages():
+    """Default hugepage size, free pages and hugetlbfs mount point (Linux)"""
+    info = {"page_kb": None, "free_pages": 0, "mount": None}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('Hugepagesize:'):
+                    info["page_kb"] = int(line.split()[1])
+                elif line.startswith('HugePages_Free:'):
+                    info["free_pages"] = int(line.split()[1])
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'hugetlbfs':
+                    info["mount"] = fields[1]
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return info
+
+
+def memory_args(ram_size, placement):
+    """Guest RAM backend for a NUMA-bound and/or hugepage-backed placement"""
+    if not placement or not (placement.get("hugepages") or placement.get("numa_node") is not None):
+        return []
+    if placement.get("hugepages"):
+        backend = f"memory-backend-file,id=mem0,size={ram_size}M,mem-path={placement['hugepage_mount']}," \
+                  "share=on,prealloc=on"
+    else:
+        backend = f"memory-backend-ram,id=mem0,size={ram_size}M"
+    if placement.get("numa_node") is not None:
+        backend += f",host-nodes={placement['numa_node']},policy=bind"
+    return ["-object", backend, "-numa", "node,memdev=mem0"]
+
+
+def pin_vcpus(qmp_address, pid, cpus, timeout=PIN_TIMEOUT):
+    """Bind each vCPU thread of a running QEMU to one host core.
+
+    The rest of the process (main loop, I/O threads) is limited to the same
+    set of cores. Returns {vcpu index: host cpu}.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with QMPClient(qmp_address) as qmp:
+                vcpus = qmp.execute('query-cpus-fast') or []
+            break
+        except (QMPError, OSError):
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+    psutil.Process(pid).cpu_affinity(list(cpus))
+    pinned = {}
+    for vcpu in sorted(vcpus, key=lambda v: v.get('cpu-index', 0)):
+        index = vcpu.get('cpu-index', len(pinned))
+        cpu = cpus[index % len(cpus)]
+        os.sched_setaffinity(vcpu['thread-id'], {cpu})
+        pinned[index] = cpu
+    return pinned
+
+
+class VMScheduler:
+    def __init__(self, registry, launcher=None, path=None):
+        self.registry = registry
+        # launcher(request) starts a queued launch and returns its result dict
+        self.launcher = launcher
+        self.path = path or os.path.join(data_dir(), POLICY_FILE)
+        # Held from the capacity check until the launch is reserved, so
+        # concurrent launches can't both squeeze into the last free slot
+        self.lock = threading.RLock()
+        # Capacity admitted for launches that are not in the registry yet, so
+        # the lock need not be held while QEMU starts
+        self._reservations = {}
+        self._reservation_ids = 0
+        self._queue = []
+        self._queue_ids = 0
+        self._thread = None
+
+    # -- policy ------------------------------------------------------------
+
+    def policy(self):
+        stored = read_json(self.path, {}) or {}
+        return dict(DEFAULT_POLICY, **{key: value for key, value in stored.items() if key in DEFAULT_POLICY})
+
+    def set_policy(self, changes):
+        unknown = [key for key in changes if key not in DEFAULT_POLICY]
+        if unknown:
+            raise ValueError(f"Unknown scheduler setting(s): {', '.join(sorted(unknown))}")
+        policy = self.policy()
+        for key, value in changes.items():
+            if value is None:
+                continue
+            if key == 'when_full':
+                if value not in WHEN_FULL:
+                    raise ValueError(f"Invalid when_full: {value} (expected one of: {', '.join(WHEN_FULL)})")
+            else:
+                value = float(value)
+                if value < 0 or (key != 'reserved_ram_mb' and value == 0):
+                    raise ValueError(f"{key} must be a positive number")
+            policy[key] = value
+        write_json(self.path, policy)
+        return policy
+
+    # -- capacity ----------------------------------------------------------
+
+    def usage(self, policy=None):
+        """Committed and allowed vCPUs/RAM across the registered VMs"""
+        policy = policy or self.policy()
+        cpu_count = psutil.cpu_count(logical=True) or 1
+        total_ram_mb = psutil.virtual_memory().total // (1024 * 1024)
+        committed_cpus = committed_ram = 0
+        pinned = {}
+        for entry in self.registry.entries():
+            config = entry.get("config") or {}
+            try:
+                committed_cpus += int(config.get("cpu_cores") or 0)
+                committed_ram += int(config.get("ram_size") or 0)
+            except (TypeError, ValueError):
+                pass
+            for cpu in config.get("cpus") or []:
+                pinned[cpu] = entry["id"]
+        with self.lock:
+            reserved = dict(self._reservations)
+        reserved_cpus = sum(cpus for cpus, _, _ in reserved.values())
+        reserved_ram = sum(ram for _, ram, _ in reserved.values())
+        for reservation, (_, _, cpus) in reserved.items():
+            for cpu in cpus or []:
+                pinned[cpu] = f"reservation-{reservation}"
+        return {
+            "cpu_count": cpu_count,
+            "ram_mb": total_ram_mb,
+            "committed_cpus": committed_cpus + reserved_cpus,
+            "committed_ram_mb": committed_ram + reserved_ram,
+            "reserved_cpus": reserved_cpus,
+            "reserved_ram_mb": reserved_ram,
+            "cpu_limit": int(cpu_count * policy["cpu_overcommit"]),
+            "ram_limit_mb": int(max(total_ram_mb - policy["reserved_ram_mb"], 0) * policy["ram_overcommit"]),
+            "pinned_cpus": pinned,
+        }
+
+    def check(self, cpu_cores, ram_size, usage=None):
+        """Reasons a launch of this size would exceed the policy (empty when it fits)"""
+        usage = usage or self.usage()
+        problems = []
+        if usage["committed_cpus"] + cpu_cores > usage["cpu_limit"]:
+            problems.append(f"{cpu_cores} vCPUs requested, {usage['committed_cpus']} of "
+                            f"{usage['cpu_limit']} already committed")
+        if usage["committed_ram_mb"] + ram_size > usage["ram_limit_mb"]:
+            problems.append(f"{ram_size} MB RAM requested, {usage['committed_ram_mb']} of "
+                            f"{usage['ram_limit_mb']} MB already committed")
+        return problems
+
+    def reserve(self, cpu_cores, ram_size, cpus=None):
+        """Count an admitted launch (and the host cores it pins to) as committed until release();
+        returns the reservation ID"""
+        with self.lock:
+            self._reservation_ids += 1
+            self._reservations[self._reservation_ids] = (cpu_cores, ram_size, cpus)
+            return self._reservation_ids
+
+    def release(self, reservation):
+        """Drop a reservation once its VM is in the registry (or failed to start)"""
+        with self.lock:
+            self._reservations.pop(reservation, None)
+
+    # -- placement ---------------------------------------------------------
+
+    def place(self, cpu_cores, ram_size, placement, usage=None):
+        """Resolve a placement request into host cores and memory settings.
+
+        Returns None when nothing was asked for; raises ValueError when the
+        request can't be met on this host.
+        """
+        if not placement:
+            return None
+        unknown = [key for key in placement if key not in PLACEMENT_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown placement option(s): {', '.join(sorted(unknown))}")
+        if sys.platform != 'linux':
+            raise ValueError("CPU pinning, NUMA binding and hugepages are only supported on Linux hosts")
+        usage = usage or self.usage()
+        nodes = numa_nodes()
+        node = placement.get("numa_node")
+        if node is not None:
+            node = int(node)
+            if node not in nodes:
+                raise ValueError(f"NUMA node {node} does not exist (host nodes: "
+                                 f"{', '.join(str(n) for n in sorted(nodes))})")
+        resolved = {"numa_node": node, "hugepages": bool(placement.get("hugepages")), "cpus": None}
+
+        pin = placement.get("pin")
+        if pin:
+            taken = usage["pinned_cpus"]
+            if isinstance(pin, list):
+                cpus = [int(cpu) for cpu in pin]
+                host = set(range(usage["cpu_count"]))
+                bad = [cpu for cpu in cpus if cpu not in host]
+                if bad:
+                    raise ValueError(f"Host CPU(s) {', '.join(map(str, bad))} do not exist")
+                busy = [cpu for cpu in cpus if cpu in taken]
+                if busy:
+                    raise ValueError(f"Host CPU(s) {', '.join(map(str, busy))} are already pinned to another VM")
+                if len(cpus) < cpu_cores:
+                    raise ValueError(f"{cpu_cores} vCPUs need {cpu_cores} host CPUs to pin to, got {len(cpus)}")
+            else:
+                # Keep the VM on one node: the requested one, else the node with the most free cores
+                candidates = [node] if node is not None else \
+                    sorted(nodes, key=lambda n: -sum(1 for cpu in nodes[n] if cpu not in taken))
+                cpus = None
+                for candidate in candidates:
+                    free = [cpu for cpu in nodes[candidate] if cpu not in taken]
+                    if len(free) >= cpu_cores:
+                        cpus = free[:cpu_cores]
+                        break
+                if cpus is None:
+                    where = f"NUMA node {node}" if node is not None else "any single NUMA node"
+                    raise ValueError(f"Not enough unpinned host CPUs on {where} for {cpu_cores} vCPUs")
+            resolved["cpus"] = cpus[:cpu_cores]
+
+        if resolved["hugepages"]:
+            pages = hugepages()
+            if not pages["mount"] or not pages["page_kb"]:
+                raise ValueError("Hugepages requested but no hugetlbfs is mounted on this host")
+            needed = -(-ram_size * 1024 // pages["page_kb"])
+            if pages["free_pages"] < needed:
+                raise ValueError(f"{ram_size} MB of hugepages requested but only "
+                                 f"{pages['free_pages'] * pages['page_kb'] // 1024} MB are free")
+            resolved["hugepage_mount"] = pages["mount"]
+        return resolved
+
+    # -- queue -------------------------------------------------------------
+
+    def enqueue(self, request, listener=None):
+        """Hold a launch until it fits; listener(result) gets the launch result"""
+        with self.lock:
+            self._queue_ids += 1
+            item = {"queue_id": self._queue_ids, "request": request, "queued_at": time.time(),
+                    "listener": listener}
+            self._queue.append(item)
+            position = len(self._queue)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._drain, name='vm-queue', daemon=True)
+                self._thread.start()
+        return {"queue_id": item["queue_id"], "position": position}
+
+    def queued(self):
+        with self.lock:
+            return [{"queue_id": item["queue_id"], "position": position + 1, "queued_at": item["queued_at"],
+                     "name": item["request"].get("name"), "cpu_cores": item["request"].get("cpu_cores"),
+                     "ram_size": item["request"].get("ram_size")}
+                    for position, item in enumerate(self._queue)]
+
+    def cancel(self, queue_id):
+        with self.lock:
+            for item in self._queue:
+                if item["queue_id"] == int(queue_id):
+                    self._queue.remove(item)
+                    return True
+        return False
+
+    def _drain(self):
+        while True:
+            time.sleep(QUEUE_POLL_SECONDS)
+            with self.lock:
+                if not self._queue:
+                    return
+                # Strict FIFO: a big VM at the head is not starved by small ones behind it
+                item = self._queue[0]
+                request = item["request"]
+                if self.check(int(request["cpu_cores"]), int(request["ram_size"])):
+                    continue
+                self._queue.pop(0)
+            # The launcher takes the lock again for its own admission check, but not while QEMU starts
+            try:
+                result = self.launcher(request)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if item["listener"] is not None:
+                try:
+                    item["listener"](dict(result, queue_id=item["queue_id"]))
+                except Exception:
+                    pass
@@ -0,0 +1,122 @@
+"""
+Internal qcow2 snapshots of running VMs (disk plus RAM/device state).
+
+A running VM is saved with `savevm` over its QMP socket; the snapshot lives
+inside the VM's qcow2 disk. Restarting QEMU with `-loadvm <tag>` puts the
+guest back exactly where it was, so a dev VM resumes in seconds instead of
+booting. Snapshots of stopped VMs are listed and deleted with `qemu-img
+snapshot`.
+
+Resuming needs the same virtual hardware the snapshot was taken on, so the
+launch config (cores, RAM, profile, options) is recorded next to each tag in
+data_dir()/snapshots.json.
+"""
+import os
+import re
+import time
+import threading
+from app_paths import data_dir, read_json, write_json
+from instrumentation import traced_run
+from qmp import QMPClient, QMPError
+
+CATALOG_FILE = 'snapshots.json'
+# savevm writes all guest RAM; give big VMs time
+SNAPSHOT_TIMEOUT = 600
+TAG_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# ID  TAG  VM SIZE  DATE  VM CLOCK  [ICOUNT]
+_SNAPSHOT_LINE = re.compile(
+    r'^(?P<id>\S+)\s+(?P<tag>\S+)\s+(?P<vm_size>\d+(?:\.\d+)?\s*\S+)\s+'
+    r'(?P<date>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(?P<vm_clock>\S+)'
+)
+
+
+def default_tag():
+    return time.strftime('snap-%Y%m%d-%H%M%S')
+
+
+def check_tag(tag):
+    if not tag or not TAG_PATTERN.match(tag):
+        raise ValueError("Snapshot names may only contain letters, digits, '.', '_' and '-' (max 64 characters)")
+    return tag
+
+
+def parse_snapshot_list(output):
+    """Rows of `qemu-img snapshot -l` / HMP `info snapshots` output"""
+    snapshots = []
+    for line in (output or '').splitlines():
+        match = _SNAPSHOT_LINE.match(line.strip())
+        if match:
+            snapshots.append(match.groupdict())
+    return snapshots
+
+
+def disk_of(command):
+    """Path of the VM's first -drive file in a QEMU argv"""
+    for index, arg in enumerate(command[:-1]):
+        if arg == '-drive' and command[index + 1].startswith('file='):
+            return command[index + 1][len('file='):].split(',', 1)[0]
+    return None
+
+
+def hmp(qmp_address, command_line, timeout=SNAPSHOT_TIMEOUT):
+    """Run a human monitor command through QMP; HMP reports failures as text"""
+    with QMPClient(qmp_address, timeout=timeout) as client:
+        output = (client.execute('human-monitor-command', {'command-line': command_line}) or '').strip()
+    if output.lower().startswith('error') or 'error:' in output.lower():
+        raise QMPError(output)
+    return output
+
+
+def list_offline(disk_path, qemu_img='qemu-img'):
+    # -U: the disk may be open in a running VM
+    result = traced_run([qemu_img, 'snapshot', '-U', '-l', disk_path],
+                        capture_output=True, text=True, check=True, timeout=60)
+    return parse_snapshot_list(result.stdout)
+
+
+def delete_offline(disk_path, tag, qemu_img='qemu-img'):
+    traced_run([qemu_img, 'snapshot', '-d', tag, disk_path],
+               capture_output=True, text=True, check=True, timeout=SNAPSHOT_TIMEOUT)
+
+
+class SnapshotCatalog:
+    """Launch configs per (disk, tag), so a snapshot can be resumed on matching hardware"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), CATALOG_FILE)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(disk_path):
+        return os.path.normcase(os.path.abspath(disk_path))
+
+    def record(self, disk_path, tag, name, config):
+        with self._lock:
+            catalog = read_json(self.path, {}) or {}
+            catalog.setdefault(self._key(disk_path), {})[tag] = {
+                "name": name, "config": config, "created_at": time.time(),
+            }
+            write_json(self.path, catalog)
+
+    def get(self, disk_path, tag=None):
+        """(tag, record) for a tag, or for the newest recorded snapshot when tag is None"""
+        catalog = read_json(self.path, {}) or {}
+        tags = catalog.get(self._key(disk_path), {})
+        if tag is None:
+            if not tags:
+                return None, None
+            tag = max(tags, key=lambda t: tags[t].get("created_at", 0))
+        return tag, tags.get(tag)
+
+    def tags(self, disk_path):
+        return (read_json(self.path, {}) or {}).get(self._key(disk_path), {})
+
+    def forget(self, disk_path, tag):
+        with self._lock:
+            catalog = read_json(self.path, {}) or {}
+            tags = catalog.get(self._key(disk_path), {})
+            if tags.pop(tag, None) is not None:
+                if not tags:
+                    catalog.pop(self._key(disk_path), None)
+                write_json(self.path, catalog)
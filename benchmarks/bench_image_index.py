@@ -0,0 +1,120 @@
+"""
+Query latency of the local image search index over a synthetic image list.
+
+    python benchmarks/bench_image_index.py [--images 10000] [--rounds 200]
+
+Builds an ImageIndex from generated `docker image ls` rows, then times
+exact, prefix, substring, typo, tag and digest queries and an incremental
+sync after a handful of images change. Exits non-zero when a query's median
+is above --budget-ms (1 ms by default).
+"""
+import gc
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from image_index import ImageIndex  # noqa: E402
+
+REGISTRIES = ['', '', '', 'ghcr.io/', 'quay.io/', 'registry.example.com:5000/']
+NAMESPACES = ['', '', 'library/', 'bitnami/', 'acme/', 'grafana/', 'team-a/', 'team-b/']
+NAMES = ['nginx', 'postgres', 'redis', 'mysql', 'node', 'python', 'golang', 'alpine', 'ubuntu',
+         'debian', 'traefik', 'prometheus', 'grafana', 'kafka', 'zookeeper', 'mongo', 'elasticsearch',
+         'rabbitmq', 'memcached', 'httpd', 'web-api', 'billing-worker', 'auth-service', 'frontend']
+TAGS = ['latest', 'alpine', 'slim', 'bookworm', '1.25', '16', '16-alpine', '3.12-slim', '7.2', 'v2.10.4']
+
+QUERIES = {
+    'exact': 'nginx',
+    'prefix': 'postg',
+    'substring': 'worker',
+    'typo (swap)': 'ngnix',
+    'typo (swap, long)': 'postgers',
+    'two words': 'bitnami redis',
+    'repo:tag': 'python:3.12',
+    'short prefix': 're',
+    'label': 'maintainer',
+    'miss': 'doesnotexist',
+}
+
+
+def _hex(rng, length):
+    return ''.join(rng.choice('0123456789abcdef') for _ in range(length))
+
+
+def make_rows(count, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for n in range(count):
+        name = rng.choice(NAMES)
+        repository = rng.choice(REGISTRIES) + rng.choice(NAMESPACES) + name
+        if rng.random() < 0.3:
+            # Enough distinct repositories that the index is not just a few dozen terms
+            repository += f'-{n}'
+        labels = f'maintainer=team{rng.randrange(20)},org.opencontainers.image.version={rng.choice(TAGS)}'
+        rows.append({
+            "Containers": "N/A", "CreatedAt": "2024-05-01 12:00:00 +0000 UTC", "CreatedSince": "2 weeks ago",
+            "Digest": 'sha256:' + _hex(rng, 64), "ID": _hex(rng, 12), "Labels": labels,
+            "Repository": repository, "SharedSize": "N/A", "Size": f'{rng.randrange(5, 900)}MB',
+            "Tag": rng.choice(TAGS), "UniqueSize": "N/A", "VirtualSize": "N/A",
+        })
+    return rows
+
+
+def timed(func, rounds):
+    samples = []
+    # Like timeit: keep collector pauses out of the numbers
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    rows = make_rows(args.images)
+    index = ImageIndex()
+    started = time.perf_counter()
+    index.sync(rows)
+    print(f'build: {args.images} images in {(time.perf_counter() - started) * 1000:.1f} ms')
+
+    digest = rows[len(rows) // 2]["Digest"][:19]
+    queries = dict(QUERIES, digest=digest)
+    over = []
+    print(f'{"query":<20} {"matches":>8} {"median ms":>10} {"p99 ms":>8}')
+    for label, query in queries.items():
+        matches = len(index.search(query))
+        median, p99 = timed(lambda: index.search(query, args.limit), args.rounds)
+        print(f'{label:<20} {matches:>8} {median:>10.3f} {p99:>8.3f}')
+        if median > args.budget_ms:
+            over.append(label)
+
+    # A pull and a delete between two listings
+    changed = rows[5:] + make_rows(5, seed=2)
+    started = time.perf_counter()
+    added, removed = index.sync(changed)
+    print(f'incremental sync: +{added} -{removed} in {(time.perf_counter() - started) * 1000:.1f} ms')
+
+    if over:
+        print(f'over the {args.budget_ms} ms budget: {", ".join(over)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Stand-in for the Docker Engine API on a Unix socket.
+
+    python benchmarks/fakes/engine.py --socket /tmp/bench/docker.sock
+
+Serves the read paths DockerManager uses (/_ping, /version, /images/json,
+/containers/json, /containers/{id}/json, /stats, /logs, /images/search) from
+world.py with HTTP/1.1 keep-alive, so the client's connection pool behaves
+as it would against dockerd. Other requests get an empty 204.
+"""
+import os
+import sys
+import json
+import argparse
+import socketserver
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import world  # noqa: E402
+
+
+def _truthy(value):
+    return value not in (None, '', '0', 'false', 'False')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'bench-dockerd'
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return 'unix'
+
+    def _send(self, status, body=b'', content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Api-Version', '1.43')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _missing(self, ref):
+        self._send(404, {"message": f"No such container: {ref}"})
+
+    def do_GET(self):
+        config = world.settings()
+        world.delay(config)
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        # Versioned paths (/v1.43/containers/json) are served like unversioned ones
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        if parts and parts[0].startswith('v1.'):
+            parts = parts[1:]
+
+        if parts == ['_ping']:
+            return self._send(200, b'OK', 'text/plain')
+        if parts == ['version']:
+            return self._send(200, {"Version": "24.0.0", "ApiVersion": "1.43", "Os": "linux"})
+        if parts == ['images', 'json']:
+            return self._send(200, world.images(config))
+        if parts == ['images', 'search']:
+            return self._send(200, world.search(query.get('term', ''), int(query.get('limit', 25))))
+        if parts == ['containers', 'json']:
+            found = world.containers(config)
+            if not _truthy(query.get('all')):
+                found = [c for c in found if c["State"] == 'running']
+            filters = json.loads(query.get('filters') or '{}')
+            for wanted in filters.get('id') or []:
+                found = [c for c in found if c["Id"].startswith(wanted)]
+            for label in filters.get('label') or []:
+                key, _, value = label.partition('=')
+                found = [c for c in found if key in c["Labels"] and (not value or c["Labels"][key] == value)]
+            return self._send(200, found)
+        if len(parts) == 3 and parts[0] == 'containers':
+            container = world.find_container(parts[1], config)
+            if container is None:
+                return self._missing(parts[1])
+            if parts[2] == 'json':
+                return self._send(200, world.inspect(container))
+            if parts[2] == 'stats':
+                if container["State"] != 'running':
+                    return self._send(409, {"message": f"Container {parts[1]} is not running"})
+                return self._send(200, world.stats(container))
+            if parts[2] == 'logs':
+                tail = query.get('tail', 'all')
+                timestamps = _truthy(query.get('timestamps'))
+                frames = []
+                for stream, stamp, text in world.log_lines(container, None if tail == 'all' else int(tail), config):
+                    payload = (f'{stamp} {text}\n' if timestamps else text + '\n').encode()
+                    frames.append(bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, 'big') + payload)
+                return self._send(200, b''.join(frames), 'application/vnd.docker.raw-stream')
+        self._send(404, {"message": f"page not found: {url.path}"})
+
+    def do_POST(self):
+        world.delay()
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._send(204)
+
+    do_DELETE = do_POST
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Docker Engine API stand-in for benchmarks')
+    parser.add_argument('--socket', required=True)
+    args = parser.parse_args()
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    server = Server(args.socket, Handler)
+    print('ready', flush=True)
+    try:
+        server.serve_forever(poll_interval=0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Deterministic fake Docker host shared by the benchmark stand-ins.
+
+The fake `docker` CLI and the fake Engine API socket both build their answers
+from here, so a run over either transport sees the same containers, images,
+stats and logs. Everything is derived from the environment:
+
+    BENCH_CONTAINERS=200   containers (every other one is running)
+    BENCH_IMAGES=300       images
+    BENCH_LOG_LINES=1000   lines of log history per container
+    BENCH_LATENCY_MS=0     delay added to every CLI run / API request
+    BENCH_SEED=1           seed for names, sizes and IDs
+
+Counters in stats grow with wall-clock time so consecutive samples give
+non-zero rates, like a real daemon.
+"""
+import os
+import time
+import random
+import hashlib
+from datetime import datetime, timezone
+
+NAMES = ['nginx', 'postgres', 'redis', 'mysql', 'node', 'python', 'golang', 'alpine', 'ubuntu',
+         'debian', 'traefik', 'prometheus', 'grafana', 'kafka', 'mongo', 'rabbitmq', 'memcached',
+         'httpd', 'web-api', 'billing-worker', 'auth-service', 'frontend']
+NAMESPACES = ['', '', '', 'bitnami/', 'acme/', 'ghcr.io/acme/']
+TAGS = ['latest', 'alpine', 'slim', 'bookworm', '1.25', '16', '16-alpine', '3.12-slim', '7.2']
+LEVELS = ['INFO', 'INFO', 'INFO', 'DEBUG', 'WARN', 'ERROR']
+# Fixed epoch so created/started times do not depend on when the run happens
+EPOCH = 1714550400
+
+
+def settings():
+    env = os.environ
+    return {
+        "containers": int(env.get('BENCH_CONTAINERS', 200)),
+        "images": int(env.get('BENCH_IMAGES', 300)),
+        "log_lines": int(env.get('BENCH_LOG_LINES', 1000)),
+        "latency_ms": float(env.get('BENCH_LATENCY_MS', 0)),
+        "seed": int(env.get('BENCH_SEED', 1)),
+    }
+
+
+def delay(config=None):
+    latency = (config or settings())["latency_ms"]
+    if latency > 0:
+        time.sleep(latency / 1000)
+
+
+def _hex(*parts):
+    return hashlib.sha256('/'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def images(config=None):
+    """Engine-style /images/json entries"""
+    config = config or settings()
+    rng = random.Random(config["seed"])
+    found = []
+    for n in range(config["images"]):
+        repository = rng.choice(NAMESPACES) + rng.choice(NAMES) + (f'-{n}' if n >= len(NAMES) * 2 else '')
+        tag = rng.choice(TAGS)
+        image_id = 'sha256:' + _hex('image', config["seed"], n)
+        found.append({
+            "Id": image_id,
+            "RepoTags": [f'{repository}:{tag}'],
+            "RepoDigests": [f'{repository}@sha256:{_hex("digest", config["seed"], n)}'],
+            "Created": EPOCH - n * 3600,
+            "Size": rng.randrange(5, 900) * 1000 * 1000,
+            "SharedSize": -1,
+            "Containers": -1,
+            "Labels": {"maintainer": f'team{n % 20}', "org.opencontainers.image.version": tag},
+        })
+    return found
+
+
+def containers(config=None):
+    """Engine-style /containers/json?all=1 entries"""
+    config = config or settings()
+    rng = random.Random(config["seed"] + 1)
+    image_list = images(config)
+    found = []
+    for n in range(config["containers"]):
+        image = image_list[n % len(image_list)]["RepoTags"][0] if image_list else 'alpine:latest'
+        running = n % 2 == 0
+        created = EPOCH - n * 60
+        port = 8000 + n
+        found.append({
+            "Id": _hex('container', config["seed"], n),
+            "Names": [f'/bench-{n}'],
+            "Image": image,
+            "ImageID": image_list[n % len(image_list)]["Id"] if image_list else '',
+            "Command": "/docker-entrypoint.sh serve",
+            "Created": created,
+            "State": 'running' if running else 'exited',
+            "Status": 'Up 2 hours' if running else 'Exited (0) 3 hours ago',
+            "Ports": [{"IP": '0.0.0.0', "PrivatePort": 80, "PublicPort": port, "Type": 'tcp'}] if running else [],
+            "Labels": {"com.docker.compose.project": f'stack{n % 8}', "tier": rng.choice(['web', 'db', 'cache'])},
+            "Mounts": [],
+            "NetworkSettings": {"Networks": {"bridge": {}}},
+        })
+    return found
+
+
+def find_container(ref, config=None):
+    for container in containers(config):
+        if container["Id"].startswith(ref) or container["Names"][0].lstrip('/') == ref:
+            return container
+    return None
+
+
+def inspect(container):
+    """Engine-style /containers/{id}/json"""
+    return {
+        "Id": container["Id"],
+        "Name": container["Names"][0],
+        "Created": _timestamp(container["Created"]).isoformat(),
+        "State": {"Status": container["State"], "Running": container["State"] == 'running'},
+        "Config": {"Tty": False, "Image": container["Image"], "Labels": container["Labels"]},
+    }
+
+
+def stats(container, now=None):
+    """Engine-style one-shot /containers/{id}/stats"""
+    now = time.time() if now is None else now
+    n = int(container["Names"][0].rsplit('-', 1)[1])
+    elapsed = now - EPOCH
+    ticks = int(elapsed * 1e9)
+    total = int(elapsed * 1e7 * (1 + n % 5))
+    return {
+        "id": container["Id"],
+        "name": container["Names"][0],
+        "read": _timestamp(now).isoformat(),
+        "cpu_stats": {"cpu_usage": {"total_usage": total, "percpu_usage": [total // 2, total // 2]},
+                      "system_cpu_usage": ticks * 4, "online_cpus": 4},
+        "precpu_stats": {"cpu_usage": {"total_usage": total - int(1e7)}, "system_cpu_usage": ticks * 4 - int(4e9),
+                         "online_cpus": 4},
+        "memory_stats": {"usage": (40 + n % 200) * 1024 * 1024, "limit": 8 * 1024 ** 3,
+                         "stats": {"inactive_file": 1024 * 1024}},
+        "networks": {"eth0": {"rx_bytes": int(elapsed * 100), "tx_bytes": int(elapsed * 40)}},
+        "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": int(elapsed * 10)},
+                                                       {"op": "write", "value": int(elapsed * 5)}]},
+        "pids_stats": {"current": 3 + n % 7},
+    }
+
+
+def log_lines(container, count, config=None):
+    """[(stream, RFC 3339 timestamp, text)] oldest first; stream is 1 (stdout) or 2 (stderr)"""
+    config = config or settings()
+    n = int(container["Names"][0].rsplit('-', 1)[1])
+    rng = random.Random(config["seed"] * 7919 + n)
+    total = config["log_lines"]
+    start = EPOCH + 600
+    lines = []
+    for i in range(total):
+        level = rng.choice(LEVELS)
+        stamp = _timestamp(start + i * 0.25).strftime('%Y-%m-%dT%H:%M:%S.%f') + '000Z'
+        text = f'{level} request id={rng.randrange(10 ** 8)} path=/api/v1/items/{i} took {rng.randrange(1, 900)}ms'
+        lines.append((2 if level in ('WARN', 'ERROR') else 1, stamp, text))
+    return lines if count is None else lines[-count:] if count else []
+
+
+def search(term, limit=25):
+    """Engine-style /images/search results"""
+    rng = random.Random(term)
+    results = []
+    for i in range(min(limit, 100)):
+        name = term if i == 0 else f'{rng.choice(["bitnami", "acme", "library", "someone"])}/{term}-{i}'
+        results.append({"name": name, "description": f'{name} image', "star_count": rng.randrange(0, 20000),
+                        "is_official": i == 0, "is_automated": False})
+    return results
@@ -0,0 +1,464 @@
+"""
+Backend benchmarks against the fake docker/QEMU binaries in benchmarks/fakes.
+
+    python benchmarks/run.py                                  # every case, default sizes
+    python benchmarks/run.py --only docker.list --containers 2000 --images 5000
+    python benchmarks/run.py --latency-ms 20                  # a slow daemon
+    python benchmarks/run.py --baseline benchmarks/baseline.json        # exit 1 on a regression
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json   # record a new baseline
+
+Every case runs in a worker process of its own, with PATH pointing at the
+fakes and DOCKER_VM_MANAGER_HOME at a scratch directory, so the real Docker
+daemon, QEMU and the app's data are never touched and one case's peak RSS
+does not leak into the next. Docker cases run over both transports: "engine"
+talks HTTP to fakes/engine.py on a Unix socket, "cli" leaves DOCKER_HOST
+pointing at a missing socket so DockerManager forks the fake CLI. api.* cases
+measure the api.py process itself: one-shot invocations as the Electron app
+makes them without the daemon, and JSON-RPC round trips to `api.py --serve`.
+
+Each case reports latency percentiles, throughput and peak RSS (the worker's,
+or for api.* cases the backend process's). Baselines are only comparable on
+the machine and sizes they were recorded with; record one per CI runner.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import subprocess
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKES = os.path.join(HERE, 'fakes')
+BACKEND = os.path.join(HERE, '..', 'backend')
+API = os.path.join(BACKEND, 'api.py')
+
+TRANSPORTS = ('engine', 'cli')
+RPC_CONCURRENCY = 16
+WORKER_TIMEOUT = 600
+
+# Regressions smaller than this are scheduler noise whatever the percentage
+NOISE_MS = 1.0
+NOISE_RSS_MB = 4.0
+
+CASES = {}
+
+
+class Case:
+    def __init__(self, name, setup, docker=False, rounds=None, ops=1, rss='self'):
+        self.name = name
+        self.setup = setup
+        self.docker = docker     # run once per transport
+        self.rounds = rounds     # cap for slow cases
+        self.ops = ops           # operations per timed call, for throughput
+        self.rss = rss           # 'self' or 'children' (the backend process)
+
+
+def case(name, **options):
+    def register(setup):
+        CASES[name] = Case(name, setup, **options)
+        return setup
+    return register
+
+
+def _require(response):
+    data = json.loads(response)
+    if not data.get("success"):
+        raise RuntimeError(data.get("error") or response[:200])
+    return data
+
+
+# -- docker ----------------------------------------------------------------
+
+def _docker():
+    from docker import DockerManager
+    return DockerManager()
+
+
+@case('docker.list_images', docker=True)
+def _list_images(args):
+    manager = _docker()
+    return lambda: manager.list_images(fresh=True)
+
+
+@case('docker.list_images.cached', docker=True)
+def _list_images_cached(args):
+    manager = _docker()
+    return manager.list_images
+
+
+@case('docker.list_containers', docker=True)
+def _list_containers(args):
+    manager = _docker()
+    return lambda: manager.list_containers(fresh=True)
+
+
+@case('docker.list_running_containers', docker=True)
+def _list_running_containers(args):
+    manager = _docker()
+    return lambda: manager.list_running_containers(fresh=True)
+
+
+@case('docker.search_image_local', docker=True)
+def _search_image_local(args):
+    manager = _docker()
+    return lambda: manager.search_image_local('ngin', 50)
+
+
+@case('docker.get_container_stats', docker=True)
+def _get_container_stats(args):
+    manager = _docker()
+    return lambda: manager.get_container_stats('bench-0')
+
+
+@case('docker.get_containers_stats', docker=True)
+def _get_containers_stats(args):
+    manager = _docker()
+    return lambda: manager.get_containers_stats('all')
+
+
+@case('docker.get_container_logs', docker=True)
+def _get_container_logs(args):
+    manager = _docker()
+    return lambda: manager.get_container_logs('bench-0', args.log_tail)
+
+
+@case('docker.get_container_logs.filtered', docker=True)
+def _get_container_logs_filtered(args):
+    manager = _docker()
+    return lambda: manager.get_container_logs('bench-0', args.log_tail, levels=['warn', 'error'])
+
+
+# -- qemu ------------------------------------------------------------------
+
+def _qemu_with_vms(count):
+    from qemu import Qemu
+    qemu = Qemu()
+    started = []
+    for n in range(count):
+        result = _require(qemu.run_cmd([qemu.qemu_binary, '-name', f'bench-{n}', '-smp', '2', '-m', '64',
+                                        '-display', 'none'], name=f'bench-{n}'))
+        started.append(result["pid"])
+    # QMP sockets come up a moment after the process
+    deadline = time.monotonic() + 10
+    for entry in qemu.registry.entries():
+        while not os.path.exists(entry["qmp"][len('unix:'):]) and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def teardown():
+        for pid in started:
+            qemu.stop_vm(pid, force=True)
+    return qemu, teardown
+
+
+@case('qemu.list_running_vms')
+def _list_running_vms(args):
+    qemu, teardown = _qemu_with_vms(args.vms)
+    return qemu.list_running_vms, teardown
+
+
+@case('qemu.get_vm_metrics')
+def _get_vm_metrics(args):
+    qemu, teardown = _qemu_with_vms(args.vms)
+    for _ in range(3):
+        qemu.metrics.record(qemu.metrics.sample())
+    return lambda: qemu.get_vm_metrics(points=60), teardown
+
+
+@case('qemu.list_disk_images')
+def _list_disk_images(args):
+    from qemu import Qemu
+    qemu = Qemu()
+    directory = tempfile.mkdtemp(prefix='disks-', dir=os.environ['DOCKER_VM_MANAGER_HOME'])
+    first = os.path.join(directory, 'disk-0.qcow2')
+    _require(qemu.create_disk_image(first, '20G'))
+    for n in range(1, args.disks):
+        shutil.copyfile(first, os.path.join(directory, f'disk-{n}.qcow2'))
+    return lambda: qemu.list_disk_images(directory)
+
+
+@case('qemu.create_disk_image', rounds=20)
+def _create_disk_image(args):
+    from qemu import Qemu
+    qemu = Qemu()
+    directory = tempfile.mkdtemp(prefix='created-', dir=os.environ['DOCKER_VM_MANAGER_HOME'])
+    counter = iter(range(10 ** 9))
+    return lambda: qemu.create_disk_image(os.path.join(directory, f'disk-{next(counter)}.qcow2'), '10G')
+
+
+# -- api.py ------------------------------------------------------------------
+
+@case('api.oneshot.list_containers', rounds=10, rss='children')
+def _oneshot(args):
+    command = [sys.executable, API, '--service', 'docker', '--action', 'list_containers']
+    return lambda: subprocess.run(command, capture_output=True, text=True, check=True).stdout
+
+
+class _RpcClient:
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, API, '--serve'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def call_many(self, method, params, count):
+        """Send `count` requests at once and wait for every answer"""
+        ids = set()
+        with self.lock:
+            for _ in range(count):
+                self.next_id += 1
+                ids.add(self.next_id)
+                self.process.stdin.write(json.dumps({"jsonrpc": "2.0", "id": self.next_id, "method": method,
+                                                     "params": params}) + '\n')
+            self.process.stdin.flush()
+            result = None
+            while ids:
+                message = json.loads(self.process.stdout.readline())
+                if message.get("id") in ids:
+                    ids.discard(message["id"])
+                    result = message.get("result") or {"success": False, "error": message.get("error")}
+                    if not result.get("success"):
+                        break
+        return json.dumps(result)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=30)
+
+
+@case('api.rpc.list_containers', rss='children')
+def _rpc_sequential(args):
+    client = _RpcClient()
+    return lambda: client.call_many('docker.list_containers', {}, 1), client.close
+
+
+@case('api.rpc.get_containers_stats.concurrent', ops=RPC_CONCURRENCY, rss='children')
+def _rpc_concurrent(args):
+    client = _RpcClient()
+    return lambda: client.call_many('docker.get_containers_stats', {"ids": "all"}, RPC_CONCURRENCY), client.close
+
+
+# -- worker ------------------------------------------------------------------
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def _rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_worker(args):
+    sys.path.insert(0, BACKEND)
+    spec = CASES[args.worker]
+    prepared = spec.setup(args)
+    bench, teardown = prepared if isinstance(prepared, tuple) else (prepared, None)
+    rounds = min(args.rounds, spec.rounds) if spec.rounds else args.rounds
+    try:
+        for _ in range(args.warmup):
+            _require(bench())
+        samples = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+            call_started = time.perf_counter()
+            _require(bench())
+            samples.append((time.perf_counter() - call_started) * 1000)
+        elapsed = time.perf_counter() - started
+    finally:
+        if teardown is not None:
+            teardown()
+    samples.sort()
+    result = {
+        "rounds": rounds,
+        "p50_ms": round(_percentile(samples, 0.50), 3),
+        "p90_ms": round(_percentile(samples, 0.90), 3),
+        "p99_ms": round(_percentile(samples, 0.99), 3),
+        "max_ms": round(samples[-1], 3),
+        "ops_per_s": round(rounds * spec.ops / elapsed, 1),
+        "peak_rss_mb": _rss_mb(resource.RUSAGE_CHILDREN if spec.rss == 'children' else resource.RUSAGE_SELF),
+    }
+    sys.stdout.write(json.dumps(result) + '\n')
+    return 0
+
+
+# -- driver ------------------------------------------------------------------
+
+def _sizes(args):
+    return {"containers": args.containers, "images": args.images, "vms": args.vms, "disks": args.disks,
+            "log_lines": args.log_lines, "log_tail": args.log_tail, "latency_ms": args.latency_ms}
+
+
+def _start_engine(scratch, env):
+    socket_path = os.path.join(scratch, 'docker.sock')
+    process = subprocess.Popen([sys.executable, os.path.join(FAKES, 'engine.py'), '--socket', socket_path],
+                               env=env, stdout=subprocess.PIPE, text=True)
+    if process.stdout.readline().strip() != 'ready':
+        process.kill()
+        raise RuntimeError("Engine stand-in did not start")
+    return process, socket_path
+
+
+def _selected(args):
+    jobs = []
+    for name, spec in CASES.items():
+        if args.only and not any(part in name for part in args.only.split(',')):
+            continue
+        for transport in (args.transports if spec.docker else (None,)):
+            jobs.append((name, transport))
+    return jobs
+
+
+def _key(name, transport):
+    return f'{name}[{transport}]' if transport else name
+
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    """{key: verdict} for every case in both runs; verdicts other than 'ok' are regressions"""
+    verdicts = {}
+    for key, current in results.items():
+        base = (baseline.get("results") or {}).get(key)
+        if base is None or "error" in current or "error" in base:
+            continue
+        problems = []
+        for field in ('p50_ms', 'p90_ms'):
+            if current[field] > base[field] * (1 + tolerance) and current[field] - base[field] > NOISE_MS:
+                problems.append(f'{field} {base[field]} -> {current[field]}')
+        if current["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_tolerance) and \
+                current["peak_rss_mb"] - base["peak_rss_mb"] > NOISE_RSS_MB:
+            problems.append(f'rss {base["peak_rss_mb"]} -> {current["peak_rss_mb"]} MB')
+        verdicts[key] = '; '.join(problems) or 'ok'
+    return verdicts
+
+
+def _print_table(results, verdicts, baseline):
+    print(f'{"case":<48} {"rounds":>6} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"ops/s":>9} {"rss MB":>7}  baseline')
+    for key, result in results.items():
+        if "error" in result:
+            print(f'{key:<48} error: {result["error"]}')
+            continue
+        note = ''
+        base = (baseline or {}).get("results", {}).get(key)
+        if base and "error" not in base:
+            change = (result["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100 if base["p50_ms"] else 0
+            verdict = verdicts.get(key, 'ok')
+            note = f'{change:+.0f}%' + ('' if verdict == 'ok' else f'  REGRESSION: {verdict}')
+        print(f'{key:<48} {result["rounds"]:>6} {result["p50_ms"]:>9.2f} {result["p90_ms"]:>9.2f} '
+              f'{result["p99_ms"]:>9.2f} {result["ops_per_s"]:>9.1f} {result["peak_rss_mb"]:>7.1f}  {note}')
+
+
+def run_all(args):
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("sizes") != _sizes(args):
+            print(f'warning: baseline was recorded with {baseline.get("sizes")}, this run uses {_sizes(args)}',
+                  file=sys.stderr)
+
+    scratch = tempfile.mkdtemp(prefix='backend-bench-')
+    env = dict(os.environ)
+    env.update({
+        "PATH": FAKES + os.pathsep + env.get("PATH", ''),
+        "BENCH_CONTAINERS": str(args.containers),
+        "BENCH_IMAGES": str(args.images),
+        "BENCH_LOG_LINES": str(args.log_lines),
+        "BENCH_LATENCY_MS": str(args.latency_ms),
+        "PYTHONDONTWRITEBYTECODE": '1',
+    })
+    engine = None
+    results = {}
+    try:
+        jobs = _selected(args)
+        if any(transport == 'engine' for _, transport in jobs):
+            engine, socket_path = _start_engine(scratch, env)
+        for name, transport in jobs:
+            key = _key(name, transport)
+            worker_env = dict(env, DOCKER_VM_MANAGER_HOME=os.path.join(scratch, key.replace('[', '-').strip(']')))
+            os.makedirs(worker_env["DOCKER_VM_MANAGER_HOME"])
+            worker_env["DOCKER_HOST"] = 'unix://' + (socket_path if transport == 'engine'
+                                                     else os.path.join(scratch, 'absent.sock'))
+            command = [sys.executable, os.path.abspath(__file__), '--worker', name] + args.passthrough
+            try:
+                finished = subprocess.run(command, env=worker_env, capture_output=True, text=True,
+                                          timeout=WORKER_TIMEOUT)
+                lines = finished.stdout.strip().splitlines()
+                if finished.returncode != 0 or not lines:
+                    error = (finished.stderr.strip().splitlines() or ['worker failed'])[-1]
+                    results[key] = {"error": error}
+                else:
+                    results[key] = json.loads(lines[-1])
+            except subprocess.TimeoutExpired:
+                results[key] = {"error": f"timed out after {WORKER_TIMEOUT} s"}
+            if args.verbose:
+                print(key, results[key], file=sys.stderr)
+    finally:
+        if engine is not None:
+            engine.terminate()
+            engine.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    verdicts = compare(results, baseline, args.tolerance, args.rss_tolerance) if baseline else {}
+    _print_table(results, verdicts, baseline)
+
+    report = {"sizes": _sizes(args), "rounds": args.rounds, "python": sys.version.split()[0],
+              "platform": sys.platform, "recorded": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+              "results": results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'baseline written to {args.save_baseline}')
+
+    failed = [key for key, result in results.items() if "error" in result]
+    regressed = [key for key, verdict in verdicts.items() if verdict != 'ok']
+    if failed:
+        print(f'{len(failed)} case(s) failed: {", ".join(failed)}')
+    if regressed:
+        print(f'{len(regressed)} regression(s) against {args.baseline}: {", ".join(regressed)}')
+    return 1 if failed or regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the backend against fake docker/QEMU binaries')
+    parser.add_argument('--only', help='Comma-separated substrings of case names to run')
+    parser.add_argument('--transports', default=','.join(TRANSPORTS),
+                        help='Docker transports to run: engine, cli or both (default: both)')
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--containers', type=int, default=200)
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--vms', type=int, default=8)
+    parser.add_argument('--disks', type=int, default=200)
+    parser.add_argument('--log-lines', type=int, default=2000, help='Log history per container')
+    parser.add_argument('--log-tail', type=int, default=500, help='Lines requested per log read')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every fake CLI run / API request')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--baseline', help='Compare against a results file and exit 1 on regressions')
+    parser.add_argument('--save-baseline', help='Write the results as a new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50/p90 slowdown (0.25 = 25%%)')
+    parser.add_argument('--rss-tolerance', type=float, default=0.20, help='Allowed peak RSS growth')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.transports = [t for t in args.transports.split(',') if t]
+    unknown = set(args.transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f'unknown transport: {", ".join(sorted(unknown))}')
+
+    if args.worker:
+        return run_worker(args)
+    args.passthrough = ['--rounds', str(args.rounds), '--warmup', str(args.warmup), '--vms', str(args.vms),
+                        '--disks', str(args.disks), '--log-tail', str(args.log_tail)]
+    return run_all(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
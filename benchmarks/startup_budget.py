@@ -0,0 +1,173 @@
+"""
+Cold-start budget for one-shot api.py invocations, measured with -X importtime.
+
+    python benchmarks/startup_budget.py                  # exit 1 if a budget is exceeded
+    python benchmarks/startup_budget.py --update         # record new budgets from this machine
+
+Without the resident backend the Electron app starts a fresh api.py process
+for every call, so what api.py imports before it can answer is paid on every
+click. Each scenario runs one action against the fakes in benchmarks/fakes
+(DOCKER_HOST points at a missing socket, as on a machine without the daemon)
+under `python -X importtime`, and is checked for:
+
+  - total import time (best of --runs runs, bytecode already cached: the
+    fastest run is the one least disturbed by the rest of the machine)
+  - number of modules imported
+  - modules it must not import at all: a Docker listing has no use for QEMU
+    or psutil, a disk listing none for the Docker Engine client or the disk
+    job pool
+
+The forbidden lists live here because they follow from how the backend is
+split into modules; the numeric budgets live in startup_budget.json because
+they depend on the machine and Python version they were recorded with.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKES = os.path.join(HERE, 'fakes')
+API = os.path.join(HERE, '..', 'backend', 'api.py')
+BUDGETS = os.path.join(HERE, 'startup_budget.json')
+
+# Only needed by --serve, --profile or --metrics-port, never by a plain one-shot call
+COMMON_FORBIDDEN = ('concurrent.futures', 'platform', 'cProfile', 'socketserver', 'http.server')
+
+SCENARIOS = {
+    "docker.list_images": {
+        "call": ('docker', 'list_images', {}),
+        "forbidden": COMMON_FORBIDDEN + ('qemu', 'qemu_caps', 'qmp', 'psutil', 'docker_events', 'docker_bulk',
+                                         'docker_metrics', 'docker_build', 'docker_pull'),
+    },
+    "qemu.list_disk_images": {
+        "call": ('qemu', 'list_disk_images', {"directory": '{home}'}),
+        "forbidden": COMMON_FORBIDDEN + ('docker', 'docker_engine', 'http.client', 'disk_jobs', 'uuid'),
+    },
+    "backend.metrics": {
+        "call": ('backend', 'metrics', {}),
+        "forbidden": COMMON_FORBIDDEN + ('docker', 'qemu', 'http.client'),
+    },
+}
+
+# Headroom --update leaves above what this machine measured
+TIME_HEADROOM = 0.5
+MODULE_HEADROOM = 10
+
+
+def parse_importtime(stderr):
+    """Return (total import ms, {module: cumulative ms}) from -X importtime output"""
+    total_us = 0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented two spaces per level below the top-level one
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative)
+        modules[name.strip()] = int(cumulative) / 1000
+    return total_us / 1000, modules
+
+
+def measure(name, env, home, runs):
+    service, action, args = SCENARIOS[name]["call"]
+    args = json.loads(json.dumps(args).replace('{home}', home))
+    command = [sys.executable, '-X', 'importtime', API, '--service', service, '--action', action,
+               '--args', json.dumps(args)]
+    totals = []
+    modules = {}
+    # The first run fills the bytecode cache and is not counted
+    for _ in range(runs + 1):
+        finished = subprocess.run(command, env=env, capture_output=True, text=True, timeout=60)
+        if not finished.stdout.startswith('{"success": true'):
+            raise RuntimeError(f'{name} failed: {finished.stdout.strip() or finished.stderr.strip()[-300:]}')
+        total, modules = parse_importtime(finished.stderr)
+        totals.append(total)
+    return {"import_ms": round(min(totals[1:]), 2), "modules": len(modules),
+            "imported": sorted(modules)}
+
+
+def check(name, measured, budget):
+    problems = []
+    if budget:
+        if measured["import_ms"] > budget["max_import_ms"]:
+            problems.append(f'import time {measured["import_ms"]:.1f} ms > {budget["max_import_ms"]} ms')
+        if measured["modules"] > budget["max_modules"]:
+            problems.append(f'{measured["modules"]} modules > {budget["max_modules"]}')
+    leaked = [module for module in SCENARIOS[name]["forbidden"] if module in measured["imported"]]
+    if leaked:
+        problems.append(f'imports {", ".join(leaked)}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check api.py cold-start import cost against a budget')
+    parser.add_argument('--only', help='Comma-separated substrings of scenario names to run')
+    parser.add_argument('--runs', type=int, default=5, help='Measured runs per scenario (the fastest counts)')
+    parser.add_argument('--budgets', default=BUDGETS, help='Budget file (default: %(default)s)')
+    parser.add_argument('--update', action='store_true', help='Write budgets from this run, with headroom')
+    parser.add_argument('--verbose', action='store_true', help='List the modules each scenario imports')
+    args = parser.parse_args()
+
+    budgets = {}
+    if os.path.exists(args.budgets) and not args.update:
+        with open(args.budgets) as f:
+            recorded = json.load(f)
+        budgets = recorded.get("scenarios", {})
+        if recorded.get("python") != sys.version.split()[0]:
+            print(f'warning: budgets were recorded with Python {recorded.get("python")}, '
+                  f'this is {sys.version.split()[0]}', file=sys.stderr)
+
+    names = [name for name in SCENARIOS
+             if not args.only or any(part in name for part in args.only.split(','))]
+    scratch = tempfile.mkdtemp(prefix='backend-startup-')
+    env = dict(os.environ)
+    env.update({
+        "PATH": FAKES + os.pathsep + env.get("PATH", ''),
+        "DOCKER_HOST": 'unix://' + os.path.join(scratch, 'absent.sock'),
+        "DOCKER_VM_MANAGER_HOME": scratch,
+        "PYTHONPYCACHEPREFIX": os.path.join(scratch, 'pycache'),
+    })
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    results = {}
+    failed = []
+    try:
+        print(f'{"scenario":<28}{"import ms":>12}{"budget":>10}{"modules":>10}{"budget":>10}  verdict')
+        for name in names:
+            measured = measure(name, env, scratch, args.runs)
+            budget = budgets.get(name)
+            problems = check(name, measured, budget)
+            results[name] = measured
+            if problems:
+                failed.append(name)
+            print(f'{name:<28}{measured["import_ms"]:>12.1f}{budget["max_import_ms"] if budget else "-":>10}'
+                  f'{measured["modules"]:>10}{budget["max_modules"] if budget else "-":>10}  '
+                  f'{"; ".join(problems) or "ok"}')
+            if args.verbose:
+                print('    ' + ' '.join(measured["imported"]))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.update:
+        report = {"python": sys.version.split()[0], "platform": sys.platform,
+                  "recorded": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                  "scenarios": {name: {"max_import_ms": round(measured["import_ms"] * (1 + TIME_HEADROOM), 1),
+                                       "max_modules": measured["modules"] + MODULE_HEADROOM}
+                                for name, measured in results.items()}}
+        with open(args.budgets, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'budgets written to {args.budgets}')
+    if failed:
+        print(f'{len(failed)} scenario(s) over budget: {", ".join(failed)}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -265,8 +265,165 @@ app.on('window-all-closed', () => {
   }
 });
 
-// Execute Python API call
+// Resident Python backend (api.py --serve) shared by all IPC calls.
+// Requests are multiplexed over its stdin/stdout as JSON-RPC lines, so the
+// interpreter, imports and manager objects are only paid for once.
+let backendDaemon = null;
+let backendRequestId = 0;
+let backendRestarts = 0;
+const backendPending = new Map();
+const MAX_BACKEND_RESTARTS = 3;
+// Actions that only read state and can safely run again after a backend crash.
+// Anything else may already have happened (a created container, a started VM),
+// so it is reported as unknown rather than repeated.
+const REPLAYABLE_ACTIONS = new Set([
+  'docker.list_images', 'docker.list_containers', 'docker.list_running_containers',
+  'docker.get_container_logs', 'docker.get_container_stats', 'docker.get_containers_stats',
+  'docker.get_metrics', 'docker.cache_stats', 'docker.search_dockerhub', 'docker.search_image_local',
+  'docker.get_inventory',
+  'qemu.list_running_vms', 'qemu.vm_status', 'qemu.get_capabilities', 'qemu.list_snapshots',
+  'qemu.scheduler_status', 'qemu.get_vm_metrics', 'qemu.list_disk_jobs', 'qemu.inspect_disk',
+  'qemu.list_disk_images', 'qemu.list_base_images',
+  'backend.metrics', 'backend.traces'
+]);
+let inventorySubscribed = false;
+const followedLogs = new Set();
+let metricsInterval = null;
+let vmMetricsInterval = null;
+
+function handleBackendMessage(message) {
+  if (message.id === undefined || message.id === null) {
+    // Server push (e.g. docker.inventory) -> renderer channel docker:inventory
+    if (message.method && mainWindow && !mainWindow.isDestroyed()) {
+      mainWindow.webContents.send(message.method.replace('.', ':'), message.params);
+    }
+    return;
+  }
+  const pending = backendPending.get(message.id);
+  if (!pending) {
+    return;
+  }
+  backendPending.delete(message.id);
+  backendRestarts = 0;
+  if (message.error) {
+    pending.resolve({ success: false, error: message.error.message });
+  } else {
+    pending.resolve(message.result);
+  }
+}
+
+function startBackendDaemon() {
+  const apiDir = path.dirname(apiScriptPath);
+  const child = spawn(pythonExecutable, [apiScriptPath, '--serve'], {
+    cwd: apiDir
+  });
+  let buffer = '';
+
+  child.stdout.on('data', (data) => {
+    buffer += data.toString();
+    let newline;
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (!line) {
+        continue;
+      }
+      try {
+        handleBackendMessage(JSON.parse(line));
+      } catch (e) {
+        console.error('Invalid message from backend:', line);
+      }
+    }
+  });
+
+  child.stderr.on('data', (data) => {
+    console.error('Backend:', data.toString());
+  });
+
+  const onGone = () => {
+    if (backendDaemon !== child) {
+      return;
+    }
+    backendDaemon = null;
+    // Re-run in-flight reads through the one-shot CLI; mutations may or may not
+    // have completed, so the renderer is told to refresh instead
+    const pending = Array.from(backendPending.values());
+    backendPending.clear();
+    for (const request of pending) {
+      if (REPLAYABLE_ACTIONS.has(`${request.service}.${request.action}`)) {
+        execPythonAPIOnce(request.service, request.action, request.args)
+          .then(request.resolve, request.reject);
+      } else {
+        request.resolve({
+          success: false,
+          error: `Backend restarted, operation state unknown (${request.service}.${request.action}); refresh to see the current state`
+        });
+      }
+    }
+  };
+  child.on('exit', onGone);
+  child.on('error', (error) => {
+    console.error('Backend daemon error:', error);
+    onGone();
+  });
+  child.stdin.on('error', onGone);
+
+  backendDaemon = child;
+
+  // A fresh backend has no subscriptions; renew the ones the renderer holds
+  if (inventorySubscribed) {
+    execPythonAPI('docker', 'subscribe_events').then((result) => {
+      if (result && result.success && mainWindow && !mainWindow.isDestroyed()) {
+        mainWindow.webContents.send('docker:inventory', result.data);
+      }
+    });
+  }
+  if (metricsInterval) {
+    execPythonAPI('docker', 'start_metrics', { interval: metricsInterval });
+  }
+  if (vmMetricsInterval) {
+    execPythonAPI('qemu', 'start_vm_metrics', { interval: vmMetricsInterval });
+  }
+  // tail 0: only lines logged from now on, the renderer already shows the rest
+  for (const id of followedLogs) {
+    execPythonAPI('docker', 'follow_logs', { id, tail: 0 });
+  }
+  // Conversions interrupted by a crash start over (qemu-img cannot continue half way)
+  execPythonAPI('qemu', 'resume_disk_jobs');
+  return child;
+}
+
+function stopBackendDaemon() {
+  if (backendDaemon) {
+    const child = backendDaemon;
+    backendDaemon = null;
+    child.stdin.end();
+    child.kill();
+  }
+}
+
+app.on('will-quit', stopBackendDaemon);
+
+// Execute Python API call, preferring the resident backend
 function execPythonAPI(service, action, args = {}) {
+  if (!backendDaemon && backendRestarts < MAX_BACKEND_RESTARTS) {
+    backendRestarts++;
+    startBackendDaemon();
+  }
+  if (!backendDaemon) {
+    return execPythonAPIOnce(service, action, args);
+  }
+
+  return new Promise((resolve, reject) => {
+    const id = ++backendRequestId;
+    backendPending.set(id, { service, action, args, resolve, reject });
+    const request = { jsonrpc: '2.0', id, method: `${service}.${action}`, params: args };
+    backendDaemon.stdin.write(JSON.stringify(request) + '\n');
+  });
+}
+
+// Execute Python API call in a fresh process (fallback when the daemon is unavailable)
+function execPythonAPIOnce(service, action, args = {}) {
   return new Promise((resolve, reject) => {
     const argsJson = JSON.stringify(args);
     // Set working directory to the directory containing api.py so Python can find docker.py and qemu.py
@@ -363,12 +520,23 @@ ipcMain.handle('docker:createDockerfile', async (event, path, code) => {
   return await execPythonAPI('docker', 'create_dockerfile', { path, code });
 });
 
-ipcMain.handle('docker:buildImage', async (event, buildPath, tag) => {
-  return await execPythonAPI('docker', 'build_image', { path: buildPath, tag });
+// options: { cache_from, no_cache, target, build_args }
+ipcMain.handle('docker:buildImage', async (event, buildPath, tag, options = {}) => {
+  return await execPythonAPI('docker', 'build_image', { ...options, path: buildPath, tag });
+});
+
+ipcMain.handle('docker:stopContainer', async (event, id, timeout) => {
+  return await execPythonAPI('docker', 'stop_container', { id, timeout });
 });
 
-ipcMain.handle('docker:stopContainer', async (event, id) => {
-  return await execPythonAPI('docker', 'stop_container', { id });
+ipcMain.handle('docker:restartContainer', async (event, id, timeout) => {
+  return await execPythonAPI('docker', 'restart_container', { id, timeout });
+});
+
+// action: 'start' | 'stop' | 'restart' | 'delete'
+// targets: { ids?: string[], labels?: string[] | object, timeout?: number, force?: boolean, max_workers?: number }
+ipcMain.handle('docker:bulkContainers', async (event, action, targets = {}) => {
+  return await execPythonAPI('docker', `${action}_containers`, targets);
 });
 
 ipcMain.handle('docker:startContainer', async (event, id) => {
@@ -387,33 +555,86 @@ ipcMain.handle('docker:deleteImage', async (event, id, force = false) => {
   return await execPythonAPI('docker', 'delete_image', { id, force });
 });
 
-ipcMain.handle('docker:getContainerLogs', async (event, id, tail = 100) => {
-  return await execPythonAPI('docker', 'get_container_logs', { id, tail });
+// filters (optional): { cursor, pattern, levels, since, until }
+ipcMain.handle('docker:getContainerLogs', async (event, id, tail = 100, filters = {}) => {
+  return await execPythonAPI('docker', 'get_container_logs', { ...filters, id, tail });
+});
+
+ipcMain.handle('docker:followLogs', async (event, id, tail = 100, filters = {}) => {
+  const result = await execPythonAPI('docker', 'follow_logs', { ...filters, id, tail });
+  if (result && result.success) {
+    followedLogs.add(id);
+  }
+  return result;
+});
+
+ipcMain.handle('docker:unfollowLogs', async (event, id) => {
+  followedLogs.delete(id);
+  return await execPythonAPI('docker', 'unfollow_logs', { id });
 });
 
 ipcMain.handle('docker:getContainerStats', async (event, id) => {
   return await execPythonAPI('docker', 'get_container_stats', { id });
 });
 
-ipcMain.handle('docker:searchDockerhub', async (event, name) => {
-  return await execPythonAPI('docker', 'search_dockerhub', { name });
+// ids: array of container IDs/names, or 'all' for every running container
+ipcMain.handle('docker:getContainersStats', async (event, ids = 'all') => {
+  return await execPythonAPI('docker', 'get_containers_stats', { ids });
+});
+
+ipcMain.handle('docker:startMetrics', async (event, interval = 5) => {
+  metricsInterval = interval;
+  return await execPythonAPI('docker', 'start_metrics', { interval });
+});
+
+// range (optional): { start, end, points }
+ipcMain.handle('docker:getMetrics', async (event, id, range = {}) => {
+  return await execPythonAPI('docker', 'get_metrics', { ...range, id });
+});
+
+ipcMain.handle('docker:searchDockerhub', async (event, name, options = {}) => {
+  return await execPythonAPI('docker', 'search_dockerhub', { name, ...options });
 });
 
 ipcMain.handle('docker:pullImage', async (event, name) => {
   return await execPythonAPI('docker', 'pull_image', { name });
 });
 
-ipcMain.handle('docker:searchImageLocal', async (event, name) => {
-  return await execPythonAPI('docker', 'search_image_local', { name });
+ipcMain.handle('docker:pullImages', async (event, names) => {
+  return await execPythonAPI('docker', 'pull_images', { names });
+});
+
+ipcMain.handle('docker:cancelPull', async (event, name) => {
+  return await execPythonAPI('docker', 'cancel_pull', { name });
+});
+
+ipcMain.handle('docker:searchImageLocal', async (event, name, limit) => {
+  return await execPythonAPI('docker', 'search_image_local', { name, limit });
+});
+
+ipcMain.handle('docker:cacheStats', async (event, clear = false) => {
+  return await execPythonAPI('docker', 'cache_stats', { clear });
+});
+
+ipcMain.handle('docker:subscribeInventory', async () => {
+  inventorySubscribed = true;
+  return await execPythonAPI('docker', 'subscribe_events');
+});
+
+ipcMain.handle('docker:unsubscribeInventory', async () => {
+  inventorySubscribed = false;
+  return await execPythonAPI('docker', 'unsubscribe_events');
 });
 
 // IPC Handlers for QEMU
-ipcMain.handle('qemu:startVM', async (event, cpuCores, ramSize, diskPath, isoPath) => {
+// launch: { name?: string, profile?: 'compat' | 'performance', options?: object, dry_run?: boolean }
+ipcMain.handle('qemu:startVM', async (event, cpuCores, ramSize, diskPath, isoPath, launch = {}) => {
   return await execPythonAPI('qemu', 'start_virtual_machine', { 
     cpu_cores: cpuCores, 
     ram_size: ramSize, 
     disk_path: diskPath, 
-    iso_path: isoPath 
+    iso_path: isoPath,
+    ...launch
   });
 });
 
@@ -425,18 +646,143 @@ ipcMain.handle('qemu:deleteVM', async (event, diskPath) => {
   return await execPythonAPI('qemu', 'delete_vm', { disk_path: diskPath });
 });
 
-ipcMain.handle('qemu:listRunningVMs', async () => {
-  return await execPythonAPI('qemu', 'list_running_vms');
+ipcMain.handle('qemu:listRunningVMs', async (event, legacy = false) => {
+  return await execPythonAPI('qemu', 'list_running_vms', { legacy });
+});
+
+ipcMain.handle('qemu:vmStatus', async (event, vm) => {
+  return await execPythonAPI('qemu', 'vm_status', { vm });
+});
+
+// Overcommit policy, committed resources and queued launches
+ipcMain.handle('qemu:schedulerStatus', async () => {
+  return await execPythonAPI('qemu', 'scheduler_status');
+});
+
+ipcMain.handle('qemu:setSchedulerPolicy', async (event, policy) => {
+  return await execPythonAPI('qemu', 'set_scheduler_policy', { policy });
+});
+
+ipcMain.handle('qemu:cancelQueuedVM', async (event, queueId) => {
+  return await execPythonAPI('qemu', 'cancel_queued_vm', { queue_id: queueId });
+});
+
+ipcMain.handle('qemu:startVMMetrics', async (event, interval = 5) => {
+  vmMetricsInterval = interval;
+  return await execPythonAPI('qemu', 'start_vm_metrics', { interval });
+});
+
+ipcMain.handle('qemu:stopVMMetrics', async () => {
+  vmMetricsInterval = null;
+  return await execPythonAPI('qemu', 'stop_vm_metrics');
+});
+
+// range (optional): { start, end, points }
+ipcMain.handle('qemu:getVMMetrics', async (event, vm = null, range = {}) => {
+  return await execPythonAPI('qemu', 'get_vm_metrics', { ...range, vm });
 });
 
-ipcMain.handle('qemu:stopVM', async (event, pid) => {
-  return await execPythonAPI('qemu', 'stop_vm', { pid });
+// options: { force?: boolean, timeout?: number }
+ipcMain.handle('qemu:stopVM', async (event, vm, options = {}) => {
+  return await execPythonAPI('qemu', 'stop_vm', { vm, ...options });
 });
 
 ipcMain.handle('qemu:createDiskImage', async (event, imagePath, size) => {
   return await execPythonAPI('qemu', 'create_disk_image', { path: imagePath, size });
 });
 
+// Snapshots (qcow2 internal, including RAM state)
+ipcMain.handle('qemu:saveSnapshot', async (event, vm, tag = null, stop = false) => {
+  return await execPythonAPI('qemu', 'save_snapshot', { vm, tag, stop });
+});
+
+ipcMain.handle('qemu:restoreSnapshot', async (event, vm, tag) => {
+  return await execPythonAPI('qemu', 'restore_snapshot', { vm, tag });
+});
+
+ipcMain.handle('qemu:listSnapshots', async (event, target) => {
+  return await execPythonAPI('qemu', 'list_snapshots', { target });
+});
+
+ipcMain.handle('qemu:deleteSnapshot', async (event, target, tag) => {
+  return await execPythonAPI('qemu', 'delete_snapshot', { target, tag });
+});
+
+ipcMain.handle('qemu:resumeVM', async (event, diskPath, tag = null, name = null) => {
+  return await execPythonAPI('qemu', 'resume_vm', { disk_path: diskPath, tag, name });
+});
+
+// Background conversion/compaction; progress arrives as 'qemu:disk_job'
+ipcMain.handle('qemu:convertDisk', async (event, source, output = null, options = {}) => {
+  return await execPythonAPI('qemu', 'convert_disk', { ...options, source, output });
+});
+
+ipcMain.handle('qemu:compactDisk', async (event, imagePath, options = {}) => {
+  return await execPythonAPI('qemu', 'compact_disk', { ...options, path: imagePath });
+});
+
+ipcMain.handle('qemu:listDiskJobs', async (event, id = null) => {
+  return await execPythonAPI('qemu', 'list_disk_jobs', { id });
+});
+
+ipcMain.handle('qemu:cancelDiskJob', async (event, id) => {
+  return await execPythonAPI('qemu', 'cancel_disk_job', { id });
+});
+
+ipcMain.handle('qemu:inspectDisk', async (event, imagePath) => {
+  return await execPythonAPI('qemu', 'inspect_disk', { path: imagePath });
+});
+
+ipcMain.handle('qemu:listDiskImages', async (event, directory) => {
+  return await execPythonAPI('qemu', 'list_disk_images', { directory });
+});
+
+// Golden images and copy-on-write overlays
+ipcMain.handle('qemu:listBaseImages', async () => {
+  return await execPythonAPI('qemu', 'list_base_images');
+});
+
+ipcMain.handle('qemu:addBaseImage', async (event, imagePath, name, copy = false) => {
+  return await execPythonAPI('qemu', 'add_base_image', { path: imagePath, name, copy });
+});
+
+ipcMain.handle('qemu:removeBaseImage', async (event, base, options = {}) => {
+  return await execPythonAPI('qemu', 'remove_base_image', { base, ...options });
+});
+
+ipcMain.handle('qemu:createOverlayDisk', async (event, base, imagePath, size) => {
+  return await execPythonAPI('qemu', 'create_overlay_disk', { base, path: imagePath, size });
+});
+
+ipcMain.handle('qemu:commitOverlay', async (event, imagePath, force = false) => {
+  return await execPythonAPI('qemu', 'commit_overlay', { path: imagePath, force });
+});
+
+ipcMain.handle('qemu:rebaseOverlay', async (event, imagePath, base) => {
+  return await execPythonAPI('qemu', 'rebase_overlay', { path: imagePath, base });
+});
+
+ipcMain.handle('qemu:flattenOverlay', async (event, imagePath) => {
+  return await execPythonAPI('qemu', 'flatten_overlay', { path: imagePath });
+});
+
+ipcMain.handle('qemu:getCapabilities', async (event, refresh = false) => {
+  return await execPythonAPI('qemu', 'get_capabilities', { refresh });
+});
+
+// Backend instrumentation (timings are aggregated inside the resident backend)
+ipcMain.handle('backend:metrics', async (event, format = 'json', reset = false) => {
+  return await execPythonAPI('backend', 'metrics', { format, reset });
+});
+
+ipcMain.handle('backend:traces', async (event, limit) => {
+  return await execPythonAPI('backend', 'traces', { limit });
+});
+
+ipcMain.handle('backend:setProfiling', async (event, directory) => {
+  return await execPythonAPI('backend', 'set_profiling', { directory });
+});
+
 // File dialog handlers
 ipcMain.handle('dialog:openFile', async (event, options) => {
   const result = await dialog.showOpenDialog(mainWindow, options);
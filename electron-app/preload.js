@@ -9,31 +9,83 @@ contextBridge.exposeInMainWorld('electronAPI', {
     listContainers: () => ipcRenderer.invoke('docker:listContainers'),
     listRunningContainers: () => ipcRenderer.invoke('docker:listRunningContainers'),
     createDockerfile: (path, code) => ipcRenderer.invoke('docker:createDockerfile', path, code),
-    buildImage: (path, tag) => ipcRenderer.invoke('docker:buildImage', path, tag),
-    stopContainer: (id) => ipcRenderer.invoke('docker:stopContainer', id),
+    buildImage: (path, tag, options) => ipcRenderer.invoke('docker:buildImage', path, tag, options),
+    onBuildProgress: (callback) => ipcRenderer.on('docker:build_progress', callback),
+    stopContainer: (id, timeout) => ipcRenderer.invoke('docker:stopContainer', id, timeout),
+    restartContainer: (id, timeout) => ipcRenderer.invoke('docker:restartContainer', id, timeout),
+    bulkContainers: (action, targets) => ipcRenderer.invoke('docker:bulkContainers', action, targets),
     startContainer: (id) => ipcRenderer.invoke('docker:startContainer', id),
     createContainer: (image, name, ports, envVars) => 
       ipcRenderer.invoke('docker:createContainer', image, name, ports, envVars),
     deleteContainer: (id, force) => ipcRenderer.invoke('docker:deleteContainer', id, force),
     deleteImage: (id, force) => ipcRenderer.invoke('docker:deleteImage', id, force),
-    getContainerLogs: (id, tail) => ipcRenderer.invoke('docker:getContainerLogs', id, tail),
+    getContainerLogs: (id, tail, filters) => ipcRenderer.invoke('docker:getContainerLogs', id, tail, filters),
+    followLogs: (id, tail, filters) => ipcRenderer.invoke('docker:followLogs', id, tail, filters),
+    unfollowLogs: (id) => ipcRenderer.invoke('docker:unfollowLogs', id),
+    onLog: (callback) => ipcRenderer.on('docker:log', callback),
     getContainerStats: (id) => ipcRenderer.invoke('docker:getContainerStats', id),
-    searchDockerhub: (name) => ipcRenderer.invoke('docker:searchDockerhub', name),
+    getContainersStats: (ids) => ipcRenderer.invoke('docker:getContainersStats', ids),
+    startMetrics: (interval) => ipcRenderer.invoke('docker:startMetrics', interval),
+    getMetrics: (id, range) => ipcRenderer.invoke('docker:getMetrics', id, range),
+    searchDockerhub: (name, options) => ipcRenderer.invoke('docker:searchDockerhub', name, options),
     pullImage: (name) => ipcRenderer.invoke('docker:pullImage', name),
-    searchImageLocal: (name) => ipcRenderer.invoke('docker:searchImageLocal', name)
+    pullImages: (names) => ipcRenderer.invoke('docker:pullImages', names),
+    cancelPull: (name) => ipcRenderer.invoke('docker:cancelPull', name),
+    onPullProgress: (callback) => ipcRenderer.on('docker:pull_progress', callback),
+    searchImageLocal: (name, limit) => ipcRenderer.invoke('docker:searchImageLocal', name, limit),
+    cacheStats: (clear) => ipcRenderer.invoke('docker:cacheStats', clear),
+    subscribeInventory: () => ipcRenderer.invoke('docker:subscribeInventory'),
+    unsubscribeInventory: () => ipcRenderer.invoke('docker:unsubscribeInventory'),
+    onInventory: (callback) => ipcRenderer.on('docker:inventory', callback)
   },
   
   // QEMU API
   qemu: {
-    startVM: (cpuCores, ramSize, diskPath, isoPath) => 
-      ipcRenderer.invoke('qemu:startVM', cpuCores, ramSize, diskPath, isoPath),
+    startVM: (cpuCores, ramSize, diskPath, isoPath, launch) => 
+      ipcRenderer.invoke('qemu:startVM', cpuCores, ramSize, diskPath, isoPath, launch),
     createVMFromConfig: (configFilePath) => 
       ipcRenderer.invoke('qemu:createVMFromConfig', configFilePath),
     deleteVM: (diskPath) => ipcRenderer.invoke('qemu:deleteVM', diskPath),
-    listRunningVMs: () => ipcRenderer.invoke('qemu:listRunningVMs'),
-    stopVM: (pid) => ipcRenderer.invoke('qemu:stopVM', pid),
+    listRunningVMs: (legacy) => ipcRenderer.invoke('qemu:listRunningVMs', legacy),
+    vmStatus: (vm) => ipcRenderer.invoke('qemu:vmStatus', vm),
+    schedulerStatus: () => ipcRenderer.invoke('qemu:schedulerStatus'),
+    setSchedulerPolicy: (policy) => ipcRenderer.invoke('qemu:setSchedulerPolicy', policy),
+    cancelQueuedVM: (queueId) => ipcRenderer.invoke('qemu:cancelQueuedVM', queueId),
+    onVMQueue: (callback) => ipcRenderer.on('qemu:vm_queue', callback),
+    startVMMetrics: (interval) => ipcRenderer.invoke('qemu:startVMMetrics', interval),
+    stopVMMetrics: () => ipcRenderer.invoke('qemu:stopVMMetrics'),
+    getVMMetrics: (vm, range) => ipcRenderer.invoke('qemu:getVMMetrics', vm, range),
+    stopVM: (vm, options) => ipcRenderer.invoke('qemu:stopVM', vm, options),
     createDiskImage: (imagePath, size) => 
-      ipcRenderer.invoke('qemu:createDiskImage', imagePath, size)
+      ipcRenderer.invoke('qemu:createDiskImage', imagePath, size),
+    getCapabilities: (refresh) => ipcRenderer.invoke('qemu:getCapabilities', refresh),
+    saveSnapshot: (vm, tag, stop) => ipcRenderer.invoke('qemu:saveSnapshot', vm, tag, stop),
+    restoreSnapshot: (vm, tag) => ipcRenderer.invoke('qemu:restoreSnapshot', vm, tag),
+    listSnapshots: (target) => ipcRenderer.invoke('qemu:listSnapshots', target),
+    deleteSnapshot: (target, tag) => ipcRenderer.invoke('qemu:deleteSnapshot', target, tag),
+    resumeVM: (diskPath, tag, name) => ipcRenderer.invoke('qemu:resumeVM', diskPath, tag, name),
+    inspectDisk: (imagePath) => ipcRenderer.invoke('qemu:inspectDisk', imagePath),
+    listDiskImages: (directory) => ipcRenderer.invoke('qemu:listDiskImages', directory),
+    convertDisk: (source, output, options) => ipcRenderer.invoke('qemu:convertDisk', source, output, options),
+    compactDisk: (imagePath, options) => ipcRenderer.invoke('qemu:compactDisk', imagePath, options),
+    listDiskJobs: (id) => ipcRenderer.invoke('qemu:listDiskJobs', id),
+    cancelDiskJob: (id) => ipcRenderer.invoke('qemu:cancelDiskJob', id),
+    onDiskJob: (callback) => ipcRenderer.on('qemu:disk_job', callback),
+    listBaseImages: () => ipcRenderer.invoke('qemu:listBaseImages'),
+    addBaseImage: (imagePath, name, copy) => ipcRenderer.invoke('qemu:addBaseImage', imagePath, name, copy),
+    removeBaseImage: (base, options) => ipcRenderer.invoke('qemu:removeBaseImage', base, options),
+    createOverlayDisk: (base, imagePath, size) =>
+      ipcRenderer.invoke('qemu:createOverlayDisk', base, imagePath, size),
+    commitOverlay: (imagePath, force) => ipcRenderer.invoke('qemu:commitOverlay', imagePath, force),
+    rebaseOverlay: (imagePath, base) => ipcRenderer.invoke('qemu:rebaseOverlay', imagePath, base),
+    flattenOverlay: (imagePath) => ipcRenderer.invoke('qemu:flattenOverlay', imagePath)
+  },
+
+  // Backend instrumentation API
+  backend: {
+    metrics: (format, reset) => ipcRenderer.invoke('backend:metrics', format, reset),
+    traces: (limit) => ipcRenderer.invoke('backend:traces', limit),
+    setProfiling: (directory) => ipcRenderer.invoke('backend:setProfiling', directory)
   },
   
   // Dialog API
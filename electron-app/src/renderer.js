@@ -172,6 +172,44 @@ function showSearchResults(results) {
     modal.classList.add('active');
 }
 
+// Per-layer pull progress pushed by the backend while a pull runs
+const pullProgress = {};
+
+function handlePullProgress(event) {
+    if (!event || !event.image) return;
+    const image = event.image;
+    if (['complete', 'failed', 'cancelled'].includes(event.phase)) {
+        delete pullProgress[image];
+        return;
+    }
+    if (!event.layer) return;
+    if (!pullProgress[image]) pullProgress[image] = {};
+    pullProgress[image][event.layer] = event;
+    const layers = Object.values(pullProgress[image]);
+    const done = layers.filter(layer => layer.phase === 'done').length;
+    const downloading = layers.filter(layer => layer.phase === 'downloading');
+    const current = downloading.reduce((sum, layer) => sum + (layer.current || 0), 0);
+    const total = downloading.reduce((sum, layer) => sum + (layer.total || 0), 0);
+    const bytes = total ? `, ${(current / 1048576).toFixed(1)} of ${(total / 1048576).toFixed(1)} MB downloading` : '';
+    updateStatus(`Pulling ${image}: ${done}/${layers.length} layers done${bytes}`);
+}
+
+if (window.electronAPI && window.electronAPI.docker.onPullProgress) {
+    window.electronAPI.docker.onPullProgress((event, progress) => handlePullProgress(progress));
+}
+
+// Step progress pushed by the backend while a build runs
+function handleBuildProgress(event) {
+    if (!event || event.type !== 'step' || !event.step) return;
+    const step = event.step;
+    const state = step.status === 'running' ? '' : ` (${step.cached ? 'cached' : `${step.duration}s`})`;
+    updateStatus(`Building ${event.tag}: #${step.id} ${step.name}${state}`);
+}
+
+if (window.electronAPI && window.electronAPI.docker.onBuildProgress) {
+    window.electronAPI.docker.onBuildProgress((event, progress) => handleBuildProgress(progress));
+}
+
 // Pull image from search results
 async function pullImageFromSearch(imageName) {
     console.log('Pulling image from search:', imageName);
@@ -207,8 +245,146 @@ async function pullImageFromSearch(imageName) {
     }
 }
 
+// Live Docker inventory pushed by the backend from the Docker events stream.
+// While it is live, loadImages()/loadContainers() render from it instead of
+// asking the backend to list everything again.
+let dockerInventory = null;
+
+function inventoryKey(row) {
+    return (row.Id || row.ID || '').substring(0, 12);
+}
+
+function applyInventoryDelta(delta) {
+    if (!delta) return;
+    if (delta.kind === 'snapshot') {
+        const images = new Map();
+        delta.images.forEach(row => {
+            const key = inventoryKey(row);
+            if (!images.has(key)) images.set(key, []);
+            images.get(key).push(row);
+        });
+        dockerInventory = {
+            live: delta.connected !== false,
+            version: delta.version,
+            containers: new Map(delta.containers.map(row => [inventoryKey(row), row])),
+            images
+        };
+        renderImages(inventoryImages());
+        renderContainers(Array.from(dockerInventory.containers.values()));
+        return;
+    }
+    if (!dockerInventory) return;
+    dockerInventory.version = delta.version;
+    if (delta.kind === 'disconnected') {
+        // Fall back to listing until the backend resyncs and sends a new snapshot
+        dockerInventory.live = false;
+    } else if (delta.kind === 'container') {
+        if (delta.op === 'remove') {
+            dockerInventory.containers.delete(delta.id);
+        } else {
+            dockerInventory.containers.set(delta.id, delta.data);
+        }
+        renderContainers(Array.from(dockerInventory.containers.values()));
+    } else if (delta.kind === 'image') {
+        if (delta.op === 'remove') {
+            dockerInventory.images.delete(delta.id);
+        } else {
+            dockerInventory.images.set(delta.id, delta.data);
+        }
+        renderImages(inventoryImages());
+    }
+}
+
+function inventoryImages() {
+    return Array.from(dockerInventory.images.values()).flat();
+}
+
+// Background sampling so the stats tab can show history without asking the daemon
+const METRICS_INTERVAL_SECONDS = 5;
+
+async function startDockerMetrics() {
+    try {
+        await window.electronAPI.docker.startMetrics(METRICS_INTERVAL_SECONDS);
+    } catch (error) {
+        console.error('Starting metrics collector failed:', error);
+    }
+}
+
+const SPARK_CHARS = '▁▂▃▄▅▆▇█';
+
+function sparkline(values) {
+    const numbers = values.filter(value => value !== null);
+    if (numbers.length === 0) return '';
+    const max = Math.max(...numbers) || 1;
+    return values.map(value => value === null ? ' ' : SPARK_CHARS[Math.min(SPARK_CHARS.length - 1, Math.floor(value / max * (SPARK_CHARS.length - 1)))]).join('');
+}
+
+function formatMetricsHistory(entry) {
+    const series = entry.series;
+    if (!series || series.t.length < 2) return '';
+    const minutes = Math.round((series.t[series.t.length - 1] - series.t[0]) / 60) || 1;
+    const maxCpu = Math.max(...series.cpu_percent.filter(value => value !== null), 0);
+    const maxMem = Math.max(...series.mem_usage.filter(value => value !== null), 0) / 1048576;
+    return `\n\nHistory (last ${minutes} min)\n` +
+        `CPU ${sparkline(series.cpu_percent)} max ${maxCpu.toFixed(2)}%\n` +
+        `Mem ${sparkline(series.mem_usage)} max ${maxMem.toFixed(1)} MiB`;
+}
+
+async function startVMMetrics() {
+    try {
+        await window.electronAPI.qemu.startVMMetrics(METRICS_INTERVAL_SECONDS);
+    } catch (error) {
+        console.error('Starting VM metrics collector failed:', error);
+    }
+}
+
+function formatVMUsage(metrics) {
+    if (!metrics) return '';
+    const parts = [];
+    if (metrics.cpu_percent !== undefined && metrics.cpu_percent !== null) parts.push(`${metrics.cpu_percent.toFixed(1)}% CPU`);
+    if (metrics.rss) parts.push(`${(metrics.rss / 1048576).toFixed(0)} MiB`);
+    const diskRate = (metrics.disk_read_rate || 0) + (metrics.disk_write_rate || 0);
+    if (diskRate) parts.push(`disk ${(diskRate / 1048576).toFixed(1)} MiB/s`);
+    return parts.length ? `<br><small>${parts.join(' · ')}</small>` : '';
+}
+
+async function subscribeDockerInventory() {
+    try {
+        const result = await window.electronAPI.docker.subscribeInventory();
+        if (result && result.success) {
+            applyInventoryDelta(result.data);
+        }
+    } catch (error) {
+        console.error('Inventory subscription failed:', error);
+    }
+}
+
 // Docker Functions
+function renderImages(images) {
+    const tbody = document.getElementById('imagesTableBody');
+    if (images.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="6" class="loading">No images found</td></tr>';
+    } else {
+        tbody.innerHTML = images.map(img => `
+            <tr>
+                <td>${img.Repository || img.REPOSITORY || '-'}</td>
+                <td>${img.Tag || img.TAG || '-'}</td>
+                <td>${(img.Id || img.ID || '').substring(0, 12)}</td>
+                <td>${img.CreatedAt || img.CREATED || '-'}</td>
+                <td>${img.Size || img.SIZE || '-'}</td>
+                <td class="action-buttons">
+                    <button class="btn btn-danger btn-small" onclick="deleteImage('${img.Id || img.ID}')">Delete</button>
+                </td>
+            </tr>
+        `).join('');
+    }
+}
+
 async function loadImages() {
+    if (dockerInventory && dockerInventory.live) {
+        renderImages(inventoryImages());
+        return;
+    }
     const tbody = document.getElementById('imagesTableBody');
     tbody.innerHTML = '<tr><td colspan="6" class="loading">Loading images...</td></tr>';
     
@@ -217,22 +393,7 @@ async function loadImages() {
         const result = await window.electronAPI.docker.listImages();
         
         if (result.success && result.data) {
-            if (result.data.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="6" class="loading">No images found</td></tr>';
-            } else {
-                tbody.innerHTML = result.data.map(img => `
-                    <tr>
-                        <td>${img.Repository || img.REPOSITORY || '-'}</td>
-                        <td>${img.Tag || img.TAG || '-'}</td>
-                        <td>${(img.Id || img.ID || '').substring(0, 12)}</td>
-                        <td>${img.CreatedAt || img.CREATED || '-'}</td>
-                        <td>${img.Size || img.SIZE || '-'}</td>
-                        <td class="action-buttons">
-                            <button class="btn btn-danger btn-small" onclick="deleteImage('${img.Id || img.ID}')">Delete</button>
-                        </td>
-                    </tr>
-                `).join('');
-            }
+            renderImages(result.data);
             updateStatus('Images loaded');
         } else {
             throw new Error(result.error || 'Failed to load images');
@@ -244,7 +405,69 @@ async function loadImages() {
     }
 }
 
+function renderContainers(containers) {
+    const tbody = document.getElementById('containersTableBody');
+    if (containers.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="7" class="loading">No containers found</td></tr>';
+    } else {
+        tbody.innerHTML = containers.map(container => {
+            const status = container.Status || container.STATUS || 'unknown';
+            const statusClass = status.includes('Up') ? 'running' : 
+                               status.includes('Exited') ? 'exited' : 'stopped';
+            return `
+                <tr data-container-id="${(container.Id || container.ID || '').substring(0, 12)}">
+                    <td>${(container.Id || container.ID || '').substring(0, 12)}</td>
+                    <td>${container.Image || container.IMAGE || '-'}</td>
+                    <td>${(container.Command || container.COMMAND || '-').substring(0, 30)}</td>
+                    <td>${container.CreatedAt || container.CREATED || '-'}</td>
+                    <td style="vertical-align: middle; padding: 0.75rem;"><span class="status-badge status-${statusClass}">${status}</span></td>
+                    <td style="padding: 0.75rem;">${container.Names || container.NAMES || '-'}</td>
+                    <td class="action-buttons" style="vertical-align: middle; padding: 0.75rem;">
+                        ${status.includes('Up') 
+                            ? `<button class="btn btn-warning btn-small" onclick="stopContainer('${container.Id || container.ID}')">Stop</button>`
+                            : `<button class="btn btn-success btn-small" onclick="startContainer('${container.Id || container.ID}')">Start</button>`
+                        }
+                        <button class="btn btn-danger btn-small" onclick="deleteContainer('${container.Id || container.ID}')">Delete</button>
+                        <button class="btn btn-secondary btn-small" onclick="showContainerDetails('${container.Id || container.ID}', '${container.Names || container.NAMES || ''}')">Details</button>
+                    </td>
+                </tr>
+            `;
+        }).join('');
+        annotateContainerStats();
+    }
+}
+
+// CPU/memory under each running container's status, fetched for all of them in one call
+async function annotateContainerStats() {
+    if (!window.electronAPI.docker.getContainersStats) return;
+    try {
+        const result = await window.electronAPI.docker.getContainersStats('all');
+        if (!result || !result.success) return;
+        for (const [id, entry] of Object.entries(result.data)) {
+            if (!entry.success) continue;
+            const row = document.querySelector(`tr[data-container-id="${id.substring(0, 12)}"]`);
+            if (!row) continue;
+            const cell = row.children[4];
+            let usage = cell.querySelector('.container-usage');
+            if (!usage) {
+                usage = document.createElement('div');
+                usage.className = 'container-usage';
+                usage.style.fontSize = '0.75rem';
+                usage.style.opacity = '0.7';
+                cell.appendChild(usage);
+            }
+            usage.textContent = `CPU ${entry.stats.CPUPerc} · Mem ${entry.stats.MemUsage.split(' / ')[0]}`;
+        }
+    } catch (error) {
+        console.error('Batch stats error:', error);
+    }
+}
+
 async function loadContainers() {
+    if (dockerInventory && dockerInventory.live) {
+        renderContainers(Array.from(dockerInventory.containers.values()));
+        return;
+    }
     const tbody = document.getElementById('containersTableBody');
     tbody.innerHTML = '<tr><td colspan="7" class="loading">Loading containers...</td></tr>';
     
@@ -253,33 +476,7 @@ async function loadContainers() {
         const result = await window.electronAPI.docker.listContainers();
         
         if (result.success && result.data) {
-            if (result.data.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="7" class="loading">No containers found</td></tr>';
-            } else {
-                tbody.innerHTML = result.data.map(container => {
-                    const status = container.Status || container.STATUS || 'unknown';
-                    const statusClass = status.includes('Up') ? 'running' : 
-                                       status.includes('Exited') ? 'exited' : 'stopped';
-                    return `
-                        <tr>
-                            <td>${(container.Id || container.ID || '').substring(0, 12)}</td>
-                            <td>${container.Image || container.IMAGE || '-'}</td>
-                            <td>${(container.Command || container.COMMAND || '-').substring(0, 30)}</td>
-                            <td>${container.CreatedAt || container.CREATED || '-'}</td>
-                            <td style="vertical-align: middle; padding: 0.75rem;"><span class="status-badge status-${statusClass}">${status}</span></td>
-                            <td style="padding: 0.75rem;">${container.Names || container.NAMES || '-'}</td>
-                            <td class="action-buttons" style="vertical-align: middle; padding: 0.75rem;">
-                                ${status.includes('Up') 
-                                    ? `<button class="btn btn-warning btn-small" onclick="stopContainer('${container.Id || container.ID}')">Stop</button>`
-                                    : `<button class="btn btn-success btn-small" onclick="startContainer('${container.Id || container.ID}')">Start</button>`
-                                }
-                                <button class="btn btn-danger btn-small" onclick="deleteContainer('${container.Id || container.ID}')">Delete</button>
-                                <button class="btn btn-secondary btn-small" onclick="showContainerDetails('${container.Id || container.ID}', '${container.Names || container.NAMES || ''}')">Details</button>
-                            </td>
-                        </tr>
-                    `;
-                }).join('');
-            }
+            renderContainers(result.data);
             updateStatus('Containers loaded');
         } else {
             throw new Error(result.error || 'Failed to load containers');
@@ -334,6 +531,37 @@ async function stopContainer(id) {
     }
 }
 
+// Stops every running container in the table in one backend call
+async function stopAllContainers() {
+    const ids = Array.from(document.querySelectorAll('#containersTableBody tr[data-container-id]'))
+        .filter(row => row.querySelector('.status-running'))
+        .map(row => row.dataset.containerId);
+    if (ids.length === 0) {
+        showToast('No running containers', 'info');
+        return;
+    }
+    try {
+        updateStatus(`Stopping ${ids.length} containers...`);
+        const result = await window.electronAPI.docker.bulkContainers('stop', { ids, timeout: 5 });
+        if (!result || !result.success) {
+            throw new Error((result && result.error) || 'Unknown error occurred');
+        }
+        if (result.failed) {
+            const failures = Object.entries(result.results)
+                .filter(([, item]) => !item.success)
+                .map(([id, item]) => `${id.substring(0, 12)}: ${item.details || item.error}`);
+            showToast(`Stopped ${result.succeeded} of ${result.total}. ${failures.join('; ')}`, 'error');
+        } else {
+            showToast(`Stopped ${result.succeeded} containers in ${result.seconds}s`, 'success');
+        }
+        updateStatus('Containers stopped');
+        loadContainers();
+    } catch (error) {
+        showToast(`Error stopping containers: ${error.message}`, 'error');
+        updateStatus('Error stopping containers', true);
+    }
+}
+
 async function startContainer(id) {
     try {
         updateStatus('Starting container...');
@@ -401,24 +629,73 @@ async function showContainerDetails(id, name) {
     });
 }
 
+// Container whose logs the backend is pushing to the open logs tab
+let followedLogsId = null;
+const MAX_LOG_CHARS = 1000000;
+
+async function stopFollowingLogs() {
+    if (!followedLogsId) return;
+    const id = followedLogsId;
+    followedLogsId = null;
+    try {
+        await window.electronAPI.docker.unfollowLogs(id);
+    } catch (error) {
+        console.error('Unfollow logs error:', error);
+    }
+}
+
+function handleLogPush(payload) {
+    if (!payload || payload.container !== followedLogsId) return;
+    const logsElement = document.getElementById('containerLogs');
+    if (payload.ended) {
+        followedLogsId = null;
+        logsElement.textContent += payload.error ? `\n[log stream ended: ${payload.error}]` : '\n[log stream ended]';
+        return;
+    }
+    if (!payload.logs) return;
+    const atBottom = logsElement.scrollTop + logsElement.clientHeight >= logsElement.scrollHeight - 5;
+    const current = logsElement.dataset.empty ? '' : logsElement.textContent;
+    delete logsElement.dataset.empty;
+    let text = current ? `${current}\n${payload.logs}` : payload.logs;
+    // Keep the view bounded for chatty containers; the backend holds the full ring buffer
+    if (text.length > MAX_LOG_CHARS) {
+        text = text.slice(text.indexOf('\n', text.length - MAX_LOG_CHARS) + 1);
+    }
+    logsElement.textContent = text;
+    if (atBottom) logsElement.scrollTop = logsElement.scrollHeight;
+}
+
+if (window.electronAPI && window.electronAPI.docker.onLog) {
+    window.electronAPI.docker.onLog((event, payload) => handleLogPush(payload));
+}
+
 async function loadContainerLogs(id) {
     const logsElement = document.getElementById('containerLogs');
     logsElement.textContent = 'Loading logs...';
+    await stopFollowingLogs();
     
     try {
         console.log('Loading logs for container:', id);
-        const result = await window.electronAPI.docker.getContainerLogs(id, 500);
+        // Follow when the resident backend is running; otherwise a one-shot read
+        let result = await window.electronAPI.docker.followLogs(id, 500);
+        if (result && result.success) {
+            followedLogsId = id;
+        } else {
+            result = await window.electronAPI.docker.getContainerLogs(id, 500);
+        }
         console.log('Logs result:', result);
         console.log('Logs content:', result?.logs);
         
         if (result && result.success) {
             const logs = result.logs || '';
+            delete logsElement.dataset.empty;
             // Always display the logs, even if they seem empty (might have whitespace)
             logsElement.textContent = logs;
             
             // Only show "no logs" message if logs are truly empty
             if (!logs || logs.trim() === '' || logs === 'No logs available for this container. The container may not have produced any output yet.') {
                 logsElement.textContent = 'No logs available for this container. The container may not have produced any output yet.';
+                logsElement.dataset.empty = 'true';
             }
         } else {
             const errorMsg = (result && result.error) || 'Unknown error occurred';
@@ -444,6 +721,11 @@ async function loadContainerStats(id) {
         if (result && result.success) {
             if (result.stats) {
                 statsElement.textContent = JSON.stringify(result.stats, null, 2);
+                const metrics = await window.electronAPI.docker.getMetrics(id, { points: 60 });
+                if (metrics && metrics.success) {
+                    const entry = Object.values(metrics.containers)[0];
+                    if (entry) statsElement.textContent += formatMetricsHistory(entry);
+                }
             } else {
                 statsElement.textContent = 'No stats data available';
             }
@@ -484,6 +766,10 @@ function setupEventListeners() {
     if (refreshContainersBtn) {
         refreshContainersBtn.addEventListener('click', loadContainers);
     }
+    const stopAllContainersBtn = document.getElementById('stopAllContainersBtn');
+    if (stopAllContainersBtn) {
+        stopAllContainersBtn.addEventListener('click', stopAllContainers);
+    }
     
     if (searchBtn) {
         searchBtn.addEventListener('click', async () => {
@@ -659,7 +945,8 @@ document.getElementById('buildImageBtn').addEventListener('click', async () => {
         updateStatus('Building image...');
         const result = await window.electronAPI.docker.buildImage(path, tag);
         if (result && result.success) {
-            showToast('Image built successfully', 'success');
+            const cached = result.cached_steps ? `, ${result.cached_steps} cached steps` : '';
+            showToast(`Image built successfully in ${result.duration}s${cached}`, 'success');
             loadImages();
             
             // Reset form after successful build
@@ -792,9 +1079,10 @@ async function loadRunningVMs() {
                 tbody.innerHTML = result.data.map(vm => `
                     <tr>
                         <td>${vm.pid}</td>
-                        <td>${vm.name}</td>
+                        <td>${vm.name}${vm.status ? ` (${vm.status})` : ''}${formatVMUsage(vm.metrics)}</td>
                         <td>${(vm.cmdline || []).join(' ').substring(0, 50)}</td>
                         <td class="action-buttons">
+                            ${vm.id ? `<button class="btn btn-small" onclick="suspendVM('${vm.id}')">Suspend</button>` : ''}
                             <button class="btn btn-danger btn-small" onclick="stopVM(${vm.pid})">Stop</button>
                         </td>
                     </tr>
@@ -818,7 +1106,7 @@ async function stopVM(pid) {
         updateStatus('Stopping VM...');
         const result = await window.electronAPI.qemu.stopVM(pid);
         if (result.success) {
-            showToast('VM stopped', 'success');
+            showToast(result.message || 'VM stopped', 'success');
             loadRunningVMs();
         } else {
             throw new Error(result.error);
@@ -829,6 +1117,24 @@ async function stopVM(pid) {
     }
 }
 
+// Save the VM's state into a disk snapshot and quit QEMU; resumeVM brings it back
+async function suspendVM(id) {
+    try {
+        updateStatus('Saving VM state...');
+        const result = await window.electronAPI.qemu.saveSnapshot(id, null, true);
+        if (result.success) {
+            showToast(`VM suspended to snapshot ${result.tag} (${result.seconds}s)`, 'success');
+            updateStatus('VM suspended');
+            loadRunningVMs();
+        } else {
+            throw new Error(result.error);
+        }
+    } catch (error) {
+        showToast(`Error suspending VM: ${error.message}`, 'error');
+        updateStatus('Error suspending VM', true);
+    }
+}
+
 document.getElementById('refreshVMs').addEventListener('click', loadRunningVMs);
 
 document.getElementById('pickDiskPath').addEventListener('click', async () => {
@@ -905,6 +1211,7 @@ document.getElementById('createVMForm').addEventListener('submit', async (e) =>
     const ramSize = parseInt(document.getElementById('vmRamSize').value);
     const diskPath = document.getElementById('vmDiskPath').value;
     const isoPath = document.getElementById('vmIsoPath').value || null;
+    const profile = document.getElementById('vmProfile').value;
     
     // Validate inputs - prevent negative numbers
     if (isNaN(cpuCores) || cpuCores < 1) {
@@ -921,7 +1228,7 @@ document.getElementById('createVMForm').addEventListener('submit', async (e) =>
     
     try {
         updateStatus('Starting VM...');
-        const result = await window.electronAPI.qemu.startVM(cpuCores, ramSize, diskPath, isoPath);
+        const result = await window.electronAPI.qemu.startVM(cpuCores, ramSize, diskPath, isoPath, { profile });
         if (result.success) {
             showToast('VM started successfully', 'success');
             loadRunningVMs();
@@ -941,6 +1248,26 @@ document.getElementById('createVMForm').addEventListener('submit', async (e) =>
     }
 });
 
+// Dry run: show the QEMU command the selected profile would use on this host
+document.getElementById('previewVMCommand').addEventListener('click', async () => {
+    const cpuCores = parseInt(document.getElementById('vmCpuCores').value);
+    const ramSize = parseInt(document.getElementById('vmRamSize').value);
+    const diskPath = document.getElementById('vmDiskPath').value;
+    const isoPath = document.getElementById('vmIsoPath').value || null;
+    const profile = document.getElementById('vmProfile').value;
+
+    try {
+        const result = await window.electronAPI.qemu.startVM(cpuCores, ramSize, diskPath, isoPath, { profile, dry_run: true });
+        if (!result.success) {
+            throw new Error(result.error);
+        }
+        const notes = (result.notes || []).join('\n');
+        alert(`${result.command_line}${notes ? `\n\n${notes}` : ''}`);
+    } catch (error) {
+        showToast(`Error building VM command: ${error.message}`, 'error');
+    }
+});
+
 document.getElementById('loadConfigBtn').addEventListener('click', async () => {
     const result = await window.electronAPI.dialog.openFile({
         title: 'Load VM Configuration',
@@ -1048,7 +1375,15 @@ document.getElementById('createVMFromConfigBtn').addEventListener('click', async
         const result = await window.electronAPI.qemu.createVMFromConfig(window.currentConfigFilePath);
         if (result.success) {
             const vmCount = result.results ? result.results.length : 1;
-            showToast(`Successfully created ${vmCount} VM(s) from configuration`, 'success');
+            const launched = result.launched !== undefined ? result.launched : vmCount;
+            if (launched < vmCount) {
+                const failures = result.results
+                    .filter(vm => !vm.success)
+                    .map(vm => `${vm.name}: ${vm.error}`);
+                showToast(`Started ${launched} of ${vmCount} VM(s). ${failures.join('; ')}`, 'error');
+            } else {
+                showToast(`Successfully created ${vmCount} VM(s) from configuration in ${result.seconds}s`, 'success');
+            }
             loadRunningVMs();
         } else {
             throw new Error(result.error);
@@ -1072,6 +1407,9 @@ document.querySelectorAll('.close').forEach(closeBtn => {
             currentSearchPromise = null;
             updateStatus('Search cancelled');
         }
+        if (modal.id === 'containerModal') {
+            stopFollowingLogs();
+        }
         modal.classList.remove('active');
     });
 });
@@ -1087,6 +1425,9 @@ window.addEventListener('click', (e) => {
             currentSearchPromise = null;
             updateStatus('Search cancelled');
         }
+        if (e.target.id === 'containerModal') {
+            stopFollowingLogs();
+        }
         e.target.classList.remove('active');
     }
 });
@@ -1109,6 +1450,7 @@ window.startContainer = startContainer;
 window.deleteContainer = deleteContainer;
 window.showContainerDetails = showContainerDetails;
 window.stopVM = stopVM;
+window.suspendVM = suspendVM;
 window.pullImageFromSearch = pullImageFromSearch;
 
 // Dockerfile path picker
@@ -1122,10 +1464,18 @@ document.getElementById('pickDockerfilePath').addEventListener('click', async ()
     }
 });
 
+// Apply inventory deltas pushed by the backend
+if (window.electronAPI && window.electronAPI.docker.onInventory) {
+    window.electronAPI.docker.onInventory((event, delta) => applyInventoryDelta(delta));
+}
+
 // Listen for Docker ready event from main process
 if (window.electronAPI && window.electronAPI.onDockerReady) {
     window.electronAPI.onDockerReady(() => {
         console.log('Docker is ready, refreshing images and containers...');
+        if (!dockerInventory || !dockerInventory.live) {
+            subscribeDockerInventory();
+        }
         // Only refresh if Docker tab is active
         const dockerTab = document.getElementById('docker-tab');
         if (dockerTab && dockerTab.classList.contains('active')) {
@@ -1142,10 +1492,16 @@ if (document.readyState === 'loading') {
         setupEventListeners();
         loadImages();
         loadContainers();
+        subscribeDockerInventory();
+        startDockerMetrics();
+        startVMMetrics();
     });
 } else {
     setupEventListeners();
     loadImages();
     loadContainers();
+    subscribeDockerInventory();
+    startDockerMetrics();
+    startVMMetrics();
 }
 
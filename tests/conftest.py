@@ -0,0 +1,20 @@
+"""
+Shared setup for the backend tests.
+
+The backend modules import each other by bare name (as api.py runs them from
+backend/), so that directory goes on sys.path. Every test gets its own
+DOCKER_VM_MANAGER_HOME so caches, registries and sockets never touch the
+real app data.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+
+@pytest.fixture(autouse=True)
+def app_home(tmp_path, monkeypatch):
+    monkeypatch.setenv('DOCKER_VM_MANAGER_HOME', str(tmp_path / 'home'))
+    return tmp_path / 'home'
@@ -0,0 +1,186 @@
+import io
+import os
+import sys
+import json
+import subprocess
+import importlib.util
+
+import pytest
+
+import api
+from api import INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND, PARSE_ERROR, ActionError, Param, prepare
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+
+
+class Immediate:
+    """Executor that runs each request on submit, so responses are written in order"""
+
+    def submit(self, function, *args):
+        function(*args)
+
+
+class FakeDocker:
+    def __init__(self):
+        self.calls = []
+
+    def stop_container(self, ID, timeout=None):
+        self.calls.append(('stop_container', ID, timeout))
+        return json.dumps({"success": True, "message": f"Container {ID} stopped"})
+
+    def bulk_container_action(self, ids=None, labels=None, timeout=None, force=False, max_workers=None, action=None):
+        self.calls.append(('bulk', action, ids))
+        return json.dumps({"success": True})
+
+    def unsubscribe_events(self, listener):
+        pass
+
+    def unfollow_container_logs(self, ID, listener):
+        pass
+
+
+def _rpc(*lines, managers=None):
+    writer = io.StringIO()
+    connection = api.RpcConnection(iter(lines), writer, managers if managers is not None else {}, Immediate())
+    connection.serve_forever()
+    return [json.loads(line) for line in writer.getvalue().splitlines()]
+
+
+def test_param_types_defaults_and_aliases():
+    assert Param('n', 'int', 1).value({}) == 1
+    assert Param('n', 'int', 1).value({"n": None}) == 1
+    assert Param('vm', ('str', 'int'), aliases=('pid',)).value({"pid": 42}) == 42
+    assert Param('x', 'number').value({"x": 1.5}) == 1.5
+    # JSON booleans are not integers
+    with pytest.raises(ActionError, match="Invalid argument 'n': expected int, got bool") as raised:
+        Param('n', 'int').value({"n": True})
+    assert raised.value.code == INVALID_PARAMS
+    default = Param('names', 'list', [])
+    default.value({}).append('leaked')
+    assert default.value({}) == []
+
+
+def test_convert_errors_are_invalid_params():
+    def positive(value):
+        if value < 1:
+            raise ValueError('must be at least 1')
+        return value
+
+    assert Param('n', 'int', convert=positive).value({"n": 3}) == 3
+    with pytest.raises(ActionError, match="Invalid argument 'n': must be at least 1"):
+        Param('n', 'int', convert=positive).value({"n": 0})
+
+
+def test_prepare_binds_keywords_without_importing_the_service():
+    spec, kwargs = prepare('docker', 'stop_containers', {"ids": ['web'], "timeout": 5})
+    assert spec.method == 'bulk_container_action'
+    assert kwargs == {"ids": ['web'], "labels": None, "timeout": 5, "force": False, "max_workers": None,
+                      "action": 'stop'}
+    assert prepare('qemu', 'stop_vm', {"pid": 1234})[1] == {"pid": 1234, "force": False, "timeout": None}
+
+
+@pytest.mark.parametrize('service, action, params, code, message', [
+    ('kubernetes', 'list', {}, METHOD_NOT_FOUND, 'Unknown service: kubernetes'),
+    ('docker', 'explode', {}, METHOD_NOT_FOUND, 'Unknown action: explode'),
+    ('docker', 'stop_container', [], INVALID_PARAMS, 'params must be an object'),
+    ('docker', 'stop_container', {"id": 7}, INVALID_PARAMS, "Invalid argument 'id': expected str, got int"),
+])
+def test_prepare_rejects_bad_requests(service, action, params, code, message):
+    with pytest.raises(ActionError) as raised:
+        prepare(service, action, params)
+    assert (raised.value.code, raised.value.message) == (code, message)
+
+
+def test_dispatch_uses_cached_managers():
+    docker = FakeDocker()
+    managers = {"docker": docker}
+    assert json.loads(api.dispatch('docker', 'stop_container', {"id": 'web'}, managers))["success"]
+    assert json.loads(api.dispatch('docker', 'explode', {}, managers)) == \
+        {"success": False, "error": 'Unknown action: explode'}
+    assert docker.calls == [('stop_container', 'web', None)]
+    result = json.loads(api.dispatch('docker', 'subscribe_events', {}, managers))
+    assert result == {"success": False, "error": 'subscribe_events requires --serve mode'}
+
+
+def test_backend_actions_need_no_manager():
+    managers = {}
+    assert json.loads(api.dispatch('backend', 'traces', {"limit": 1}, managers))["success"]
+    assert managers == {}
+
+
+def test_describe_actions():
+    described = api.describe_actions()
+    assert described['docker.get_container_logs']["params"]['tail'] == {"type": ['int', 'str'], "default": 100}
+    assert described['docker.follow_logs']["serve_only"] is True
+
+
+def test_rpc_errors_and_results():
+    docker = FakeDocker()
+    responses = _rpc(
+        '{not json\n',
+        '[1, 2]\n',
+        '{"jsonrpc": "2.0", "id": 1, "method": "ping"}\n',
+        '{"jsonrpc": "2.0", "id": 2, "method": "docker.nope"}\n',
+        '{"jsonrpc": "2.0", "id": 3, "method": "docker.stop_container", "params": {"timeout": "soon"}}\n',
+        '{"jsonrpc": "2.0", "id": 4, "method": "docker.stop_container", "params": [1]}\n',
+        '\n',
+        '{"jsonrpc": "2.0", "method": "docker.stop_container", "params": {"id": "quiet"}}\n',
+        '{"jsonrpc": "2.0", "id": 5, "method": "docker.stop_container", "params": {"id": "web", "timeout": 2}}\n',
+        managers={"docker": docker})
+    errors = [(response["id"], response["error"]["code"]) for response in responses if "error" in response]
+    assert errors == [(None, PARSE_ERROR), (None, INVALID_REQUEST), (2, METHOD_NOT_FOUND), (3, INVALID_PARAMS),
+                      (4, INVALID_REQUEST)]
+    assert responses[3]["error"]["message"] == 'Unknown method: docker.nope'
+    results = [(response["id"], response["result"]) for response in responses if "result" in response]
+    assert results == [(1, {"success": True}), (5, {"success": True, "message": 'Container web stopped'})]
+    # The notification ran but got no response
+    assert docker.calls == [('stop_container', 'quiet', None), ('stop_container', 'web', 2)]
+
+
+def test_backend_action_imports_no_service():
+    # A backend action must not pull in either manager module
+    script = ('import sys, json, api\n'
+              'result = api.dispatch("backend", "metrics", {})\n'
+              'print(json.dumps([json.loads(result)["success"], '
+              'sorted(m for m in ("docker", "qemu", "docker_engine", "psutil", "concurrent.futures") '
+              'if m in sys.modules)]))\n')
+    finished = subprocess.run([sys.executable, '-c', script], cwd=BACKEND, capture_output=True, text=True,
+                              timeout=60, env=dict(os.environ, PYTHONPATH=BACKEND))
+    assert finished.returncode == 0, finished.stderr
+    assert json.loads(finished.stdout) == [True, []]
+
+
+def test_cli_reports_invalid_arguments():
+    finished = subprocess.run([sys.executable, os.path.join(BACKEND, 'api.py'), '--service', 'docker',
+                               '--action', 'stop_container', '--args', '{"id": 1}'],
+                              capture_output=True, text=True, timeout=60)
+    assert finished.returncode == 0
+    assert json.loads(finished.stdout) == {"success": False,
+                                           "error": "Invalid argument 'id': expected str, got int"}
+
+
+@pytest.fixture(scope='module')
+def startup_budget():
+    spec = importlib.util.spec_from_file_location('startup_budget', os.path.join(BENCHMARKS, 'startup_budget.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_startup_budget_reads_importtime(startup_budget):
+    stderr = ('import time: self [us] | cumulative | imported package\n'
+              'import time:       100 |        100 |   _io\n'
+              'import time:       200 |        500 | json\n'
+              'import time:       300 |        300 |   json.decoder\n'
+              'import time:      1500 |       1500 | instrumentation\n')
+    total, modules = startup_budget.parse_importtime(stderr)
+    assert total == 2.0
+    assert modules == {"_io": 0.1, "json": 0.5, "json.decoder": 0.3, "instrumentation": 1.5}
+
+
+def test_startup_budget_flags_forbidden_imports(startup_budget):
+    measured = {"import_ms": 30.0, "modules": 80, "imported": ['api', 'docker', 'qemu', 'psutil']}
+    assert startup_budget.check('docker.list_images', measured, {"max_import_ms": 20.0, "max_modules": 100}) == \
+        ['import time 30.0 ms > 20.0 ms', 'imports qemu, psutil']
+    assert startup_budget.check('backend.metrics', dict(measured, imported=['api']), None) == []
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import subprocess
+import importlib.util
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+
+
+@pytest.fixture(scope='module')
+def run():
+    spec = importlib.util.spec_from_file_location('bench_run', os.path.join(BENCHMARKS, 'run.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _result(p50, p90=None, rss=20.0):
+    return {"p50_ms": p50, "p90_ms": p90 if p90 is not None else p50, "peak_rss_mb": rss}
+
+
+def test_compare_flags_slowdowns_beyond_tolerance_and_noise(run):
+    baseline = {"results": {"fast": _result(0.2), "slow": _result(10.0), "big": _result(5.0, rss=40.0),
+                            "broken": {"error": 'worker failed'}}}
+    results = {
+        # +150%, but well under a millisecond: noise
+        "fast": _result(0.5),
+        "slow": _result(14.0, 12.0),
+        "big": _result(5.0, rss=60.0),
+        "broken": _result(1.0),
+        "new": _result(1.0),
+    }
+    assert run.compare(results, baseline, tolerance=0.25, rss_tolerance=0.20) == {
+        "fast": 'ok',
+        "slow": 'p50_ms 10.0 -> 14.0',
+        "big": 'rss 40.0 -> 60.0 MB',
+    }
+
+
+def test_cases_select_by_substring_and_transport(run):
+    args = type('Args', (), {"only": 'list_images,rpc.list', "transports": ['cli']})()
+    assert run._selected(args) == [('docker.list_images', 'cli'), ('docker.list_images.cached', 'cli'),
+                                   ('api.rpc.list_containers', None)]
+    assert run._key('docker.list_images', 'cli') == 'docker.list_images[cli]'
+
+
+def test_small_run_against_the_fakes(tmp_path):
+    report = tmp_path / 'report.json'
+    finished = subprocess.run([sys.executable, os.path.join(BENCHMARKS, 'run.py'), '--only', 'docker.list_images',
+                               '--rounds', '2', '--warmup', '0', '--containers', '5', '--images', '5',
+                               '--json', str(report)], capture_output=True, text=True, timeout=120)
+    assert finished.returncode == 0, finished.stdout + finished.stderr
+    with open(report) as f:
+        results = json.load(f)["results"]
+    assert set(results) == {'docker.list_images[engine]', 'docker.list_images[cli]',
+                            'docker.list_images.cached[engine]', 'docker.list_images.cached[cli]'}
+    assert all(result["rounds"] == 2 and result["p50_ms"] > 0 for result in results.values())
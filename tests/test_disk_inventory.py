@@ -0,0 +1,146 @@
+import os
+import struct
+
+import pytest
+
+from disk_inventory import (QCOW2_EXT_BACKING_FORMAT, QCOW2_MAGIC, VDI_SIGNATURE, VHD_COOKIE, VHDX_MAGIC,
+                            VMDK_SPARSE_MAGIC, DiskInventory, detect)
+
+GIB = 1024 ** 3
+
+
+def qcow2(virtual_size, backing_file=None, backing_format=None, version=3):
+    header_length = 104 if version >= 3 else 72
+    header = bytearray(512)
+    header[:4] = QCOW2_MAGIC
+    backing = backing_file.encode() if backing_file else b''
+    backing_offset = 256 if backing else 0
+    struct.pack_into('>IQI', header, 4, version, backing_offset, len(backing))
+    struct.pack_into('>Q', header, 24, virtual_size)
+    if version >= 3:
+        struct.pack_into('>I', header, 100, header_length)
+    offset = header_length
+    if backing_format:
+        struct.pack_into('>II', header, offset, QCOW2_EXT_BACKING_FORMAT, len(backing_format))
+        header[offset + 8:offset + 8 + len(backing_format)] = backing_format.encode()
+        offset += 8 + ((len(backing_format) + 7) & ~7)
+    struct.pack_into('>II', header, offset, 0, 0)
+    header[backing_offset:backing_offset + len(backing)] = backing
+    return bytes(header)
+
+
+def vdi(virtual_size):
+    header = bytearray(512)
+    header[:40] = b'<<< Oracle VM VirtualBox Disk Image >>>\n'
+    struct.pack_into('<I', header, 0x40, VDI_SIGNATURE)
+    struct.pack_into('<Q', header, 0x170, virtual_size)
+    return bytes(header)
+
+
+def vmdk_sparse(sectors, descriptor=None):
+    header = bytearray(1024)
+    header[:4] = VMDK_SPARSE_MAGIC
+    struct.pack_into('<Q', header, 12, sectors)
+    if descriptor:
+        struct.pack_into('<QQ', header, 28, 1, 1)
+        header[512:512 + len(descriptor)] = descriptor.encode()
+    return bytes(header)
+
+
+def vhd_footer(virtual_size):
+    footer = bytearray(512)
+    footer[:8] = VHD_COOKIE
+    struct.pack_into('>Q', footer, 48, virtual_size)
+    return bytes(footer)
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+def test_qcow2_v3_with_backing_file_and_format(write):
+    info = detect(write('web.qcow2', qcow2(20 * GIB, '/images/ubuntu.qcow2', 'qcow2')))
+    assert (info["format"], info["version"], info["virtual_size"]) == ('qcow2', 3, 20 * GIB)
+    assert (info["backing_file"], info["backing_format"]) == ('/images/ubuntu.qcow2', 'qcow2')
+
+
+def test_qcow2_v2_extensions_start_after_the_fixed_header(write):
+    info = detect(write('old.img', qcow2(GIB, 'base.img', 'raw', version=2)))
+    assert (info["format"], info["version"]) == ('qcow2', 2)
+    assert (info["backing_file"], info["backing_format"]) == ('base.img', 'raw')
+
+
+def test_standalone_qcow2(write):
+    info = detect(write('disk.raw', qcow2(GIB)))
+    # The header wins over the extension
+    assert info["format"] == 'qcow2'
+    assert (info["backing_file"], info["backing_format"]) == (None, None)
+
+
+def test_vdi(write):
+    info = detect(write('win.vdi', vdi(32 * GIB)))
+    assert (info["format"], info["virtual_size"]) == ('vdi', 32 * GIB)
+
+
+def test_sparse_vmdk_with_an_embedded_descriptor(write):
+    descriptor = '# Disk DescriptorFile\nparentFileNameHint="base.vmdk"\nRW 41943040 SPARSE "disk.vmdk"\n'
+    info = detect(write('disk.vmdk', vmdk_sparse(41943040, descriptor)))
+    assert (info["format"], info["virtual_size"]) == ('vmdk', 41943040 * 512)
+    assert (info["backing_file"], info["backing_format"]) == ('base.vmdk', 'vmdk')
+
+
+def test_vmdk_descriptor_file_adds_up_its_extents(write):
+    descriptor = ('# Disk DescriptorFile\nversion=1\n'
+                  'RW 4192256 SPARSE "disk-s001.vmdk"\nRW 4192256 SPARSE "disk-s002.vmdk"\n')
+    info = detect(write('disk.vmdk', descriptor.encode()))
+    assert (info["format"], info["virtual_size"]) == ('vmdk', 2 * 4192256 * 512)
+    assert info["backing_file"] is None
+
+
+def test_vhdx_and_vhd(write):
+    assert detect(write('a.vhdx', VHDX_MAGIC + b'\0' * 1016))["format"] == 'vhdx'
+    # A fixed VHD only has its footer, in the last sector
+    info = detect(write('b.vhd', b'\0' * 4096 + vhd_footer(8 * GIB)))
+    assert (info["format"], info["virtual_size"]) == ('vpc', 8 * GIB)
+
+
+def test_raw_images_report_a_boot_sector(write):
+    mbr = b'\0' * 510 + b'\x55\xaa'
+    info = detect(write('boot.img', mbr + b'\0' * 512))
+    assert (info["format"], info["bootable"], info["virtual_size"]) == ('raw', True, 1024)
+    assert detect(write('blank.img', b'\0' * 1024))["bootable"] is False
+
+
+def test_index_is_reused_until_the_file_changes(tmp_path, write):
+    path = write('web.qcow2', qcow2(GIB))
+    inventory = DiskInventory(str(tmp_path / 'index.json'))
+    assert inventory.inspect(path)["cached"] is False
+    assert DiskInventory(str(tmp_path / 'index.json')).inspect(path)["cached"] is True
+    with open(path, 'wb') as f:
+        f.write(qcow2(2 * GIB) + b'\0' * 512)
+    info = inventory.inspect(path)
+    assert (info["cached"], info["virtual_size"]) == (False, 2 * GIB)
+
+
+def test_scan_lists_images_and_forgets_removed_ones(tmp_path, write):
+    write('a.qcow2', qcow2(GIB))
+    removed = write('b.vdi', vdi(GIB))
+    write('notes.txt', b'not a disk')
+    inventory = DiskInventory(str(tmp_path / 'index.json'))
+    assert [os.path.basename(info["path"]) for info in inventory.scan(str(tmp_path))] == ['a.qcow2', 'b.vdi']
+    os.remove(removed)
+    assert [info["format"] for info in inventory.scan(str(tmp_path))] == ['qcow2']
+    assert removed not in inventory._load()
+
+
+def test_pick_boots_the_overlay_rather_than_its_base(tmp_path, write):
+    write('base.qcow2', qcow2(GIB))
+    write('blank.img', b'\0' * 1024)
+    overlay = write('web.qcow2', qcow2(GIB, 'base.qcow2', 'qcow2'))
+    os.utime(overlay, (1, 1))
+    assert DiskInventory(str(tmp_path / 'index.json')).pick(str(tmp_path))["path"] == overlay
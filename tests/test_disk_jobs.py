@@ -0,0 +1,160 @@
+import os
+import json
+import sys
+import time
+import stat
+
+import pytest
+
+import instrumentation
+from disk_jobs import DiskJobManager, build_command
+
+# Stand-in for qemu-img convert: FAKE_QEMU_IMG picks copy (default), fail or slow
+FAKE_QEMU_IMG = f'''#!{sys.executable}
+import os, sys, time, shutil
+source, output = sys.argv[-2], sys.argv[-1]
+mode = os.environ.get('FAKE_QEMU_IMG', 'copy')
+if mode == 'fail':
+    sys.stderr.write('qemu-img: Could not open source: Permission denied\\n')
+    sys.exit(1)
+with open(output, 'wb') as f:
+    f.write(b'partial')
+for step in range(0, 101, 25):
+    sys.stdout.write(f'    ({{step:.2f}}/100%)\\r')
+    sys.stdout.flush()
+    time.sleep(10 if mode == 'slow' else 0.01)
+shutil.copyfile(source, output)
+'''
+
+
+@pytest.fixture
+def qemu_img(tmp_path):
+    path = tmp_path / 'qemu-img'
+    path.write_text(FAKE_QEMU_IMG)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'disk.vmdk'
+    path.write_bytes(b'KDMV' + b'\0' * 4092)
+    return str(path)
+
+
+@pytest.fixture
+def manager(tmp_path, qemu_img):
+    manager = DiskJobManager(path=str(tmp_path / 'jobs.json'), qemu_img=qemu_img)
+    yield manager
+    for job in manager.jobs():
+        manager.cancel(job['id'])
+    manager.pool.shutdown(wait=True)
+
+
+def _wait(manager, job_id, states=('done', 'failed', 'cancelled'), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.jobs(job_id)[0]
+        if job['state'] in states:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['state']}")
+
+
+def _trace():
+    # The job reaches its final state just before its action span closes
+    deadline = time.monotonic() + 5
+    while not instrumentation.recent_traces() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return instrumentation.recent_traces(1)[0]
+
+
+def test_build_command_keeps_an_overlay_an_overlay():
+    job = {"source": '/d/overlay.qcow2', "output": '/d/overlay.qcow2', "format": 'qcow2', "compress": True,
+           "source_format": 'qcow2', "rate_limit": 1048576, "backing_file": '/d/base.qcow2',
+           "backing_format": 'qcow2'}
+    assert build_command(job) == ['qemu-img', 'convert', '-p', '-f', 'qcow2', '-O', 'qcow2', '-c',
+                                  '-r', '1048576', '-B', '/d/base.qcow2', '-F', 'qcow2',
+                                  '/d/overlay.qcow2', '/d/overlay.qcow2.part']
+
+
+def test_conversion_is_renamed_into_place_and_traced(manager, source):
+    instrumentation.reset()
+    job = manager.submit('convert', source, fmt='qcow2')
+    assert len(job['id']) == 8 and int(job['id'], 16) >= 0
+    done = _wait(manager, job['id'])
+    assert done['state'] == 'done' and done['progress'] == 100.0
+    assert os.path.exists(done['output']) and not os.path.exists(done['output'] + '.part')
+    trace = _trace()
+    assert (trace["service"], trace["action"], trace["outcome"]) == ('disk_jobs', 'convert', 'success')
+    assert [(child["name"], child["program"]) for child in trace["spans"]] == \
+        [('exec', 'qemu-img'), ('wait', 'qemu-img')]
+
+
+def test_failure_keeps_qemu_img_error_and_removes_the_part_file(manager, source, monkeypatch):
+    monkeypatch.setenv('FAKE_QEMU_IMG', 'fail')
+    instrumentation.reset()
+    job = manager.submit('convert', source)
+    failed = _wait(manager, job['id'])
+    assert failed['error'] == 'qemu-img: Could not open source: Permission denied'
+    assert not os.path.exists(job['output'] + '.part') and not os.path.exists(job['output'])
+    assert _trace()["outcome"] == 'error'
+
+
+def test_cancel_stops_qemu_img_and_leaves_no_part_file(manager, source, monkeypatch):
+    monkeypatch.setenv('FAKE_QEMU_IMG', 'slow')
+    job = manager.submit('convert', source)
+    running = _wait(manager, job['id'], states=('running',))
+    deadline = time.monotonic() + 5
+    while not os.path.exists(job['output'] + '.part') and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert running['state'] == 'running'
+    assert manager.cancel(job['id'])
+    cancelled = _wait(manager, job['id'])
+    assert cancelled['state'] == 'cancelled' and cancelled['pid'] is None
+    assert not os.path.exists(job['output'] + '.part') and not os.path.exists(job['output'])
+    assert not manager.cancel(job['id'])
+
+
+def test_interrupted_jobs_start_over_on_resume(tmp_path, qemu_img, source):
+    # A backend that died mid-copy leaves its job "running" and a stale .part behind
+    output = str(tmp_path / 'disk.qcow2')
+    with open(output + '.part', 'wb') as f:
+        f.write(b'stale half copy')
+    job = {"id": 'a1b2c3d4', "kind": 'convert', "source": source, "source_format": None, "output": output,
+           "format": 'qcow2', "compress": False, "sparse_size": None, "rate_limit": None, "backing_file": None,
+           "backing_format": None, "state": 'running', "progress": 60.0, "attempts": 1, "created_at": 1.0,
+           "started_at": 2.0, "finished_at": None, "pid": None, "error": None}
+    finished = dict(job, id='e5f6a7b8', state='done', progress=100.0, finished_at=3.0)
+    with open(tmp_path / 'jobs.json', 'w') as f:
+        json.dump({"jobs": {job["id"]: job, finished["id"]: finished}}, f)
+
+    manager = DiskJobManager(path=str(tmp_path / 'jobs.json'), qemu_img=qemu_img)
+    try:
+        assert manager.resume() == ['a1b2c3d4']
+        done = _wait(manager, 'a1b2c3d4')
+        assert (done['state'], done['attempts']) == ('done', 2)
+        with open(output, 'rb') as f, open(source, 'rb') as original:
+            assert f.read() == original.read()
+        assert not os.path.exists(output + '.part')
+        # Already scheduled, so a second resume leaves it alone
+        assert manager.resume() == []
+    finally:
+        manager.pool.shutdown(wait=True)
+
+
+def test_queued_job_cancelled_before_it_starts(tmp_path, qemu_img, source, monkeypatch):
+    monkeypatch.setenv('FAKE_QEMU_IMG', 'slow')
+    manager = DiskJobManager(path=str(tmp_path / 'jobs.json'), qemu_img=qemu_img, max_concurrent=1)
+    try:
+        first = manager.submit('convert', source)
+        second = manager.submit('convert', source, output=str(tmp_path / 'copy.raw'), fmt='raw')
+        assert manager.jobs(second['id'])[0]['state'] == 'queued'
+        assert manager.cancel(second['id'])
+        assert manager.jobs(second['id'])[0]['state'] == 'cancelled'
+        manager.cancel(first['id'])
+        _wait(manager, first['id'])
+    finally:
+        manager.pool.shutdown(wait=True)
+    assert manager.jobs(second['id'])[0]['attempts'] == 0
+    assert not os.path.exists(str(tmp_path / 'copy.raw'))
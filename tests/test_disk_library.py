@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from disk_inventory import detect
+from disk_library import DiskLibrary
+
+# The benchmark suite's qemu-img stand-in writes real qcow2 headers for `create`
+QEMU_IMG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fakes', 'qemu-img')
+
+
+@pytest.fixture
+def library(tmp_path):
+    return DiskLibrary(str(tmp_path / 'data' / 'disk_library.json'), qemu_img=QEMU_IMG)
+
+
+@pytest.fixture
+def base(tmp_path):
+    path = tmp_path / 'ubuntu.raw'
+    path.write_bytes(b'\0' * 65536)
+    return str(path)
+
+
+def test_copied_base_is_read_only(library, base):
+    entry = library.add_base(base, copy=True)
+    assert (entry["name"], entry["format"], entry["virtual_size"], entry["copied"]) == ('ubuntu', 'raw', 65536, True)
+    assert entry["path"] == os.path.join(library.images_dir, 'ubuntu.raw')
+    assert oct(os.stat(entry["path"]).st_mode & 0o777) == '0o444'
+    with pytest.raises(ValueError, match='already exists'):
+        library.add_base(base)
+
+
+def test_overlay_points_at_its_base(library, base, tmp_path):
+    library.add_base(base)
+    (tmp_path / 'vms').mkdir()
+    overlay = library.create_overlay('ubuntu', str(tmp_path / 'vms'))
+    assert overlay["path"] == str(tmp_path / 'vms' / 'vm_disk.qcow2') and overlay["base"] == 'ubuntu'
+    info = detect(overlay["path"])
+    assert (info["format"], info["backing_file"], info["backing_format"]) == ('qcow2', base, 'raw')
+    assert [b["overlays"] for b in library.list_bases()] == [[overlay["path"]]]
+    with pytest.raises(ValueError, match='already exists'):
+        library.create_overlay('ubuntu', overlay["path"])
+
+
+def test_base_in_use_is_protected(library, base, tmp_path):
+    library.add_base(base)
+    first = library.create_overlay(base, str(tmp_path / 'web.qcow2'))
+    library.create_overlay('ubuntu', str(tmp_path / 'db.qcow2'))
+    assert library.users_of(base) == [first["path"], str(tmp_path / 'db.qcow2')]
+    with pytest.raises(ValueError, match='still used by 2 overlay'):
+        library.remove_base('ubuntu')
+    with pytest.raises(ValueError, match='under 1 other overlay'):
+        library.commit_overlay(first["path"])
+    assert library.commit_overlay(first["path"], force=True) == {"path": first["path"], "base": 'ubuntu'}
+
+
+def test_deleted_overlays_release_their_base(library, base, tmp_path):
+    library.add_base(base)
+    overlay = library.create_overlay('ubuntu', str(tmp_path / 'web.qcow2'))
+    os.remove(overlay["path"])
+    assert library.list_bases()[0]["overlays"] == []
+    assert library.remove_base('ubuntu')["overlays"] == []
+    assert library.list_bases() == []
+
+
+def test_rebase_and_flatten_update_the_records(library, base, tmp_path):
+    library.add_base(base)
+    other = tmp_path / 'debian.raw'
+    other.write_bytes(b'\0' * 65536)
+    library.add_base(str(other))
+    overlay = library.create_overlay('ubuntu', str(tmp_path / 'web.qcow2'))
+    assert library.rebase_overlay(overlay["path"], 'debian')["previous_base"] == 'ubuntu'
+    assert library.users_of(str(other)) == [overlay["path"]] and library.users_of(base) == []
+    assert library.flatten_overlay(overlay["path"]) == {"path": overlay["path"], "previous_base": 'debian'}
+    assert library.users_of(str(other)) == []
+    with pytest.raises(ValueError, match='Not an overlay managed by the library'):
+        library.commit_overlay(overlay["path"])
+
+
+def test_forget_drops_a_deleted_base(library, base):
+    library.add_base(base)
+    library.forget(base)
+    with pytest.raises(ValueError, match='Base image not found'):
+        library.create_overlay('ubuntu', base + '.qcow2')
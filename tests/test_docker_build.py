@@ -0,0 +1,84 @@
+import sys
+
+from docker_build import BuildLogParser, build_command, run_build
+
+BUILDKIT = '''#1 [internal] load build definition from Dockerfile
+#1 transferring dockerfile: 120B done
+#1 DONE 0.1s
+
+#2 [1/3] FROM docker.io/library/python:3.12-slim
+#2 CACHED
+
+#3 [2/3] RUN pip install -r requirements.txt
+#3 1.204 Collecting flask
+#3 4.511 Successfully installed flask-3.0.3
+#3 DONE 5.2s
+
+#4 [3/3] COPY . /app
+#4 ERROR: failed to compute cache key: "/app" not found
+'''
+
+LEGACY = '''Sending build context to Docker daemon  3.072kB
+Step 1/3 : FROM alpine:3.19
+ ---> 05455a08881e
+Step 2/3 : RUN apk add curl
+ ---> Using cache
+ ---> 4b1d0f3e2a7c
+Step 3/3 : COPY . /app
+ ---> 9e8f7a6b5c4d
+Successfully built 9e8f7a6b5c4d
+'''
+
+
+def _parse(text, failed=False):
+    events = []
+    parser = BuildLogParser('app:dev', events.append)
+    for line in text.splitlines(keepends=True):
+        parser.feed(line)
+    parser.close(failed=failed)
+    return parser, events
+
+
+def test_build_command_cache_options():
+    assert build_command('/src', 'app:dev', cache_from=['app:latest'], no_cache=True, target='prod',
+                         build_args={"VERSION": '1.2'}) == [
+        'docker', 'build', '--progress=plain', '-t', 'app:dev', '--no-cache', '--cache-from', 'app:latest',
+        '--target', 'prod', '--build-arg', 'VERSION=1.2', '/src']
+    assert build_command('.', 'app', build_args=['A=1']) == \
+        ['docker', 'build', '--progress=plain', '-t', 'app', '--build-arg', 'A=1', '.']
+
+
+def test_buildkit_steps_and_timings():
+    parser, events = _parse(BUILDKIT, failed=True)
+    summary = parser.summary()
+    assert [(s["id"], s["status"], s["duration"], s["cached"]) for s in summary["steps"][:3]] == [
+        (1, 'done', 0.1, False), (2, 'cached', 0.0, True), (3, 'done', 5.2, False)]
+    assert summary["steps"][3]["status"] == 'error'
+    assert summary["cached_steps"] == 1
+    assert summary["slowest"][0]["name"] == '[2/3] RUN pip install -r requirements.txt'
+    logs = [(e["step"], e["line"]) for e in events if e["type"] == 'log']
+    # BuildKit's elapsed-time prefix is stripped from log lines
+    assert (3, 'Collecting flask') in logs
+    assert logs[-1] == (4, 'ERROR: failed to compute cache key: "/app" not found')
+    assert all(e["tag"] == 'app:dev' for e in events)
+
+
+def test_legacy_builder_steps():
+    parser, events = _parse(LEGACY)
+    steps = parser.summary()["steps"]
+    assert [(s["id"], s["name"], s["status"], s["cached"]) for s in steps] == [
+        (1, 'FROM alpine:3.19', 'done', False), (2, 'RUN apk add curl', 'cached', True),
+        (3, 'COPY . /app', 'done', False)]
+    assert events[0] == {"type": 'log', "step": None, "line": 'Sending build context to Docker daemon  3.072kB',
+                         "tag": 'app:dev'}
+
+
+def test_run_build_streams_a_process(tmp_path):
+    script = tmp_path / 'build.py'
+    script.write_text(f'import sys, os\nsys.stdout.write({BUILDKIT!r})\n'
+                      'sys.exit(0 if os.environ.get("DOCKER_BUILDKIT") == "1" else 3)\n')
+    events = []
+    returncode, output, summary, seconds = run_build([sys.executable, str(script)], 'app:dev', events.append)
+    assert returncode == 0 and output == BUILDKIT
+    assert len(summary["steps"]) == 4 and seconds >= 0
+    assert events[0]["type"] == 'step' and events[0]["step"]["status"] == 'running'
@@ -0,0 +1,97 @@
+import json
+import time
+import threading
+
+import pytest
+
+import docker_bulk
+from docker_bulk import _normalize_labels, run_bulk
+
+
+class FakeManager:
+    """The single-container methods bulk actions fan out to, recording each call"""
+
+    def __init__(self, delay=0.0):
+        self.engine = None
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _call(self, *call):
+        with self._lock:
+            self.calls.append(call)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        if call[1] == 'gone':
+            return json.dumps({"success": False, "error": "Container gone not found"})
+        if call[1] == 'broken':
+            raise RuntimeError('unexpected reply')
+        return json.dumps({"success": True, "message": f"{call[0]} {call[1]}: done"})
+
+    def start_container(self, ID):
+        return self._call('start', ID)
+
+    def stop_container(self, ID, timeout=None):
+        return self._call('stop', ID, timeout)
+
+    def restart_container(self, ID, timeout=None):
+        return self._call('restart', ID, timeout)
+
+    def delete_container(self, ID, force=False):
+        return self._call('delete', ID, force)
+
+
+def test_normalize_labels():
+    assert _normalize_labels(None) == []
+    assert _normalize_labels('tier=web') == ['tier=web']
+    assert _normalize_labels({"tier": 'web', "managed": None}) == ['tier=web', 'managed']
+
+
+def test_every_target_gets_its_own_result():
+    manager = FakeManager()
+    result = run_bulk(manager, 'stop', ['web-1', 'gone', 'broken', 'web-1'], timeout=5)
+    assert (result["action"], result["total"], result["succeeded"], result["failed"]) == ('stop', 3, 1, 2)
+    assert list(result["results"]) == ['web-1', 'gone', 'broken']
+    assert result["results"]['gone']["error"] == 'Container gone not found'
+    assert result["results"]['broken']["error"] == 'unexpected reply'
+    assert all("seconds" in entry for entry in result["results"].values())
+    assert sorted(manager.calls) == [('stop', 'broken', 5), ('stop', 'gone', 5), ('stop', 'web-1', 5)]
+
+
+def test_targets_run_concurrently_up_to_max_workers():
+    manager = FakeManager(delay=0.2)
+    started = time.monotonic()
+    result = run_bulk(manager, 'restart', [f'web-{i}' for i in range(8)], max_workers=4)
+    assert result["succeeded"] == 8
+    assert manager.peak == 4
+    assert time.monotonic() - started < 1.2
+
+
+def test_label_selectors_resolve_through_one_listing(monkeypatch):
+    listings = []
+
+    def docker_ps(cmd, **kwargs):
+        listings.append(cmd)
+        return 'a1b2c3d4e5f6\nf6e5d4c3b2a1\n'
+
+    monkeypatch.setattr(docker_bulk, 'traced_check_output', docker_ps)
+    manager = FakeManager()
+    result = run_bulk(manager, 'delete', ['a1b2c3d4e5f6', 'extra'], labels={"tier": 'web', "managed": ''},
+                      force=True)
+    assert listings == [['docker', 'ps', '-a', '-q', '--filter', 'label=tier=web', '--filter', 'label=managed']]
+    assert list(result["results"]) == ['a1b2c3d4e5f6', 'extra', 'f6e5d4c3b2a1']
+    assert ('delete', 'extra', True) in manager.calls
+
+
+@pytest.mark.parametrize('action, ids, message', [
+    ('pause', ['web'], 'Unknown bulk action'),
+    ('stop', [], 'Provide container IDs or label selectors'),
+])
+def test_invalid_requests(action, ids, message):
+    with pytest.raises(ValueError, match=message):
+        run_bulk(FakeManager(), action, ids)
@@ -0,0 +1,306 @@
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import docker as docker_module
+from docker import DockerManager
+from docker_engine import DockerEngineClient, DockerEngineError, DockerEngineUnavailable
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers from the server's route table: path -> (status, body, options)"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return 'unix'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, body, options = self.server.routes.get(self.path, (404, {"message": "page not found"}, {}))
+        if callable(body):
+            body = body()
+        self.send_response(status)
+        if options.get('chunks'):
+            self.send_header('Content-Type', options.get('content_type', 'application/json'))
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in options['chunks']:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_header('Content-Type', options.get('content_type', 'application/json'))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # Send only the first `truncate` bytes of the body, then hang up
+        if options.get('truncate') is not None:
+            self.wfile.write(body[:options['truncate']])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+        # Drop the connection without announcing it, as a daemon timing out an idle client does
+        if options.get('drop'):
+            self.close_connection = True
+
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(path, Handler)
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+
+
+@pytest.fixture
+def socket_dir():
+    # Unix socket paths are limited to ~100 bytes, which pytest's tmp_path can exceed
+    directory = tempfile.mkdtemp(prefix='engine-')
+    yield directory
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def engine(socket_dir):
+    server = FakeEngine(f'{socket_dir}/docker.sock')
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **options):
+    return DockerEngineClient(server.server_address, timeout=5, **options)
+
+
+def _frame(stream, text):
+    payload = text.encode()
+    return bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, 'big') + payload
+
+
+def test_keep_alive_reuses_one_connection(engine):
+    engine.routes['/version'] = (200, {"ApiVersion": "1.43"}, {})
+    client = _client(engine)
+    for _ in range(3):
+        assert client.get_json('/version') == {"ApiVersion": "1.43"}
+    assert engine.connections == 1
+    assert len(client._idle) == 1
+    client.close()
+
+
+def test_query_parameters_are_encoded(engine):
+    engine.routes['/containers/json?all=1&filters=%7B%22label%22%3A+%5B%22a%3Db%22%5D%7D'] = (200, [], {})
+    client = _client(engine)
+    assert client.get_json('/containers/json', params={'all': True, 'filters': {'label': ['a=b']},
+                                                       'limit': None}) == []
+    client.close()
+
+
+def test_dropped_idle_connection_is_retried_on_a_new_one(engine):
+    engine.routes['/_ping'] = (200, b'OK', {"content_type": 'text/plain', "drop": True})
+    client = _client(engine)
+    assert client.ping()
+    # The pooled connection is dead now; the request goes out again on a fresh one
+    assert client.ping()
+    assert engine.connections == 2
+    assert engine.requests == ['/_ping', '/_ping']
+    client.close()
+
+
+def test_pool_keeps_at_most_pool_size_idle_connections(engine):
+    engine.routes['/version'] = (200, {}, {})
+    client = _client(engine, pool_size=1)
+    first, _ = client._acquire(5)
+    second, _ = client._acquire(5)
+    client._release(first)
+    client._release(second)
+    assert client._idle == [first]
+    assert second.sock is None
+    client.close()
+
+
+def test_chunked_json_stream_is_read_as_it_arrives(engine):
+    events = [{"status": "start", "id": "a"}, {"status": "die", "id": "a"}]
+    lines = [json.dumps(event).encode() + b'\n' for event in events]
+    # One event split over two chunks, plus a blank keep-alive line
+    engine.routes['/events'] = (200, None, {"chunks": [lines[0][:5], lines[0][5:] + b'\n', lines[1]]})
+    client = _client(engine)
+    with client.stream('GET', '/events') as response:
+        assert list(response.iter_json()) == events
+    client.close()
+
+
+def test_chunked_body_is_reassembled_by_request(engine):
+    engine.routes['/images/json'] = (200, None, {"chunks": [b'[{"Id": ', b'"sha256:ab"}]']})
+    client = _client(engine)
+    assert client.get_json('/images/json') == [{"Id": "sha256:ab"}]
+    client.close()
+
+
+def test_multiplexed_frames_are_split_across_chunks(engine):
+    data = _frame(1, 'out line\n') + _frame(2, 'err line\n')
+    engine.routes['/containers/a/logs'] = (200, None, {"content_type": 'application/vnd.docker.raw-stream',
+                                                       "chunks": [data[:3], data[3:12], data[12:]]})
+    client = _client(engine)
+    with client.stream('GET', '/containers/a/logs') as response:
+        assert list(response.iter_frames()) == [(1, b'out line\n'), (2, b'err line\n')]
+    client.close()
+
+
+def test_streams_do_not_return_their_connection_to_the_pool(engine):
+    engine.routes['/events'] = (200, None, {"chunks": [b'{}\n']})
+    client = _client(engine)
+    with client.stream('GET', '/events') as response:
+        list(response.iter_lines())
+    assert client._idle == []
+    client.close()
+
+
+def test_json_error_body_becomes_docker_engine_error(engine):
+    engine.routes['/containers/nope/json'] = (404, {"message": "No such container: nope"}, {})
+    client = _client(engine)
+    with pytest.raises(DockerEngineError) as raised:
+        client.get_json('/containers/nope/json')
+    assert raised.value.status == 404
+    assert raised.value.message == 'No such container: nope'
+    # The error body was read in full, so the connection is still usable
+    engine.routes['/version'] = (200, {}, {})
+    client.get_json('/version')
+    assert engine.connections == 1
+    client.close()
+
+
+def test_plain_text_and_empty_error_bodies(engine):
+    engine.routes['/text'] = (500, b'server error\n', {"content_type": 'text/plain'})
+    engine.routes['/empty'] = (409, b'', {"content_type": 'text/plain'})
+    client = _client(engine)
+    with pytest.raises(DockerEngineError, match='^server error$'):
+        client.request('GET', '/text')
+    with pytest.raises(DockerEngineError, match='^HTTP 409$'):
+        client.request('GET', '/empty')
+    client.close()
+
+
+def test_stream_errors_are_raised_before_reading(engine):
+    engine.routes['/containers/x/stats'] = (409, {"message": "Container x is not running"}, {})
+    client = _client(engine)
+    with pytest.raises(DockerEngineError, match='not running'):
+        client.stream('GET', '/containers/x/stats')
+    client.close()
+
+
+def test_missing_socket_is_unavailable(socket_dir):
+    client = DockerEngineClient(f'{socket_dir}/absent.sock')
+    assert not client.is_configured()
+    with pytest.raises(DockerEngineUnavailable):
+        client.request('GET', '/_ping')
+    assert not client.ping()
+
+
+def test_socket_without_a_daemon_is_unavailable(socket_dir):
+    # A stale socket file left by a daemon that exited: the file exists, connecting is refused
+    path = f'{socket_dir}/stale.sock'
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.close()
+    client = DockerEngineClient(path)
+    assert client.is_configured()
+    with pytest.raises(DockerEngineUnavailable):
+        client.request('GET', '/_ping')
+
+
+def _fake_cli(monkeypatch, rows):
+    calls = []
+
+    def check_output(cmd, **kwargs):
+        calls.append(cmd)
+        return ''.join(json.dumps(row) + '\n' for row in rows)
+
+    monkeypatch.setattr(docker_module, 'traced_check_output', check_output)
+    return calls
+
+
+def test_manager_falls_back_to_the_cli_without_a_socket(socket_dir, monkeypatch):
+    calls = _fake_cli(monkeypatch, [{"Repository": "nginx", "Tag": "latest", "ID": "4f2a9c1e0b7d"}])
+    manager = DockerManager(engine=DockerEngineClient(f'{socket_dir}/absent.sock'))
+    result = json.loads(manager.list_images())
+    assert result == {"success": True, "data": [{"Repository": "nginx", "Tag": "latest", "ID": "4f2a9c1e0b7d"}]}
+    assert calls and calls[0][:3] == ['docker', 'image', 'ls']
+
+
+def test_manager_falls_back_to_the_cli_when_the_daemon_is_gone(socket_dir, monkeypatch):
+    path = f'{socket_dir}/stale.sock'
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.close()
+    calls = _fake_cli(monkeypatch, [])
+    manager = DockerManager(engine=DockerEngineClient(path))
+    assert json.loads(manager.list_images()) == {"success": True, "data": []}
+    assert len(calls) == 1
+
+
+def test_manager_uses_the_engine_when_it_answers(engine, monkeypatch):
+    engine.routes['/images/json'] = (200, [{"Id": "sha256:4f2a9c1e0b7d11", "RepoTags": ["nginx:latest"],
+                                            "RepoDigests": [], "Created": 1714550400, "Size": 1000}], {})
+    calls = _fake_cli(monkeypatch, [])
+    manager = DockerManager(engine=_client(engine))
+    result = json.loads(manager.list_images())
+    assert [(row["Repository"], row["Tag"], row["ID"]) for row in result["data"]] == \
+        [('nginx', 'latest', '4f2a9c1e0b7d')]
+    assert calls == []
+
+
+def test_manager_reports_engine_errors_without_falling_back(engine, monkeypatch):
+    engine.routes['/images/json'] = (500, {"message": "layer store is corrupt"}, {})
+    calls = _fake_cli(monkeypatch, [])
+    manager = DockerManager(engine=_client(engine))
+    assert json.loads(manager.list_images()) == {"success": False, "error": "layer store is corrupt"}
+    assert calls == []
+
+
+def test_connection_dropped_mid_body_is_unavailable_to_callers(engine):
+    engine.routes['/images/json'] = (200, [{"Id": "sha256:4f2a9c1e0b7d11"}] * 50, {"truncate": 100})
+    client = _client(engine)
+    with pytest.raises(ConnectionResetError, match='after 100 bytes'):
+        client.get_json('/images/json')
+    # The broken connection is not pooled
+    assert client._idle == []
+    client.close()
+
+
+def test_manager_falls_back_to_the_cli_when_the_daemon_drops_mid_body(engine, monkeypatch):
+    engine.routes['/images/json'] = (200, [{"Id": "sha256:4f2a9c1e0b7d11", "RepoTags": ["nginx:latest"],
+                                            "RepoDigests": [], "Created": 1714550400, "Size": 1000}],
+                                     {"truncate": 20})
+    calls = _fake_cli(monkeypatch, [{"Repository": "nginx", "Tag": "latest", "ID": "4f2a9c1e0b7d"}])
+    manager = DockerManager(engine=_client(engine))
+    result = json.loads(manager.list_images())
+    assert result["success"] and result["data"][0]["ID"] == '4f2a9c1e0b7d'
+    assert len(calls) == 1 and engine.requests == ['/images/json']
+
+
+def test_manager_reports_an_unparseable_reply(engine, monkeypatch):
+    engine.routes['/images/json'] = (200, b'[{"Id": "sha256:4f2a', {})
+    calls = _fake_cli(monkeypatch, [])
+    manager = DockerManager(engine=_client(engine))
+    result = json.loads(manager.list_images())
+    assert not result["success"]
+    assert result["error"].startswith('Invalid response from the Docker daemon')
+    assert calls == []
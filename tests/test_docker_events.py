@@ -0,0 +1,113 @@
+import json
+import time
+import queue
+import threading
+
+from docker_events import DockerInventory
+
+CONTAINER = {"ID": "93bc7c72b23c", "Names": "web", "State": "running"}
+IMAGE = {"ID": "4f2a9c1e0b7d", "Repository": "nginx", "Tag": "latest"}
+
+
+class FakeManager:
+    engine = None
+    cache = None
+
+    def list_containers(self, fresh=False):
+        return json.dumps({"success": True, "data": [CONTAINER]})
+
+    def list_images(self, fresh=False):
+        return json.dumps({"success": True, "data": [IMAGE]})
+
+
+class FakeStream:
+    """An events stream that blocks until aborted, like GET /events on an idle daemon"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            yield event
+
+    def abort(self):
+        self.events.put(None)
+
+    def close(self):
+        self.abort()
+        # Closing a real stream takes a moment (terminating the CLI, shutting the socket)
+        time.sleep(0.2)
+
+
+class Recorder:
+    def __init__(self):
+        self.deltas = []
+        self.snapshot = threading.Event()
+
+    def __call__(self, delta):
+        self.deltas.append(delta)
+        if delta["kind"] == "snapshot":
+            self.snapshot.set()
+
+
+def _inventory(monkeypatch):
+    inventory = DockerInventory(FakeManager())
+    streams = []
+
+    def open_stream():
+        stream = FakeStream()
+        streams.append(stream)
+        inventory._stream = stream
+        return iter(stream)
+
+    monkeypatch.setattr(inventory, '_open_stream', open_stream)
+    return inventory, streams
+
+
+def test_first_listener_gets_a_snapshot(monkeypatch):
+    inventory, _ = _inventory(monkeypatch)
+    listener = Recorder()
+    inventory.add_listener(listener)
+    assert listener.snapshot.wait(5)
+    assert listener.deltas[0]["containers"] == [CONTAINER]
+    inventory.remove_listener(listener)
+
+
+def test_resubscribing_while_the_watcher_is_still_stopping(monkeypatch):
+    inventory, streams = _inventory(monkeypatch)
+    first = Recorder()
+    inventory.add_listener(first)
+    assert first.snapshot.wait(5)
+    watcher = inventory._thread
+
+    inventory.remove_listener(first)
+    second = Recorder()
+    # The old watcher is still closing its aborted stream
+    assert watcher.is_alive()
+    inventory.add_listener(second)
+
+    assert second.snapshot.wait(5), 'the new listener never got a snapshot'
+    assert not inventory._stop.is_set()
+    assert inventory._thread is watcher and watcher.is_alive()
+    assert len(streams) == 2
+    inventory.remove_listener(second)
+
+
+def test_resubscribing_after_the_watcher_exited(monkeypatch):
+    inventory, streams = _inventory(monkeypatch)
+    first = Recorder()
+    inventory.add_listener(first)
+    assert first.snapshot.wait(5)
+    watcher = inventory._thread
+    inventory.remove_listener(first)
+    watcher.join(5)
+    assert not watcher.is_alive() and inventory._thread is None
+
+    second = Recorder()
+    inventory.add_listener(second)
+    assert second.snapshot.wait(5)
+    assert inventory._thread is not watcher
+    inventory.remove_listener(second)
@@ -0,0 +1,164 @@
+import json
+import types
+import subprocess
+
+import pytest
+
+import api
+import docker_logs
+from docker_logs import LogFilter, LogStreams, parse_tail, parse_timestamp, render
+
+LINES = [
+    '2024-05-01T10:00:00.000000001Z starting server',
+    '2024-05-01T10:00:01.000000000Z INFO listening on :8080',
+    '2024-05-01T10:00:02.500000000Z WARN slow request /api/items',
+    '2024-05-01T10:00:03.000000000Z ERROR database connection lost',
+    '2024-05-01T10:00:04.000000000Z INFO reconnected',
+]
+
+
+class FakeLogs:
+    """Stands in for traced_run(['docker', 'logs', ...]), honouring --tail and --since"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        self.calls.append(cmd)
+        lines = self.lines
+        if '--since' in cmd:
+            since = parse_timestamp(cmd[cmd.index('--since') + 1])
+            # The daemon's --since is inclusive
+            lines = [line for line in lines if parse_timestamp(line.split(' ', 1)[0]) >= since]
+        tail = cmd[cmd.index('--tail') + 1]
+        if tail != 'all':
+            lines = lines[-int(tail):] if int(tail) else []
+        return subprocess.CompletedProcess(cmd, 0, ''.join(line + '\n' for line in lines), '')
+
+
+class FakeFollower:
+    """A follower that already holds every line, so follow() needs no daemon"""
+    created = []
+
+    def __init__(self, manager, container, tail, buffer_lines):
+        self.tail = tail
+        self.error = None
+        self.alive = True
+        FakeFollower.created.append(self)
+
+    def start(self):
+        pass
+
+    def settle(self):
+        pass
+
+    def attach(self, listener, log_filter):
+        return [docker_logs.parse_line(line) for line in LINES]
+
+
+@pytest.fixture
+def fake_logs(monkeypatch):
+    fake = FakeLogs(LINES)
+    monkeypatch.setattr(docker_logs, 'traced_run', fake)
+    return fake
+
+
+@pytest.fixture
+def streams():
+    # No engine, so reads go through the (stubbed) CLI
+    return LogStreams(types.SimpleNamespace(engine=None))
+
+
+def _lines(entries):
+    return [entry["line"] for entry in entries]
+
+
+@pytest.mark.parametrize('value, expected', [(100, 100), ('100', 100), (' 7 ', 7), (0, 0), ('all', None),
+                                             (None, None)])
+def test_parse_tail(value, expected):
+    assert parse_tail(value) == expected
+
+
+@pytest.mark.parametrize('value', ['-5', 'ten', '', -1, True, 2.5])
+def test_parse_tail_rejects_anything_else(value):
+    with pytest.raises(ValueError, match='Invalid tail'):
+        parse_tail(value)
+
+
+def test_read_accepts_string_tails(streams, fake_logs):
+    entries, truncated = streams.read('web', tail='2')
+    assert _lines(entries) == ['ERROR database connection lost', 'INFO reconnected']
+    assert not truncated
+    entries, truncated = streams.read('web', tail='all')
+    assert len(entries) == len(LINES) and not truncated
+    assert [call[call.index('--tail') + 1] for call in fake_logs.calls] == ['2', 'all']
+
+
+def test_invalid_tail_is_rejected_before_fetching(streams, fake_logs):
+    with pytest.raises(ValueError, match='Invalid tail'):
+        streams.read('web', tail='lots')
+    assert fake_logs.calls == []
+
+
+def test_follow_accepts_string_tails(streams, monkeypatch):
+    FakeFollower.created = []
+    monkeypatch.setattr(docker_logs, 'LogFollower', FakeFollower)
+    assert _lines(streams.follow('web', print, LogFilter(), tail='1')) == ['INFO reconnected']
+    assert len(streams.follow('api', print, LogFilter(), tail='all')) == len(LINES)
+    assert [follower.tail for follower in FakeFollower.created] == [1, 'all']
+
+
+def test_invalid_tail_is_rejected_before_attaching(streams, monkeypatch):
+    FakeFollower.created = []
+    monkeypatch.setattr(docker_logs, 'LogFollower', FakeFollower)
+    with pytest.raises(ValueError, match='Invalid tail'):
+        streams.follow('web', print, LogFilter(), tail='-1')
+    assert FakeFollower.created == [] and streams._followers == {}
+
+
+def test_cursor_returns_only_newer_lines(streams, fake_logs):
+    entries, _ = streams.read('web', tail=2)
+    cursor = render(entries)["cursor"]
+    assert cursor == '2024-05-01T10:00:04.000000000Z'
+    fake_logs.lines = LINES + ['2024-05-01T10:00:05.000000000Z INFO shutting down']
+    newer, _ = streams.read('web', cursor=parse_timestamp(cursor))
+    assert _lines(newer) == ['INFO shutting down']
+    # Everything after the cursor is asked for, starting at the cursor
+    assert fake_logs.calls[-1][:6] == ['docker', 'logs', '--timestamps', '--tail', 'all', '--since']
+
+
+def test_filters_apply_before_the_tail_is_cut(streams, fake_logs):
+    entries, truncated = streams.read('web', tail=1, log_filter=LogFilter(levels=['info', 'warning']))
+    assert _lines(entries) == ['INFO reconnected'] and truncated
+    # A filtered read scans more than `tail` lines so the filter has something to choose from
+    assert fake_logs.calls[-1][4] == str(docker_logs.DEFAULT_SCAN_LINES)
+    entries, _ = streams.read('web', tail=10, log_filter=LogFilter(pattern=r'connect'))
+    assert _lines(entries) == ['ERROR database connection lost', 'INFO reconnected']
+    window = LogFilter(since='2024-05-01T10:00:01Z', until='2024-05-01T10:00:03Z')
+    assert len(streams.read('web', log_filter=window)[0]) == 3
+
+
+def test_invalid_filters_are_rejected():
+    with pytest.raises(ValueError, match='Invalid pattern'):
+        LogFilter(pattern='(unclosed')
+    with pytest.raises(ValueError, match='Invalid timestamp'):
+        LogFilter(since='yesterday')
+
+
+def test_levels_are_detected_from_the_line():
+    entry = docker_logs.parse_line('2024-05-01T10:00:00+02:00 [warning] disk 91% full', 'stderr')
+    assert entry == {"ts": '2024-05-01T10:00:00+02:00', "nanos": parse_timestamp('2024-05-01T08:00:00Z'),
+                     "stream": 'stderr', "line": '[warning] disk 91% full', "level": 'warn'}
+
+
+def test_api_reports_a_bad_tail_as_invalid_params():
+    with pytest.raises(api.ActionError) as raised:
+        api.prepare('docker', 'get_container_logs', {"id": 'web', "tail": 'everything'})
+    assert raised.value.code == api.INVALID_PARAMS
+    assert 'Invalid tail' in raised.value.message
+    assert json.loads(api.dispatch('docker', 'follow_logs', {"id": 'web', "tail": '-1'}))["success"] is False
+    _, kwargs = api.prepare('docker', 'get_container_logs', {"id": 'web', "tail": 'all'})
+    assert kwargs["tail"] is None
+    _, kwargs = api.prepare('docker', 'follow_logs', {"id": 'web', "tail": '50'})
+    assert kwargs["tail"] == 50
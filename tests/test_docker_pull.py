@@ -0,0 +1,135 @@
+import types
+import threading
+
+import pytest
+
+import docker_pull
+from docker_pull import PullManager, layer_event
+
+
+class FakeStream:
+    """Stands in for a StreamResponse; `block` holds the stream open until abort()"""
+
+    def __init__(self, messages, block=False):
+        self.messages = messages
+        self.block = block
+        self.aborted = threading.Event()
+        self.closed = False
+
+    def iter_json(self):
+        yield from self.messages
+        if self.block:
+            self.aborted.wait(5)
+            raise ConnectionResetError('connection aborted')
+
+    def abort(self):
+        self.aborted.set()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    def __init__(self):
+        self.streams = {}
+        self.requests = []
+        self.opened = threading.Event()
+
+    def is_configured(self):
+        return True
+
+    def stream(self, method, path, params=None, timeout=None):
+        self.requests.append((method, path, params))
+        self.opened.set()
+        return self.streams[params['fromImage']]
+
+
+@pytest.fixture
+def engine():
+    return FakeEngine()
+
+
+@pytest.fixture
+def pulls(engine):
+    pulls = PullManager(types.SimpleNamespace(engine=engine))
+    yield pulls
+    pulls.pool.shutdown(wait=True)
+
+
+def _progress(layer, current, total=1000):
+    return {"status": 'Downloading', "id": layer, "progressDetail": {"current": current, "total": total}}
+
+
+NGINX = [
+    {"status": 'Pulling from library/nginx', "id": 'latest'},
+    {"status": 'Pulling fs layer', "id": 'a2abf6c4d29d', "progressDetail": {}},
+    _progress('a2abf6c4d29d', 100),
+    _progress('a2abf6c4d29d', 200),
+    _progress('a2abf6c4d29d', 300),
+    {"status": 'Download complete', "id": 'a2abf6c4d29d', "progressDetail": {}},
+    {"status": 'Pull complete', "id": 'a2abf6c4d29d', "progressDetail": {}},
+    {"status": 'Digest: sha256:0d17b565c37bcbd895e9d92315a05c1c3c9a29f762b011a10c54a66cd53c9b31'},
+]
+
+
+def test_layer_event():
+    assert layer_event('nginx', _progress('a2ab', 5)) == {
+        "image": 'nginx', "layer": 'a2ab', "phase": 'downloading', "status": 'Downloading', "current": 5,
+        "total": 1000}
+    assert layer_event('nginx', {"status": 'Status: Image is up to date', "id": None}) == {
+        "image": 'nginx', "layer": None, "phase": 'status', "status": 'Status: Image is up to date'}
+
+
+def test_pull_streams_phase_changes_and_rate_limits_bytes(engine, pulls, monkeypatch):
+    monkeypatch.setattr(docker_pull, 'PROGRESS_INTERVAL', 60)
+    engine.streams['nginx'] = FakeStream(NGINX)
+    events = []
+    result = pulls.pull('nginx', events.append)
+    assert engine.requests == [('POST', '/images/create', {'fromImage': 'nginx', 'tag': 'latest'})]
+    assert result["success"] and result["layers"]['a2abf6c4d29d']["phase"] == 'done'
+    assert result["output"].splitlines()[0] == 'latest: Pulling from library/nginx'
+    # Only the first byte update of a phase goes out inside the interval; every phase change does
+    assert [(event["phase"], event.get("current")) for event in events] == [
+        ('status', None), ('waiting', None), ('downloading', 100), ('downloaded', None), ('done', None),
+        ('status', None), ('complete', None)]
+    assert engine.streams['nginx'].closed
+
+
+def test_daemon_error_fails_the_pull(engine, pulls):
+    engine.streams['private/app'] = FakeStream([{"status": 'Pulling from private/app', "id": 'latest'},
+                                                {"error": 'pull access denied for private/app'}])
+    events = []
+    result = pulls.pull('private/app', events.append)
+    assert result == {"success": False, "error": 'Failed to pull image private/app',
+                      "details": 'pull access denied for private/app'}
+    assert events[-1]["phase"] == 'failed'
+
+
+def test_cancel_aborts_the_stream(engine, pulls):
+    engine.streams['ubuntu'] = FakeStream(NGINX[:3], block=True)
+    events = []
+    outcome = {}
+
+    def run():
+        outcome.update(pulls.pull('ubuntu', events.append))
+
+    pull = threading.Thread(target=run, daemon=True)
+    pull.start()
+    assert engine.opened.wait(5)
+    # One pull per image at a time
+    assert pulls.pull('ubuntu') == {"success": False, "error": 'Image ubuntu is already being pulled'}
+    assert pulls.active() == ['ubuntu']
+    assert pulls.cancel('ubuntu')
+    pull.join(5)
+    assert outcome == {"success": False, "error": 'Pull of ubuntu cancelled', "cancelled": True}
+    assert events[-1]["phase"] == 'cancelled'
+    assert pulls.active() == [] and not pulls.cancel('ubuntu')
+
+
+def test_pull_many_pulls_each_name_once(engine, pulls):
+    engine.streams['nginx'] = FakeStream(NGINX)
+    engine.streams['redis'] = FakeStream([{"status": 'Already exists', "id": 'b1c2', "progressDetail": {}}])
+    results = pulls.pull_many(['nginx', 'redis', 'nginx'])
+    assert list(results) == ['nginx', 'redis']
+    assert all(result["success"] for result in results.values())
+    assert len(engine.requests) == 2
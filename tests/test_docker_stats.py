@@ -0,0 +1,87 @@
+import json
+import time
+import subprocess
+
+import pytest
+
+import docker_metrics
+from docker import DockerManager
+from docker_engine import DockerEngineClient
+
+CONTAINERS = {
+    'web': {"ID": 'a1b2c3d4e5f6', "Name": 'web', "CPUPerc": '1.50%', "MemUsage": '20MiB / 1GiB', "MemPerc": '1.95%',
+            "NetIO": '1kB / 2kB', "BlockIO": '0B / 0B', "PIDs": '3'},
+    'db': {"ID": 'f6e5d4c3b2a1', "Name": 'db', "CPUPerc": '0.20%', "MemUsage": '200MiB / 1GiB', "MemPerc": '19.5%',
+           "NetIO": '0B / 0B', "BlockIO": '4MB / 1MB', "PIDs": '12'},
+}
+
+
+class FakeStats:
+    """Stands in for traced_run(['docker', 'stats', ...]) and counts the calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        self.calls.append(cmd)
+        ids = cmd[5:]
+        for ID in ids:
+            if ID not in CONTAINERS:
+                return subprocess.CompletedProcess(cmd, 1, '', f'Error response from daemon: No such container: {ID}')
+        rows = [dict(CONTAINERS[ID], Container=ID) for ID in ids] if ids else \
+            [dict(row, Container=row["ID"]) for row in CONTAINERS.values()]
+        return subprocess.CompletedProcess(cmd, 0, ''.join(json.dumps(row) + '\n' for row in rows), '')
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    fake = FakeStats()
+    monkeypatch.setattr(docker_metrics, 'traced_run', fake)
+    return fake
+
+
+@pytest.fixture
+def manager(tmp_path):
+    # No daemon socket, so stats go through the (stubbed) CLI
+    manager = DockerManager(engine=DockerEngineClient(str(tmp_path / 'absent.sock')))
+    yield manager
+    if manager._metrics_collector is not None:
+        manager._metrics_collector.stop()
+
+
+def _batch(manager, ids=None):
+    result = json.loads(manager.get_containers_stats(ids))
+    assert result["success"]
+    return result["data"]
+
+
+def test_every_running_container_in_one_call(manager, stats):
+    data = _batch(manager, 'all')
+    assert set(data) == {'a1b2c3d4e5f6', 'f6e5d4c3b2a1'}
+    assert data['a1b2c3d4e5f6']["stats"]["CPUPerc"] == '1.50%'
+    assert len(stats.calls) == 1
+
+
+def test_one_missing_container_does_not_fail_the_others(manager, stats):
+    data = _batch(manager, ['web', 'gone', 'db', 'web'])
+    assert list(data) == ['web', 'gone', 'db']
+    assert data['web']["success"] and data['db']["success"]
+    assert data['gone'] == {"success": False, "error": 'Container gone not found'}
+    # The combined call fails, then each ID is asked for on its own
+    assert sorted(call[5:] for call in stats.calls) == [['db'], ['gone'], ['web'], ['web', 'gone', 'db']]
+    assert _batch(manager, []) == {}
+
+
+def test_fresh_background_pass_is_reused(manager, stats):
+    assert json.loads(manager.start_metrics(interval=1))["success"]
+    deadline = time.monotonic() + 5
+    while manager._metrics().last_pass is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # By name and by full ID
+    full_id = 'f6e5d4c3b2a1' + '0' * 52
+    data = _batch(manager, ['web', full_id])
+    assert data['web']["stats"]["Name"] == 'web' and data[full_id]["stats"]["Name"] == 'db'
+    # A container the last pass does not know about is sampled now
+    assert not _batch(manager, ['gone'])['gone']["success"]
+    # Only that one was asked for by ID; the loop's own passes cover everything else
+    assert [call[5:] for call in stats.calls if call[5:]] == [['gone']]
@@ -0,0 +1,184 @@
+import json
+import types
+import subprocess
+
+import pytest
+
+import api
+import docker as docker_module
+import response_cache
+from docker import HUB_SEARCH_LIMIT, HUB_SEARCH_TTL, DockerManager
+from docker_engine import DockerEngineClient
+
+# What `docker search --format '{{json .}}'` prints: older CLIs flag official images with "[OK]"
+HUB = {
+    "nginx": [
+        {"Name": "nginx", "Description": "Official build of Nginx.", "StarCount": "20000", "IsOfficial": "[OK]",
+         "IsAutomated": ""},
+        {"Name": "bitnami/nginx", "Description": "Bitnami nginx", "StarCount": "180", "IsOfficial": "",
+         "IsAutomated": ""},
+        {"Name": "nginx/nginx-ingress", "Description": "NGINX Ingress", "StarCount": "90", "IsOfficial": "false",
+         "IsAutomated": "false"},
+        # The registry sometimes repeats a result
+        {"Name": "bitnami/nginx", "Description": "Bitnami nginx", "StarCount": "180", "IsOfficial": "",
+         "IsAutomated": ""},
+        {"Name": "acme/nginx-proxy", "Description": "", "StarCount": "3", "IsOfficial": "false",
+         "IsAutomated": "true"},
+        {"Name": "nginxinc/nginx-unprivileged", "Description": "Unprivileged NGINX", "StarCount": "150",
+         "IsOfficial": "true", "IsAutomated": "false"},
+    ],
+    "nothing-matches-this": [],
+}
+
+
+class FakeHub:
+    """Stands in for traced_run(['docker', 'search', ...]) and counts the calls"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = None
+
+    def __call__(self, cmd, **kwargs):
+        self.calls.append(cmd)
+        if self.fail:
+            return subprocess.CompletedProcess(cmd, 1, '', self.fail)
+        rows = HUB.get(cmd[-1], [])
+        return subprocess.CompletedProcess(cmd, 0, ''.join(json.dumps(row) + '\n' for row in rows), '')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    fake = FakeHub()
+    monkeypatch.setattr(docker_module, 'traced_run', fake)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def manager(tmp_path):
+    # No daemon socket, so searches go through the (stubbed) CLI
+    return DockerManager(engine=DockerEngineClient(str(tmp_path / 'absent.sock')))
+
+
+def _search(manager, name, **options):
+    return json.loads(manager.search_dockerhub(name, **options))
+
+
+def _names(result):
+    return [row["name"] for row in result["data"]]
+
+
+def test_registry_is_asked_once_for_the_first_hub_search_limit_results(manager, hub, clock):
+    result = _search(manager, 'nginx')
+    assert hub.calls == [['docker', 'search', '--no-trunc', '--limit', str(HUB_SEARCH_LIMIT),
+                          '--format', '{{json .}}', 'nginx']]
+    assert result["success"] and result["total"] == 5
+    assert result["data"][0] == {"name": "nginx", "description": "Official build of Nginx.", "star_count": 20000,
+                                 "is_official": True, "is_automated": False}
+
+
+def test_pages_and_filters_are_served_from_one_cached_search(manager, hub, clock):
+    first = _search(manager, 'nginx', page=1, page_size=2)
+    second = _search(manager, 'nginx', page=2, page_size=2)
+    official = _search(manager, ' NGINX ', official_only=True)
+    assert len(hub.calls) == 1
+    assert _names(first) == ['nginx', 'bitnami/nginx']
+    assert _names(second) == ['nginx/nginx-ingress', 'acme/nginx-proxy']
+    assert (first["total"], first["pages"], second["page"]) == (5, 3, 2)
+    assert _names(official) == ['nginx', 'nginxinc/nginx-unprivileged']
+    assert manager.hub_cache.stats()["hits"] == 2
+
+
+def test_filters_apply_before_paging(manager, hub, clock):
+    result = _search(manager, 'nginx', min_stars=100, page=2, page_size=2)
+    assert _names(result) == ['nginxinc/nginx-unprivileged']
+    assert (result["total"], result["pages"]) == (3, 2)
+    limited = _search(manager, 'nginx', limit=3, page_size=2, page=2)
+    assert _names(limited) == ['nginx/nginx-ingress']
+    assert limited["total"] == 3
+
+
+def test_duplicate_results_are_listed_once(manager, hub, clock):
+    assert _names(_search(manager, 'nginx')).count('bitnami/nginx') == 1
+
+
+def test_last_page_and_past_the_end(manager, hub, clock):
+    last = _search(manager, 'nginx', page=3, page_size=2)
+    assert _names(last) == ['nginxinc/nginx-unprivileged']
+    beyond = _search(manager, 'nginx', page=9, page_size=2)
+    assert beyond["data"] == [] and beyond["total"] == 5 and beyond["pages"] == 3
+
+
+def test_empty_result(manager, hub, clock):
+    result = _search(manager, 'nothing-matches-this', page_size=10)
+    assert result == {"success": True, "data": [], "total": 0, "page": 1, "page_size": 10, "pages": 0}
+    # An empty answer is still an answer, and cached like any other
+    _search(manager, 'nothing-matches-this')
+    assert len(hub.calls) == 1
+
+
+def test_cached_search_expires_after_the_ttl(manager, hub, clock):
+    _search(manager, 'nginx')
+    clock.now += HUB_SEARCH_TTL - 1
+    _search(manager, 'nginx', page=2, page_size=2)
+    assert len(hub.calls) == 1
+    clock.now += 2
+    _search(manager, 'nginx')
+    assert len(hub.calls) == 2
+
+
+def test_fresh_bypasses_the_cache(manager, hub, clock):
+    _search(manager, 'nginx')
+    _search(manager, 'nginx', fresh=True)
+    assert len(hub.calls) == 2
+
+
+def test_failures_are_not_cached(manager, hub, clock):
+    hub.fail = 'toomanyrequests: too many search requests, try again later'
+    failed = _search(manager, 'nginx')
+    assert failed == {"success": False, "error": hub.fail}
+    hub.fail = None
+    assert _search(manager, 'nginx')["total"] == 5
+    assert len(hub.calls) == 2
+
+
+def test_invalid_arguments(manager, hub, clock):
+    assert _search(manager, '  ') == {"success": False, "error": "Search term is required"}
+    assert not _search(manager, 'nginx', page_size='ten')["success"]
+    assert _search(manager, 'nginx', page=0, page_size=2) == {"success": False,
+                                                              "error": "page must be 1 or more, got 0"}
+    assert _search(manager, 'nginx', page_size=0)["error"] == \
+        f"page_size must be between 1 and {HUB_SEARCH_LIMIT}, got 0"
+    assert not _search(manager, 'nginx', page=-1)["success"]
+    assert not _search(manager, 'nginx', page_size=HUB_SEARCH_LIMIT + 1)["success"]
+    # Nothing is asked of the registry for a bad request
+    assert hub.calls == []
+    assert _search(manager, 'nginx', page_size=HUB_SEARCH_LIMIT)["pages"] == 1
+    assert len(hub.calls) == 1
+
+
+@pytest.mark.parametrize('params, message', [
+    ({"page": 0}, "Invalid argument 'page': page must be 1 or more, got 0"),
+    ({"page_size": -5}, f"Invalid argument 'page_size': page_size must be between 1 and {HUB_SEARCH_LIMIT}, got -5"),
+    ({"page_size": HUB_SEARCH_LIMIT + 1}, "Invalid argument 'page_size': page_size must be between 1 and "
+                                          f"{HUB_SEARCH_LIMIT}, got {HUB_SEARCH_LIMIT + 1}"),
+])
+def test_api_reports_out_of_range_pages_as_invalid_params(params, message):
+    with pytest.raises(api.ActionError) as raised:
+        api.prepare('docker', 'search_dockerhub', dict(params, name='nginx'))
+    assert (raised.value.code, raised.value.message) == (api.INVALID_PARAMS, message)
+    assert api.prepare('docker', 'search_dockerhub', {"name": 'nginx', "page": 2, "page_size": 10})[1]["page"] == 2
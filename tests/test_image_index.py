@@ -0,0 +1,33 @@
+from image_index import ImageIndex, _SortedTerms
+
+ROWS = [
+    {"ID": "sha256:4f2a9c1e0b7d", "Repository": "nginx", "Tag": "latest", "Digest": "sha256:aa11bb22cc33"},
+    {"ID": "sha256:9e8d7c6b5a41", "Repository": "ghcr.io/acme/web-api", "Tag": "1.25", "Digest": ""},
+]
+
+
+def _index():
+    index = ImageIndex()
+    index.sync(ROWS)
+    return index
+
+
+def test_bare_digest_prefix_matches_everything_like_an_empty_query():
+    index = _index()
+    assert len(index.search('sha256:')) == len(ROWS)
+    assert len(index.search('  sha256:  ')) == len(ROWS)
+
+
+def test_bare_digest_prefix_next_to_a_word_is_ignored():
+    assert [row["Repository"] for row in _index().search('sha256: nginx')] == ['nginx']
+
+
+def test_digest_prefix_still_matches_ids():
+    assert [row["Repository"] for row in _index().search('sha256:9e8d')] == ['ghcr.io/acme/web-api']
+
+
+def test_empty_prefix_matches_no_terms():
+    terms = _SortedTerms()
+    terms.add('nginx', 'repo', 1)
+    assert terms.prefixed('') == []
+    assert terms.prefixed('ng') == [{1}]
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import pstats
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import instrumentation
+from instrumentation import (Histogram, Registry, in_current_span, instrument_actions, prometheus_text,
+                             recent_traces, run_action, span, traced_check_output, traced_popen, traced_run)
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    instrumentation.reset()
+    yield
+    instrumentation.set_profiling(None)
+    instrumentation.reset()
+
+
+def _counters(name):
+    return {tuple(sorted(labels.items())): value for labels, value in instrumentation.REGISTRY.counters(name)}
+
+
+def test_histogram_quantiles_are_bucket_upper_bounds():
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None and histogram.summary()["mean_ms"] is None
+    for seconds in [0.002] * 9 + [0.3]:
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.0025
+    # Never past the slowest observation
+    assert histogram.quantile(0.99) == 0.3
+    histogram.observe(60.0)
+    assert histogram.counts[-1] == 1 and histogram.quantile(1.0) == 60.0
+    summary = histogram.summary()
+    assert (summary["count"], summary["max_ms"], summary["p50_ms"]) == (11, 60000.0, 2.5)
+
+
+def test_registry_keys_by_label_values():
+    registry = Registry()
+    registry.increment('hits', service='docker', action='stop')
+    registry.increment('hits', action='stop', service='docker', amount=2)
+    registry.increment('hits', service='qemu', action='stop')
+    registry.observe('took', 0.01, phase='exec')
+    assert registry.counters('hits') == [({"action": 'stop', "service": 'docker'}, 3),
+                                         ({"action": 'stop', "service": 'qemu'}, 1)]
+    assert [(labels, histogram.count) for labels, histogram in registry.histograms('took')] == [({"phase": 'exec'}, 1)]
+    assert registry.counters('missing') == []
+    registry.reset()
+    assert registry.counters('hits') == []
+
+
+def test_action_trace_nests_its_spans():
+    def list_images():
+        with span('parse', rows=2):
+            with span('inner'):
+                pass
+        return json.dumps({"success": True, "data": []})
+
+    run_action('docker', 'list_images', list_images)
+    [trace] = recent_traces()
+    assert (trace["name"], trace["service"], trace["action"], trace["outcome"]) == \
+        ('action', 'docker', 'list_images', 'success')
+    [parse] = trace["spans"]
+    assert (parse["name"], parse["rows"], parse["spans"][0]["name"]) == ('parse', 2, 'inner')
+    phases = {labels["phase"]: labels for labels, _ in instrumentation.REGISTRY.histograms('backend_phase_seconds')}
+    assert phases['parse']["action"] == phases['inner']["action"] == 'list_images'
+
+
+def test_outcomes_and_nested_actions():
+    def failing():
+        return json.dumps({"success": False, "error": 'No such container'})
+
+    def raising():
+        raise RuntimeError('boom')
+
+    def outer():
+        return run_action('docker', 'inner', failing)
+
+    run_action('docker', 'outer', outer)
+    with pytest.raises(RuntimeError):
+        run_action('docker', 'raising', raising)
+    assert _counters('backend_actions_total') == {
+        (('action', 'inner'), ('outcome', 'error'), ('service', 'docker')): 1,
+        (('action', 'outer'), ('outcome', 'error'), ('service', 'docker')): 1,
+        (('action', 'raising'), ('outcome', 'exception'), ('service', 'docker')): 1,
+    }
+    # Only top-level actions are kept as traces, newest first
+    traces = recent_traces()
+    assert [trace["action"] for trace in traces] == ['raising', 'outer']
+    assert traces[0]["error"] == 'RuntimeError'
+    assert traces[1]["spans"][0]["action"] == 'inner'
+    assert [trace["action"] for trace in recent_traces(limit=1)] == ['raising']
+
+
+def test_child_spans_per_trace_are_capped(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'MAX_CHILD_SPANS', 3)
+
+    def busy():
+        for _ in range(5):
+            with span('parse'):
+                pass
+
+    run_action('qemu', 'busy', busy)
+    trace = recent_traces()[0]
+    assert (len(trace["spans"]), trace["dropped_spans"]) == (3, 2)
+
+
+def test_instrument_actions_wraps_public_methods():
+    @instrument_actions('docker', exclude=('close',))
+    class Manager:
+        def list_containers(self):
+            return 'rows'
+
+        def close(self):
+            return 'closed'
+
+        def _helper(self):
+            return 'private'
+
+    manager = Manager()
+    assert (manager.list_containers(), manager.close(), manager._helper()) == ('rows', 'closed', 'private')
+    assert Manager.list_containers.__name__ == 'list_containers'
+    assert [trace["action"] for trace in recent_traces()] == ['list_containers']
+
+
+def test_pool_threads_attach_to_the_callers_span():
+    def fetch(ID):
+        with span('request', container=ID):
+            return ID
+
+    def fan_out():
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(in_current_span(fetch), ['a', 'b']))
+            # Unwrapped, the thread has no span to attach to
+            pool.submit(fetch, 'c').result()
+
+    run_action('docker', 'bulk', fan_out)
+    assert sorted(child["container"] for child in recent_traces()[0]["spans"]) == ['a', 'b']
+    assert in_current_span(fetch) is fetch
+
+
+def test_traced_run_matches_subprocess_run():
+    program = [sys.executable, '-c', 'import sys; print(sys.stdin.read().upper()); sys.exit(3)']
+
+    def action():
+        return traced_run(program, input='hi', capture_output=True, text=True)
+
+    result = run_action('qemu', 'probe', action)
+    assert (result.returncode, result.stdout, result.args) == (3, 'HI\n', program)
+    assert [child["name"] for child in recent_traces()[0]["spans"]] == ['exec', 'wait']
+    with pytest.raises(subprocess.CalledProcessError) as raised:
+        traced_run(program, input=b'x', capture_output=True, check=True)
+    assert raised.value.stdout == b'X\n'
+    with pytest.raises(subprocess.TimeoutExpired):
+        traced_run([sys.executable, '-c', 'import time; time.sleep(10)'], timeout=0.2)
+    with pytest.raises(ValueError):
+        traced_run(program, capture_output=True, stdout=subprocess.PIPE)
+    assert traced_check_output([sys.executable, '-c', 'print(42)'], text=True) == '42\n'
+    program_name = os.path.basename(sys.executable)
+    assert _counters('backend_subprocess_total') == {
+        (('program', program_name), ('status', 'error')): 2,
+        (('program', program_name), ('status', 'ok')): 1,
+        (('program', program_name), ('status', 'timeout')): 1,
+    }
+
+
+def test_traced_popen_waits_for_exit():
+    with traced_popen([sys.executable, '-c', 'print("line")'], stdout=subprocess.PIPE, text=True) as process:
+        assert process.stdout.readline() == 'line\n'
+    assert process.returncode == 0
+    assert list(_counters('backend_subprocess_total').values()) == [1]
+
+
+def test_prometheus_text_exposition():
+    run_action('docker', 'list "quoted"', lambda: json.dumps({"success": True}))
+    text = prometheus_text()
+    assert '# TYPE backend_action_seconds histogram' in text
+    assert 'backend_action_seconds_bucket{action="list \\"quoted\\"",service="docker",le="+Inf"} 1' in text
+    assert 'backend_action_seconds_count{action="list \\"quoted\\"",service="docker"} 1' in text
+    assert 'backend_actions_total{action="list \\"quoted\\"",outcome="success",service="docker"} 1' in text
+    assert 'backend_uptime_seconds ' in text and text.endswith('\n')
+    # Buckets are cumulative
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('backend_action_seconds_bucket')]
+    assert buckets == sorted(buckets) and buckets[-1] == 1
+
+
+def test_snapshot_summarises_actions():
+    run_action('docker', 'stop', lambda: json.dumps({"success": False, "error": 'x'}))
+    snapshot = instrumentation.snapshot()
+    [action] = snapshot["actions"]
+    assert (action["service"], action["action"], action["count"], action["errors"], action["exceptions"]) == \
+        ('docker', 'stop', 1, 1, 0)
+    assert snapshot["profiling"] == {"enabled": False, "directory": None, "skipped": 0}
+
+
+def test_profiled_actions_write_pstats(tmp_path):
+    if sys.getprofile() is not None:
+        pytest.skip('another profiler is active')
+    directory = str(tmp_path / 'profiles')
+    assert instrumentation.set_profiling(directory)["enabled"]
+    run_action('qemu', 'start_vm', lambda: sum(range(1000)))
+    path = recent_traces()[0]["profile"]
+    assert os.path.dirname(path) == directory and path.endswith('-qemu.start_vm.pstats')
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_metrics_endpoint():
+    run_action('docker', 'ping', lambda: 'OK')
+    server = instrumentation.serve_metrics(0)
+    try:
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        with urllib.request.urlopen(base + '/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert b'backend_actions_total{action="ping",outcome="success",service="docker"} 1' in response.read()
+        with urllib.request.urlopen(base + '/metrics.json', timeout=5) as response:
+            assert json.load(response)["actions"][0]["action"] == 'ping'
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(base + '/other', timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
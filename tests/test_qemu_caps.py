@@ -0,0 +1,82 @@
+import os
+import sys
+import stat
+
+import pytest
+
+from qemu_caps import _parse_help_list, _parse_version, get_capabilities
+
+# Stand-in for qemu-system-x86_64 that logs each probe to calls.log next to it
+FAKE_QEMU = f'''#!{sys.executable}
+import os, sys
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'calls.log'), 'a') as log:
+    log.write(' '.join(sys.argv[1:]) + '\\n')
+if sys.argv[1:] == ['--version']:
+    print('QEMU emulator version 8.2.2 (Debian 1:8.2.2+ds-0ubuntu1)')
+    print('Copyright (c) 2003-2023 Fabrice Bellard and the QEMU Project developers')
+elif sys.argv[1:] == ['-accel', 'help']:
+    print('Accelerators supported in QEMU binary:')
+    print('tcg')
+    print('kvm')
+elif sys.argv[1:] == ['-machine', 'help']:
+    print('Supported machines are:')
+    print('pc                   Standard PC (i440FX + PIIX, 1996) (alias of pc-i440fx-8.2)')
+    print('q35                  Standard PC (Q35 + ICH9, 2009) (alias of pc-q35-8.2)')
+else:
+    sys.exit(1)
+'''
+
+
+@pytest.fixture
+def qemu_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'bin'
+    directory.mkdir()
+    path = directory / 'qemu-system-x86_64'
+    path.write_text(FAKE_QEMU)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(directory))
+    return directory
+
+
+def _probes(qemu_dir):
+    log = qemu_dir / 'calls.log'
+    return log.read_text().splitlines() if log.exists() else []
+
+
+def test_parsers():
+    assert _parse_version('QEMU emulator version 9.0.0\n') == '9.0.0'
+    assert _parse_version(None) is None
+    assert _parse_help_list('Accelerators supported in QEMU binary:\ntcg\nkvm\n\n') == ['tcg', 'kvm']
+
+
+def test_probe_runs_once_and_is_cached_on_disk(qemu_dir):
+    first = get_capabilities(['qemu-system-x86_64'])
+    assert (first["usable"], first["version"], first["cached"]) == (True, '8.2.2', False)
+    assert first["accelerators"] == ['tcg', 'kvm'] and first["machine_types"] == ['pc', 'q35']
+    assert first["path"] == str(qemu_dir / 'qemu-system-x86_64')
+    assert len(_probes(qemu_dir)) == 3
+    second = get_capabilities(['qemu-system-x86_64'])
+    assert second == dict(first, cached=True)
+    assert len(_probes(qemu_dir)) == 3
+
+
+def test_replacing_the_binary_or_refresh_probes_again(qemu_dir):
+    get_capabilities(['qemu-system-x86_64'])
+    binary = qemu_dir / 'qemu-system-x86_64'
+    binary.write_text(FAKE_QEMU + '\n')
+    assert get_capabilities(['qemu-system-x86_64'])["cached"] is False
+    assert get_capabilities(['qemu-system-x86_64'], refresh=True)["cached"] is False
+    assert len(_probes(qemu_dir)) == 9
+
+
+def test_first_candidate_on_path_wins(qemu_dir):
+    result = get_capabilities(['qemu-system-x86_64.exe', 'qemu-system-x86_64'])
+    assert result["binary"] == 'qemu-system-x86_64' and result["usable"]
+
+
+def test_missing_qemu(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmp_path))
+    result = get_capabilities(['qemu-system-x86_64'])
+    assert result == {"binary": 'qemu-system-x86_64', "path": None, "usable": False, "version": None,
+                      "accelerators": [], "machine_types": [], "cached": False}
+    assert not os.path.exists(tmp_path / 'home' / 'cache' / 'qemu_capabilities.json')
@@ -0,0 +1,146 @@
+import os
+import time
+import types
+import threading
+
+import pytest
+
+from qemu_fleet import fleet_settings, launch_fleet
+from vm_registry import VMRegistry
+from vm_scheduler import VMScheduler
+
+
+class FakeQemu:
+    """The parts of Qemu a fleet launch uses, with this test process standing in for QEMU"""
+
+    def __init__(self, tmp_path):
+        self.registry = VMRegistry(str(tmp_path / 'vms.json'))
+        self.scheduler = VMScheduler(self.registry, path=str(tmp_path / 'scheduler.json'))
+        self.launched = []
+        self.exit_status = None
+        self.launch_seconds = 0
+        self.running = self.peak = 0
+        self._lock = threading.Lock()
+
+    def prepare_vm(self, cpu_cores, ram_size, disk_path, iso_path=None, profile=None, options=None):
+        if not disk_path:
+            return None, {"success": False, "error": "Disk path is required."}
+        return ['qemu-system-x86_64', '-smp', str(cpu_cores), '-m', str(ram_size), disk_path], None
+
+    def launch(self, cmd, config=None, name=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.launch_seconds)
+        with self._lock:
+            self.running -= 1
+        process = types.SimpleNamespace(pid=os.getpid(), poll=lambda: self.exit_status)
+        vm_id = self.registry.new_id()
+        self.launched.append((time.monotonic(), name))
+        return process, self.registry.add(vm_id, name, process, f'unix:/tmp/vm-{vm_id}.qmp', config, cmd)
+
+    def forget(self, entry):
+        self.registry.remove(entry["id"])
+
+
+@pytest.fixture
+def qemu(tmp_path):
+    return FakeQemu(tmp_path)
+
+
+def _vm(name, cpu_cores=1, ram_size=64):
+    return {"name": name, "cpu_cores": cpu_cores, "ram_size": ram_size, "disk_path": f'/images/{name}.qcow2'}
+
+
+def _in_background(target):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(result=target()), daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_fleet_settings_shapes():
+    assert fleet_settings([_vm('a')]) == ([_vm('a')], {})
+    assert fleet_settings(_vm('a')) == ([_vm('a')], {})
+    config = {"max_parallel": 2, "vms": [_vm('a'), _vm('b')]}
+    assert fleet_settings(config) == (config["vms"], config)
+
+
+def test_staggered_fleet_does_not_hold_the_scheduler_lock(qemu):
+    entries = [_vm('a'), _vm('b', cpu_cores=2, ram_size=128)]
+    thread, outcome = _in_background(lambda: launch_fleet(qemu, entries, stagger_seconds=0.5, settle_seconds=0))
+    time.sleep(0.2)
+    # The second VM is still waiting for its stagger slot: a single launch can take the lock
+    # meanwhile, and sees the fleet's capacity as committed
+    assert qemu.scheduler.lock.acquire(timeout=0.1)
+    try:
+        usage = qemu.scheduler.usage()
+    finally:
+        qemu.scheduler.lock.release()
+    assert [name for _, name in qemu.launched] == ['a']
+    assert (usage["committed_cpus"], usage["committed_ram_mb"]) == (3, 192)
+    assert (usage["reserved_cpus"], usage["reserved_ram_mb"]) == (2, 128)
+    thread.join(5)
+    assert outcome["result"]["launched"] == 2
+    usage = qemu.scheduler.usage()
+    assert (usage["committed_cpus"], usage["reserved_cpus"], usage["reserved_ram_mb"]) == (3, 0, 0)
+
+
+def test_overcommitted_fleet_is_still_reserved(qemu):
+    limit = qemu.scheduler.usage()["cpu_limit"]
+    entries = [_vm('big', cpu_cores=limit), _vm('small')]
+    thread, outcome = _in_background(lambda: launch_fleet(qemu, entries, stagger_seconds=0.5, settle_seconds=0,
+                                                          allow_overcommit=True))
+    time.sleep(0.2)
+    assert qemu.scheduler.usage()["reserved_cpus"] == 1
+    assert qemu.scheduler.check(1, 64)
+    thread.join(5)
+    assert outcome["result"]["launched"] == 2
+
+
+def test_fleet_over_capacity_launches_nothing(qemu):
+    limit = qemu.scheduler.usage()["cpu_limit"]
+    result = launch_fleet(qemu, [_vm('a', cpu_cores=limit), _vm('b')], settle_seconds=0)
+    assert not result["success"] and result["launched"] == 0
+    assert 'Set allow_overcommit' in result["error"]
+    assert qemu.launched == [] and qemu.scheduler.usage()["reserved_cpus"] == 0
+
+
+def test_invalid_entries_fail_alone(qemu):
+    result = launch_fleet(qemu, [_vm('a'), {"name": 'nodisk', "cpu_cores": 1, "ram_size": 64}, 'junk',
+                                 dict(_vm('a'), name='again')], settle_seconds=0)
+    assert [r["success"] for r in result["results"]] == [True, False, False, False]
+    assert result["results"][1]["error"] == "Disk path is required."
+    assert result["results"][2] == {"name": 'vm-3', "success": False, "error": "VM entry must be a JSON object."}
+    assert 'already used by a' in result["results"][3]["error"]
+
+
+def test_vm_that_exits_right_away_is_forgotten(qemu):
+    qemu.exit_status = 1
+    result = launch_fleet(qemu, [_vm('a')], settle_seconds=0.01)
+    assert result["launched"] == 0 and result["results"][0]["error"] == 'QEMU exited with status 1'
+    assert qemu.registry.entries() == []
+
+
+def test_launches_run_in_parallel_up_to_max_parallel(qemu):
+    qemu.launch_seconds = 0.2
+    result = launch_fleet(qemu, [_vm(f'vm{i}') for i in range(6)], max_parallel=3, settle_seconds=0,
+                          allow_overcommit=True)
+    assert result["launched"] == 6 and qemu.peak == 3
+    assert result["seconds"] < 1.0
+    # Results stay in config order whatever order the launches finished in
+    assert [r["name"] for r in result["results"]] == [f'vm{i}' for i in range(6)]
+    assert all(r["latency_seconds"] >= 0.2 for r in result["results"])
+    assert len(qemu.registry.entries()) == 6
+
+
+def test_stagger_spaces_out_the_starts(qemu):
+    result = launch_fleet(qemu, [_vm('a'), _vm('b'), _vm('c')], stagger_seconds=0.1, settle_seconds=0)
+    offsets = [r["started_after_seconds"] for r in result["results"]]
+    assert offsets == sorted(offsets) and offsets[2] >= 0.2
+
+
+def test_fleet_profile_applies_to_entries_without_one(qemu):
+    launch_fleet(qemu, [_vm('a'), dict(_vm('b'), profile='compat')], profile='performance', settle_seconds=0)
+    assert {entry["name"]: entry["config"]["profile"] for entry in qemu.registry.entries()} == \
+        {'a': 'performance', 'b': 'compat'}
@@ -0,0 +1,54 @@
+import sys
+import json
+
+import pytest
+
+from qemu import Qemu
+
+# Stand-ins for qemu-system-x86_64; the -qmp arguments launch() appends end up in sys.argv
+FAILING = [sys.executable, '-c', 'import sys; sys.stderr.write("qemu: Could not open disk.qcow2\\n"); sys.exit(1)']
+RUNNING = [sys.executable, '-c', 'import time; time.sleep(30)']
+
+
+@pytest.fixture
+def qemu():
+    qemu = Qemu()
+    yield qemu
+    for process in qemu._processes.values():
+        process.kill()
+        process.wait()
+
+
+def test_qemu_exiting_right_away_is_an_error(qemu):
+    result = json.loads(qemu.run_cmd(FAILING, {"cpu_cores": 1, "ram_size": 64}, 'broken', settle_seconds=0.5))
+    assert not result["success"]
+    assert result["error"] == 'qemu: Could not open disk.qcow2'
+    assert '-qmp' in result["command"]
+    assert qemu.registry.entries() == []
+
+
+def test_qemu_that_stays_up_is_started(qemu):
+    result = json.loads(qemu.run_cmd(RUNNING, {"cpu_cores": 1, "ram_size": 64}, 'web', settle_seconds=0.2))
+    assert result["success"] and result["message"] == 'VM started'
+    assert qemu.registry.find('web')["pid"] == result["pid"]
+
+
+def test_reservation_is_released_once_the_vm_is_registered(qemu):
+    reservation = qemu.scheduler.reserve(1, 64)
+    assert qemu.scheduler.usage()["reserved_cpus"] == 1
+    json.loads(qemu.run_cmd(RUNNING, {"cpu_cores": 1, "ram_size": 64}, 'web', settle_seconds=0,
+                            reservation=reservation))
+    usage = qemu.scheduler.usage()
+    assert (usage["reserved_cpus"], usage["committed_cpus"]) == (0, 1)
+
+
+def test_reservation_is_released_when_qemu_is_missing(qemu):
+    reservation = qemu.scheduler.reserve(2, 128)
+    result = json.loads(qemu.run_cmd(['/nonexistent/qemu-system-x86_64'], reservation=reservation))
+    assert result == {"success": False, "error": "QEMU not found. Is Qemu installed and in PATH?"}
+    assert qemu.scheduler.usage()["reserved_cpus"] == 0
+
+
+def test_reserved_cores_are_not_pinned_twice(qemu):
+    qemu.scheduler.reserve(1, 64, cpus=[0])
+    assert qemu.scheduler.usage()["pinned_cpus"] == {0: 'reservation-1'}
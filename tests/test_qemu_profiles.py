@@ -0,0 +1,85 @@
+import types
+
+import pytest
+
+import qemu_profiles
+from qemu_profiles import build_command, resolve_profile
+
+CAPABILITIES = {"accelerators": ['kvm', 'tcg'], "machine_types": ['pc', 'q35']}
+
+
+@pytest.fixture
+def host(monkeypatch):
+    """A Linux host; `devices` lists the /dev nodes that are usable"""
+    host = types.SimpleNamespace(devices={'/dev/kvm', '/dev/vhost-net'})
+    monkeypatch.setattr(qemu_profiles, 'sys', types.SimpleNamespace(platform='linux'))
+    monkeypatch.setattr(qemu_profiles, 'os', types.SimpleNamespace(
+        R_OK=4, W_OK=2, access=lambda path, mode: path in host.devices))
+    return host
+
+
+def _command(settings, cpu_cores=2, iso_path=None):
+    return build_command('qemu-system-x86_64', settings, cpu_cores, 2048, 'C:/vms/web.qcow2', 'qcow2', iso_path)
+
+
+def test_compat_profile_keeps_the_old_command_line(host):
+    settings = resolve_profile(CAPABILITIES, cpu_cores=2)
+    assert settings["notes"] == []
+    assert _command(settings) == [
+        'qemu-system-x86_64', '-accel', 'kvm', '-smp', '2', '-m', '2048',
+        '-drive', 'file=C:/vms/web.qcow2,format=qcow2,if=ide,index=0,media=disk',
+        '-boot', 'order=c', '-netdev', 'user,id=net0', '-device', 'virtio-net,netdev=net0']
+
+
+def test_performance_profile_with_kvm(host):
+    settings = resolve_profile(CAPABILITIES, 'performance', cpu_cores=4)
+    assert _command(settings, cpu_cores=4, iso_path='C:/isos/ubuntu.iso') == [
+        'qemu-system-x86_64', '-machine', 'q35', '-accel', 'kvm', '-cpu', 'host', '-smp', '4', '-m', '2048',
+        '-object', 'iothread,id=io0',
+        '-drive', 'file=C:/vms/web.qcow2,format=qcow2,if=none,id=disk0,cache=none,aio=native,discard=unmap',
+        '-device', 'virtio-blk-pci,drive=disk0,num-queues=4,iothread=io0',
+        '-cdrom', 'C:/isos/ubuntu.iso', '-boot', 'order=dc',
+        '-netdev', 'user,id=net0', '-device', 'virtio-net-pci,netdev=net0']
+
+
+def test_performance_profile_falls_back_under_tcg(host):
+    host.devices.discard('/dev/kvm')
+    settings = resolve_profile({"accelerators": ['tcg'], "machine_types": ['pc']}, 'performance')
+    assert (settings["accel"], settings["cpu_model"], settings["machine"]) == ('tcg', 'max', None)
+    assert len(settings["notes"]) == 3
+    assert _command(settings)[:7] == ['qemu-system-x86_64', '-accel', 'tcg', '-cpu', 'max', '-smp', '2']
+
+
+def test_multiqueue_tap_with_vhost(host):
+    settings = resolve_profile(CAPABILITIES, 'performance', {"network": 'tap', "tap_ifname": 'tap0',
+                                                             "disk_bus": 'virtio-scsi', "queues": 16}, cpu_cores=2)
+    assert settings["queues"] == qemu_profiles.MAX_QUEUES
+    cmd = _command(settings)
+    assert cmd[cmd.index('-device') + 1] == 'virtio-scsi-pci,id=scsi0,num_queues=8,iothread=io0'
+    assert 'scsi-hd,drive=disk0,bus=scsi0.0' in cmd
+    assert cmd[-4:] == ['-netdev', 'tap,id=net0,ifname=tap0,script=no,downscript=no,vhost=on,queues=8',
+                        '-device', 'virtio-net-pci,netdev=net0,mq=on,vectors=18']
+
+
+def test_user_networking_notes_that_it_has_one_queue(host):
+    settings = resolve_profile(CAPABILITIES, 'performance', {"queues": 4})
+    assert any('user-mode networking uses one queue' in note for note in settings["notes"])
+
+
+@pytest.mark.parametrize('options, message', [
+    ({"disk_bus": 'sata'}, 'Invalid disk_bus'),
+    ({"cache": 'writeback', "aio": 'native'}, 'aio=native requires cache=none'),
+    ({"network": 'tap'}, 'network=tap requires tap_ifname'),
+    ({"turbo": True}, 'Unknown launch option'),
+])
+def test_invalid_options(host, options, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_profile(CAPABILITIES, 'performance', options)
+
+
+def test_unknown_profile_and_io_uring_off_linux(host, monkeypatch):
+    with pytest.raises(ValueError, match='Unknown launch profile'):
+        resolve_profile(CAPABILITIES, 'fast')
+    monkeypatch.setattr(qemu_profiles, 'sys', types.SimpleNamespace(platform='darwin'))
+    with pytest.raises(ValueError, match='only available on Linux'):
+        resolve_profile(CAPABILITIES, 'performance', {"aio": 'io_uring'})
@@ -0,0 +1,192 @@
+import json
+import time
+import shutil
+import tempfile
+import threading
+import socketserver
+
+import pytest
+
+from qmp import QMPClient, QMPError, qmp_command
+
+GREETING = {"QMP": {"version": {"qemu": {"micro": 0, "minor": 2, "major": 8}, "package": ""}, "capabilities": []}}
+
+
+def _line(message):
+    return json.dumps(message).encode() + b'\r\n'
+
+
+class QMPHandler(socketserver.StreamRequestHandler):
+    """Greets, insists on qmp_capabilities first, then plays the server's script.
+
+    script maps a command to the byte chunks sent back for it, written one at a
+    time with a short pause so the client sees them as separate reads; None
+    means never answer.
+    """
+
+    def handle(self):
+        server = self.server
+        if server.greeting is None:
+            time.sleep(5)
+            return
+        self.wfile.write(server.greeting)
+        negotiated = False
+        for line in self.rfile:
+            message = json.loads(line)
+            server.received.append(message)
+            command = message.get('execute')
+            if not negotiated:
+                if command == 'qmp_capabilities':
+                    negotiated = True
+                    self.wfile.write(_line({"return": {}}))
+                else:
+                    self.wfile.write(_line({"error": {"class": "CommandNotFound",
+                                                      "desc": "Expecting capabilities negotiation with 'qmp_capabilities'"}}))
+                continue
+            chunks = server.script.get(command, [_line({"return": {}})])
+            if chunks is None:
+                time.sleep(5)
+                return
+            if chunks == 'close':
+                return
+            for chunk in chunks:
+                self.wfile.write(chunk)
+                time.sleep(0.01)
+
+
+class FakeQMP(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, path):
+        super().__init__(path, QMPHandler)
+        self.greeting = _line(GREETING)
+        self.script = {}
+        self.received = []
+
+    @property
+    def address(self):
+        return 'unix:' + self.server_address
+
+
+@pytest.fixture
+def qmp_server():
+    directory = tempfile.mkdtemp(prefix='qmp-')
+    server = FakeQMP(f'{directory}/vm.qmp')
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_connect_reads_the_greeting_and_negotiates_capabilities(qmp_server):
+    qmp_server.script['query-status'] = [_line({"return": {"status": "running", "running": True}})]
+    with QMPClient(qmp_server.address) as client:
+        assert client.greeting == GREETING
+        assert client.execute('query-status') == {"status": "running", "running": True}
+    assert [message["execute"] for message in qmp_server.received] == ['qmp_capabilities', 'query-status']
+
+
+def test_arguments_are_sent_only_when_given(qmp_server):
+    with QMPClient(qmp_server.address) as client:
+        client.execute('human-monitor-command', {"command-line": "info snapshots"})
+        client.execute('system_powerdown')
+    assert qmp_server.received[1] == {"execute": "human-monitor-command",
+                                      "arguments": {"command-line": "info snapshots"}}
+    assert qmp_server.received[2] == {"execute": "system_powerdown"}
+
+
+def test_unexpected_greeting_is_rejected(qmp_server):
+    qmp_server.greeting = _line({"hello": "not qmp"})
+    client = QMPClient(qmp_server.address)
+    with pytest.raises(QMPError, match='Unexpected QMP greeting'):
+        client.connect()
+    assert client._sock is None
+
+
+def test_events_before_the_reply_are_kept(qmp_server):
+    powerdown = {"event": "POWERDOWN", "timestamp": {"seconds": 1, "microseconds": 0}}
+    shutdown = {"event": "SHUTDOWN", "data": {"guest": True}, "timestamp": {"seconds": 2, "microseconds": 0}}
+    qmp_server.script['system_powerdown'] = [_line(powerdown), _line(shutdown), _line({"return": {}})]
+    with QMPClient(qmp_server.address) as client:
+        assert client.execute('system_powerdown') == {}
+        assert client.events == [powerdown, shutdown]
+
+
+def test_messages_split_and_batched_across_reads(qmp_server):
+    event = _line({"event": "STOP", "timestamp": {"seconds": 1, "microseconds": 0}})
+    reply = _line({"return": {"status": "paused"}})
+    # One event split mid-object, then the rest of it arriving together with the reply
+    qmp_server.script['query-status'] = [event[:7], event[7:] + b'\r\n' + reply]
+    with QMPClient(qmp_server.address) as client:
+        assert client.execute('query-status') == {"status": "paused"}
+        assert [e["event"] for e in client.events] == ['STOP']
+
+
+def test_events_after_a_reply_are_picked_up_by_the_next_command(qmp_server):
+    resume = {"event": "RESUME", "timestamp": {"seconds": 1, "microseconds": 0}}
+    qmp_server.script['cont'] = [_line({"return": {}}) + _line(resume)]
+    qmp_server.script['query-status'] = [_line({"return": {"status": "running"}})]
+    with QMPClient(qmp_server.address) as client:
+        client.execute('cont')
+        assert client.execute('query-status') == {"status": "running"}
+        assert client.events == [resume]
+
+
+def test_error_reply_raises_with_its_class(qmp_server):
+    qmp_server.script['savevm'] = [_line({"error": {"class": "GenericError",
+                                                    "desc": "Device 'ide0-hd0' is writable but does not support snapshots"}})]
+    with QMPClient(qmp_server.address) as client:
+        with pytest.raises(QMPError) as raised:
+            client.execute('savevm')
+        assert raised.value.error_class == 'GenericError'
+        assert 'does not support snapshots' in str(raised.value)
+        # The connection stays usable after an error reply
+        assert client.execute('query-status') == {}
+
+
+def test_command_without_a_reply_times_out(qmp_server):
+    qmp_server.script['query-status'] = None
+    with QMPClient(qmp_server.address, timeout=0.2) as client:
+        started = time.monotonic()
+        with pytest.raises(QMPError, match='timed out'):
+            client.execute('query-status')
+        assert time.monotonic() - started < 2
+
+
+def test_silent_server_times_out_during_the_greeting(qmp_server):
+    qmp_server.greeting = None
+    with pytest.raises(QMPError, match='timed out'):
+        QMPClient(qmp_server.address, timeout=0.2).connect()
+
+
+def test_server_closing_mid_command(qmp_server):
+    qmp_server.script['quit'] = 'close'
+    with QMPClient(qmp_server.address) as client:
+        with pytest.raises(QMPError, match='closed'):
+            client.execute('quit')
+
+
+def test_missing_socket_and_unconnected_client():
+    with pytest.raises(QMPError, match='Cannot connect'):
+        QMPClient('unix:/nonexistent/vm.qmp').connect()
+    with pytest.raises(QMPError, match='not connected'):
+        QMPClient('unix:/nonexistent/vm.qmp').execute('query-status')
+
+
+def test_one_shot_command_over_tcp():
+    class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        daemon_threads = True
+        block_on_close = False
+
+    server = TCPServer(('127.0.0.1', 0), QMPHandler)
+    server.greeting = _line(GREETING)
+    server.script = {'query-name': [_line({"return": {"name": "web"}})]}
+    server.received = []
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    try:
+        assert qmp_command(f'tcp:127.0.0.1:{server.server_address[1]}', 'query-name') == {"name": "web"}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,186 @@
+import json
+import time
+import types
+import threading
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, cached, invalidates
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Blocking:
+    """A compute() that holds its caller until released, counting the calls"""
+
+    def __init__(self, value='answer'):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+def _in_thread(function, *args, **kwargs):
+    results = []
+
+    def run():
+        try:
+            results.append(function(*args, **kwargs))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, results
+
+
+def _until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = ResponseCache()
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_compute('images', 10, compute) == 1
+    clock.now += 9.9
+    assert cache.get_or_compute('images', 10, compute) == 1
+    clock.now += 0.2
+    assert cache.get_or_compute('images', 10, compute) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 2, 2)
+
+
+def test_fresh_skips_the_lookup_and_replaces_the_entry(clock):
+    cache = ResponseCache()
+    cache.get_or_compute('images', 10, lambda: 'old')
+    assert cache.get_or_compute('images', 10, lambda: 'new', fresh=True) == 'new'
+    assert cache.get_or_compute('images', 10, lambda: 'unused') == 'new'
+
+
+def test_concurrent_callers_share_one_compute():
+    cache = ResponseCache()
+    compute = Blocking()
+    first, first_result = _in_thread(cache.get_or_compute, 'images', 10, compute)
+    assert compute.started.wait(5)
+    others = [_in_thread(cache.get_or_compute, 'images', 10, compute) for _ in range(3)]
+    _until(lambda: cache.stats()["coalesced"] == 3)
+    compute.release.set()
+    for thread, _ in [(first, first_result)] + others:
+        thread.join(5)
+    assert compute.calls == 1
+    assert first_result + [result for _, results in others for result in results] == ['answer'] * 4
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_waiters_get_the_error_and_nothing_is_stored():
+    cache = ResponseCache()
+    compute = Blocking(ConnectionError('daemon went away'))
+    first, first_result = _in_thread(cache.get_or_compute, 'images', 10, compute)
+    assert compute.started.wait(5)
+    second, second_result = _in_thread(cache.get_or_compute, 'images', 10, compute)
+    compute.release.set()
+    first.join(5)
+    second.join(5)
+    assert [str(result) for result in first_result + second_result] == ['daemon went away'] * 2
+    assert cache.get_or_compute('images', 10, lambda: 'recovered') == 'recovered'
+
+
+def test_invalidation_during_a_compute_is_not_undone():
+    cache = ResponseCache()
+    compute = Blocking('before the delete')
+    first, first_result = _in_thread(cache.get_or_compute, 'images', 10, compute, tags=('images',))
+    assert compute.started.wait(5)
+    cache.invalidate('images')
+    # A caller arriving after the change does not join the call that predates it
+    assert cache.get_or_compute('images', 10, lambda: 'after the delete', tags=('images',)) == 'after the delete'
+    compute.release.set()
+    first.join(5)
+    assert first_result == ['before the delete']
+    # ...and the stale answer did not overwrite the fresh one
+    assert cache.get_or_compute('images', 10, lambda: 'unused', tags=('images',)) == 'after the delete'
+
+
+def test_invalidation_only_drops_matching_tags():
+    cache = ResponseCache()
+    cache.get_or_compute('images', 10, lambda: 'images', tags=('images',))
+    cache.get_or_compute('containers', 10, lambda: 'containers', tags=('containers',))
+    cache.invalidate('images')
+    assert cache.get_or_compute('images', 10, lambda: 'reloaded', tags=('images',)) == 'reloaded'
+    assert cache.get_or_compute('containers', 10, lambda: 'unused', tags=('containers',)) == 'containers'
+    cache.invalidate()
+    assert cache.get_or_compute('containers', 10, lambda: 'reloaded', tags=('containers',)) == 'reloaded'
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.get_or_compute('a', 10, lambda: 'a')
+    cache.get_or_compute('b', 10, lambda: 'b')
+    cache.get_or_compute('a', 10, lambda: 'unused')
+    cache.get_or_compute('c', 10, lambda: 'c')
+    assert cache.get_or_compute('a', 10, lambda: 'unused') == 'a'
+    assert cache.get_or_compute('b', 10, lambda: 'recomputed') == 'recomputed'
+    assert cache.stats()["evictions"] == 2
+
+
+class Manager:
+    def __init__(self):
+        self.cache = ResponseCache()
+        self.images = ['alpine']
+        self.fail = False
+
+    @cached(ttl=10, tags=('images',))
+    def list_images(self, all=False):
+        if self.fail:
+            return json.dumps({"success": False, "error": "daemon went away"})
+        return json.dumps({"success": True, "images": list(self.images)})
+
+    @invalidates('images')
+    def delete_image(self, name):
+        self.images.remove(name)
+        return json.dumps({"success": True})
+
+
+def test_decorated_queries_are_cached_per_arguments_and_invalidated():
+    manager = Manager()
+    assert json.loads(manager.list_images())["images"] == ['alpine']
+    manager.images.append('nginx')
+    assert json.loads(manager.list_images())["images"] == ['alpine']
+    assert json.loads(manager.list_images(all=True))["images"] == ['alpine', 'nginx']
+    assert json.loads(manager.list_images(fresh=True))["images"] == ['alpine', 'nginx']
+    manager.delete_image('alpine')
+    assert json.loads(manager.list_images())["images"] == ['nginx']
+
+
+def test_failed_responses_are_not_cached():
+    manager = Manager()
+    manager.fail = True
+    assert not json.loads(manager.list_images())["success"]
+    manager.fail = False
+    assert json.loads(manager.list_images())["success"]
+    assert manager.cache.stats()["stores"] == 1
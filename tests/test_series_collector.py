@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from docker_metrics import MetricsCollector
+from series_collector import SeriesCollector
+from vm_metrics import VMMetricsCollector
+
+
+class CountingCollector(SeriesCollector):
+    """Samples whichever targets are in `targets`, with a value that grows each pass"""
+    FIELDS = ('value',)
+    THREAD_NAME = 'test-metrics'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.targets = {'a1b2': 'web', 'c3d4': 'db'}
+        self.passes = 0
+
+    def sample(self, targets=None):
+        self.passes += 1
+        samples = {}
+        for key, name in self.targets.items():
+            if targets is None or key in targets:
+                with self._lock:
+                    self._previous[key] = self.passes
+                samples[key] = {"id": key, "name": name, "values": {"value": float(self.passes)}}
+        return samples
+
+    def resolve(self, target):
+        with self._lock:
+            return target if target in self.series else \
+                next((key for key, name in self.names.items() if name == target), None)
+
+
+def test_record_keeps_a_series_per_target():
+    collector = CountingCollector(interval=5, capacity=10)
+    for t in (100.0, 105.0, 110.0):
+        collector.record(collector.sample(), timestamp=t)
+    result = collector.query('web')
+    assert list(result) == ['a1b2']
+    assert result['a1b2']["name"] == 'web'
+    assert result['a1b2']["series"]["t"] == [100.0, 105.0, 110.0]
+    assert result['a1b2']["series"]["value"] == [1.0, 2.0, 3.0]
+    assert set(collector.query()) == {'a1b2', 'c3d4'}
+    assert collector.query('nope') == {}
+
+
+def test_gone_targets_keep_history_for_the_span_of_the_buffer():
+    collector = CountingCollector(interval=5, capacity=10)
+    collector.record(collector.sample(), timestamp=100.0)
+    del collector.targets['c3d4']
+    # A full pass without the target drops its sampling state right away...
+    collector.record(collector.sample(), timestamp=105.0)
+    assert 'c3d4' in collector.series and 'c3d4' not in collector._previous
+    # ...and its history once it is older than capacity * interval, on any pass
+    collector.record(collector.sample(targets=['a1b2']), timestamp=151.0, full_pass=False)
+    assert 'c3d4' not in collector.series and 'c3d4' not in collector.names
+    assert 'a1b2' in collector.series
+
+
+def test_partial_passes_keep_other_targets_state():
+    collector = CountingCollector()
+    collector.record(collector.sample(), timestamp=100.0)
+    collector.record(collector.sample(targets=['a1b2']), timestamp=101.0, full_pass=False)
+    assert set(collector._previous) == {'a1b2', 'c3d4'}
+    assert collector.last_pass == 100.0
+
+
+def test_last_pass_is_only_served_while_the_loop_is_fresh():
+    collector = CountingCollector(interval=1)
+    collector.record(collector.sample())
+    assert collector.fresh_samples() is None
+    collector.start()
+    try:
+        deadline = time.monotonic() + 2
+        while collector.passes < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert set(collector.fresh_samples()) == {'a1b2', 'c3d4'}
+        assert collector._thread.name == 'test-metrics'
+    finally:
+        collector.stop()
+        collector._thread.join(2)
+    assert not collector.running
+
+
+def test_sampling_errors_are_kept_for_the_caller():
+    collector = CountingCollector(interval=1)
+
+    def fail(targets=None):
+        raise RuntimeError('daemon went away')
+
+    collector.sample = fail
+    collector.start()
+    deadline = time.monotonic() + 2
+    while collector.last_error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    collector.stop()
+    collector._thread.join(2)
+    assert collector.last_error == 'daemon went away'
+
+
+@pytest.mark.parametrize('collector_class', [MetricsCollector, VMMetricsCollector])
+def test_both_collectors_share_the_base(collector_class):
+    # The Docker manager / VM registry is only used when sampling
+    collector = collector_class(None, interval=2, capacity=30)
+    assert isinstance(collector, SeriesCollector)
+    assert (collector.interval, collector.capacity) == (2, 30)
+    collector.start(interval=0.1)
+    collector.stop()
+    collector._thread.join(2)
+    # The minimum interval applies to both
+    assert collector.interval == 1
@@ -0,0 +1,54 @@
+from timeseries import LAST, MAX, RingSeries
+
+
+def _filled(count, capacity=10, aggregates=None):
+    series = RingSeries(('cpu', 'mem'), capacity, aggregates)
+    for i in range(count):
+        series.append(100.0 + i, {"cpu": float(i), "mem": 1000.0 + i})
+    return series
+
+
+def test_oldest_samples_are_overwritten_once_full():
+    series = _filled(13, capacity=10)
+    assert len(series) == 10
+    assert (series.first_time, series.last_time) == (103.0, 112.0)
+    assert series.range()["cpu"] == [float(i) for i in range(3, 13)]
+    assert series.latest() == {"t": 112.0, "cpu": 12.0, "mem": 1012.0}
+
+
+def test_missing_values_come_back_as_none():
+    series = RingSeries(('cpu', 'mem'), 4)
+    assert series.latest() is None and series.first_time is None
+    series.append(1.0, {"cpu": 5.0})
+    series.append(2.0, {"cpu": None, "mem": 7.0})
+    assert series.range() == {"t": [1.0, 2.0], "cpu": [5.0, None], "mem": [None, 7.0]}
+
+
+def test_range_is_inclusive_across_the_wrap():
+    series = _filled(15, capacity=10)
+    assert series.range(107.0, 110.0)["t"] == [107.0, 108.0, 109.0, 110.0]
+    assert series.range(start=113.0)["cpu"] == [13.0, 14.0]
+    assert series.range(end=100.0)["t"] == []
+
+
+def test_downsample_reduces_each_bucket_per_field():
+    series = _filled(10, aggregates={"cpu": MAX, "mem": LAST})
+    result = series.downsample(3)
+    assert len(result["t"]) == 3
+    assert result["t"] == [100.0, 103.0, 106.0]
+    assert result["cpu"] == [2.0, 5.0, 9.0]
+    assert result["mem"] == [1002.0, 1005.0, 1009.0]
+
+
+def test_downsample_defaults_to_the_mean_and_skips_gaps():
+    series = RingSeries(('cpu',), 8)
+    for t, value in [(0.0, 1.0), (1.0, 3.0), (2.0, None), (3.0, None), (4.0, 10.0), (5.0, 20.0)]:
+        series.append(t, {"cpu": value})
+    assert series.downsample(3, start=0.0, end=6.0) == {"t": [0.0, 2.0, 4.0], "cpu": [2.0, None, 15.0]}
+
+
+def test_downsample_returns_raw_samples_when_there_are_few_enough():
+    series = _filled(5)
+    assert series.downsample(10) == series.range()
+    assert series.downsample(0) == series.range()
+    assert series.downsample(2, start=102.0, end=103.0) == series.range(102.0, 103.0)
@@ -0,0 +1,74 @@
+import os
+import time
+import types
+
+import pytest
+
+import vm_metrics
+from vm_metrics import VMMetricsCollector, tap_interface
+from vm_registry import VMRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return VMRegistry(str(tmp_path / 'vms.json'))
+
+
+@pytest.fixture
+def entry(registry):
+    # This test process stands in for QEMU
+    command = ['qemu-system-x86_64', '-netdev', 'user,id=n0', '-netdev', 'tap,id=n1,ifname=tap7,script=no']
+    return registry.add(registry.new_id(), 'web', types.SimpleNamespace(pid=os.getpid()), 'tcp:127.0.0.1:1',
+                        {"cpu_cores": 1}, command)
+
+
+class Counters:
+    """Stands in for query-blockstats, returning the next totals on each call"""
+
+    def __init__(self, *reads):
+        self.reads = list(reads)
+
+    def __call__(self, address):
+        read = self.reads.pop(0)
+        return {'disk_read': read, 'disk_write': 0, 'disk_read_ops': read // 512, 'disk_write_ops': 0}
+
+
+def test_tap_interface():
+    assert tap_interface(['qemu', '-netdev', 'tap,id=n1,ifname=tap7,script=no']) == 'tap7'
+    assert tap_interface(['qemu', '-netdev', 'user,id=n0']) is None
+    assert tap_interface(['qemu', '-netdev']) is None
+
+
+def test_rates_start_on_the_second_sample(registry, entry, monkeypatch):
+    monkeypatch.setattr(vm_metrics, '_blockstats', Counters(1000, 5000, 2000))
+    monkeypatch.setattr(vm_metrics, '_tap_counters', lambda ifname: {'net_rx': 10, 'net_tx': 20})
+    collector = VMMetricsCollector(registry)
+    first = collector.sample()[entry["id"]]["values"]
+    assert first["rss"] > 0 and first["threads"] >= 1
+    assert first["disk_read"] == 1000 and first["net_rx"] == 10
+    assert 'cpu_percent' not in first and 'disk_read_rate' not in first
+    time.sleep(0.05)
+    second = collector.sample()[entry["id"]]["values"]
+    assert second["cpu_percent"] >= 0
+    assert second["disk_read_rate"] > 0 and second["net_rx_rate"] == 0
+    time.sleep(0.05)
+    # A counter that went backwards was reset: no negative rate
+    assert collector.sample()[entry["id"]]["values"]["disk_read_rate"] == 0
+
+
+def test_vm_that_is_gone_is_reported_not_raised(registry):
+    collector = VMMetricsCollector(registry, blockstats=False)
+    gone = {"id": 'deadbeef', "name": 'gone', "pid": 2 ** 22 + 1, "command": []}
+    assert collector.sample([gone]) == {
+        'deadbeef': {"id": 'deadbeef', "name": 'gone', "pid": 2 ** 22 + 1, "error": 'VM gone is not running'}}
+
+
+def test_history_is_found_by_id_name_or_pid(registry, entry):
+    collector = VMMetricsCollector(registry, blockstats=False)
+    samples = collector.current([entry])
+    assert samples[entry["id"]]["values"]["rss"] > 0
+    for target in (entry["id"], 'web', os.getpid()):
+        assert list(collector.query(target)) == [entry["id"]]
+    assert collector.query('db') == {}
+    collector.forget(entry["id"])
+    assert entry["id"] not in collector._processes and entry["id"] not in collector._previous
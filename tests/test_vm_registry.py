@@ -0,0 +1,86 @@
+import os
+import json
+import types
+import threading
+
+import pytest
+
+from vm_registry import VMRegistry, log_path, log_tail
+
+
+def _process():
+    # This test process stands in for QEMU, so the entries stay alive
+    return types.SimpleNamespace(pid=os.getpid())
+
+
+def _add(registry, name):
+    vm_id = registry.new_id()
+    return registry.add(vm_id, name, _process(), 'tcp:127.0.0.1:4444', {"cpu_cores": 1}, ['qemu'])
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'vms.json')
+
+
+def test_entries_survive_a_new_registry(path):
+    entry = _add(VMRegistry(path), 'web')
+    reopened = VMRegistry(path)
+    assert reopened.find('web') == entry
+    assert reopened.find(entry["id"]) == entry
+    assert reopened.find(os.getpid())["id"] == entry["id"]
+
+
+def test_two_processes_do_not_overwrite_each_other(path):
+    # The resident backend keeps its registry open while one-shot calls add and remove VMs
+    resident, one_shot = VMRegistry(path), VMRegistry(path)
+    web = _add(resident, 'web')
+    db = _add(one_shot, 'db')
+    cache = _add(resident, 'cache')
+    with open(path) as f:
+        assert set(json.load(f)["vms"]) == {web["id"], db["id"], cache["id"]}
+    assert {entry["name"] for entry in resident.entries()} == {'web', 'db', 'cache'}
+    one_shot.remove(web["id"])
+    assert resident.find('web') is None
+    assert {entry["name"] for entry in VMRegistry(path).entries()} == {'db', 'cache'}
+
+
+def test_concurrent_writers_through_separate_registries(path):
+    registries = [VMRegistry(path) for _ in range(4)]
+
+    def add_many(registry, worker):
+        for index in range(10):
+            _add(registry, f'vm-{worker}-{index}')
+
+    threads = [threading.Thread(target=add_many, args=(registry, worker))
+               for worker, registry in enumerate(registries)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(VMRegistry(path).entries()) == 40
+
+
+def test_exited_vms_are_dropped_with_their_log(path):
+    registry = VMRegistry(path)
+    entry = registry.add(registry.new_id(), 'gone', types.SimpleNamespace(pid=2 ** 22 + 1), 'tcp:127.0.0.1:1',
+                         {}, ['qemu'])
+    with open(log_path(entry["id"]), 'w') as f:
+        f.write('qemu-system-x86_64: -drive file=missing.qcow2: Could not open\n')
+    assert registry.entries() == []
+    assert not os.path.exists(log_path(entry["id"]))
+    assert VMRegistry(path).find('gone') is None
+
+
+def test_log_tail_quotes_the_end_of_the_log():
+    with open(log_path('abcd1234'), 'w') as f:
+        f.write('x' * 5000 + '\nfailed to open disk\n')
+    assert log_tail('abcd1234', size=20) == 'failed to open disk'
+    assert len(log_tail('abcd1234')) <= 4096
+    assert log_tail('no-such-vm') == ''
+
+
+def test_removing_an_unknown_vm_writes_nothing(path):
+    registry = VMRegistry(path)
+    assert registry.remove('deadbeef') is None
+    assert not os.path.exists(path)
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import types
+
+import pytest
+
+import vm_scheduler
+from vm_registry import VMRegistry
+from vm_scheduler import VMScheduler, memory_args, parse_cpulist
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return VMRegistry(str(tmp_path / 'vms.json'))
+
+
+@pytest.fixture
+def scheduler(tmp_path, registry, monkeypatch):
+    monkeypatch.setattr(vm_scheduler, 'QUEUE_POLL_SECONDS', 0.01)
+    return VMScheduler(registry, path=str(tmp_path / 'scheduler.json'))
+
+
+def _register(registry, name, cpu_cores, ram_size, cpus=None):
+    # This test process stands in for QEMU, so the entry stays alive
+    config = {"cpu_cores": cpu_cores, "ram_size": ram_size, "cpus": cpus}
+    return registry.add(registry.new_id(), name, types.SimpleNamespace(pid=os.getpid()), 'tcp:127.0.0.1:1',
+                        config, ['qemu'])
+
+
+def _until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_parse_cpulist():
+    assert parse_cpulist('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist('') == []
+
+
+def test_memory_args_for_hugepages_on_a_numa_node():
+    assert memory_args(2048, None) == []
+    assert memory_args(2048, {"numa_node": 1, "hugepages": False}) == \
+        ['-object', 'memory-backend-ram,id=mem0,size=2048M,host-nodes=1,policy=bind', '-numa', 'node,memdev=mem0']
+    assert memory_args(2048, {"numa_node": None, "hugepages": True, "hugepage_mount": '/dev/hugepages'}) == \
+        ['-object', 'memory-backend-file,id=mem0,size=2048M,mem-path=/dev/hugepages,share=on,prealloc=on',
+         '-numa', 'node,memdev=mem0']
+
+
+def test_policy_is_validated_and_persisted(scheduler, tmp_path):
+    assert scheduler.policy() == vm_scheduler.DEFAULT_POLICY
+    with pytest.raises(ValueError, match='Unknown scheduler setting'):
+        scheduler.set_policy({"cpu_ratio": 2})
+    with pytest.raises(ValueError, match='Invalid when_full'):
+        scheduler.set_policy({"when_full": 'wait'})
+    with pytest.raises(ValueError, match='must be a positive number'):
+        scheduler.set_policy({"cpu_overcommit": 0})
+    scheduler.set_policy({"cpu_overcommit": 1, "when_full": 'queue'})
+    policy = VMScheduler(scheduler.registry, path=str(tmp_path / 'scheduler.json')).policy()
+    assert (policy["cpu_overcommit"], policy["when_full"]) == (1.0, 'queue')
+
+
+def test_admission_counts_registered_vms_and_reservations(scheduler, registry):
+    limit = scheduler.usage()["cpu_limit"]
+    assert scheduler.check(limit, 64) == []
+    _register(registry, 'web', 1, 64)
+    problems = scheduler.check(limit, 64)
+    assert problems == [f"{limit} vCPUs requested, 1 of {limit} already committed"]
+    reservation = scheduler.reserve(limit - 1, 64)
+    assert scheduler.check(1, 64)
+    scheduler.release(reservation)
+    assert scheduler.check(1, 64) == []
+    ram_limit = scheduler.usage()["ram_limit_mb"]
+    assert 'MB RAM requested' in scheduler.check(1, ram_limit)[0]
+
+
+def test_queue_drains_in_order_once_capacity_frees_up(scheduler):
+    limit = scheduler.usage()["cpu_limit"]
+    launched, results = [], []
+
+    def launcher(request):
+        launched.append(request["name"])
+        return {"success": True, "name": request["name"]}
+
+    scheduler.launcher = launcher
+    blocker = scheduler.reserve(limit - 1, 64)
+    assert scheduler.enqueue({"name": 'big', "cpu_cores": limit, "ram_size": 64}, results.append) == \
+        {"queue_id": 1, "position": 1}
+    scheduler.enqueue({"name": 'small', "cpu_cores": 1, "ram_size": 64}, results.append)
+    time.sleep(0.1)
+    # Strict FIFO: the small VM would fit, but it must not jump ahead of the big one
+    assert launched == []
+    assert [item["name"] for item in scheduler.queued()] == ['big', 'small']
+    scheduler.release(blocker)
+    _until(lambda: len(results) == 2)
+    assert launched == ['big', 'small']
+    assert results == [{"success": True, "name": 'big', "queue_id": 1},
+                       {"success": True, "name": 'small', "queue_id": 2}]
+    _until(lambda: not scheduler._thread.is_alive())
+
+
+def test_cancelled_and_failing_launches_leave_the_queue(scheduler):
+    limit = scheduler.usage()["cpu_limit"]
+    results = []
+
+    def launcher(request):
+        raise RuntimeError('QEMU not found')
+
+    scheduler.launcher = launcher
+    blocker = scheduler.reserve(limit, 64)
+    first = scheduler.enqueue({"name": 'a', "cpu_cores": 1, "ram_size": 64}, results.append)
+    scheduler.enqueue({"name": 'b', "cpu_cores": 1, "ram_size": 64}, results.append)
+    assert scheduler.cancel(first["queue_id"])
+    assert not scheduler.cancel(first["queue_id"])
+    scheduler.release(blocker)
+    _until(lambda: results)
+    assert results == [{"success": False, "error": 'QEMU not found', "queue_id": 2}]
+    assert scheduler.queued() == []
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='placement is Linux only')
+def test_pinned_cores_are_not_handed_out_twice(scheduler, registry):
+    _register(registry, 'web', 1, 64, cpus=[0])
+    with pytest.raises(ValueError, match='already pinned to another VM'):
+        scheduler.place(1, 64, {"pin": [0]})
+    with pytest.raises(ValueError, match='do not exist'):
+        scheduler.place(1, 64, {"pin": [4096]})
+    with pytest.raises(ValueError, match='Unknown placement option'):
+        scheduler.place(1, 64, {"pin": True, "cores": 2})
+    assert scheduler.place(1, 64, None) is None
+    if scheduler.usage()["cpu_count"] > 1:
+        placed = scheduler.place(1, 64, {"pin": True})
+        assert placed["cpus"] and 0 not in placed["cpus"]
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from qmp import QMPError
+from vm_snapshots import SnapshotCatalog, check_tag, disk_of, hmp, parse_snapshot_list
+
+# The fake QMP server from the QMP client tests
+from test_qmp import _line, qmp_server  # noqa: F401
+
+SNAPSHOT_LIST = '''Snapshot list:
+ID        TAG               VM SIZE                DATE     VM CLOCK     ICOUNT
+1         fresh-install     512 MiB 2024-05-01 09:30:12 00:03:41.120
+2         snap-20240502    1.02 GiB 2024-05-02 18:02:55 01:12:09.004
+'''
+
+
+def test_parse_snapshot_list():
+    assert parse_snapshot_list(SNAPSHOT_LIST) == [
+        {"id": '1', "tag": 'fresh-install', "vm_size": '512 MiB', "date": '2024-05-01 09:30:12',
+         "vm_clock": '00:03:41.120'},
+        {"id": '2', "tag": 'snap-20240502', "vm_size": '1.02 GiB', "date": '2024-05-02 18:02:55',
+         "vm_clock": '01:12:09.004'},
+    ]
+    assert parse_snapshot_list('') == []
+
+
+def test_tags_are_checked():
+    assert check_tag('before-upgrade_1.2') == 'before-upgrade_1.2'
+    for tag in ('', 'has space', 'a;quit', 'x' * 65):
+        with pytest.raises(ValueError, match='Snapshot names may only contain'):
+            check_tag(tag)
+
+
+def test_disk_of():
+    assert disk_of(['qemu', '-m', '512', '-drive', 'file=/vms/web.qcow2,format=qcow2,if=none,id=disk0']) == \
+        '/vms/web.qcow2'
+    assert disk_of(['qemu', '-cdrom', 'x.iso']) is None
+
+
+def test_catalog_keeps_the_launch_config_per_tag(tmp_path):
+    catalog = SnapshotCatalog(str(tmp_path / 'snapshots.json'))
+    assert catalog.get('/vms/web.qcow2') == (None, None)
+    catalog.record('/vms/web.qcow2', 'first', 'web', {"cpu_cores": 2, "ram_size": 2048})
+    time.sleep(0.01)
+    catalog.record('/vms/web.qcow2', 'second', 'web', {"cpu_cores": 4, "ram_size": 4096})
+    tag, record = catalog.get('/vms/web.qcow2')
+    assert (tag, record["config"]["cpu_cores"]) == ('second', 4)
+    assert catalog.get('/vms/web.qcow2', 'first')[1]["config"]["ram_size"] == 2048
+    catalog.forget('/vms/web.qcow2', 'second')
+    catalog.forget('/vms/web.qcow2', 'first')
+    assert catalog.tags('/vms/web.qcow2') == {}
+    assert SnapshotCatalog(str(tmp_path / 'snapshots.json')).get('/vms/web.qcow2') == (None, None)
+
+
+def test_hmp_output_with_an_error_raises(qmp_server):
+    qmp_server.script['human-monitor-command'] = [_line({"return": "Error: Device 'disk0' is writable but does "
+                                                                   "not support snapshots\r\n"})]
+    with pytest.raises(QMPError, match='does not support snapshots'):
+        hmp(qmp_server.address, 'savevm snap-1', timeout=2)
+    assert qmp_server.received[-1] == {"execute": 'human-monitor-command',
+                                       "arguments": {"command-line": 'savevm snap-1'}}
+
+
+def test_hmp_returns_the_monitor_output(qmp_server):
+    qmp_server.script['human-monitor-command'] = [_line({"return": SNAPSHOT_LIST.replace('\n', '\r\n')})]
+    assert parse_snapshot_list(hmp(qmp_server.address, 'info snapshots', timeout=2))[1]["tag"] == 'snap-20240502'